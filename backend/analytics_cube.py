@@ -0,0 +1,446 @@
+import logging
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from bson import Decimal128
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+
+# ============================================================================
+# MONTHLY ANALYTICS CUBE
+# ============================================================================
+#
+# `analytics_monthly` holds one document (cell) per
+# (month, family, purity, category, party_type) with additive measures:
+#   lines, qty, amount, vat, weight_in, weight_out
+#
+# Families and what each line contributes:
+# - sales: finalized invoice items. amount = line_total (incl. VAT), vat = vat_amount,
+#   weight_out = weight (the Stock OUT of the line)
+# - purchases: items of every purchase not deleted (all are stocked on creation, even
+#   an unpaid "Draft"); legacy single-item purchases count as one line.
+#   amount = calculated_amount, weight_in = weight_grams, purity = entered purity,
+#   category = the stock header the weight is booked into ("Gold 22K")
+# - sales_returns / purchase_returns: finalized return items. amount = item amount,
+#   weight_in (sales return) or weight_out (purchase return) = weight_grams
+# party_type is the saved party's type, or "walk_in".
+#
+# The write paths add a document's cells with $inc (record_*), or subtract them
+# first when a purchase is edited or deleted. rebuild_analytics_cube()
+# recomputes every cell from the source collections into a staging collection
+# and swaps it in; run it after bulk imports or to repair drift.
+#
+# Writes during a rebuild would be lost with the collection it replaces, and the
+# scan may or may not have read them. Each change is therefore stamped on its
+# document (CHANGE_TIME_FIELDS), and the rebuild's start is kept in
+# `analytics_cube_state`:
+# - the scan counts a document as it was before the start; documents it reads
+#   with a later stamp are left out
+# - while the rebuild runs, record_* queue their cells in the state document
+#   instead of applying them; after the swap, the queue of every change stamped
+#   after the start is applied, plus the removed cells of a purchase the scan
+#   left out (it had counted neither the old nor the new version)
+# - a change stamped before the start of the last rebuild was counted by its
+#   scan; record_* arriving that late skip it
+# A rebuild whose process died is taken over after ANALYTICS_REBUILD_TIMEOUT_SECONDS.
+
+ANALYTICS_COLLECTION = 'analytics_monthly'
+ANALYTICS_STAGING_COLLECTION = 'analytics_monthly_rebuild'
+ANALYTICS_STATE_COLLECTION = 'analytics_cube_state'
+ANALYTICS_REBUILD_TIMEOUT_SECONDS = float(os.environ.get('ANALYTICS_REBUILD_TIMEOUT_SECONDS', '3600'))
+FAMILIES = ('sales', 'purchases', 'sales_returns', 'purchase_returns')
+MEASURES = ('lines', 'qty', 'amount', 'vat', 'weight_in', 'weight_out')
+DIMENSIONS = ('purity', 'category', 'party_type')
+UNCATEGORIZED = 'Uncategorized'
+WALK_IN = 'walk_in'
+REBUILD_BATCH_SIZE = 1000
+
+# Set by every write that changes a document's cells; the latest is the document's change time
+CHANGE_TIME_FIELDS = {
+    'invoices': ('finalized_at',),
+    'purchases': ('created_at', 'updated_at', 'deleted_at'),
+    'returns': ('finalized_at',),
+}
+
+CellKey = Tuple[str, str, Optional[int], str, str]
+
+
+class RebuildRunningError(RuntimeError):
+    """Another rebuild of the cube is in progress"""
+
+
+def _decimal(value: Any) -> Decimal:
+    if value is None:
+        return Decimal('0')
+    if isinstance(value, Decimal128):
+        return value.to_decimal()
+    return Decimal(str(value))
+
+
+def month_of(value: Any) -> Optional[str]:
+    """"YYYY-MM" (UTC) of a stored date"""
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            return None
+    if not isinstance(value, datetime):
+        return None
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc)
+    return value.strftime('%Y-%m')
+
+
+def _utc(value: Any) -> Optional[datetime]:
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            return None
+    if not isinstance(value, datetime):
+        return None
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+def change_time(collection: str, doc: dict) -> Optional[datetime]:
+    stamps = [_utc(doc.get(name)) for name in CHANGE_TIME_FIELDS[collection]]
+    return max((stamp for stamp in stamps if stamp), default=None)
+
+
+def _purity(value: Any) -> Optional[int]:
+    try:
+        return int(_decimal(value)) if value is not None else None
+    except (ValueError, ArithmeticError):
+        return None
+
+
+def purchase_header_name(valuation_purity: int) -> str:
+    """Stock header purchases are booked into (same naming as create_purchase)"""
+    return f"Gold {valuation_purity // 41.6:.0f}K"
+
+
+def _add(cells: Dict[CellKey, Dict[str, Decimal]], key: CellKey, **measures):
+    cell = cells[key]
+    cell['lines'] += 1
+    for name, value in measures.items():
+        cell[name] += _decimal(value)
+
+
+def _new_cells() -> Dict[CellKey, Dict[str, Decimal]]:
+    return defaultdict(lambda: {name: Decimal('0') for name in MEASURES})
+
+
+def invoice_cells(invoice: dict, party_type: str, cells=None) -> Dict[CellKey, Dict[str, Decimal]]:
+    cells = _new_cells() if cells is None else cells
+    month = month_of(invoice.get('date'))
+    if not month:
+        return cells
+    for item in invoice.get('items') or []:
+        key = (month, 'sales', _purity(item.get('purity')), item.get('category') or UNCATEGORIZED, party_type)
+        _add(cells, key, qty=item.get('qty', 0), amount=item.get('line_total'),
+             vat=item.get('vat_amount'), weight_out=item.get('weight'))
+    return cells
+
+
+def purchase_cells(purchase: dict, party_type: str, cells=None) -> Dict[CellKey, Dict[str, Decimal]]:
+    cells = _new_cells() if cells is None else cells
+    month = month_of(purchase.get('date'))
+    if not month:
+        return cells
+    category = purchase_header_name(_purity(purchase.get('valuation_purity_fixed')) or 916)
+    items = purchase.get('items') or [{
+        'entered_purity': purchase.get('entered_purity'),
+        'weight_grams': purchase.get('weight_grams'),
+        'calculated_amount': purchase.get('amount_total'),
+    }]
+    for item in items:
+        key = (month, 'purchases', _purity(item.get('entered_purity')), category, party_type)
+        _add(cells, key, qty=1, amount=item.get('calculated_amount'), weight_in=item.get('weight_grams'))
+    return cells
+
+
+def return_cells(return_doc: dict, party_type: str, cells=None) -> Dict[CellKey, Dict[str, Decimal]]:
+    cells = _new_cells() if cells is None else cells
+    month = month_of(return_doc.get('date'))
+    if not month:
+        return cells
+    is_sale_return = return_doc.get('return_type') == 'sale_return'
+    family = 'sales_returns' if is_sale_return else 'purchase_returns'
+    weight_field = 'weight_in' if is_sale_return else 'weight_out'
+    for item in return_doc.get('items') or []:
+        key = (month, family, _purity(item.get('purity')), UNCATEGORIZED, party_type)
+        _add(cells, key, qty=item.get('qty', 0), amount=item.get('amount'),
+             **{weight_field: item.get('weight_grams')})
+    return cells
+
+
+def cell_id(key: CellKey) -> str:
+    month, family, purity, category, party_type = key
+    return f"{month}|{family}|{'' if purity is None else purity}|{category}|{party_type}"
+
+
+def cell_document(key: CellKey, measures: Dict[str, Decimal]) -> dict:
+    month, family, purity, category, party_type = key
+    return {
+        "_id": cell_id(key), "month": month, "family": family, "purity": purity,
+        "category": category, "party_type": party_type,
+        **{name: Decimal128(value) for name, value in measures.items()},
+    }
+
+
+def _add_cell_documents(cells: Dict[CellKey, Dict[str, Decimal]], documents: Iterable[dict], sign: int = 1):
+    for doc in documents:
+        key = (doc["month"], doc["family"], doc["purity"], doc["category"], doc["party_type"])
+        for name in MEASURES:
+            cells[key][name] += _decimal(doc.get(name)) * sign
+
+
+async def _party_type(db, party_id: Optional[str]) -> str:
+    if not party_id:
+        return WALK_IN
+    party = await db.parties.find_one({"id": party_id}, {"_id": 0, "party_type": 1})
+    return (party or {}).get('party_type') or WALK_IN
+
+
+async def apply_cells(db, cells: Dict[CellKey, Dict[str, Decimal]], sign: int = 1):
+    """Add (sign=1) or subtract (sign=-1) cells with one $inc upsert each"""
+    if not cells:
+        return
+    now = datetime.now(timezone.utc)
+    await db[ANALYTICS_COLLECTION].bulk_write([
+        UpdateOne(
+            {"_id": cell_id(key)},
+            {
+                "$inc": {name: Decimal128(value * sign) for name, value in measures.items()},
+                "$set": {"updated_at": now},
+                "$setOnInsert": {
+                    "month": key[0], "family": key[1], "purity": key[2], "category": key[3], "party_type": key[4],
+                },
+            },
+            upsert=True,
+        )
+        for key, measures in cells.items()
+    ], ordered=False)
+
+
+async def _left_to_rebuild(db, collection: str, doc: dict, cells: Dict[CellKey, Dict[str, Decimal]], sign: int,
+                           changed_at: datetime) -> bool:
+    """True when a rebuild accounts for the change: queued while one runs, or counted by the last one"""
+    states = db[ANALYTICS_STATE_COLLECTION]
+    state = await states.find_one({"_id": ANALYTICS_COLLECTION}, {"pending": 0}) or {}
+    if state.get("rebuild_started_at"):
+        entry = {
+            "collection": collection, "id": doc.get('id'), "sign": sign, "changed_at": changed_at,
+            "cells": [cell_document(key, {name: value * sign for name, value in measures.items()})
+                      for key, measures in cells.items()],
+        }
+        queued = await states.update_one(
+            {"_id": ANALYTICS_COLLECTION, "rebuild_started_at": state["rebuild_started_at"]},
+            {"$push": {"pending": entry}})
+        if queued.modified_count:
+            return True
+        # The rebuild finished in the meantime
+        state = await states.find_one({"_id": ANALYTICS_COLLECTION}, {"pending": 0}) or {}
+    covered_until = _utc(state.get("covered_until"))
+    return covered_until is not None and changed_at < covered_until
+
+
+async def _record(db, collection: str, cells_of, doc: dict, party_id: Optional[str], sign: int,
+                  changed_at: Optional[datetime]):
+    # The business write has already succeeded; a missed cube update is repaired by a rebuild
+    try:
+        cells = cells_of(doc, await _party_type(db, party_id))
+        if not cells:
+            return
+        changed_at = _utc(changed_at) or change_time(collection, doc) or datetime.now(timezone.utc)
+        if await _left_to_rebuild(db, collection, doc, cells, sign, changed_at):
+            return
+        await apply_cells(db, cells, sign)
+    except Exception as e:
+        logging.warning(f"Analytics cube update failed for {doc.get('id')}: {e}")
+
+
+async def record_invoice(db, invoice: dict, sign: int = 1, changed_at: Optional[datetime] = None):
+    party_id = None if invoice.get('customer_type') == 'walk_in' else invoice.get('customer_id')
+    await _record(db, 'invoices', invoice_cells, invoice, party_id, sign, changed_at)
+
+
+async def record_purchase(db, purchase: dict, sign: int = 1, changed_at: Optional[datetime] = None):
+    """changed_at: stamp of the edit or delete when subtracting the previous version"""
+    party_id = None if purchase.get('is_walk_in') else purchase.get('vendor_party_id')
+    await _record(db, 'purchases', purchase_cells, purchase, party_id, sign, changed_at)
+
+
+async def record_return(db, return_doc: dict, sign: int = 1, changed_at: Optional[datetime] = None):
+    await _record(db, 'returns', return_cells, return_doc, return_doc.get('party_id'), sign, changed_at)
+
+
+async def _start_rebuild(db, started_at: datetime):
+    """
+    Raises:
+        RebuildRunningError: another rebuild started less than ANALYTICS_REBUILD_TIMEOUT_SECONDS ago
+    """
+    expired = started_at - timedelta(seconds=ANALYTICS_REBUILD_TIMEOUT_SECONDS)
+    try:
+        await db[ANALYTICS_STATE_COLLECTION].update_one(
+            {"_id": ANALYTICS_COLLECTION,
+             "$or": [{"rebuild_started_at": None}, {"rebuild_started_at": {"$lt": expired}}]},
+            {"$set": {"rebuild_started_at": started_at, "pending": []}},
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        raise RebuildRunningError("An analytics cube rebuild is already running")
+
+
+async def _finish_rebuild(db, started_at: datetime, covered: bool) -> List[dict]:
+    """Leave rebuild mode; returns the changes queued meanwhile"""
+    update = {"$set": {"rebuild_started_at": None}, "$unset": {"pending": ""}}
+    if covered:
+        update["$set"]["covered_until"] = started_at
+    state = await db[ANALYTICS_STATE_COLLECTION].find_one_and_update(
+        {"_id": ANALYTICS_COLLECTION, "rebuild_started_at": started_at}, update,
+        return_document=ReturnDocument.BEFORE)
+    return (state or {}).get("pending") or []
+
+
+def queued_cells(pending: List[dict], started_at: datetime, left_out: set) -> Dict[CellKey, Dict[str, Decimal]]:
+    """
+    Cells to add to a rebuilt cube for the changes queued during the rebuild.
+
+    left_out: (collection, id) of the documents the scan read with a change after started_at
+    """
+    cells = _new_cells()
+    first_changes = {}
+    for entry in pending:
+        if _utc(entry["changed_at"]) < started_at:
+            continue
+        ref = (entry["collection"], entry["id"])
+        first_changes.setdefault(ref, entry)
+        _add_cell_documents(cells, entry["cells"])
+    for ref, entry in first_changes.items():
+        # The scan left out the version this change removed; the queue subtracts it
+        if entry["sign"] < 0 and ref in left_out:
+            _add_cell_documents(cells, entry["cells"], sign=-1)
+    return cells
+
+
+async def rebuild_analytics_cube(db) -> int:
+    """
+    Recompute every cell from invoices, purchases and returns.
+
+    Returns:
+        Number of cells written
+
+    Raises:
+        RebuildRunningError: another rebuild is in progress
+    """
+    now = datetime.now(timezone.utc)
+    # Rounded up to MongoDB's millisecond precision: stamps compare alike before and after storage
+    started_at = now + timedelta(microseconds=-now.microsecond % 1000)
+    await _start_rebuild(db, started_at)
+    try:
+        cells, left_out = await _scan_cells(db, started_at)
+        count = await _swap_in(db, cells)
+    except BaseException:
+        # The old cube stays; apply what was queued for it
+        pending = await _finish_rebuild(db, started_at, covered=False)
+        cells = _new_cells()
+        for entry in pending:
+            _add_cell_documents(cells, entry["cells"])
+        await apply_cells(db, cells)
+        raise
+    pending = await _finish_rebuild(db, started_at, covered=True)
+    await apply_cells(db, queued_cells(pending, started_at, left_out))
+    return count
+
+
+async def _scan_cells(db, started_at: datetime) -> Tuple[Dict[CellKey, Dict[str, Decimal]], set]:
+    """Cells of every document as it was before started_at, and the documents read with later changes"""
+    left_out = set()
+
+    def changed_since_start(collection: str, doc: dict) -> bool:
+        stamp = change_time(collection, doc)
+        if stamp is not None and stamp >= started_at:
+            left_out.add((collection, doc.get('id')))
+            return True
+        return False
+
+    party_types = {
+        party['id']: party.get('party_type') or WALK_IN
+        async for party in db.parties.find({}, {"_id": 0, "id": 1, "party_type": 1})
+    }
+    cells = _new_cells()
+
+    invoice_projection = {"_id": 0, "id": 1, "finalized_at": 1, "date": 1, "customer_type": 1, "customer_id": 1,
+                          "items.purity": 1, "items.category": 1, "items.qty": 1, "items.line_total": 1,
+                          "items.vat_amount": 1, "items.weight": 1}
+    async for invoice in db.invoices.find({"is_deleted": False, "status": "finalized"},
+                                          invoice_projection).batch_size(REBUILD_BATCH_SIZE):
+        if changed_since_start('invoices', invoice):
+            continue
+        party_id = None if invoice.get('customer_type') == 'walk_in' else invoice.get('customer_id')
+        invoice_cells(invoice, party_types.get(party_id, WALK_IN), cells)
+
+    purchase_projection = {"_id": 0, "id": 1, "is_deleted": 1, "created_at": 1, "updated_at": 1, "deleted_at": 1,
+                           "date": 1, "is_walk_in": 1, "vendor_party_id": 1, "valuation_purity_fixed": 1,
+                           "entered_purity": 1, "weight_grams": 1, "amount_total": 1, "items.entered_purity": 1,
+                           "items.weight_grams": 1, "items.calculated_amount": 1}
+    # Purchases deleted since the start are read to tell whether the scan saw them
+    purchase_query = {"$or": [{"is_deleted": False}, {"deleted_at": {"$gte": started_at}}]}
+    async for purchase in db.purchases.find(purchase_query, purchase_projection).batch_size(REBUILD_BATCH_SIZE):
+        if changed_since_start('purchases', purchase) or purchase.get('is_deleted'):
+            continue
+        party_id = None if purchase.get('is_walk_in') else purchase.get('vendor_party_id')
+        purchase_cells(purchase, party_types.get(party_id, WALK_IN), cells)
+
+    return_projection = {"_id": 0, "id": 1, "finalized_at": 1, "date": 1, "return_type": 1, "party_id": 1,
+                         "items.purity": 1, "items.qty": 1, "items.amount": 1, "items.weight_grams": 1}
+    async for return_doc in db.returns.find({"is_deleted": False, "status": "finalized"},
+                                            return_projection).batch_size(REBUILD_BATCH_SIZE):
+        if changed_since_start('returns', return_doc):
+            continue
+        return_cells(return_doc, party_types.get(return_doc.get('party_id'), WALK_IN), cells)
+    return cells, left_out
+
+
+async def _swap_in(db, cells: Dict[CellKey, Dict[str, Decimal]]) -> int:
+    now = datetime.now(timezone.utc)
+    documents = [{**cell_document(key, measures), "updated_at": now} for key, measures in cells.items()]
+    staging = db[ANALYTICS_STAGING_COLLECTION]
+    await staging.drop()
+    for start in range(0, len(documents), REBUILD_BATCH_SIZE):
+        await staging.insert_many(documents[start:start + REBUILD_BATCH_SIZE])
+    if documents:
+        await staging.rename(ANALYTICS_COLLECTION, dropTarget=True)
+    else:
+        await db[ANALYTICS_COLLECTION].delete_many({})
+    await ensure_analytics_indexes(db)
+    return len(documents)
+
+
+async def ensure_analytics_indexes(db):
+    """(family, month) index serving trend queries"""
+    await db[ANALYTICS_COLLECTION].create_index([("family", 1), ("month", 1)], name="analytics_family_month")
+
+
+def trend_pipeline(families: Iterable[str], start_month: Optional[str], end_month: Optional[str],
+                   group_by: List[str]) -> list:
+    """Aggregation over the cube summing measures per month, family and group_by dimensions."""
+    match = {"family": {"$in": list(families)}}
+    month_filter = {}
+    if start_month:
+        month_filter["$gte"] = start_month
+    if end_month:
+        month_filter["$lte"] = end_month
+    if month_filter:
+        match["month"] = month_filter
+    group_id = {"month": "$month", "family": "$family", **{name: f"${name}" for name in group_by}}
+    return [
+        {"$match": match},
+        {"$group": {"_id": group_id, **{name: {"$sum": f"${name}"} for name in MEASURES}}},
+        {"$sort": {"_id.month": 1, "_id.family": 1, **{f"_id.{name}": 1 for name in group_by}}},
+    ]
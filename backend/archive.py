@@ -0,0 +1,232 @@
+import os
+import re
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from pymongo.errors import BulkWriteError, OperationFailure
+
+
+# ============================================================================
+# HISTORY ARCHIVE
+# ============================================================================
+#
+# Documents of fully closed years move out of the hot collections into one
+# archive collection per collection and calendar year ("transactions_2023"),
+# so the working set of the hot collections stays at the open years.
+#
+# - Archivable: dated before January 1 of the year the latest closed accounting
+#   period ends in (period_close.archivable_before). Closed periods are frozen,
+#   so archived documents never change, and balance queries start from the
+#   period snapshots.
+# - Archived documents are compact: only the model's fields (no legacy or
+#   denormalized extras) and the document id as _id instead of an ObjectId (a
+#   re-run after an interrupted one skips what it already copied).
+# - `archive_state` records per collection the date field and the archived
+#   years. Readers (archive_find, archive_count, archive_aggregate) add a
+#   $unionWith of exactly the archive years the query's date range reaches;
+#   queries on open years read the hot collection alone.
+#
+# auth_audit_logs are not archived; a TTL index purges them after
+# AUTH_AUDIT_LOG_RETENTION_DAYS.
+
+ARCHIVE_STATE_COLLECTION = 'archive_state'
+ARCHIVE_BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE', '1000'))
+AUTH_AUDIT_LOG_RETENTION_DAYS = int(os.environ.get('AUTH_AUDIT_LOG_RETENTION_DAYS', '365'))
+DUPLICATE_KEY = 11000
+
+
+@dataclass(frozen=True)
+class ArchiveSpec:
+    """A hot collection whose closed years are archived."""
+    collection: str
+    date_field: str
+    fields: Tuple[str, ...]
+    indexes: Tuple[Tuple[Tuple[str, int], ...], ...] = ()
+    # Filter of documents that stay hot even when old enough (given the current time)
+    keep_hot: Optional[Callable[[datetime], dict]] = None
+
+    def compact(self, doc: dict) -> dict:
+        compact = {name: doc[name] for name in self.fields if name in doc}
+        compact["_id"] = doc.get("id") or doc["_id"]
+        return compact
+
+
+def archive_name(collection: str, year: int) -> str:
+    return f"{collection}_{year}"
+
+
+def current_year_numbers(prefix: str) -> Callable[[datetime], dict]:
+    """keep_hot for documents numbered "<prefix>-<year>-n" by counting the year's documents"""
+    return lambda now: {"transaction_number": re.compile(f"^{re.escape(prefix)}-{now.year}")}
+
+
+def _year_range(condition: Any) -> Tuple[Optional[int], Optional[int]]:
+    """First and last year a date condition can match (None = unbounded)"""
+    if isinstance(condition, datetime):
+        return condition.year, condition.year
+    if not isinstance(condition, dict):
+        return None, None
+    lower = condition.get("$gte", condition.get("$gt"))
+    upper = condition.get("$lte", condition.get("$lt"))
+    return (lower.year if isinstance(lower, datetime) else None,
+            upper.year if isinstance(upper, datetime) else None)
+
+
+async def archive_collections(db, collection: str, query: dict) -> List[str]:
+    """Archive collections holding documents the query's date range can match"""
+    state = await db[ARCHIVE_STATE_COLLECTION].find_one({"_id": collection})
+    if not state or not state.get("years"):
+        return []
+    first, last = _year_range(query.get(state["date_field"]))
+    return [
+        archive_name(collection, year) for year in sorted(state["years"])
+        if (first is None or year >= first) and (last is None or year <= last)
+    ]
+
+
+def _union_stages(names: List[str], query: dict) -> list:
+    return [{"$unionWith": {"coll": name, "pipeline": [{"$match": query}]}} for name in names]
+
+
+async def archive_aggregate(db, collection: str, pipeline: list, **kwargs):
+    """Aggregation cursor over the hot collection and the archives pipeline[0]'s $match reaches"""
+    names = await archive_collections(db, collection, pipeline[0]["$match"])
+    if not names:
+        return db[collection].aggregate(pipeline, **kwargs)
+    return db[collection].aggregate(
+        pipeline[:1] + _union_stages(names, pipeline[0]["$match"]) + pipeline[1:], **{**kwargs, "allowDiskUse": True})
+
+
+async def archive_find(db, collection: str, query: dict, projection: Optional[dict] = None,
+                       sort: Optional[List[Tuple[str, int]]] = None, skip: int = 0,
+                       limit: Optional[int] = None) -> List[dict]:
+    """find() over the hot collection, unioned with the archives the query's date range reaches"""
+    names = await archive_collections(db, collection, query)
+    if not names:
+        cursor = db[collection].find(query, projection)
+        if sort:
+            cursor = cursor.sort(sort)
+        if skip:
+            cursor = cursor.skip(skip)
+        if limit:
+            cursor = cursor.limit(limit)
+        return await cursor.to_list(limit)
+    pipeline = [{"$match": query}, *_union_stages(names, query)]
+    if sort:
+        pipeline.append({"$sort": dict(sort)})
+    if skip:
+        pipeline.append({"$skip": skip})
+    if limit:
+        pipeline.append({"$limit": limit})
+    if projection:
+        pipeline.append({"$project": projection})
+    return await db[collection].aggregate(pipeline, allowDiskUse=True).to_list(limit)
+
+
+async def archive_count(db, collection: str, query: dict) -> int:
+    names = await archive_collections(db, collection, query)
+    counts = [await db[collection].count_documents(query)]
+    for name in names:
+        counts.append(await db[name].count_documents(query))
+    return sum(counts)
+
+
+async def archive_spec(db, spec: ArchiveSpec, until: datetime, batch_size: int = ARCHIVE_BATCH_SIZE,
+                       now: Optional[datetime] = None) -> Dict[int, int]:
+    """
+    Move documents of spec dated before until into their year's archive collection.
+
+    Returns:
+        Documents moved per year
+    """
+    now = now or datetime.now(timezone.utc)
+    state_collection = db[ARCHIVE_STATE_COLLECTION]
+    state = await state_collection.find_one({"_id": spec.collection}) or {}
+    years = set(state.get("years", []))
+    query = {spec.date_field: {"$lt": until}}
+    if spec.keep_hot:
+        query = {"$and": [query, {"$nor": [spec.keep_hot(now)]}]}
+    moved: Dict[int, int] = defaultdict(int)
+
+    while True:
+        batch = await db[spec.collection].find(query).limit(batch_size).to_list(batch_size)
+        if not batch:
+            break
+        by_year = defaultdict(list)
+        for doc in batch:
+            by_year[doc[spec.date_field].year].append(spec.compact(doc))
+        new_years = sorted(set(by_year) - years)
+        for year in new_years:
+            for keys in spec.indexes:
+                await db[archive_name(spec.collection, year)].create_index(list(keys))
+        if new_years:
+            # Recorded before any document leaves the hot collection, so readers never miss it
+            years.update(new_years)
+            await state_collection.update_one(
+                {"_id": spec.collection},
+                {"$set": {"date_field": spec.date_field}, "$addToSet": {"years": {"$each": new_years}}},
+                upsert=True,
+            )
+        for year, docs in by_year.items():
+            try:
+                await db[archive_name(spec.collection, year)].insert_many(docs, ordered=False)
+            except BulkWriteError as e:
+                if any(error.get("code") != DUPLICATE_KEY for error in e.details.get("writeErrors", [])):
+                    raise
+            moved[year] += len(docs)
+        await db[spec.collection].delete_many({"_id": {"$in": [doc["_id"] for doc in batch]}})
+
+    await state_collection.update_one(
+        {"_id": spec.collection},
+        {"$set": {"date_field": spec.date_field}, "$max": {"archived_before": until}},
+        upsert=True,
+    )
+    return dict(moved)
+
+
+async def archive_history(db, specs: List[ArchiveSpec], until: Optional[datetime],
+                          batch_size: int = ARCHIVE_BATCH_SIZE) -> dict:
+    """Archive every spec up to until; {"archived_before", "moved": {collection: {year: n}}}"""
+    if not until:
+        return {"archived_before": None, "moved": {}}
+    moved = {}
+    for spec in specs:
+        moved[spec.collection] = await archive_spec(db, spec, until, batch_size)
+    return {"archived_before": until, "moved": moved}
+
+
+async def archived_before(db) -> Optional[datetime]:
+    """Latest archive boundary over every archived collection"""
+    states = await db[ARCHIVE_STATE_COLLECTION].find({}, {"archived_before": 1}).to_list(None)
+    boundaries = [state["archived_before"] for state in states if state.get("archived_before")]
+    return max(boundaries) if boundaries else None
+
+
+async def archive_status(db) -> List[dict]:
+    states = await db[ARCHIVE_STATE_COLLECTION].find({}).to_list(None)
+    status = []
+    for state in states:
+        years = sorted(state.get("years", []))
+        status.append({
+            "collection": state["_id"],
+            "archived_before": state.get("archived_before"),
+            "hot_count": await db[state["_id"]].estimated_document_count(),
+            "archives": [
+                {"collection": archive_name(state["_id"], year),
+                 "count": await db[archive_name(state["_id"], year)].estimated_document_count()}
+                for year in years
+            ],
+        })
+    return status
+
+
+async def ensure_auth_audit_ttl(db, retention_days: int = AUTH_AUDIT_LOG_RETENTION_DAYS):
+    """TTL index purging auth audit logs after retention_days (updated in place when it changes)"""
+    seconds = retention_days * 86400
+    try:
+        await db.auth_audit_logs.create_index("timestamp", name="auth_audit_logs_ttl", expireAfterSeconds=seconds)
+    except OperationFailure:
+        await db.command("collMod", "auth_audit_logs",
+                         index={"name": "auth_audit_logs_ttl", "expireAfterSeconds": seconds})
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+History Archive
+===============
+Moves transactions, stock movements and audit logs of fully closed years out of
+the hot collections into per-year archive collections ("transactions_2023"),
+the same as POST /api/archive/run.
+
+Only years before the year the latest closed accounting period ends in are
+archived, so close the periods first (POST /api/accounting-periods/close).
+Reports keep reading archived documents; the run is safe to repeat or resume
+after an interruption.
+
+Usage:
+    python archive_history.py                  # archive everything archivable
+    python archive_history.py --status         # show hot and archive counts only
+    python archive_history.py --batch-size 5000
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from archive import ARCHIVE_BATCH_SIZE, archive_history, archive_status
+from period_close import archivable_before
+from server import ARCHIVE_SPECS
+
+load_dotenv(Path(__file__).parent / '.env')
+MONGO_URL = os.environ['MONGO_URL']
+DB_NAME = os.environ['DB_NAME']
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Archive history of closed years")
+    parser.add_argument('--batch-size', type=int, default=ARCHIVE_BATCH_SIZE,
+                        help=f"documents moved per batch (default {ARCHIVE_BATCH_SIZE})")
+    parser.add_argument('--status', action='store_true', help="only print the archive status")
+    return parser.parse_args(argv)
+
+
+def print_status(status):
+    for state in status:
+        archived = ", ".join(f"{a['collection']}: {a['count']:,}" for a in state['archives']) or "none"
+        print(f"   {state['collection']}: {state['hot_count']:,} hot | archives: {archived}")
+
+
+async def run(db, args):
+    if not args.status:
+        until = await archivable_before(db)
+        if not until:
+            print("⚠️  No closed accounting period ends in a past year; nothing to archive")
+            return
+        started = time.perf_counter()
+        print(f"🗄️  Archiving history before {until.date().isoformat()}...")
+        result = await archive_history(db, ARCHIVE_SPECS, until, args.batch_size)
+        for collection, years in result['moved'].items():
+            print(f"   {collection}: {sum(years.values()):,} moved")
+        print(f"✅ Done in {time.perf_counter() - started:.1f}s")
+    print("📊 Archive status")
+    print_status(await archive_status(db))
+
+
+def main():
+    args = parse_args()
+    client = AsyncIOMotorClient(MONGO_URL)
+    try:
+        asyncio.run(run(client[DB_NAME], args))
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
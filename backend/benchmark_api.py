@@ -0,0 +1,493 @@
+"""
+API Benchmark Harness
+---------------------
+Drives the FastAPI `app` from server.py in-process through an ASGI client
+(no uvicorn, no network) and records latency percentiles and DB round trips
+for the hot API paths:
+
+- /dashboard
+- /transactions, /transactions/summary
+- /reports/* JSON views
+- POST /invoices/{id}/finalize
+- POST /invoices/{id}/add-payment
+
+Data is seeded with the existing generators (create_dummy_data.py and
+seed_dashboard_data.py) into a throwaway database, either on a local mongod
+or an in-memory mongomock stand-in. Results are written as JSON so two runs
+(e.g. before/after a commit) can be compared with --compare.
+
+Every measured request does the report work: the report result cache is off
+unless --report-cache is given, and no If-None-Match is sent, so report ETags
+never answer 304. A request that fails (500 or an exception in the app) is
+counted as an error of its scenario and the run goes on with the next one.
+
+Usage:
+    python benchmark_api.py                                  # mongomock, defaults
+    python benchmark_api.py --backend mongod --mongo-url mongodb://localhost:27017
+    python benchmark_api.py --scale 20 --iterations 100
+    python benchmark_api.py --compare benchmark_results/<previous>.json
+    python benchmark_api.py --report-cache                   # measure report cache hits
+
+Requires httpx; the default mongomock backend also needs mongomock-motor
+(pip install httpx mongomock-motor).
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).parent
+DEFAULT_OUTPUT_DIR = ROOT_DIR / 'benchmark_results'
+BENCH_DB_NAME = 'gold_shop_erp_benchmark'
+
+# server.py, create_dummy_data.py and seed_dashboard_data.py read these at import
+# time. load_dotenv() never overrides variables that are already set, so this keeps
+# the benchmark away from the database configured in backend/.env.
+os.environ['MONGO_URL'] = os.environ.get('BENCH_MONGO_URL', 'mongodb://localhost:27017')
+os.environ['DB_NAME'] = BENCH_DB_NAME
+
+
+# ============================================================================
+# DB ROUND-TRIP COUNTING
+# ============================================================================
+
+class RoundTripCounter:
+    """Counts database commands issued while a request is being measured."""
+
+    def __init__(self):
+        self.count = 0
+
+    def reset(self):
+        self.count = 0
+
+    def hit(self):
+        self.count += 1
+
+
+def make_command_listener(counter: RoundTripCounter):
+    """pymongo command listener that counts every command sent to mongod (incl. getMore)."""
+    from pymongo import monitoring
+
+    class _Listener(monitoring.CommandListener):
+        def started(self, event):
+            counter.hit()
+
+        def succeeded(self, event):
+            pass
+
+        def failed(self, event):
+            pass
+
+    return _Listener()
+
+
+# Collection methods that map to one server command on a real mongod
+MOCK_COUNTED_METHODS = [
+    'find', 'find_one', 'aggregate', 'count_documents', 'estimated_document_count', 'distinct',
+    'insert_one', 'insert_many', 'update_one', 'update_many', 'replace_one',
+    'delete_one', 'delete_many', 'find_one_and_update', 'find_one_and_delete',
+    'find_one_and_replace', 'bulk_write',
+]
+
+
+def patch_mongomock_counter(counter: RoundTripCounter):
+    """Wrap mongomock Collection methods so each call counts as one round trip."""
+    from mongomock.collection import Collection
+
+    def wrap(method):
+        def counted(self, *args, **kwargs):
+            counter.hit()
+            return method(self, *args, **kwargs)
+        return counted
+
+    for name in MOCK_COUNTED_METHODS:
+        setattr(Collection, name, wrap(getattr(Collection, name)))
+
+
+# ============================================================================
+# DATABASE SETUP
+# ============================================================================
+
+def connect(backend: str, mongo_url: str, counter: RoundTripCounter):
+    """Return (sync_db, async_db) pointing at the same benchmark database."""
+    if backend == 'mongomock':
+        import mongomock
+        from mongomock_motor import AsyncMongoMockClient
+
+        sync_client = mongomock.MongoClient()
+        async_client = AsyncMongoMockClient(mock_mongo_client=sync_client)
+        patch_mongomock_counter(counter)
+    else:
+        from pymongo import MongoClient
+        from motor.motor_asyncio import AsyncIOMotorClient
+
+        sync_client = MongoClient(mongo_url)
+        sync_client.drop_database(BENCH_DB_NAME)
+        async_client = AsyncIOMotorClient(mongo_url, event_listeners=[make_command_listener(counter)])
+
+    return sync_client[BENCH_DB_NAME], async_client[BENCH_DB_NAME]
+
+
+async def seed_database(sync_db, async_db, scale: int):
+    """
+    Seed realistic volumes using the existing generator scripts.
+
+    create_dummy_data.py builds one "shop" worth of documents per call; it is run
+    `scale` times so report endpoints see proportionally more rows.
+    seed_dashboard_data.py then adds dashboard-shaped headers, movements and parties.
+    """
+    import create_dummy_data
+    import seed_dashboard_data
+
+    create_dummy_data.db = sync_db
+    seed_dashboard_data.db = async_db
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        user_id = create_dummy_data.create_admin_user()
+        accounts = create_dummy_data.create_accounts(user_id)
+        categories = create_dummy_data.create_inventory_categories(user_id)
+        for _ in range(scale):
+            create_dummy_data.create_stock_movements(categories, user_id)
+            customers, vendors, _workers = create_dummy_data.create_parties(user_id)
+            parties = customers + vendors
+            create_dummy_data.create_gold_ledger_entries(parties, user_id)
+            create_dummy_data.create_purchases(vendors, accounts, user_id)
+            job_cards = create_dummy_data.create_job_cards(customers, categories, user_id)
+            invoices = create_dummy_data.create_invoices(customers, job_cards, categories, user_id)
+            create_dummy_data.create_transactions(parties, invoices, accounts, user_id)
+            create_dummy_data.create_daily_closings(user_id)
+            create_dummy_data.create_audit_logs(user_id)
+        await seed_dashboard_data.seed_comprehensive_dashboard_data()
+
+    return user_id
+
+
+def seed_write_fixtures(sync_db, user_id: str, count: int) -> dict:
+    """
+    Create the documents consumed by the write-path scenarios:
+    - `count` draft sale invoices for /finalize (one per iteration, each finalized once)
+    - `count` finalized invoices with a balance for /add-payment
+    - an asset "Cash" account to receive the payments
+    """
+    now = datetime.now(timezone.utc)
+    header = {
+        'id': str(uuid.uuid4()),
+        'name': 'Benchmark Stock',
+        'current_qty': float(count * 10),
+        'current_weight': float(count * 100),
+        'is_active': True,
+        'created_at': now,
+        'created_by': user_id,
+        'is_deleted': False,
+    }
+    sync_db.inventory_headers.insert_one(header)
+
+    cash_account = {
+        'id': str(uuid.uuid4()),
+        'name': 'Cash',
+        'account_type': 'asset',
+        'opening_balance': 0.0,
+        'current_balance': 0.0,
+        'created_at': now,
+        'created_by': user_id,
+        'is_deleted': False,
+    }
+    sync_db.accounts.insert_one(cash_account)
+
+    def invoice_doc(index: int, status: str) -> dict:
+        item = {
+            'id': str(uuid.uuid4()),
+            'category': header['name'],
+            'description': 'Benchmark ring',
+            'qty': 1,
+            'gross_weight': 5.0,
+            'stone_weight': 0.0,
+            'net_gold_weight': 5.0,
+            'weight': 5.0,
+            'purity': 916,
+            'metal_rate': 25.0,
+            'gold_value': 125.0,
+            'making_value': 10.0,
+            'vat_percent': 5.0,
+            'vat_amount': 6.75,
+            'line_total': 141.75,
+        }
+        return {
+            'id': str(uuid.uuid4()),
+            'invoice_number': f'BENCH-{status.upper()}-{index:05d}',
+            'date': now,
+            'created_at': now,
+            'customer_type': 'walk_in',
+            'walk_in_name': f'Bench Customer {index}',
+            'invoice_type': 'sale',
+            'payment_status': 'unpaid',
+            'status': status,
+            'finalized_at': now if status == 'finalized' else None,
+            'items': [item],
+            'subtotal': 135.0,
+            'vat_total': 6.75,
+            'grand_total': 141.75,
+            'paid_amount': 0.0,
+            'balance_due': 141.75,
+            'created_by': user_id,
+            'is_deleted': False,
+        }
+
+    drafts = [invoice_doc(i, 'draft') for i in range(count)]
+    finalized = [invoice_doc(i, 'finalized') for i in range(count)]
+    sync_db.invoices.insert_many(drafts)
+    sync_db.invoices.insert_many(finalized)
+
+    return {
+        'draft_invoice_ids': [inv['id'] for inv in drafts],
+        'payable_invoice_ids': [inv['id'] for inv in finalized],
+        'cash_account_id': cash_account['id'],
+    }
+
+
+def collection_counts(sync_db) -> dict:
+    return {name: sync_db[name].count_documents({}) for name in sorted(sync_db.list_collection_names())}
+
+
+# ============================================================================
+# SCENARIOS
+# ============================================================================
+
+def build_scenarios(fixtures: dict) -> list:
+    """
+    Each scenario is (name, method, path_fn, body_fn) where path_fn/body_fn take
+    the iteration index, so write scenarios can target a fresh document each time.
+    """
+    today = datetime.now(timezone.utc).date()
+    quarter_start = (today - timedelta(days=90)).isoformat()
+    draft_ids = fixtures['draft_invoice_ids']
+    payable_ids = fixtures['payable_invoice_ids']
+    payment_body = {'amount': 10.0, 'payment_mode': 'Cash', 'account_id': fixtures['cash_account_id']}
+
+    def get(path):
+        return lambda i: path
+
+    return [
+        ('dashboard', 'GET', get('/api/dashboard'), None),
+        ('transactions', 'GET', get('/api/transactions?page=1&page_size=50'), None),
+        ('transactions_summary', 'GET', get('/api/transactions/summary'), None),
+        ('reports_financial_summary', 'GET', get(f'/api/reports/financial-summary?start_date={quarter_start}'), None),
+        ('reports_outstanding', 'GET', get('/api/reports/outstanding'), None),
+        ('reports_sales_history', 'GET', get(f'/api/reports/sales-history?date_from={quarter_start}'), None),
+        ('reports_purchase_history', 'GET', get(f'/api/reports/purchase-history?date_from={quarter_start}'), None),
+        ('reports_returns_summary', 'GET', get('/api/reports/returns-summary'), None),
+        ('reports_inventory_view', 'GET', get('/api/reports/inventory-view'), None),
+        ('reports_parties_view', 'GET', get('/api/reports/parties-view?sort_by=outstanding_desc'), None),
+        ('reports_invoices_view', 'GET', get('/api/reports/invoices-view'), None),
+        ('reports_transactions_view', 'GET', get('/api/reports/transactions-view'), None),
+        ('invoice_finalize', 'POST', lambda i: f'/api/invoices/{draft_ids[i]}/finalize', lambda i: None),
+        ('invoice_add_payment', 'POST', lambda i: f'/api/invoices/{payable_ids[i]}/add-payment', lambda i: payment_body),
+    ]
+
+
+def percentile(sorted_values: list, pct: float) -> float:
+    """Nearest-rank percentile on an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(pct / 100.0 * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+async def run_scenario(client, counter: RoundTripCounter, scenario, iterations: int, warmup: int) -> dict:
+    name, method, path_fn, body_fn = scenario
+    is_write = method != 'GET'
+    latencies_ms = []
+    round_trips = []
+    status_codes = {}
+    first_error = None
+
+    # Write scenarios consume one fixture per call, so they are not warmed up
+    total = iterations if is_write else iterations + warmup
+    for i in range(total):
+        path = path_fn(i)
+        body = body_fn(i) if body_fn else None
+        counter.reset()
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, path, json=body)
+            outcome = str(response.status_code)
+            if response.status_code >= 500 and first_error is None:
+                first_error = f"{response.status_code}: {response.text[:200]}"
+        except Exception as e:
+            outcome = 'exception'
+            if first_error is None:
+                first_error = f"{type(e).__name__}: {e}"
+        elapsed_ms = (time.perf_counter() - started) * 1000.0
+        if not is_write and i < warmup:
+            continue
+        latencies_ms.append(elapsed_ms)
+        round_trips.append(counter.count)
+        status_codes[outcome] = status_codes.get(outcome, 0) + 1
+
+    latencies_ms.sort()
+    return {
+        'method': method,
+        'samples': len(latencies_ms),
+        'status_codes': status_codes,
+        'errors': sum(n for code, n in status_codes.items() if not code.startswith('2')),
+        'first_error': first_error,
+        'latency_ms': {
+            'min': round(latencies_ms[0], 3),
+            'mean': round(statistics.fmean(latencies_ms), 3),
+            'p50': round(percentile(latencies_ms, 50), 3),
+            'p95': round(percentile(latencies_ms, 95), 3),
+            'p99': round(percentile(latencies_ms, 99), 3),
+            'max': round(latencies_ms[-1], 3),
+        },
+        'db_round_trips': {
+            'mean': round(statistics.fmean(round_trips), 2),
+            'max': max(round_trips),
+        },
+    }
+
+
+# ============================================================================
+# REPORTING
+# ============================================================================
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return 'unknown'
+
+
+def print_results(results: dict, baseline: dict = None):
+    header = f"{'scenario':<28}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'DB trips':>10}{'errors':>8}"
+    if baseline:
+        header += f"{'Δp95':>10}"
+    print(header)
+    print('-' * len(header))
+    for name, result in results.items():
+        latency = result['latency_ms']
+        line = (f"{name:<28}{latency['p50']:>10.2f}{latency['p95']:>10.2f}{latency['p99']:>10.2f}"
+                f"{result['db_round_trips']['mean']:>10.1f}{result['errors']:>8}")
+        if baseline:
+            previous = baseline.get('results', {}).get(name)
+            if previous and previous['latency_ms']['p95'] > 0:
+                delta = (latency['p95'] - previous['latency_ms']['p95']) / previous['latency_ms']['p95'] * 100
+                line += f"{delta:>+9.1f}%"
+            else:
+                line += f"{'n/a':>10}"
+        print(line)
+    for name, result in results.items():
+        if result.get('first_error'):
+            print(f"{name}: {result['first_error']}")
+
+
+async def main_async(args) -> dict:
+    random.seed(args.seed)
+    counter = RoundTripCounter()
+    sync_db, async_db = connect(args.backend, args.mongo_url, counter)
+
+    # Read by report_cache at import; cached reports would measure cache hits after the warmup
+    os.environ['REPORT_CACHE_ENABLED'] = 'true' if args.report_cache else 'false'
+    import server
+    import httpx
+
+    server.db = async_db
+    # Rate limits would otherwise throttle the measured loop after a few hundred calls
+    server.limiter.enabled = False
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+
+    user_id = await seed_database(sync_db, async_db, args.scale)
+    fixtures = seed_write_fixtures(sync_db, user_id, args.iterations)
+
+    token = server.jwt.encode(
+        {'user_id': user_id, 'exp': datetime.now(timezone.utc) + timedelta(hours=1)},
+        server.JWT_SECRET,
+        algorithm=server.JWT_ALGORITHM,
+    )
+
+    scenarios = build_scenarios(fixtures)
+    if args.only:
+        scenarios = [s for s in scenarios if s[0] in args.only]
+
+    results = {}
+    # App exceptions come back as 500 responses instead of aborting the run
+    transport = httpx.ASGITransport(app=server.app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(
+        transport=transport,
+        base_url='http://testserver',
+        headers={'Authorization': f'Bearer {token}'},
+        timeout=None,
+    ) as client:
+        for scenario in scenarios:
+            results[scenario[0]] = await run_scenario(client, counter, scenario, args.iterations, args.warmup)
+
+    return {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'git_commit': git_commit(),
+            'python': platform.python_version(),
+            'backend': args.backend,
+            'scale': args.scale,
+            'seed': args.seed,
+            'iterations': args.iterations,
+            'warmup': args.warmup,
+            'report_cache': args.report_cache,
+            'dataset': collection_counts(sync_db),
+        },
+        'results': results,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='In-process benchmark for the Gold Shop ERP API hot paths')
+    parser.add_argument('--backend', choices=['mongomock', 'mongod'], default='mongomock',
+                        help='Database to run against (default: in-memory mongomock)')
+    parser.add_argument('--mongo-url', default=os.environ['MONGO_URL'],
+                        help=f'mongod URL for --backend mongod; the {BENCH_DB_NAME} database is dropped first')
+    parser.add_argument('--scale', type=int, default=5, help='Number of generator rounds to seed (default: 5)')
+    parser.add_argument('--iterations', type=int, default=30, help='Measured requests per scenario (default: 30)')
+    parser.add_argument('--warmup', type=int, default=3, help='Unmeasured requests per read scenario (default: 3)')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed for the data generators (default: 42)')
+    parser.add_argument('--only', nargs='*', help='Run only the named scenarios')
+    parser.add_argument('--report-cache', action='store_true',
+                        help='Keep the report result cache on (repeated reads then measure cache hits)')
+    parser.add_argument('--output', type=Path, help='Result file (default: benchmark_results/<timestamp>-<commit>.json)')
+    parser.add_argument('--compare', type=Path, help='Previous result file to compare p95 latencies against')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = asyncio.run(main_async(args))
+
+    output = args.output
+    if output is None:
+        stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+        output = DEFAULT_OUTPUT_DIR / f"{stamp}-{report['meta']['git_commit']}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+
+    baseline = json.loads(args.compare.read_text()) if args.compare else None
+    print_results(report['results'], baseline)
+    print(f"\nResults written to {output}")
+
+    failed = [name for name, result in report['results'].items() if result['errors']]
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,356 @@
+import asyncio
+import os
+import typing
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type
+
+from bson import Decimal128
+from pydantic import BaseModel
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from archive import archive_aggregate
+
+
+# ============================================================================
+# COLUMNAR (PARQUET) EXPORT
+# ============================================================================
+#
+# Ledger collections are written to Parquet for offline analytics, as a
+# hive-partitioned dataset readable by pyarrow.dataset, DuckDB, Spark or pandas:
+#
+#     <COLUMNAR_EXPORT_DIR>/<collection>/year=2025/month=03/part-<run>.parquet
+#
+# - The Arrow schema comes from the collection's model: Decimal128 money and
+#   weight fields (3 decimal places, as stored) become decimal128(18, 3), other
+#   floats float64, datetimes UTC timestamps, invoice items a list of structs.
+# - Documents are read in (date, id) order, so a partition's rows mostly come
+#   together; rows are converted into RecordBatches of COLUMNAR_BATCH_ROWS and
+#   written as they fill, and a partition's pending rows are written when the
+#   cursor moves on, keeping memory bounded whatever the collection size. Each
+#   partition keeps one part file open for the whole run, since documents
+#   without a date (partitioned by created_at) or with a string date come back
+#   to a partition after the cursor left it.
+# - Runs are incremental: `columnar_export_state` keeps per collection the
+#   created_at high-water mark of the last run, and a run exports documents
+#   created after it (up to the run's start) as new part files. Documents
+#   edited after their export are not re-exported; a full run rebuilds the
+#   collection's dataset.
+# - Part files are written under a hidden "_" name and renamed, and the
+#   high-water mark moves, only after the collection's cursor is exhausted; an
+#   interrupted run leaves no visible files and is repeated by the next one.
+#   A full run renames its new parts into place before removing the previous
+#   ones, so a run killed in between leaves duplicate rows, never missing ones.
+# - One run per collection at a time: the run takes a lock in the collection's
+#   state document and only then removes hidden files left by killed runs. A
+#   lock older than COLUMNAR_LOCK_TIMEOUT_SECONDS belongs to a dead run and is
+#   taken over.
+#
+# pyarrow is imported when an export runs, so the API starts without it.
+
+COLUMNAR_STATE_COLLECTION = 'columnar_export_state'
+COLUMNAR_EXPORT_DIR = os.environ.get('COLUMNAR_EXPORT_DIR', str(Path(__file__).parent / 'columnar_exports'))
+COLUMNAR_BATCH_ROWS = int(os.environ.get('COLUMNAR_BATCH_ROWS', '10000'))
+COLUMNAR_LOCK_TIMEOUT_SECONDS = float(os.environ.get('COLUMNAR_LOCK_TIMEOUT_SECONDS', '3600'))
+DECIMAL_PRECISION = 18
+DECIMAL_SCALE = 3
+DECIMAL_QUANTUM = Decimal('0.001')
+
+
+class ExportRunningError(RuntimeError):
+    """Another export of the collection is in progress"""
+
+
+@dataclass(frozen=True)
+class ColumnarSpec:
+    """A collection exported to Parquet with the columns of its model."""
+    collection: str
+    model: Type[BaseModel]
+    # Decimal128 fields, nested ones as "items.gold_value"
+    decimal_fields: Tuple[str, ...] = ()
+    partition_field: str = 'date'
+
+
+def _unwrap_optional(annotation: Any) -> Any:
+    if typing.get_origin(annotation) is typing.Union:
+        args = [arg for arg in typing.get_args(annotation) if arg is not type(None)]
+        if len(args) == 1:
+            return args[0]
+    return annotation
+
+
+def _arrow_type(annotation: Any, path: str, decimal_fields: Tuple[str, ...]):
+    import pyarrow as pa
+
+    annotation = _unwrap_optional(annotation)
+    if typing.get_origin(annotation) in (list, List):
+        (item,) = typing.get_args(annotation)
+        return pa.list_(_arrow_type(item, path, decimal_fields))
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return pa.struct(_arrow_fields(annotation, decimal_fields, f"{path}."))
+    if path in decimal_fields:
+        return pa.decimal128(DECIMAL_PRECISION, DECIMAL_SCALE)
+    if annotation is bool:
+        return pa.bool_()
+    if annotation is int:
+        return pa.int64()
+    if annotation is float:
+        return pa.float64()
+    if annotation is datetime:
+        return pa.timestamp('ms', tz='UTC')
+    return pa.string()
+
+
+def _arrow_fields(model: Type[BaseModel], decimal_fields: Tuple[str, ...], prefix: str = '') -> list:
+    import pyarrow as pa
+
+    return [
+        pa.field(name, _arrow_type(field.annotation, f"{prefix}{name}", decimal_fields))
+        for name, field in model.model_fields.items()
+    ]
+
+
+def arrow_schema(spec: ColumnarSpec):
+    import pyarrow as pa
+
+    return pa.schema(_arrow_fields(spec.model, spec.decimal_fields))
+
+
+def _to_decimal(value: Any) -> Optional[Decimal]:
+    if value is None:
+        return None
+    if isinstance(value, Decimal128):
+        value = value.to_decimal()
+    try:
+        return Decimal(str(value)).quantize(DECIMAL_QUANTUM, rounding=ROUND_HALF_UP)
+    except (InvalidOperation, ValueError):
+        return None
+
+
+def _to_datetime(value: Any) -> Optional[datetime]:
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            return None
+    if not isinstance(value, datetime):
+        return None
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+def _to_number(value: Any, kind: type) -> Any:
+    if isinstance(value, Decimal128):
+        value = value.to_decimal()
+    try:
+        return kind(value) if value is not None else None
+    except (TypeError, ValueError, InvalidOperation):
+        return None
+
+
+def _converter(arrow_type) -> Callable[[Any], Any]:
+    """Function turning a stored value into a Python value of arrow_type (None when it does not fit)"""
+    import pyarrow as pa
+
+    if pa.types.is_list(arrow_type):
+        convert_item = _converter(arrow_type.value_type)
+        return lambda value: [convert_item(item) for item in value] if isinstance(value, list) else None
+    if pa.types.is_struct(arrow_type):
+        convert_struct = row_converter(arrow_type)
+        return lambda value: convert_struct(value) if isinstance(value, dict) else None
+    if pa.types.is_decimal(arrow_type):
+        return _to_decimal
+    if pa.types.is_timestamp(arrow_type):
+        return _to_datetime
+    if pa.types.is_boolean(arrow_type):
+        return lambda value: bool(value) if value is not None else None
+    if pa.types.is_integer(arrow_type):
+        return lambda value: _to_number(value, int)
+    if pa.types.is_floating(arrow_type):
+        return lambda value: _to_number(value, float)
+    return lambda value: str(value) if value is not None else None
+
+
+def row_converter(fields) -> Callable[[dict], dict]:
+    """Function turning a document into a row of the schema (or struct type) fields"""
+    converters = [(field.name, _converter(field.type)) for field in fields]
+    return lambda doc: {name: convert(doc.get(name)) for name, convert in converters}
+
+
+def _partition(doc: dict, spec: ColumnarSpec) -> Tuple[int, int]:
+    when = _to_datetime(doc.get(spec.partition_field)) or _to_datetime(doc.get('created_at'))
+    return (when.year, when.month) if when else (0, 0)
+
+
+class _PartitionWriter:
+    """Writes RecordBatches of one partition into a hidden part file until committed"""
+
+    def __init__(self, directory: Path, run_id: str, schema):
+        import pyarrow.parquet as pq
+
+        directory.mkdir(parents=True, exist_ok=True)
+        self.path = directory / f"part-{run_id}.parquet"
+        # "_" prefix: skipped by dataset readers while the run is in progress
+        self.tmp_path = directory / f"_part-{run_id}.parquet.tmp"
+        self.schema = schema
+        self.writer = pq.ParquetWriter(self.tmp_path, schema, compression='zstd')
+        self.rows: List[dict] = []
+
+    async def flush(self):
+        import pyarrow as pa
+
+        if self.rows:
+            batch = pa.RecordBatch.from_pylist(self.rows, schema=self.schema)
+            self.rows = []
+            await asyncio.to_thread(self.writer.write_batch, batch)
+
+    async def close(self):
+        await self.flush()
+        await asyncio.to_thread(self.writer.close)
+
+    async def discard(self):
+        if self.writer.is_open:
+            await asyncio.to_thread(self.writer.close)
+        self.tmp_path.unlink(missing_ok=True)
+
+
+async def _lock_collection(db, collection: str, run_id: str, now: datetime) -> dict:
+    """
+    Take the collection's export lock; returns its state before the run.
+
+    Raises:
+        ExportRunningError: another run took the lock less than COLUMNAR_LOCK_TIMEOUT_SECONDS ago
+    """
+    expired = now - timedelta(seconds=COLUMNAR_LOCK_TIMEOUT_SECONDS)
+    try:
+        state = await db[COLUMNAR_STATE_COLLECTION].find_one_and_update(
+            {"_id": collection, "$or": [{"running": None}, {"running.started_at": {"$lt": expired}}]},
+            {"$set": {"running": {"run_id": run_id, "started_at": now}}},
+            upsert=True,
+            return_document=ReturnDocument.BEFORE,
+        )
+    except DuplicateKeyError:
+        raise ExportRunningError(f"A columnar export of {collection} is already running")
+    return state or {}
+
+
+async def export_collection(db, spec: ColumnarSpec, output_dir: str = COLUMNAR_EXPORT_DIR,
+                            full: bool = False, batch_rows: int = COLUMNAR_BATCH_ROWS,
+                            now: Optional[datetime] = None) -> dict:
+    """
+    Export the documents of spec created after its high-water mark (every
+    document when full, replacing the previous files) to Parquet part files.
+
+    Raises:
+        ExportRunningError: another export of the collection is in progress
+    """
+    now = now or datetime.now(timezone.utc)
+    run_id = now.strftime('%Y%m%dT%H%M%S%fZ')
+    state_collection = db[COLUMNAR_STATE_COLLECTION]
+    state = await _lock_collection(db, spec.collection, run_id, now)
+    try:
+        return await _export_locked(db, spec, output_dir, full, batch_rows, now, run_id, state)
+    finally:
+        await state_collection.update_one(
+            {"_id": spec.collection, "running.run_id": run_id}, {"$set": {"running": None}})
+
+
+async def _export_locked(db, spec: ColumnarSpec, output_dir: str, full: bool, batch_rows: int,
+                         now: datetime, run_id: str, state: dict) -> dict:
+    since = None if full else state.get("high_water_mark")
+    # Documents without created_at (legacy) are only included by the first or a full run
+    created = {"$gt": since, "$lte": now} if since else {"$not": {"$gt": now}}
+
+    schema = arrow_schema(spec)
+    to_row = row_converter(schema)
+    collection_dir = Path(output_dir) / spec.collection
+    if collection_dir.exists():
+        # Leftovers of a run that was killed before it could clean up
+        for path in collection_dir.rglob('_part-*.parquet.tmp'):
+            path.unlink()
+    pipeline = [
+        {"$match": {"created_at": created}},
+        {"$sort": {spec.partition_field: 1, "id": 1}},
+        {"$project": {"_id": 0}},
+    ]
+    # A full run sorts the whole collection: the ensure_columnar_indexes index or, failing that, disk
+    cursor = await archive_aggregate(db, spec.collection, pipeline, batchSize=batch_rows, allowDiskUse=True)
+
+    parts: Dict[Tuple[int, int], _PartitionWriter] = {}
+    part = None
+    rows = 0
+    try:
+        async for doc in cursor:
+            partition = _partition(doc, spec)
+            if partition not in parts:
+                parts[partition] = _PartitionWriter(
+                    collection_dir / f"year={partition[0]:04d}" / f"month={partition[1]:02d}", run_id, schema)
+            if part is not parts[partition]:
+                if part is not None:
+                    await part.flush()
+                part = parts[partition]
+            part.rows.append(to_row(doc))
+            rows += 1
+            if len(part.rows) >= batch_rows:
+                await part.flush()
+        for part in parts.values():
+            await part.close()
+    except BaseException:
+        for part in parts.values():
+            await part.discard()
+        raise
+
+    for part in parts.values():
+        part.tmp_path.replace(part.path)
+    if full:
+        written = {part.path for part in parts.values()}
+        for path in collection_dir.rglob('part-*.parquet'):
+            if path not in written:
+                path.unlink()
+
+    await db[COLUMNAR_STATE_COLLECTION].update_one(
+        {"_id": spec.collection},
+        {"$set": {"high_water_mark": now, "last_run_at": now, "last_run_rows": rows, "last_run_full": full}},
+        upsert=True,
+    )
+    return {
+        "collection": spec.collection,
+        "rows": rows,
+        "since": since,
+        "high_water_mark": now,
+        "files": [str(part.path.relative_to(output_dir)) for part in parts.values()],
+    }
+
+
+async def ensure_columnar_indexes(db, specs: List[ColumnarSpec]):
+    """(partition field, id) index per exported collection, serving the export's sort"""
+    for spec in specs:
+        await db[spec.collection].create_index(
+            [(spec.partition_field, 1), ("id", 1)], name=f"{spec.collection}_{spec.partition_field}_id")
+
+
+async def export_columnar(db, specs: List[ColumnarSpec], output_dir: str = COLUMNAR_EXPORT_DIR,
+                          full: bool = False, batch_rows: int = COLUMNAR_BATCH_ROWS) -> List[dict]:
+    """Export every spec; one high-water mark per collection"""
+    await ensure_columnar_indexes(db, specs)
+    return [await export_collection(db, spec, output_dir, full, batch_rows) for spec in specs]
+
+
+async def columnar_export_status(db, specs: List[ColumnarSpec], output_dir: str = COLUMNAR_EXPORT_DIR) -> List[dict]:
+    states = {state["_id"]: state for state in await db[COLUMNAR_STATE_COLLECTION].find({}).to_list(None)}
+    status = []
+    for spec in specs:
+        state = states.get(spec.collection, {})
+        collection_dir = Path(output_dir) / spec.collection
+        files = list(collection_dir.rglob('part-*.parquet')) if collection_dir.exists() else []
+        status.append({
+            "collection": spec.collection,
+            "high_water_mark": state.get("high_water_mark"),
+            "last_run_at": state.get("last_run_at"),
+            "last_run_rows": state.get("last_run_rows"),
+            "files": len(files),
+            "bytes": sum(path.stat().st_size for path in files),
+        })
+    return status
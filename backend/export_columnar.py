@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Columnar Export
+===============
+Writes transactions, invoices (with items), stock movements and the gold ledger
+to Parquet files partitioned by year and month of their date, the same as
+POST /api/exports/columnar/run:
+
+    <output>/<collection>/year=2025/month=03/part-<run>.parquet
+
+Each run exports the documents created since the previous run (created_at
+high-water mark) as new part files; --full rebuilds every dataset from scratch.
+Requires pyarrow.
+
+Usage:
+    python export_columnar.py                              # incremental, all collections
+    python export_columnar.py --full                       # rebuild all datasets
+    python export_columnar.py --collections invoices,gold_ledger
+    python export_columnar.py --output /data/ledger --batch-rows 50000
+    python export_columnar.py --status                     # high-water marks and files only
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from columnar_export import (
+    COLUMNAR_BATCH_ROWS, COLUMNAR_EXPORT_DIR, ExportRunningError, columnar_export_status, export_columnar,
+)
+from server import COLUMNAR_SPECS
+
+load_dotenv(Path(__file__).parent / '.env')
+MONGO_URL = os.environ['MONGO_URL']
+DB_NAME = os.environ['DB_NAME']
+
+
+def parse_args(argv=None):
+    collections = [spec.collection for spec in COLUMNAR_SPECS]
+    parser = argparse.ArgumentParser(description="Export ledger collections to partitioned Parquet")
+    parser.add_argument('--output', default=COLUMNAR_EXPORT_DIR, help=f"dataset directory (default {COLUMNAR_EXPORT_DIR})")
+    parser.add_argument('--collections', default=','.join(collections),
+                        help=f"comma-separated subset of {', '.join(collections)}")
+    parser.add_argument('--full', action='store_true', help="export every document and replace the existing files")
+    parser.add_argument('--batch-rows', type=int, default=COLUMNAR_BATCH_ROWS,
+                        help=f"rows per Arrow record batch (default {COLUMNAR_BATCH_ROWS})")
+    parser.add_argument('--status', action='store_true', help="only print the export status")
+    args = parser.parse_args(argv)
+    names = [name.strip() for name in args.collections.split(',') if name.strip()]
+    unknown = [name for name in names if name not in collections]
+    if unknown:
+        parser.error(f"unknown collections: {', '.join(unknown)}")
+    args.specs = [spec for spec in COLUMNAR_SPECS if spec.collection in names]
+    return args
+
+
+async def run(db, args):
+    if not args.status:
+        started = time.perf_counter()
+        print(f"📦 {'Full' if args.full else 'Incremental'} Parquet export to {args.output}...")
+        for result in await export_columnar(db, args.specs, args.output, args.full, args.batch_rows):
+            since = result['since'].isoformat() if result['since'] else 'the beginning'
+            print(f"   {result['collection']}: {result['rows']:,} rows since {since} "
+                  f"in {len(result['files'])} files")
+        print(f"✅ Done in {time.perf_counter() - started:.1f}s")
+    print("📊 Export status")
+    for state in await columnar_export_status(db, args.specs, args.output):
+        high_water_mark = state['high_water_mark'].isoformat() if state['high_water_mark'] else 'never exported'
+        print(f"   {state['collection']}: up to {high_water_mark} | {state['files']:,} files, "
+              f"{state['bytes'] / 1024 / 1024:.1f} MB")
+
+
+def main():
+    args = parse_args()
+    client = AsyncIOMotorClient(MONGO_URL)
+    try:
+        asyncio.run(run(client[DB_NAME], args))
+    except ExportRunningError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
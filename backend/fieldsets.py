@@ -0,0 +1,79 @@
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+# ============================================================================
+# SPARSE FIELDSETS
+# ============================================================================
+#
+# List endpoints accept `fields=a,b,c` and/or `view=summary|full`. The selection
+# is checked against the resource's whitelist (its model fields) and turned into
+# a MongoDB projection, so unrequested fields, above all the `items` arrays, are
+# never read from the server or serialized.
+#
+# - view=full (default, no fields): whole documents, as before
+# - view=summary: the resource's grid columns
+# - fields=...: exactly those fields; combined with view=summary they are added
+#   to the summary columns
+# `id` is always included so rows stay addressable.
+
+VIEWS = ('full', 'summary')
+MAX_FIELDS = 50
+
+
+@dataclass(frozen=True)
+class Fieldset:
+    resource: str
+    allowed: Tuple[str, ...]
+    summary: Tuple[str, ...]
+    # Response field -> document fields it is built from, when they differ
+    sources: Dict[str, Tuple[str, ...]] = field(default_factory=dict)
+    required: Tuple[str, ...] = ('id',)
+
+    def select(self, fields: Optional[str] = None, view: Optional[str] = None) -> Optional[List[str]]:
+        """
+        Resolve the fields/view query parameters.
+
+        Returns:
+            Ordered list of response fields, or None for whole documents
+
+        Raises:
+            ValueError: unknown view or field names outside the whitelist
+        """
+        view = (view or 'full').strip().lower()
+        if view not in VIEWS:
+            raise ValueError(f"Unknown view '{view}' for {self.resource}. Use one of: {', '.join(VIEWS)}")
+        requested = [name.strip() for name in (fields or '').split(',') if name.strip()]
+        if len(requested) > MAX_FIELDS:
+            raise ValueError(f"At most {MAX_FIELDS} fields can be requested")
+        unknown = sorted(set(requested) - set(self.allowed))
+        if unknown:
+            raise ValueError(
+                f"Unknown fields for {self.resource}: {', '.join(unknown)}. "
+                f"Allowed: {', '.join(self.allowed)}"
+            )
+        if view == 'full' and not requested:
+            return None
+        base = self.summary if view == 'summary' else ()
+        return _unique(self.required + base + tuple(requested))
+
+    def projection(self, selected: List[str]) -> dict:
+        """MongoDB projection reading only what the selected response fields need."""
+        projection = {"_id": 0}
+        for name in selected:
+            for source in self.sources.get(name, (name,)):
+                projection[source] = 1
+        return projection
+
+    @staticmethod
+    def trim(selected: List[str], row: dict) -> dict:
+        """Row with exactly the selected fields (missing ones as None), in request order."""
+        return {name: row.get(name) for name in selected}
+
+
+def _unique(names: Iterable[str]) -> List[str]:
+    seen = []
+    for name in names:
+        if name not in seen:
+            seen.append(name)
+    return seen
@@ -0,0 +1,860 @@
+#!/usr/bin/env python3
+"""
+Synthetic Load-Test Dataset Generator
+=====================================
+Produces a production-shaped dataset (parties, invoices, purchases, transactions,
+stock movements, gold ledger entries and returns) for profiling report endpoints.
+
+Unlike create_dummy_data.py / seed_dashboard_data.py, which insert a few hundred
+hand-built documents one at a time, this generator:
+
+- is parameterized by document counts and a time span (default 3 years)
+- is deterministic for a given --seed (ids, names, amounts, and dates relative to today)
+- keeps referential integrity the same way the API write paths do:
+    invoice -> Stock OUT movements (on finalize)
+    invoice -> payment transactions (Cash/Bank debit + Sales Income credit)
+    invoice -> gold ledger IN + "Gold Received" transaction (gold exchange)
+    purchase -> Stock IN movements + payment / vendor payable transactions
+    return -> refund transactions / gold ledger entries, invoice balances adjusted
+    accounts.current_balance = opening_balance + balance deltas of its transactions
+    inventory_headers.current_qty/current_weight = sum of their movements
+- uses realistic dates: year-over-year growth, seasonal months, Friday weekend,
+  shop opening hours, and payments/returns landing after their invoice
+- bulk-inserts with insert_many in bounded parallel batches
+
+Profiles (approximate total documents):
+    small       ~  25k   quick local runs
+    medium      ~ 250k
+    production  ~   2M   3-year production shape
+
+Usage:
+    python generate_load_data.py --profile small --drop
+    python generate_load_data.py --profile production --drop --concurrency 8
+    python generate_load_data.py --parties 2000 --invoices 50000 --years 1 --seed 7
+
+Options:
+    --profile NAME        Base document counts (small | medium | production)
+    --parties N           Override party count (customers + vendors)
+    --invoices N          Override invoice count
+    --purchases N         Override purchase count
+    --gold-ledger N       Override count of manual gold ledger entries
+    --returns N           Override approximate number of returns
+    --expenses N          Override count of manual expense transactions
+    --years N             Time span ending today (default 3)
+    --seed N              Random seed (default 2024)
+    --batch-size N        Documents per insert_many (default 5000)
+    --concurrency N       Parallel insert_many batches in flight (default 4)
+    --drop                Drop the generated collections first
+"""
+
+import argparse
+import asyncio
+import bisect
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timezone, timedelta
+from decimal import Decimal
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Reuse the storage conversions and accounting rules from server.py so generated
+# documents are byte-for-byte shaped like the ones the API writes.
+from server import (
+    convert_invoice_to_decimal,
+    convert_purchase_to_decimal,
+    convert_transaction_to_decimal,
+    convert_account_to_decimal,
+    convert_stock_movement_to_decimal,
+    convert_gold_ledger_to_decimal,
+    convert_return_to_decimal,
+    calculate_balance_delta,
+)
+from party_search import party_search_keys_update
+
+MONGO_URL = os.environ['MONGO_URL']
+DB_NAME = os.environ['DB_NAME']
+
+GENERATED_COLLECTIONS = [
+    'parties', 'invoices', 'purchases', 'transactions', 'stock_movements',
+    'gold_ledger', 'returns', 'accounts', 'inventory_headers',
+]
+
+PROFILES = {
+    'small': {
+        'parties': 300, 'invoices': 5000, 'purchases': 400,
+        'gold_ledger': 1000, 'returns': 100, 'expenses': 500,
+    },
+    'medium': {
+        'parties': 3000, 'invoices': 50000, 'purchases': 4000,
+        'gold_ledger': 10000, 'returns': 1000, 'expenses': 5000,
+    },
+    'production': {
+        'parties': 15000, 'invoices': 400000, 'purchases': 30000,
+        'gold_ledger': 80000, 'returns': 8000, 'expenses': 40000,
+    },
+}
+
+# (name, purity, typical item weight in grams)
+INVENTORY_CATEGORIES = [
+    ('Chain', 916, 18.0), ('Ring', 916, 5.0), ('Bangle', 916, 22.0),
+    ('Necklace', 916, 35.0), ('Bracelet', 916, 14.0), ('Earrings', 916, 6.0),
+    ('Pendant', 916, 4.0), ('Coin', 999, 8.0), ('Biscuit', 999, 100.0),
+    ('18K Rings', 750, 4.5),
+]
+CATEGORY_WEIGHTS = [18, 26, 14, 8, 9, 12, 7, 3, 1, 2]
+
+# Same header name create_purchase derives from the fixed 916 valuation purity
+PURCHASE_HEADER_NAME = f"Gold {916 // 41.6:.0f}K"
+
+# (name, account_type, opening_balance)
+STANDARD_ACCOUNTS = [
+    ('Cash', 'asset', 20000), ('Bank', 'asset', 150000), ('Gold Received', 'asset', 0),
+    ('Sales Income', 'income', 0), ('Purchases', 'expense', 0), ('Rent', 'expense', 0),
+    ('Salaries', 'expense', 0), ('Utilities', 'expense', 0),
+]
+
+FIRST_NAMES = [
+    'Ahmed', 'Mohammed', 'Fatima', 'Aisha', 'Khalid', 'Sara', 'Said', 'Maryam', 'Salim',
+    'Zainab', 'Hamad', 'Noura', 'Yousuf', 'Layla', 'Abdullah', 'Huda', 'Ali', 'Amal',
+    'Sultan', 'Muna', 'Nasser', 'Reem', 'Hilal', 'Badriya', 'Rajesh', 'Priya', 'Suresh',
+]
+LAST_NAMES = [
+    'Al-Farsi', 'Al-Balushi', 'Al-Hinai', 'Al-Rawahi', 'Al-Maamari', 'Al-Siyabi',
+    'Al-Jabri', 'Al-Harthi', 'Al-Busaidi', 'Al-Kindi', 'Al-Lawati', 'Al-Saadi',
+    'Al-Shukaili', 'Al-Mahrouqi', 'Al-Abri', 'Nair', 'Menon', 'Pillai',
+]
+VENDOR_SUFFIXES = ['Gold Trading LLC', 'Bullion Co', 'Jewellery Wholesale', 'Metals SAOC', 'Refinery']
+CITIES = ['Muscat', 'Seeb', 'Salalah', 'Sohar', 'Nizwa', 'Sur', 'Barka', 'Ibri', 'Rustaq']
+PAYMENT_MODES = ['Cash', 'Card', 'Bank Transfer', 'UPI', 'Cheque']
+PAYMENT_MODE_WEIGHTS = [45, 30, 15, 7, 3]
+
+# Relative activity by month (Eid / wedding season peaks) and weekday (Mon=0; Friday weekend)
+MONTH_WEIGHTS = [0.9, 0.9, 1.1, 1.3, 1.2, 1.0, 0.8, 0.8, 1.0, 1.1, 1.2, 1.4]
+WEEKDAY_WEIGHTS = [1.0, 1.0, 1.1, 1.4, 0.3, 1.3, 1.1]
+
+
+def to_money(value) -> float:
+    """Round to 3 decimals (OMR baisa) the same way the API does before Decimal128 conversion."""
+    return float(Decimal(str(value)).quantize(Decimal('0.001')))
+
+
+class DateSampler:
+    """
+    Samples timestamps inside [start, end] weighted by growth, season and weekday.
+    Day weights are cumulative so each draw is a single bisect.
+    """
+
+    def __init__(self, rng: random.Random, start: datetime, end: datetime, yearly_growth: float = 0.15):
+        self.rng = rng
+        self.start = start.replace(hour=0, minute=0, second=0, microsecond=0)
+        self.days = max(1, (end - self.start).days)
+        self.end = end
+        cumulative = []
+        total = 0.0
+        for offset in range(self.days):
+            day = self.start + timedelta(days=offset)
+            growth = (1 + yearly_growth) ** (offset / 365.0)
+            total += growth * MONTH_WEIGHTS[day.month - 1] * WEEKDAY_WEIGHTS[day.weekday()]
+            cumulative.append(total)
+        self.cumulative = cumulative
+
+    def _time_of_day(self) -> timedelta:
+        # Shop hours 09:30-22:00 local (UTC+4), busiest in the evening
+        local_hour = self.rng.triangular(9.5, 22.0, 19.0)
+        return timedelta(hours=local_hour - 4)
+
+    def sample(self) -> datetime:
+        offset = bisect.bisect_left(self.cumulative, self.rng.random() * self.cumulative[-1])
+        return min(self.start + timedelta(days=offset) + self._time_of_day(), self.end)
+
+    def after(self, moment: datetime, max_days: int) -> datetime:
+        """A later timestamp (payment, return) no further than max_days and not past `end`."""
+        delta = timedelta(days=self.rng.randint(0, max_days), hours=self.rng.uniform(0, 8))
+        return min(moment + delta, self.end)
+
+
+class BatchWriter:
+    """
+    Buffers documents per collection and writes them with insert_many.
+    At most `concurrency` batches are in flight; producers wait for a free slot,
+    which bounds memory regardless of dataset size.
+    """
+
+    def __init__(self, db, batch_size: int, concurrency: int):
+        self.db = db
+        self.batch_size = batch_size
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.buffers = {}
+        self.tasks = set()
+        self.counts = {}
+
+    async def add(self, collection: str, doc: dict):
+        buffer = self.buffers.setdefault(collection, [])
+        buffer.append(doc)
+        if len(buffer) >= self.batch_size:
+            self.buffers[collection] = []
+            await self._schedule(collection, buffer)
+
+    async def _schedule(self, collection: str, docs: list):
+        await self.semaphore.acquire()
+        task = asyncio.create_task(self._insert(collection, docs))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _insert(self, collection: str, docs: list):
+        try:
+            await self.db[collection].insert_many(docs, ordered=False)
+            self.counts[collection] = self.counts.get(collection, 0) + len(docs)
+        finally:
+            self.semaphore.release()
+
+    async def close(self):
+        for collection, docs in list(self.buffers.items()):
+            if docs:
+                await self._schedule(collection, docs)
+        self.buffers = {}
+        if self.tasks:
+            await asyncio.gather(*list(self.tasks))
+
+
+class LoadDataGenerator:
+    def __init__(self, writer: BatchWriter, counts: dict, years: float, seed: int, created_by: str):
+        self.writer = writer
+        self.counts = counts
+        self.rng = random.Random(seed)
+        self.created_by = created_by
+        self.end = datetime.now(timezone.utc)
+        self.start = self.end - timedelta(days=int(365 * years))
+        self.dates = DateSampler(self.rng, self.start, self.end)
+
+        self.accounts = {}
+        self.account_balances = {}
+        self.headers = {}
+        self.header_totals = {}
+        self.customers = []
+        self.customer_created = []
+        self.customer_weights = []
+        self.vendors = []
+        self.sequences = {}
+        self.stock_out = {}
+
+    # ------------------------------------------------------------------ helpers
+
+    def new_id(self) -> str:
+        return str(uuid.UUID(int=self.rng.getrandbits(128), version=4))
+
+    def next_number(self, prefix: str, year: int, width: int = 6) -> str:
+        key = (prefix, year)
+        self.sequences[key] = self.sequences.get(key, 0) + 1
+        return f"{prefix}-{year}-{str(self.sequences[key]).zfill(width)}"
+
+    def gold_rate(self, moment: datetime) -> float:
+        """22K rate per gram in OMR, trending upwards over the period with daily noise."""
+        years_elapsed = (moment - self.start).days / 365.0
+        return round(21.0 * (1.12 ** years_elapsed) * self.rng.uniform(0.97, 1.03), 3)
+
+    def pick_customer(self, moment: datetime):
+        """Weighted pick among customers that already existed at `moment`."""
+        available = bisect.bisect_right(self.customer_created, moment)
+        if available == 0:
+            return None
+        target = self.rng.random() * self.customer_weights[available - 1]
+        return self.customers[min(bisect.bisect_left(self.customer_weights, target), available - 1)]
+
+    async def add_transaction(self, moment, transaction_type, account_name, amount, category, mode,
+                              party=None, party_name=None, reference_type=None, reference_id=None,
+                              notes=None, balance_delta=None):
+        """
+        Emit a transaction and apply its balance effect.
+        balance_delta overrides the account-type rule for the write paths that use a
+        different effect (e.g. sales return revenue adjustment); pass 0 for rows the
+        API records without moving a balance (vendor payable).
+        """
+        account = self.accounts[account_name]
+        if balance_delta is None:
+            balance_delta = calculate_balance_delta(account['account_type'], transaction_type, amount)
+        self.account_balances[account_name] += Decimal(str(balance_delta))
+        txn = {
+            'id': self.new_id(),
+            'transaction_number': self.next_number('TXN', moment.year),
+            'date': moment,
+            'created_at': moment,
+            'transaction_type': transaction_type,
+            'mode': mode,
+            'account_id': account['id'],
+            'account_name': account['name'],
+            'party_id': party['id'] if party else None,
+            'party_name': party['name'] if party else party_name,
+            'amount': amount,
+            'category': category,
+            'notes': notes,
+            'reference_type': reference_type,
+            'reference_id': reference_id,
+            'created_by': self.created_by,
+            'is_deleted': False,
+        }
+        await self.writer.add('transactions', convert_transaction_to_decimal(txn))
+        return txn
+
+    async def add_movement(self, moment, movement_type, header_name, qty_delta, weight_delta, purity,
+                           description, reference_type=None, reference_id=None):
+        header = self.headers[header_name]
+        totals = self.header_totals[header_name]
+        totals['qty'] += qty_delta
+        totals['weight'] += Decimal(str(weight_delta))
+        movement = {
+            'id': self.new_id(),
+            'date': moment,
+            'created_at': moment,
+            'movement_type': movement_type,
+            'header_id': header['id'],
+            'header_name': header_name,
+            'description': description,
+            'qty_delta': qty_delta,
+            'weight_delta': weight_delta,
+            'purity': purity,
+            'reference_type': reference_type,
+            'reference_id': reference_id,
+            'created_by': self.created_by,
+            'notes': None,
+            'confirmation_reason': None,
+            'is_deleted': False,
+        }
+        await self.writer.add('stock_movements', convert_stock_movement_to_decimal(movement))
+
+    async def add_gold_entry(self, moment, party, entry_type, weight, purity, purpose,
+                             reference_type='manual', reference_id=None, notes=None):
+        entry = {
+            'id': self.new_id(),
+            'party_id': party['id'],
+            'date': moment,
+            'type': entry_type,
+            'weight_grams': weight,
+            'purity_entered': purity,
+            'purpose': purpose,
+            'reference_type': reference_type,
+            'reference_id': reference_id,
+            'notes': notes,
+            'created_at': moment,
+            'created_by': self.created_by,
+            'is_deleted': False,
+            'deleted_at': None,
+            'deleted_by': None,
+        }
+        await self.writer.add('gold_ledger', convert_gold_ledger_to_decimal(entry))
+
+    # ------------------------------------------------------------ reference data
+
+    def build_reference_data(self):
+        for name, account_type, opening in STANDARD_ACCOUNTS:
+            self.accounts[name] = {
+                'id': self.new_id(),
+                'name': name,
+                'account_type': account_type,
+                'opening_balance': float(opening),
+                'created_at': self.start - timedelta(days=1),
+                'created_by': self.created_by,
+                'is_deleted': False,
+            }
+            self.account_balances[name] = Decimal(str(opening))
+
+        header_names = [name for name, _purity, _weight in INVENTORY_CATEGORIES] + [PURCHASE_HEADER_NAME]
+        for name in header_names:
+            self.headers[name] = {
+                'id': self.new_id(),
+                'name': name,
+                'is_active': True,
+                'created_at': self.start - timedelta(days=1),
+                'created_by': self.created_by,
+                'is_deleted': False,
+            }
+            self.header_totals[name] = {'qty': 0, 'weight': Decimal('0')}
+            self.stock_out[name] = {'qty': 0, 'weight': Decimal('0')}
+
+    async def generate_parties(self):
+        total = self.counts['parties']
+        vendor_count = max(1, total // 12)
+        span_days = (self.end - self.start).days
+        customers = []
+        for index in range(total):
+            is_vendor = index < vendor_count
+            if is_vendor:
+                name = f"{self.rng.choice(LAST_NAMES).replace('Al-', '')} {self.rng.choice(VENDOR_SUFFIXES)}"
+                phone = f"+968 24{self.rng.randint(100000, 999999)}"
+                # Vendors are established before the period starts
+                created_at = self.start - timedelta(days=self.rng.randint(1, 365))
+            else:
+                name = f"{self.rng.choice(FIRST_NAMES)} {self.rng.choice(LAST_NAMES)}"
+                phone = f"+968 9{self.rng.randint(1000000, 9999999)}"
+                # A third of the customer base pre-dates the period, the rest join over time
+                if self.rng.random() < 0.33:
+                    created_at = self.start - timedelta(days=self.rng.randint(1, 365))
+                else:
+                    created_at = self.start + timedelta(days=self.rng.uniform(0, span_days * 0.95))
+            party = {
+                'id': self.new_id(),
+                'name': f"{name} #{index + 1}",
+                'oman_id': str(self.rng.randint(10000000, 99999999)) if self.rng.random() < 0.6 else None,
+                'phone': phone,
+                'address': self.rng.choice(CITIES),
+                'party_type': 'vendor' if is_vendor else 'customer',
+                'notes': None,
+                'created_at': created_at,
+                'created_by': self.created_by,
+                'is_deleted': False,
+            }
+            party.update(party_search_keys_update(party))
+            await self.writer.add('parties', party)
+            if is_vendor:
+                self.vendors.append(party)
+            else:
+                # Pareto-distributed activity: a few wholesale customers dominate volume
+                customers.append((created_at, party, self.rng.paretovariate(1.3)))
+
+        customers.sort(key=lambda entry: entry[0])
+        running = 0.0
+        for created_at, party, weight in customers:
+            running += weight
+            self.customers.append(party)
+            self.customer_created.append(created_at)
+            self.customer_weights.append(running)
+
+    # --------------------------------------------------------------- invoices
+
+    def build_invoice_items(self, moment: datetime) -> list:
+        rate = self.gold_rate(moment)
+        items = []
+        for _ in range(min(6, 1 + int(self.rng.expovariate(0.9)))):
+            name, purity, typical_weight = self.rng.choices(INVENTORY_CATEGORIES, weights=CATEGORY_WEIGHTS)[0]
+            qty = 1 if self.rng.random() < 0.85 else self.rng.randint(2, 4)
+            gross_weight = round(max(0.5, self.rng.lognormvariate(0, 0.45) * typical_weight) * qty, 3)
+            stone_weight = round(gross_weight * self.rng.uniform(0.02, 0.1), 3) if self.rng.random() < 0.2 else 0.0
+            net_weight = round(gross_weight - stone_weight, 3)
+            metal_rate = round(rate * purity / 916, 3)
+            gold_value = to_money(net_weight * metal_rate)
+            making_value = to_money(net_weight * self.rng.uniform(1.0, 3.5))
+            stone_charges = to_money(self.rng.uniform(5, 60)) if stone_weight else 0.0
+            subtotal = gold_value + making_value + stone_charges
+            vat_amount = to_money(subtotal * 0.05)
+            items.append({
+                'id': self.new_id(),
+                'category': name,
+                'description': f"{name} {purity}",
+                'qty': qty,
+                'gross_weight': gross_weight,
+                'stone_weight': stone_weight,
+                'net_gold_weight': net_weight,
+                'weight': net_weight,
+                'purity': purity,
+                'metal_rate': metal_rate,
+                'gold_value': gold_value,
+                'making_charge_type': 'per_gram',
+                'making_value': making_value,
+                'inches': None,
+                'stone_charges': stone_charges,
+                'wastage_charges': 0.0,
+                'item_discount': 0.0,
+                'vat_percent': 5.0,
+                'vat_amount': vat_amount,
+                'line_total': to_money(subtotal + vat_amount),
+            })
+        return items
+
+    async def generate_invoices(self):
+        total = self.counts['invoices']
+        return_probability = min(1.0, self.counts['returns'] / max(1, total))
+        moments = sorted(self.dates.sample() for _ in range(total))
+        recent_cutoff = self.end - timedelta(days=30)
+
+        for moment in moments:
+            customer = self.pick_customer(moment) if self.rng.random() < 0.8 else None
+            items = self.build_invoice_items(moment)
+            subtotal = to_money(sum(i['gold_value'] + i['making_value'] + i['stone_charges'] for i in items))
+            vat_total = to_money(sum(i['vat_amount'] for i in items))
+            grand_total = to_money(subtotal + vat_total)
+            invoice_id = self.new_id()
+            invoice_number = self.next_number('INV', moment.year, width=5)
+            is_recent = moment >= recent_cutoff
+            status = 'draft' if is_recent and self.rng.random() < 0.25 else 'finalized'
+
+            invoice = {
+                'id': invoice_id,
+                'invoice_number': invoice_number,
+                'date': moment,
+                'created_at': moment,
+                'due_date': moment + timedelta(days=30),
+                'customer_type': 'saved' if customer else 'walk_in',
+                'customer_id': customer['id'] if customer else None,
+                'customer_name': customer['name'] if customer else None,
+                'customer_oman_id': customer['oman_id'] if customer else None,
+                'customer_phone': customer['phone'] if customer else None,
+                'customer_address': customer['address'] if customer else None,
+                'walk_in_name': None if customer else f"{self.rng.choice(FIRST_NAMES)} (walk-in)",
+                'walk_in_phone': None if customer else f"+968 9{self.rng.randint(1000000, 9999999)}",
+                'invoice_type': 'sale',
+                'status': status,
+                'finalized_at': moment if status == 'finalized' else None,
+                'finalized_by': self.created_by if status == 'finalized' else None,
+                'paid_at': None,
+                'items': items,
+                'subtotal': subtotal,
+                'discount_amount': 0.0,
+                'tax_type': 'cgst_sgst',
+                'gst_percent': 5.0,
+                'vat_total': vat_total,
+                'grand_total': grand_total,
+                'paid_amount': 0.0,
+                'balance_due': grand_total,
+                'payment_status': 'unpaid',
+                'notes': None,
+                'jobcard_id': None,
+                'created_by': self.created_by,
+                'is_deleted': False,
+            }
+            paid = Decimal('0')
+
+            # Gold exchange at creation: gold ledger IN + "Gold Received" debit (create_invoice)
+            if customer and self.rng.random() < 0.08:
+                weight = round(self.rng.uniform(2.0, 25.0), 3)
+                rate = self.gold_rate(moment)
+                value = min(to_money(weight * rate), grand_total)
+                invoice.update({
+                    'gold_received_weight': weight, 'gold_received_purity': 916,
+                    'gold_received_rate': rate, 'gold_received_value': value,
+                    'gold_received_purpose': 'exchange',
+                })
+                await self.add_gold_entry(moment, customer, 'IN', weight, 916, 'exchange',
+                                          reference_type='invoice', reference_id=invoice_id,
+                                          notes=f"Gold received for invoice {invoice_number}")
+                await self.add_transaction(moment, 'debit', 'Gold Received', value, 'sales', 'Gold Exchange',
+                                           party=customer, reference_type='invoice', reference_id=invoice_id)
+                paid += Decimal(str(value))
+
+            if status == 'finalized':
+                for item in items:
+                    self.stock_out[item['category']]['qty'] += item['qty']
+                    self.stock_out[item['category']]['weight'] += Decimal(str(item['weight']))
+                    await self.add_movement(moment, 'Stock OUT', item['category'], -item['qty'], -item['weight'],
+                                            item['purity'], f"Invoice {invoice_number} - Finalized",
+                                            reference_type='invoice', reference_id=invoice_id)
+
+                # Payment behaviour: most pay in full the same day, some in instalments, recent ones may be open
+                outcome = self.rng.random()
+                remaining = Decimal(str(grand_total)) - paid
+                if outcome < 0.78 or not customer:
+                    instalments = [remaining]
+                elif outcome < 0.93 or not is_recent:
+                    first = (remaining * Decimal(str(round(self.rng.uniform(0.3, 0.7), 2)))).quantize(Decimal('0.001'))
+                    instalments = [first, remaining - first] if self.rng.random() < 0.7 else [first]
+                else:
+                    instalments = []
+
+                last_payment = moment
+                for index, amount in enumerate(instalments):
+                    if amount <= 0:
+                        continue
+                    pay_moment = moment if index == 0 and len(instalments) == 1 else self.dates.after(last_payment, 45)
+                    last_payment = pay_moment
+                    mode = self.rng.choices(PAYMENT_MODES, weights=PAYMENT_MODE_WEIGHTS)[0]
+                    cash_account = 'Cash' if mode == 'Cash' else 'Bank'
+                    amount_f = float(amount)
+                    await self.add_transaction(pay_moment, 'debit', cash_account, amount_f,
+                                               'Invoice Payment - Cash/Bank (Debit)', mode,
+                                               party=customer, party_name=invoice['walk_in_name'],
+                                               reference_type='invoice', reference_id=invoice_id,
+                                               notes=f"Payment for {invoice_number}.")
+                    await self.add_transaction(pay_moment, 'credit', 'Sales Income', amount_f,
+                                               'Invoice Payment - Sales Income (Credit)', mode,
+                                               party=customer, party_name=invoice['walk_in_name'],
+                                               reference_type='invoice', reference_id=invoice_id,
+                                               notes=f"Revenue for {invoice_number}.")
+                    paid += amount
+
+                balance = Decimal(str(grand_total)) - paid
+                invoice['paid_amount'] = float(paid)
+                invoice['balance_due'] = float(max(Decimal('0'), balance))
+                if balance < Decimal('0.01'):
+                    invoice['payment_status'] = 'paid'
+                    invoice['paid_at'] = last_payment
+                elif paid > 0:
+                    invoice['payment_status'] = 'partial'
+
+                if self.rng.random() < return_probability:
+                    await self.generate_sale_return(invoice, customer, last_payment)
+
+            await self.writer.add('invoices', convert_invoice_to_decimal(invoice))
+
+    async def generate_sale_return(self, invoice: dict, customer, after: datetime):
+        """Finalized sales return for one line of `invoice`, adjusting its balances like finalize_return."""
+        item = self.rng.choice(invoice['items'])
+        moment = self.dates.after(after, 20)
+        return_id = self.new_id()
+        return_number = self.next_number('RET', moment.year, width=5)
+        amount = to_money(min(item['line_total'], invoice['paid_amount']) * self.rng.uniform(0.6, 1.0))
+        refund_mode = 'money' if amount > 0 and (not customer or self.rng.random() < 0.85) else 'gold'
+        refund_gold = round(item['weight'] * 0.95, 3) if refund_mode == 'gold' else 0.0
+        if refund_mode == 'gold' and not customer:
+            return
+
+        transaction_id = None
+        gold_ledger_id = None
+        party_name = invoice['customer_name'] or invoice['walk_in_name']
+        if refund_mode == 'money':
+            txn = await self.add_transaction(moment, 'credit', 'Cash', amount, 'sales_return', 'Cash',
+                                             party=customer, party_name=party_name,
+                                             reference_type='return', reference_id=return_id,
+                                             notes=f"Sales Return Refund - {return_number}")
+            # finalize_return reduces Sales Income by the refund even though it books a credit row
+            await self.add_transaction(moment, 'credit', 'Sales Income', amount, 'sales_return', 'adjustment',
+                                       party=customer, party_name=party_name,
+                                       reference_type='return', reference_id=return_id,
+                                       notes=f"Sales Return Revenue Adjustment - {return_number}",
+                                       balance_delta=-amount)
+            transaction_id = txn['id']
+            new_paid = max(0.0, invoice['paid_amount'] - amount)
+            new_balance = max(0.0, invoice['grand_total'] - new_paid)
+            invoice['paid_amount'] = round(new_paid, 2)
+            invoice['balance_due'] = round(new_balance, 2)
+            invoice['payment_status'] = 'unpaid' if new_balance > 0 else 'paid'
+        else:
+            await self.add_gold_entry(moment, customer, 'OUT', refund_gold, 916, 'sales_return',
+                                      reference_type='return', reference_id=return_id,
+                                      notes=f"Sales Return Gold Refund - {return_number}")
+
+        return_doc = {
+            'id': return_id,
+            'return_number': return_number,
+            'return_type': 'sale_return',
+            'reference_type': 'invoice',
+            'reference_id': invoice['id'],
+            'reference_number': invoice['invoice_number'],
+            'party_id': customer['id'] if customer else None,
+            'party_name': party_name,
+            'party_type': 'customer',
+            'date': moment,
+            'items': [{
+                'id': self.new_id(),
+                'description': item['description'],
+                'qty': item['qty'],
+                'weight_grams': item['weight'],
+                'purity': item['purity'],
+                'amount': amount,
+            }],
+            'total_weight_grams': item['weight'],
+            'total_amount': amount,
+            'reason': self.rng.choice(['Size issue', 'Design change', 'Quality concern', 'Customer changed mind']),
+            'refund_mode': refund_mode,
+            'refund_money_amount': amount if refund_mode == 'money' else 0.0,
+            'refund_gold_grams': refund_gold,
+            'refund_gold_purity': 916 if refund_mode == 'gold' else None,
+            'payment_mode': 'Cash' if refund_mode == 'money' else None,
+            'account_id': self.accounts['Cash']['id'] if refund_mode == 'money' else None,
+            'account_name': 'Cash' if refund_mode == 'money' else None,
+            'status': 'finalized',
+            'finalized_at': moment,
+            'finalized_by': self.created_by,
+            'transaction_id': transaction_id,
+            'gold_ledger_id': gold_ledger_id,
+            'stock_movement_ids': [],
+            'inventory_action_status': 'manual_action_required',
+            'created_at': moment,
+            'created_by': self.created_by,
+            'is_deleted': False,
+        }
+        await self.writer.add('returns', convert_return_to_decimal(return_doc))
+
+    # -------------------------------------------------------------- purchases
+
+    async def generate_purchases(self):
+        moments = sorted(self.dates.sample() for _ in range(self.counts['purchases']))
+        for moment in moments:
+            vendor = self.rng.choice(self.vendors)
+            conversion_factor = 0.920
+            rate_22k = self.gold_rate(moment)
+            purchase_id = self.new_id()
+            items = []
+            for _ in range(self.rng.randint(1, 3)):
+                entered_purity = self.rng.choice([999, 995, 916, 875])
+                weight = round(self.rng.uniform(10.0, 150.0), 3)
+                amount = to_money(weight * entered_purity / 916 / conversion_factor * rate_22k)
+                items.append({
+                    'id': self.new_id(),
+                    'description': f"Gold {entered_purity} lot",
+                    'weight_grams': weight,
+                    'entered_purity': entered_purity,
+                    'rate_per_gram_22k': rate_22k,
+                    'calculated_amount': amount,
+                })
+            total_weight = round(sum(i['weight_grams'] for i in items), 3)
+            amount_total = to_money(sum(i['calculated_amount'] for i in items))
+            paid = amount_total if self.rng.random() < 0.7 else to_money(amount_total * self.rng.uniform(0.2, 0.8))
+            balance_due = to_money(amount_total - paid)
+
+            for item in items:
+                await self.add_movement(moment, 'Stock IN', PURCHASE_HEADER_NAME, 1, item['weight_grams'], 916,
+                                        f"Purchase from {vendor['name']}: {item['description']}",
+                                        reference_type='purchase', reference_id=purchase_id)
+            account_name = 'Bank' if paid > 5000 else 'Cash'
+            if paid > 0:
+                await self.add_transaction(moment, 'credit', account_name, paid, 'Purchase Payment',
+                                           'Bank Transfer' if account_name == 'Bank' else 'Cash',
+                                           party=vendor, reference_type='purchase', reference_id=purchase_id,
+                                           notes=f"Payment for purchase from {vendor['name']} ({total_weight}g total)")
+            if balance_due > 0:
+                # create_purchase records the payable without moving the Purchases balance
+                await self.add_transaction(moment, 'credit', 'Purchases', balance_due, 'Purchase', 'Vendor Payable',
+                                           party=vendor, reference_type='purchase', reference_id=purchase_id,
+                                           notes=f"Vendor payable for purchase: Multiple items ({len(items)} items)",
+                                           balance_delta=0)
+
+            purchase = {
+                'id': purchase_id,
+                'vendor_party_id': vendor['id'],
+                'vendor_oman_id': vendor['oman_id'],
+                'is_walk_in': False,
+                'walk_in_vendor_name': None,
+                'date': moment,
+                'items': items,
+                'description': None,
+                'weight_grams': total_weight,
+                'entered_purity': items[0]['entered_purity'],
+                'rate_per_gram': rate_22k,
+                'valuation_purity_fixed': 916,
+                'conversion_factor': conversion_factor,
+                'amount_total': amount_total,
+                'paid_amount_money': paid,
+                'balance_due_money': balance_due,
+                'payment_mode': 'Bank Transfer' if account_name == 'Bank' else 'Cash',
+                'account_id': self.accounts[account_name]['id'] if paid > 0 else None,
+                'status': 'Paid' if balance_due == 0 else ('Partially Paid' if paid > 0 else 'Finalized (Unpaid)'),
+                'finalized_at': moment,
+                'finalized_by': self.created_by,
+                'locked': balance_due == 0,
+                'locked_at': moment if balance_due == 0 else None,
+                'locked_by': self.created_by if balance_due == 0 else None,
+                'created_at': moment,
+                'created_by': self.created_by,
+                'is_deleted': False,
+            }
+            await self.writer.add('purchases', convert_purchase_to_decimal(purchase))
+
+    # ----------------------------------------------------------- other ledgers
+
+    async def generate_gold_ledger(self):
+        purposes = ['job_work', 'advance_gold', 'adjustment']
+        for _ in range(self.counts['gold_ledger']):
+            moment = self.dates.sample()
+            party = self.pick_customer(moment) if self.rng.random() < 0.8 else self.rng.choice(self.vendors)
+            if party is None:
+                continue
+            await self.add_gold_entry(moment, party, self.rng.choice(['IN', 'OUT']),
+                                      round(self.rng.uniform(1.0, 80.0), 3),
+                                      self.rng.choice([999, 916, 875]), self.rng.choice(purposes))
+
+    async def generate_expenses(self):
+        for _ in range(self.counts['expenses']):
+            moment = self.dates.sample()
+            account_name = self.rng.choices(['Rent', 'Salaries', 'Utilities'], weights=[1, 3, 4])[0]
+            amount = to_money(self.rng.uniform(20, 1500) if account_name == 'Utilities' else self.rng.uniform(300, 3000))
+            await self.add_transaction(moment, 'debit', account_name, amount, account_name.lower(), 'Cash',
+                                       notes=f"{account_name} expense")
+            await self.add_transaction(moment, 'credit', 'Cash', amount, account_name.lower(), 'Cash',
+                                       notes=f"{account_name} expense paid")
+
+    async def finish_reference_data(self):
+        """Write opening stock, headers and accounts once all deltas are known."""
+        opening_moment = self.start - timedelta(days=1)
+        for name, out in self.stock_out.items():
+            if out['qty'] == 0 and out['weight'] == 0:
+                continue
+            # Opening stock covers the period's sales with headroom, so no header ever goes negative
+            qty = int(out['qty'] * 1.1) + 5
+            weight = float((out['weight'] * Decimal('1.1')).quantize(Decimal('0.001'))) + 50.0
+            purity = next((p for n, p, _w in INVENTORY_CATEGORIES if n == name), 916)
+            await self.add_movement(opening_moment, 'Stock IN', name, qty, weight, purity, 'Opening stock')
+
+        for name, header in self.headers.items():
+            totals = self.header_totals[name]
+            header['current_qty'] = float(totals['qty'])
+            header['current_weight'] = float(totals['weight'])
+            await self.writer.add('inventory_headers', header)
+
+        for name, account in self.accounts.items():
+            account['current_balance'] = float(self.account_balances[name])
+            await self.writer.add('accounts', convert_account_to_decimal(account))
+
+    async def run(self):
+        self.build_reference_data()
+        await self.generate_parties()
+        await self.generate_invoices()
+        await self.generate_purchases()
+        await self.generate_gold_ledger()
+        await self.generate_expenses()
+        await self.finish_reference_data()
+        await self.writer.close()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Generate a production-shaped dataset for load testing')
+    parser.add_argument('--profile', choices=sorted(PROFILES), default='small')
+    parser.add_argument('--parties', type=int)
+    parser.add_argument('--invoices', type=int)
+    parser.add_argument('--purchases', type=int)
+    parser.add_argument('--gold-ledger', type=int, dest='gold_ledger')
+    parser.add_argument('--returns', type=int)
+    parser.add_argument('--expenses', type=int)
+    parser.add_argument('--years', type=float, default=3)
+    parser.add_argument('--seed', type=int, default=2024)
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--drop', action='store_true', help='Drop the generated collections first')
+    return parser.parse_args(argv)
+
+
+async def generate(args, db):
+    counts = dict(PROFILES[args.profile])
+    for key in counts:
+        if getattr(args, key) is not None:
+            counts[key] = getattr(args, key)
+
+    if args.drop:
+        for name in GENERATED_COLLECTIONS:
+            await db.drop_collection(name)
+        print(f"🗑️  Dropped: {', '.join(GENERATED_COLLECTIONS)}")
+
+    admin = await db.users.find_one({"username": "admin", "is_deleted": False})
+    created_by = admin['id'] if admin else 'loadgen'
+
+    writer = BatchWriter(db, args.batch_size, args.concurrency)
+    generator = LoadDataGenerator(writer, counts, args.years, args.seed, created_by)
+    print(f"🔄 Generating {args.profile} profile {counts} over {args.years} years (seed={args.seed})")
+
+    started = time.perf_counter()
+    await generator.run()
+    elapsed = time.perf_counter() - started
+
+    total = sum(writer.counts.values())
+    print("\n✅ Generation complete")
+    for name in sorted(writer.counts):
+        print(f"   • {name}: {writer.counts[name]:,}")
+    print(f"   Total: {total:,} documents in {elapsed:.1f}s ({total / max(elapsed, 0.001):,.0f} docs/s)")
+    return writer.counts
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    client = AsyncIOMotorClient(MONGO_URL)
+    try:
+        asyncio.run(generate(args, client[DB_NAME]))
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,554 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime, timezone, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import bson
+from pymongo import monitoring
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+
+
+# ============================================================================
+# PER-REQUEST DATABASE INSTRUMENTATION
+# ============================================================================
+#
+# MongoDB command monitoring events are attributed to the HTTP request that
+# issued them through a ContextVar. Motor copies the caller's context into its
+# executor threads, so the listener callbacks see the request that awaited the
+# operation even though they run off the event loop.
+
+request_logger = logging.getLogger("request_metrics")
+
+# Computing reply sizes re-encodes each reply; allow switching it off on hot deployments
+TRACK_REPLY_BYTES = os.environ.get('METRICS_TRACK_REPLY_BYTES', 'true').lower() == 'true'
+
+# Latency buckets (seconds) shared by request and DB-time histograms
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Query-count buckets expose N+1 patterns (a list endpoint issuing 50+ queries)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 1000)
+
+
+class RequestStats:
+    """Database work attributed to a single HTTP request."""
+
+    __slots__ = ('queries', 'db_seconds', 'reply_bytes', 'failed', 'commands', 'scope', '_lock')
+
+    def __init__(self, scope: Optional[dict] = None):
+        # ASGI scope of the request; the matched route is read from it lazily
+        self.scope = scope
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.reply_bytes = 0
+        self.failed = 0
+        self.commands: Dict[str, int] = {}
+        # Concurrent reads of one request (asyncio.gather) complete on different executor threads
+        self._lock = threading.Lock()
+
+    @property
+    def route(self) -> str:
+        route = (self.scope or {}).get("route")
+        return getattr(route, "path", None) or "unmatched"
+
+    def record(self, command_name: str, duration_micros: int, reply_bytes: int, failed: bool = False):
+        with self._lock:
+            self.queries += 1
+            self.db_seconds += duration_micros / 1_000_000
+            self.reply_bytes += reply_bytes
+            if failed:
+                self.failed += 1
+            self.commands[command_name] = self.commands.get(command_name, 0) + 1
+
+
+current_request_stats: ContextVar[Optional[RequestStats]] = ContextVar('current_request_stats', default=None)
+
+
+class RequestCommandListener(monitoring.CommandListener):
+    """
+    Adds every MongoDB command's duration and reply size to the current request's stats.
+    When slow-query capture is enabled, commands over the threshold are handed to
+    slow_query_recorder together with the command document that produced them.
+    """
+
+    def __init__(self):
+        # (connection_id, request_id) -> (command document, database) for in-flight commands
+        self._in_flight: Dict[tuple, tuple] = {}
+
+    def started(self, event):
+        if SLOW_QUERY_THRESHOLD_MS > 0 and current_request_stats.get() is not None:
+            self._in_flight[(event.connection_id, event.request_id)] = (event.command, event.database_name)
+
+    def succeeded(self, event):
+        stats = current_request_stats.get()
+        if stats is None:
+            return
+        reply_bytes = len(bson.encode(event.reply)) if TRACK_REPLY_BYTES else 0
+        stats.record(event.command_name, event.duration_micros, reply_bytes)
+        self._check_slow(event, stats)
+
+    def failed(self, event):
+        stats = current_request_stats.get()
+        if stats is not None:
+            stats.record(event.command_name, event.duration_micros, 0, failed=True)
+            self._check_slow(event, stats)
+
+    def _check_slow(self, event, stats: RequestStats):
+        in_flight = self._in_flight.pop((event.connection_id, event.request_id), None)
+        if in_flight is None:
+            return
+        duration_ms = event.duration_micros / 1000
+        if duration_ms >= SLOW_QUERY_THRESHOLD_MS:
+            command, database = in_flight
+            slow_query_recorder.submit(event.command_name, command, database, duration_ms, stats)
+
+
+# ============================================================================
+# PROMETHEUS METRICS REGISTRY
+# ============================================================================
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by a label tuple (Prometheus semantics)."""
+
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...], buckets: Tuple[float, ...]):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self.series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, labels: Tuple[str, ...], value: float):
+        series = self.series.get(labels)
+        if series is None:
+            # [bucket counts..., +Inf count, sum]
+            series = self.series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[index] += 1
+        series[-2] += 1
+        series[-1] += value
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for labels, series in sorted(self.series.items()):
+            label_text = _format_labels(self.label_names, labels)
+            for index, bound in enumerate(self.buckets):
+                lines.append(f'{self.name}_bucket{{{label_text},le="{bound:g}"}} {series[index]}')
+            lines.append(f'{self.name}_bucket{{{label_text},le="+Inf"}} {series[-2]}')
+            lines.append(f"{self.name}_sum{{{label_text}}} {series[-1]:.6f}")
+            lines.append(f"{self.name}_count{{{label_text}}} {series[-2]}")
+        return lines
+
+
+class Counter:
+    """Monotonic counter keyed by a label tuple."""
+
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...]):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.series: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, labels: Tuple[str, ...], value: float = 1):
+        self.series[labels] = self.series.get(labels, 0) + value
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self.series.items()):
+            lines.append(f"{self.name}{{{_format_labels(self.label_names, labels)}}} {value:g}")
+        return lines
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...]) -> str:
+    def escape(value: str) -> str:
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return ",".join(f'{name}="{escape(value)}"' for name, value in zip(names, values))
+
+
+ROUTE_LABELS = ('method', 'route')
+
+REQUEST_DURATION = Histogram(
+    'http_request_duration_seconds', 'HTTP request latency by route', ROUTE_LABELS, DURATION_BUCKETS)
+REQUEST_DB_DURATION = Histogram(
+    'http_request_db_duration_seconds', 'MongoDB time spent per HTTP request by route', ROUTE_LABELS, DURATION_BUCKETS)
+REQUEST_DB_QUERIES = Histogram(
+    'http_request_db_queries', 'MongoDB commands issued per HTTP request by route', ROUTE_LABELS, QUERY_COUNT_BUCKETS)
+REQUESTS_TOTAL = Counter(
+    'http_requests_total', 'HTTP requests by route and status code', ROUTE_LABELS + ('status',))
+REQUEST_DB_REPLY_BYTES = Counter(
+    'http_request_db_reply_bytes_total', 'Bytes returned by MongoDB per route', ROUTE_LABELS)
+DB_COMMANDS_TOTAL = Counter(
+    'mongodb_commands_total', 'MongoDB commands issued from HTTP requests by command name', ('command',))
+
+METRICS = [REQUEST_DURATION, REQUEST_DB_DURATION, REQUEST_DB_QUERIES,
+           REQUESTS_TOTAL, REQUEST_DB_REPLY_BYTES, DB_COMMANDS_TOTAL]
+
+# Middleware runs on the event loop thread, but guard renders against concurrent scrapes anyway
+_metrics_lock = threading.Lock()
+
+
+def render_metrics() -> str:
+    """Prometheus text exposition format (version 0.0.4) for all registered metrics."""
+    with _metrics_lock:
+        lines = []
+        for metric in METRICS:
+            lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ============================================================================
+# REQUEST METRICS MIDDLEWARE
+# ============================================================================
+
+class RequestMetricsMiddleware(BaseHTTPMiddleware):
+    """
+    Measures each request and the MongoDB work it caused.
+
+    Per request:
+    - Server-Timing header: total, db (with query count) and app time
+    - one structured JSON log line on the "request_metrics" logger
+    - per-route histograms exported by /api/metrics
+
+    Routes are labelled with their template (/api/invoices/{invoice_id}), never the raw
+    path, so metric cardinality stays bounded. Unmatched paths share one label.
+    """
+
+    async def dispatch(self, request: Request, call_next):
+        stats = RequestStats(request.scope)
+        stats_token = current_request_stats.set(stats)
+        started = time.perf_counter()
+        status_code = 500
+        try:
+            response = await call_next(request)
+            status_code = response.status_code
+        finally:
+            elapsed = time.perf_counter() - started
+            current_request_stats.reset(stats_token)
+            self._observe(request.method, stats.route, status_code, elapsed, stats, request.url.path)
+
+        db_ms = stats.db_seconds * 1000
+        total_ms = elapsed * 1000
+        response.headers['Server-Timing'] = (
+            f'db;dur={db_ms:.1f};desc="{stats.queries} queries", '
+            f'app;dur={max(total_ms - db_ms, 0.0):.1f}, '
+            f'total;dur={total_ms:.1f}'
+        )
+        return response
+
+    @staticmethod
+    def _observe(method: str, route: str, status_code: int, elapsed: float, stats: RequestStats, path: str):
+        labels = (method, route)
+        with _metrics_lock:
+            REQUEST_DURATION.observe(labels, elapsed)
+            REQUEST_DB_DURATION.observe(labels, stats.db_seconds)
+            REQUEST_DB_QUERIES.observe(labels, stats.queries)
+            REQUESTS_TOTAL.inc(labels + (str(status_code),))
+            REQUEST_DB_REPLY_BYTES.inc(labels, stats.reply_bytes)
+            for command_name, count in stats.commands.items():
+                DB_COMMANDS_TOTAL.inc((command_name,), count)
+
+        request_logger.info(json.dumps({
+            "event": "request",
+            "method": method,
+            "route": route,
+            "path": path,
+            "status": status_code,
+            "duration_ms": round(elapsed * 1000, 2),
+            "db_queries": stats.queries,
+            "db_failed": stats.failed,
+            "db_ms": round(stats.db_seconds * 1000, 2),
+            "db_reply_bytes": stats.reply_bytes,
+        }))
+
+
+# ============================================================================
+# SLOW QUERY CAPTURE
+# ============================================================================
+#
+# Commands issued while serving a request that take longer than
+# SLOW_QUERY_THRESHOLD_MS are recorded into the capped `slow_queries` collection
+# with their filter shape (literal values replaced by "?"), collection, duration
+# and route. Read commands are additionally explained with executionStats, at
+# most once per shape per SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS, so the record
+# shows whether the plan was an index scan or a collection scan.
+#
+# The listener only enqueues; a background task started with the app formats,
+# explains and inserts, so request latency is unaffected.
+
+SLOW_QUERY_THRESHOLD_MS = float(os.environ.get('SLOW_QUERY_THRESHOLD_MS', '0'))  # 0 disables capture
+SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS = float(os.environ.get('SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS', '300'))
+SLOW_QUERIES_COLLECTION = 'slow_queries'
+SLOW_QUERIES_CAPPED_BYTES = int(os.environ.get('SLOW_QUERIES_CAPPED_BYTES', str(64 * 1024 * 1024)))
+
+# Commands that can be explained without side effects
+EXPLAINABLE_COMMANDS = {'find', 'aggregate', 'count', 'distinct'}
+# Session/cluster fields that are not valid inside an explain command
+_NON_EXPLAIN_FIELDS = {'lsid', 'txnNumber', 'autocommit', 'startTransaction', 'apiVersion',
+                       'apiStrict', 'apiDeprecationErrors'}
+
+
+def redact_shape(value: Any) -> Any:
+    """
+    Replace literal values in a filter or pipeline with "?" while keeping its structure.
+    Field paths ("$amount") and operator names are structural and kept; arrays of scalars
+    collapse to a single placeholder so `$in` lists of different lengths share one shape.
+    """
+    if isinstance(value, dict):
+        return {key: redact_shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        if value and all(isinstance(item, (dict, list, tuple)) for item in value):
+            return [redact_shape(item) for item in value]
+        return ["?"] if value else []
+    if isinstance(value, str) and value.startswith('$'):
+        return value
+    return "?"
+
+
+def command_shape(command_name: str, command: dict) -> dict:
+    """Redacted, value-free description of what a command asked for."""
+    if command_name == 'find':
+        shape = {'filter': redact_shape(command.get('filter', {}))}
+        if command.get('sort'):
+            shape['sort'] = dict(command['sort'])
+        if command.get('projection'):
+            shape['projection'] = sorted(command['projection'])
+        return shape
+    if command_name == 'aggregate':
+        return {'pipeline': redact_shape(command.get('pipeline', []))}
+    if command_name in ('count', 'distinct'):
+        shape = {'query': redact_shape(command.get('query', {}))}
+        if command_name == 'distinct':
+            shape['key'] = command.get('key')
+        return shape
+    if command_name == 'findAndModify':
+        return {'query': redact_shape(command.get('query', {})), 'sort': dict(command.get('sort') or {})}
+    if command_name in ('update', 'delete'):
+        statements = command.get('updates' if command_name == 'update' else 'deletes') or []
+        return {'q': [redact_shape(statement.get('q', {})) for statement in statements[:1]]}
+    if command_name == 'insert':
+        return {'documents': len(command.get('documents') or [])}
+    return {}
+
+
+def command_collection(command_name: str, command: dict) -> Optional[str]:
+    """Collection targeted by a command (getMore names it under `collection`)."""
+    if command_name == 'getMore':
+        return command.get('collection')
+    target = command.get(command_name)
+    return target if isinstance(target, str) else None
+
+
+def _find_key(document: Any, key: str) -> Any:
+    """First value stored under `key` anywhere in a nested explain document."""
+    if isinstance(document, dict):
+        if key in document:
+            return document[key]
+        children = document.values()
+    elif isinstance(document, list):
+        children = document
+    else:
+        return None
+    for child in children:
+        found = _find_key(child, key)
+        if found is not None:
+            return found
+    return None
+
+
+def _plan_stages(plan: Any) -> List[dict]:
+    """Flatten a winning plan tree into [{"stage": ..., "index": ...}] from root to leaves."""
+    stages = []
+    while isinstance(plan, dict):
+        entry = {'stage': plan.get('stage')}
+        if plan.get('indexName'):
+            entry['index'] = plan['indexName']
+        stages.append(entry)
+        if 'inputStage' in plan:
+            plan = plan['inputStage']
+        elif plan.get('inputStages'):
+            stages.extend(stage for child in plan['inputStages'] for stage in _plan_stages(child))
+            break
+        elif 'queryPlan' in plan:
+            plan = plan['queryPlan']
+        else:
+            break
+    return stages
+
+
+def summarize_explain(explain: dict) -> dict:
+    """
+    Keep the numbers that explain a slow query and drop parsedQuery (it holds literal values).
+    Works for find/count/distinct explains and for aggregate explains with a $cursor stage.
+    """
+    execution_stats = _find_key(explain, 'executionStats') or {}
+    winning_plan = _find_key(explain, 'winningPlan') or {}
+    stages = _plan_stages(winning_plan)
+    return {
+        'execution_time_ms': execution_stats.get('executionTimeMillis'),
+        'n_returned': execution_stats.get('nReturned'),
+        'total_keys_examined': execution_stats.get('totalKeysExamined'),
+        'total_docs_examined': execution_stats.get('totalDocsExamined'),
+        'plan_stages': stages,
+        'collection_scan': any(stage.get('stage') == 'COLLSCAN' for stage in stages),
+    }
+
+
+class SlowQueryRecorder:
+    """Background writer for slow query samples (see section comment above)."""
+
+    def __init__(self, max_pending: int = 1000):
+        # deque.append/popleft are thread-safe; the listener runs on Motor executor threads
+        self._pending = deque(maxlen=max_pending)
+        self._last_explained: Dict[str, float] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._db = None
+
+    @property
+    def enabled(self) -> bool:
+        return SLOW_QUERY_THRESHOLD_MS > 0
+
+    def submit(self, command_name: str, command: dict, database: str, duration_ms: float, stats: RequestStats):
+        self._pending.append({
+            'command_name': command_name,
+            'command': command,
+            'database': database,
+            'duration_ms': duration_ms,
+            'route': stats.route,
+            'path': (stats.scope or {}).get('path'),
+            'timestamp': datetime.now(timezone.utc),
+        })
+
+    async def start(self, db):
+        if not self.enabled or self._task is not None:
+            return
+        self._db = db
+        try:
+            if SLOW_QUERIES_COLLECTION not in await db.list_collection_names():
+                await db.create_collection(SLOW_QUERIES_COLLECTION, capped=True, size=SLOW_QUERIES_CAPPED_BYTES)
+        except Exception as e:
+            logging.warning(f"Could not create capped {SLOW_QUERIES_COLLECTION} collection: {e}")
+        # Created from startup context, so the task's own explain/insert commands carry no request stats
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(1)
+            await self.flush()
+
+    async def flush(self):
+        """Write all queued samples; explain failures never drop the sample itself."""
+        if self._db is None:
+            return
+        documents = []
+        while self._pending:
+            documents.append(await self._build_document(self._pending.popleft()))
+        if documents:
+            try:
+                await self._db[SLOW_QUERIES_COLLECTION].insert_many(documents, ordered=False)
+            except Exception as e:
+                logging.error(f"Failed to record slow queries: {e}")
+
+    async def _build_document(self, sample: dict) -> dict:
+        command_name = sample['command_name']
+        command = sample['command']
+        shape = command_shape(command_name, command)
+        shape_text = json.dumps(shape, sort_keys=True, default=str)
+        collection = command_collection(command_name, command)
+        shape_hash = hashlib.sha1(f"{collection}:{command_name}:{shape_text}".encode()).hexdigest()[:16]
+
+        explain_summary = None
+        if self._should_explain(command_name, command, shape_hash):
+            try:
+                explain_command = {key: value for key, value in command.items()
+                                   if not key.startswith('$') and key not in _NON_EXPLAIN_FIELDS}
+                explain = await self._db.client[sample['database']].command(
+                    {'explain': explain_command, 'verbosity': 'executionStats'})
+                explain_summary = summarize_explain(explain)
+            except Exception as e:
+                explain_summary = {'error': str(e)}
+
+        return {
+            'id': str(uuid.uuid4()),
+            'timestamp': sample['timestamp'],
+            'collection': collection,
+            'command': command_name,
+            'shape': shape_text,
+            'shape_hash': shape_hash,
+            'duration_ms': round(sample['duration_ms'], 3),
+            'route': sample['route'],
+            'path': sample['path'],
+            'explain': explain_summary,
+        }
+
+    def _should_explain(self, command_name: str, command: dict, shape_hash: str) -> bool:
+        if command_name not in EXPLAINABLE_COMMANDS:
+            return False
+        if command_name == 'aggregate' and any(
+                '$out' in stage or '$merge' in stage for stage in command.get('pipeline', [])):
+            return False
+        now = time.monotonic()
+        last = self._last_explained.get(shape_hash)
+        if last is not None and now - last < SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS:
+            return False
+        self._last_explained[shape_hash] = now
+        return True
+
+
+slow_query_recorder = SlowQueryRecorder()
+
+
+async def top_slow_queries(db, limit: int = 20, hours: int = 24, route: Optional[str] = None) -> List[dict]:
+    """Slow query shapes ranked by total time spent, with the most recent explain sample."""
+    match: Dict[str, Any] = {'timestamp': {'$gte': datetime.now(timezone.utc) - timedelta(hours=hours)}}
+    if route:
+        match['route'] = route
+    pipeline = [
+        {'$match': match},
+        {'$group': {
+            '_id': '$shape_hash',
+            'collection': {'$first': '$collection'},
+            'command': {'$first': '$command'},
+            'shape': {'$first': '$shape'},  # identical within a shape_hash
+            'count': {'$sum': 1},
+            'total_ms': {'$sum': '$duration_ms'},
+            'max_ms': {'$max': '$duration_ms'},
+            'avg_ms': {'$avg': '$duration_ms'},
+            'routes': {'$addToSet': '$route'},
+            'first_seen': {'$min': '$timestamp'},
+            'last_seen': {'$max': '$timestamp'},
+            # $max ignores nulls and compares documents field by field, so this keeps the
+            # newest explained sample without pushing every unexplained one into memory
+            'latest_explain': {'$max': {'$cond': [
+                {'$ifNull': ['$explain', False]},
+                {'timestamp': '$timestamp', 'summary': '$explain'},
+                None,
+            ]}},
+        }},
+        {'$sort': {'total_ms': -1}},
+        {'$limit': limit},
+    ]
+    results = []
+    async for row in db[SLOW_QUERIES_COLLECTION].aggregate(pipeline):
+        row['shape_hash'] = row.pop('_id')
+        row['latest_explain'] = (row.get('latest_explain') or {}).get('summary')
+        row['total_ms'] = round(row['total_ms'], 3)
+        row['avg_ms'] = round(row['avg_ms'], 3)
+        results.append(row)
+    return results
@@ -0,0 +1,24 @@
+from decimal import Decimal
+
+from bson import Decimal128, ObjectId
+
+
+# ============================================================================
+# JSON ENCODING OF MONGODB TYPES
+# ============================================================================
+#
+# orjson encodes datetimes itself (ISO 8601, as datetime.isoformat()); the
+# MongoDB and Decimal values it does not know go through json_default. API
+# responses (server.AppJSONResponse, json_response) and the NDJSON report
+# exports (report_export) share it, so a value reads the same in both.
+
+
+def json_default(obj):
+    """orjson hook for the types orjson does not encode itself"""
+    if isinstance(obj, Decimal128):
+        return float(obj.to_decimal())
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
@@ -0,0 +1,161 @@
+import html
+import re
+import unicodedata
+from typing import List, Optional
+
+from pymongo import UpdateOne
+
+
+# ============================================================================
+# PARTY SEARCH KEYS
+# ============================================================================
+#
+# Every party stores a `search_keys` array of normalized terms:
+# - each lowercased name token plus its edge n-grams ("ahmed" -> "a", "ah", ... "ahmed")
+# - phone and oman_id reduced to digits, with their prefixes and every digit
+#   substring of at least MIN_DIGIT_SUBSTRING characters (so "...4567" finds a phone)
+#
+# A search box query is split the same way and matched with
+# {"search_keys": {"$all": terms}}, which a multikey index on search_keys serves
+# without scanning the collection (unlike an unanchored case-insensitive $regex).
+
+# Longest name prefix stored; longer query tokens are truncated to this length
+MAX_NAME_PREFIX = 15
+# Digit substrings shorter than this are only stored as prefixes
+MIN_DIGIT_SUBSTRING = 3
+# Digits kept from phone/oman_id (bounds the number of substrings per party)
+MAX_DIGITS = 15
+# Upper bound on the number of terms taken from one query
+MAX_QUERY_TERMS = 5
+
+SEARCH_KEYS_FIELD = "search_keys"
+
+_TOKEN_SPLIT = re.compile(r"[\W_]+", re.UNICODE)
+# Apostrophes join rather than split words ("O'Brien" -> "obrien")
+_APOSTROPHES = re.compile(r"['\u2019`]")
+_NON_DIGITS = re.compile(r"\D+")
+
+
+def normalize_search_text(text: Optional[str]) -> str:
+    """
+    Lowercase text and strip accents and HTML escaping (party names are stored
+    escaped by sanitize_text_field, so "O&#x27;Brien" must normalize like "O'Brien").
+    """
+    if not text:
+        return ""
+    text = html.unescape(str(text))
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return text.casefold()
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Split normalized text into word tokens ("Al-Habsi Trading" -> ["al", "habsi", "trading"])."""
+    text = _APOSTROPHES.sub("", normalize_search_text(text))
+    return [token for token in _TOKEN_SPLIT.split(text) if token]
+
+
+def digits_only(value: Optional[str]) -> str:
+    """Reduce a phone/ID to its digits ("+968 9123-4567" -> "96891234567")."""
+    if not value:
+        return ""
+    return _NON_DIGITS.sub("", str(value))[:MAX_DIGITS]
+
+
+def edge_ngrams(token: str, max_length: int = MAX_NAME_PREFIX) -> List[str]:
+    """All prefixes of a token up to max_length characters."""
+    return [token[:length] for length in range(1, min(len(token), max_length) + 1)]
+
+
+def digit_keys(digits: str) -> List[str]:
+    """Prefixes of a digit string plus every substring of MIN_DIGIT_SUBSTRING digits or more."""
+    keys = set(edge_ngrams(digits, max_length=len(digits)))
+    for start in range(1, len(digits)):
+        for end in range(start + MIN_DIGIT_SUBSTRING, len(digits) + 1):
+            keys.add(digits[start:end])
+    return sorted(keys)
+
+
+def build_party_search_keys(name: Optional[str], phone: Optional[str] = None, oman_id: Optional[str] = None) -> List[str]:
+    """
+    Build the search_keys array for a party.
+
+    Args:
+        name: Party name (may contain several words)
+        phone: Phone number in any format
+        oman_id: Oman national/resident ID
+
+    Returns:
+        Sorted, de-duplicated list of search terms
+    """
+    keys = set()
+    for token in tokenize(name):
+        keys.update(edge_ngrams(token))
+    for value in (phone, oman_id):
+        digits = digits_only(value)
+        if digits:
+            keys.update(digit_keys(digits))
+    return sorted(keys)
+
+
+def parse_search_query(query: Optional[str]) -> List[str]:
+    """
+    Turn a user's search text into the terms that must all be present in search_keys.
+
+    Tokens are normalized like party names; name tokens longer than MAX_NAME_PREFIX
+    are truncated so they still match the longest stored prefix. Returns an empty
+    list when the query has no searchable characters.
+    """
+    terms = []
+    for token in tokenize(query):
+        if token.isdigit():
+            term = token[:MAX_DIGITS]
+        else:
+            term = token[:MAX_NAME_PREFIX]
+        if term not in terms:
+            terms.append(term)
+    return terms[:MAX_QUERY_TERMS]
+
+
+def party_search_filter(query: Optional[str]) -> Optional[dict]:
+    """
+    MongoDB filter matching parties whose name/phone/oman_id match every query term.
+    Returns None when the query is empty (no filtering).
+    """
+    terms = parse_search_query(query)
+    if not terms:
+        return None
+    return {SEARCH_KEYS_FIELD: {"$all": terms}}
+
+
+def party_search_keys_update(party: dict) -> dict:
+    """$set payload refreshing search_keys from a party document or update dict."""
+    return {SEARCH_KEYS_FIELD: build_party_search_keys(party.get('name'), party.get('phone'), party.get('oman_id'))}
+
+
+async def ensure_party_search_index(db, batch_size: int = 500) -> int:
+    """
+    Create the search_keys index and backfill parties that were written without
+    search keys (before this feature, or by scripts that insert parties directly).
+
+    Returns:
+        Number of parties backfilled
+    """
+    await db.parties.create_index([(SEARCH_KEYS_FIELD, 1)], name="parties_search_keys")
+
+    updated = 0
+    batch: List[UpdateOne] = []
+    cursor = db.parties.find(
+        {SEARCH_KEYS_FIELD: {"$exists": False}},
+        {"_id": 1, "name": 1, "phone": 1, "oman_id": 1}
+    )
+    async for party in cursor:
+        batch.append(UpdateOne({"_id": party["_id"]}, {"$set": party_search_keys_update(party)}))
+        if len(batch) >= batch_size:
+            await db.parties.bulk_write(batch, ordered=False)
+            updated += len(batch)
+            batch = []
+    if batch:
+        await db.parties.bulk_write(batch, ordered=False)
+        updated += len(batch)
+    return updated
@@ -0,0 +1,359 @@
+import asyncio
+import heapq
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from bson import Decimal128
+
+from archive import archive_aggregate, archive_count
+
+
+# ============================================================================
+# PARTY STATEMENT ENGINE
+# ============================================================================
+#
+# A party statement is every posting for one party in date order with running
+# money and gold balances. Postings come from five collections, each read with a
+# cursor sorted by (date, id) and k-way merged, so statements of any length are
+# streamed without loading them.
+#
+# Money balance: positive = party owes the shop, negative = shop owes the party.
+# - invoice (finalized sale/service): debit grand_total; purchase invoice: credit
+# - purchase (vendor): credit amount_total
+# - payment: transactions on asset accounts (cash, bank, gold received) only.
+#   A debit is money received from the party (credit to the party), a credit is
+#   money paid to the party (debit to the party). The income/expense legs of the
+#   same double entry are skipped so nothing is counted twice.
+# - return (finalized): a sale return credits refund_money_amount, a purchase
+#   return debits it; the refund itself arrives as a payment line
+# Gold balance: gold ledger IN (shop received gold) minus OUT, as in the party
+# summary's net_gold_balance.
+#
+# The opening balance at start_date and the period totals are $group aggregations
+# over the same filters, so the first line's running balance continues from the
+# opening and the last line ends at the closing balance.
+
+STATEMENT_BATCH_SIZE = 500
+MONEY = 'money'
+GOLD = 'gold'
+
+
+@dataclass(frozen=True)
+class StatementSource:
+    """One collection contributing statement lines (see section comment above)."""
+    kind: str
+    collection: str
+    party_field: str
+    amount_field: str
+    balance: str
+    sign_field: Optional[str]
+    signs: Dict[Any, int]
+    fields: Tuple[str, ...]
+    base_filter: Dict[str, Any] = field(default_factory=dict)
+
+    def sign(self, key: Any) -> int:
+        return self.signs.get(key, 0)
+
+    @property
+    def projection(self) -> dict:
+        projection = {"_id": 0, "id": 1, "date": 1, self.amount_field: 1}
+        if self.sign_field:
+            projection[self.sign_field] = 1
+        projection.update({name: 1 for name in self.fields})
+        return projection
+
+
+INVOICE_SOURCE = StatementSource(
+    kind='invoice', collection='invoices', party_field='customer_id', amount_field='grand_total', balance=MONEY,
+    sign_field='invoice_type', signs={'sale': 1, 'service': 1, None: 1, 'purchase': -1},
+    fields=('invoice_number', 'status', 'notes'),
+    base_filter={"status": {"$in": ["finalized", "paid"]}},
+)
+PURCHASE_SOURCE = StatementSource(
+    kind='purchase', collection='purchases', party_field='vendor_party_id', amount_field='amount_total', balance=MONEY,
+    sign_field=None, signs={None: -1},
+    fields=('description', 'weight_grams'),
+)
+PAYMENT_SOURCE = StatementSource(
+    kind='payment', collection='transactions', party_field='party_id', amount_field='amount', balance=MONEY,
+    sign_field='transaction_type', signs={'debit': -1, 'credit': 1},
+    fields=('transaction_number', 'account_name', 'mode', 'category', 'notes', 'reference_type', 'reference_id'),
+)
+RETURN_SOURCE = StatementSource(
+    kind='return', collection='returns', party_field='party_id', amount_field='refund_money_amount', balance=MONEY,
+    sign_field='return_type', signs={'sale_return': -1, 'purchase_return': 1},
+    fields=('return_number', 'reference_number', 'refund_mode', 'total_amount'),
+    base_filter={"status": "finalized"},
+)
+GOLD_SOURCE = StatementSource(
+    kind='gold', collection='gold_ledger', party_field='party_id', amount_field='weight_grams', balance=GOLD,
+    sign_field='type', signs={'IN': 1, 'OUT': -1},
+    fields=('purity_entered', 'purpose', 'notes', 'reference_type'),
+)
+
+# Order also breaks ties between postings with the same timestamp
+STATEMENT_SOURCES = (INVOICE_SOURCE, PURCHASE_SOURCE, RETURN_SOURCE, PAYMENT_SOURCE, GOLD_SOURCE)
+
+
+def to_decimal(value: Any) -> Decimal:
+    if value is None:
+        return Decimal('0')
+    if isinstance(value, Decimal128):
+        return value.to_decimal()
+    if isinstance(value, Decimal):
+        return value
+    return Decimal(str(value))
+
+
+def _round(value: Decimal) -> float:
+    return float(value.quantize(Decimal('0.001')))
+
+
+def _date_key(value: Any) -> datetime:
+    """Comparable naive-UTC datetime for merging (dates may be stored aware, naive or as strings)."""
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            return datetime.min
+    if not isinstance(value, datetime):
+        return datetime.min
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def describe(source: StatementSource, doc: dict) -> Tuple[Optional[str], str]:
+    """(reference, description) shown on a statement line"""
+    if source is INVOICE_SOURCE:
+        return doc.get('invoice_number'), f"{(doc.get('invoice_type') or 'sale').title()} invoice"
+    if source is PURCHASE_SOURCE:
+        return None, f"Purchase: {doc.get('description') or ''}".strip()
+    if source is RETURN_SOURCE:
+        kind = 'Sales return' if doc.get('return_type') == 'sale_return' else 'Purchase return'
+        against = f" against {doc['reference_number']}" if doc.get('reference_number') else ''
+        return doc.get('return_number'), f"{kind}{against} ({doc.get('refund_mode') or 'money'} refund)"
+    if source is PAYMENT_SOURCE:
+        direction = 'Received' if doc.get('transaction_type') == 'debit' else 'Paid'
+        via = doc.get('mode') or doc.get('account_name') or ''
+        return doc.get('transaction_number'), f"{direction} - {via}".strip(' -')
+    direction = 'Gold received' if doc.get('type') == 'IN' else 'Gold given'
+    return None, f"{direction} ({doc.get('purpose') or 'adjustment'}, {doc.get('purity_entered') or ''})"
+
+
+@dataclass
+class Balances:
+    money: Decimal = Decimal('0')
+    gold: Decimal = Decimal('0')
+    debit: Decimal = Decimal('0')
+    credit: Decimal = Decimal('0')
+    gold_in: Decimal = Decimal('0')
+    gold_out: Decimal = Decimal('0')
+
+    def add(self, source: StatementSource, sign: int, amount: Decimal):
+        signed = amount * sign
+        if source.balance == GOLD:
+            self.gold += signed
+            if signed >= 0:
+                self.gold_in += signed
+            else:
+                self.gold_out -= signed
+        else:
+            self.money += signed
+            if signed >= 0:
+                self.debit += signed
+            else:
+                self.credit -= signed
+
+    def merge(self, other: "Balances"):
+        self.money += other.money
+        self.gold += other.gold
+        self.debit += other.debit
+        self.credit += other.credit
+        self.gold_in += other.gold_in
+        self.gold_out += other.gold_out
+
+    def to_dict(self) -> dict:
+        return {
+            "money": _round(self.money), "gold": _round(self.gold),
+            "debit": _round(self.debit), "credit": _round(self.credit),
+            "gold_in": _round(self.gold_in), "gold_out": _round(self.gold_out),
+        }
+
+
+async def asset_account_ids(db) -> List[str]:
+    # Deleted accounts included: their historical postings still belong on the statement
+    accounts = await db.accounts.find({"account_type": "asset"}, {"_id": 0, "id": 1}).to_list(None)
+    return [account['id'] for account in accounts]
+
+
+def source_filter(source: StatementSource, asset_accounts: List[str], date_filter: Optional[dict],
+                  party_id: Optional[str] = None) -> dict:
+    """Postings of source (of one party, or of every party when party_id is None)"""
+    if party_id is None:
+        query = {source.party_field: {"$nin": [None, ""]}, "is_deleted": False, **source.base_filter}
+    else:
+        query = {source.party_field: party_id, "is_deleted": False, **source.base_filter}
+    if source is PAYMENT_SOURCE:
+        query["account_id"] = {"$in": asset_accounts}
+    if date_filter:
+        query["date"] = date_filter
+    return query
+
+
+async def balances_by_party(db, date_filter: Optional[dict]) -> Dict[str, Balances]:
+    """Balances of every party over the postings matching date_filter, one $group per source."""
+    asset_accounts = await asset_account_ids(db)
+
+    async def sum_source(source: StatementSource):
+        pipeline = [
+            {"$match": source_filter(source, asset_accounts, date_filter)},
+            {"$group": {"_id": {"party": f"${source.party_field}",
+                                "sign": f"${source.sign_field}" if source.sign_field else None},
+                        "total": {"$sum": f"${source.amount_field}"}}},
+        ]
+        return source, await (await archive_aggregate(db, source.collection, pipeline)).to_list(None)
+
+    balances: Dict[str, Balances] = {}
+    for source, groups in await asyncio.gather(*(sum_source(source) for source in STATEMENT_SOURCES)):
+        for group in groups:
+            party = group["_id"]["party"]
+            balances.setdefault(party, Balances()).add(
+                source, source.sign(group["_id"].get("sign")), to_decimal(group.get("total")))
+    return balances
+
+
+class PartyStatement:
+    """
+    Statement of one party over an optional [start, end] date range.
+
+    carried: (date, balances) of all postings before date, taken from a closed
+    accounting period; the opening balance then only sums postings from date on.
+    """
+
+    def __init__(self, db, party_id: str, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                 carried: Optional[Tuple[datetime, Balances]] = None):
+        self.db = db
+        self.party_id = party_id
+        self.start = start
+        self.end = end
+        self.carried = carried
+        self._asset_account_ids: Optional[List[str]] = None
+
+    async def _source_filter(self, source: StatementSource, date_filter: Optional[dict]) -> dict:
+        if source is PAYMENT_SOURCE and self._asset_account_ids is None:
+            self._asset_account_ids = await asset_account_ids(self.db)
+        return source_filter(source, self._asset_account_ids or [], date_filter, self.party_id)
+
+    def _period_filter(self) -> Optional[dict]:
+        date_filter = {}
+        if self.start:
+            date_filter["$gte"] = self.start
+        if self.end:
+            date_filter["$lte"] = self.end
+        return date_filter or None
+
+    async def _sum(self, date_filter: Optional[dict]) -> Balances:
+        """Balances of all postings matching date_filter, one $group per source."""
+        async def sum_source(source: StatementSource):
+            pipeline = [
+                {"$match": await self._source_filter(source, date_filter)},
+                {"$group": {"_id": f"${source.sign_field}" if source.sign_field else None,
+                            "total": {"$sum": f"${source.amount_field}"}}},
+            ]
+            return source, await (await archive_aggregate(self.db, source.collection, pipeline)).to_list(None)
+
+        balances = Balances()
+        for source, groups in await asyncio.gather(*(sum_source(source) for source in STATEMENT_SOURCES)):
+            for group in groups:
+                balances.add(source, source.sign(group["_id"]), to_decimal(group.get("total")))
+        return balances
+
+    async def opening(self) -> Balances:
+        if not self.start:
+            return Balances()
+        if not self.carried:
+            return await self._sum({"$lt": self.start})
+        carried_until, carried = self.carried
+        opening = await self._sum({"$gte": carried_until, "$lt": self.start})
+        opening.merge(carried)
+        return opening
+
+    async def period_totals(self) -> Balances:
+        return await self._sum(self._period_filter())
+
+    async def count(self) -> int:
+        date_filter = self._period_filter()
+        queries = [await self._source_filter(source, date_filter) for source in STATEMENT_SOURCES]
+        counts = await asyncio.gather(*(
+            archive_count(self.db, source.collection, query)
+            for source, query in zip(STATEMENT_SOURCES, queries)
+        ))
+        return sum(counts)
+
+    async def lines(self, opening: Balances, skip: int = 0, limit: Optional[int] = None) -> AsyncIterator[dict]:
+        """
+        Statement lines in date order with running balances starting from opening.
+        Skipped lines still advance the running balances.
+        """
+        date_filter = self._period_filter()
+        iterators = []
+        for source in STATEMENT_SOURCES:
+            cursor = await archive_aggregate(self.db, source.collection, [
+                {"$match": await self._source_filter(source, date_filter)},
+                {"$sort": {"date": 1, "id": 1}},
+                {"$project": source.projection},
+            ], batchSize=STATEMENT_BATCH_SIZE)
+            iterators.append(cursor.__aiter__())
+
+        heap = []
+
+        async def advance(index: int):
+            try:
+                doc = await iterators[index].__anext__()
+            except StopAsyncIteration:
+                return
+            heapq.heappush(heap, (_date_key(doc.get("date")), index, doc.get("id") or "", doc))
+
+        await asyncio.gather(*(advance(index) for index in range(len(iterators))))
+        running = Balances(money=opening.money, gold=opening.gold)
+        position = 0
+        while heap and (limit is None or position < skip + limit):
+            _key, index, _doc_id, doc = heapq.heappop(heap)
+            await advance(index)
+            source = STATEMENT_SOURCES[index]
+            sign = source.sign(doc.get(source.sign_field) if source.sign_field else None)
+            amount = to_decimal(doc.get(source.amount_field))
+            running.add(source, sign, amount)
+            position += 1
+            if position <= skip:
+                continue
+            yield self._line(source, doc, sign * amount, running)
+
+    @staticmethod
+    def _line(source: StatementSource, doc: dict, signed: Decimal, running: Balances) -> dict:
+        reference, description = describe(source, doc)
+        line = {
+            "date": doc.get("date"),
+            "source": source.kind,
+            "id": doc.get("id"),
+            "reference": reference,
+            "description": description,
+            "debit": 0.0, "credit": 0.0, "gold_in": 0.0, "gold_out": 0.0,
+            "money_balance": _round(running.money),
+            "gold_balance": _round(running.gold),
+        }
+        if source.balance == GOLD:
+            line["gold_in" if signed >= 0 else "gold_out"] = _round(abs(signed))
+        else:
+            line["debit" if signed >= 0 else "credit"] = _round(abs(signed))
+        return line
+
+
+async def ensure_statement_indexes(db):
+    """(party, date) indexes serving the statement cursors and balance aggregations"""
+    for source in STATEMENT_SOURCES:
+        await db[source.collection].create_index(
+            [(source.party_field, 1), ("date", 1)], name=f"{source.collection}_{source.party_field}_date")
@@ -0,0 +1,334 @@
+import os
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import Decimal128
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import DuplicateKeyError
+
+from archive import archive_aggregate, archived_before
+from party_statement import Balances, balances_by_party
+
+
+# ============================================================================
+# ACCOUNTING PERIOD CLOSE
+# ============================================================================
+#
+# Closing a month ("2024-03") or fiscal year ("2024") records it in
+# `accounting_periods` and writes cumulative closing balances of every account
+# and party into `period_balances`:
+#   account rows: debit, credit, sales_return_debit, sales_return_credit
+#                 (transaction sums since the beginning) and balance
+#   party rows:   money, gold, debit, credit, gold_in, gold_out (as on the
+#                 party statement)
+# Periods are half-open [starts_at, ends_before). A close covers everything
+# dated before ends_before, so periods close in date order and each snapshot is
+# the previous one plus the postings after it.
+#
+# After a close:
+# - transactions, gold ledger entries and daily closings dated before the latest
+#   ends_before can no longer be created, deleted or edited (PeriodClosedError);
+#   neither can the other party statement sources: purchases, and invoices and
+#   returns, which are finalized with their original date
+# - balance queries start from the nearest snapshot and read only later postings
+#   (ledger_totals_until, carried_account_totals, carried_party_balances)
+#
+# Only the latest month can be reopened; fiscal year closes are permanent.
+
+ACCOUNTING_PERIODS_COLLECTION = 'accounting_periods'
+PERIOD_BALANCES_COLLECTION = 'period_balances'
+FISCAL_YEAR_START_MONTH = int(os.environ.get('FISCAL_YEAR_START_MONTH', '1'))
+LEDGER_MEASURES = ('debit', 'credit', 'sales_return_debit', 'sales_return_credit')
+PARTY_MEASURES = ('money', 'gold', 'debit', 'credit', 'gold_in', 'gold_out')
+ACCOUNT = 'account'
+PARTY = 'party'
+ZERO = Decimal('0')
+
+LedgerTotals = Dict[str, Dict[str, Decimal]]
+
+
+class PeriodClosedError(ValueError):
+    """A write dated inside a closed accounting period"""
+
+
+@dataclass(frozen=True)
+class Period:
+    key: str
+    kind: str
+    starts_at: datetime
+    ends_before: datetime
+
+
+def _add_months(year: int, month: int, months: int) -> Tuple[int, int]:
+    index = year * 12 + (month - 1) + months
+    return index // 12, index % 12 + 1
+
+
+def parse_period(key: str) -> Period:
+    """
+    "YYYY-MM" (month) or "YYYY" (fiscal year starting in FISCAL_YEAR_START_MONTH of YYYY).
+
+    Raises:
+        ValueError: malformed period
+    """
+    key = (key or '').strip()
+    try:
+        if len(key) == 7 and key[4] == '-':
+            year, month, kind, months = int(key[:4]), int(key[5:]), 'month', 1
+        elif len(key) == 4:
+            year, month, kind, months = int(key), FISCAL_YEAR_START_MONTH, 'year', 12
+        else:
+            raise ValueError
+        starts_at = datetime(year, month, 1, tzinfo=timezone.utc)
+    except ValueError:
+        raise ValueError("Invalid period. Use YYYY-MM for a month or YYYY for a fiscal year")
+    end_year, end_month = _add_months(year, month, months)
+    return Period(key, kind, starts_at, datetime(end_year, end_month, 1, tzinfo=timezone.utc))
+
+
+def _decimal(value: Any) -> Decimal:
+    if value is None:
+        return ZERO
+    if isinstance(value, Decimal128):
+        return value.to_decimal()
+    return Decimal(str(value))
+
+
+def _naive_utc(value: datetime) -> datetime:
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _sum_if(*conditions) -> dict:
+    return {"$sum": {"$cond": [{"$and": list(conditions)}, "$amount", 0]}}
+
+
+async def ledger_totals(db, date_filter: Optional[dict]) -> LedgerTotals:
+    """Per-account transaction sums (LEDGER_MEASURES) over date_filter, one $group."""
+    query = {"is_deleted": False}
+    if date_filter:
+        query["date"] = date_filter
+    is_debit = {"$eq": ["$transaction_type", "debit"]}
+    is_credit = {"$eq": ["$transaction_type", "credit"]}
+    is_sales_return = {"$eq": ["$category", "sales_return"]}
+    pipeline = [
+        {"$match": query},
+        {"$group": {
+            "_id": "$account_id",
+            "debit": _sum_if(is_debit),
+            "credit": _sum_if(is_credit),
+            "sales_return_debit": _sum_if(is_debit, is_sales_return),
+            "sales_return_credit": _sum_if(is_credit, is_sales_return),
+        }},
+    ]
+    return {
+        group["_id"]: {name: _decimal(group.get(name)) for name in LEDGER_MEASURES}
+        async for group in await archive_aggregate(db, 'transactions', pipeline)
+        if group["_id"]
+    }
+
+
+def _merge_totals(totals: LedgerTotals, more: LedgerTotals, sign: int = 1) -> LedgerTotals:
+    for account_id, measures in more.items():
+        target = totals.setdefault(account_id, {name: ZERO for name in LEDGER_MEASURES})
+        for name in LEDGER_MEASURES:
+            target[name] += measures[name] * sign
+    return totals
+
+
+async def latest_closed_period(db, until: Optional[datetime] = None) -> Optional[dict]:
+    """Latest closed period ending at or before until (the latest of all when None)"""
+    query = {"ends_before": {"$lte": until}} if until else {}
+    return await db[ACCOUNTING_PERIODS_COLLECTION].find_one(
+        query, {"_id": 0}, sort=[("ends_before", DESCENDING), ("closed_at", DESCENDING)])
+
+
+async def archivable_before(db) -> Optional[datetime]:
+    """January 1 of the year the latest closed period ends in: every earlier year is fully closed"""
+    period = await latest_closed_period(db)
+    if not period:
+        return None
+    return datetime(period["ends_before"].year, 1, 1, tzinfo=timezone.utc)
+
+
+async def closed_periods(db) -> List[dict]:
+    return await db[ACCOUNTING_PERIODS_COLLECTION].find({}, {"_id": 0}).sort("ends_before", ASCENDING).to_list(None)
+
+
+async def _snapshot_rows(db, period_key: str, entity_type: str, entity_ids: Optional[List[str]] = None) -> List[dict]:
+    query = {"period": period_key, "entity_type": entity_type}
+    if entity_ids is not None:
+        query["entity_id"] = {"$in": entity_ids}
+    return await db[PERIOD_BALANCES_COLLECTION].find(query, {"_id": 0}).to_list(None)
+
+
+async def carried_account_totals(db, period_key: str, account_ids: Optional[List[str]] = None) -> LedgerTotals:
+    rows = await _snapshot_rows(db, period_key, ACCOUNT, account_ids)
+    return {row["entity_id"]: {name: _decimal(row.get(name)) for name in LEDGER_MEASURES} for row in rows}
+
+
+async def ledger_totals_until(db, until: Optional[datetime], inclusive: bool = True) -> LedgerTotals:
+    """
+    Cumulative per-account totals of transactions dated up to until (all when None):
+    the nearest closed snapshot plus the transactions after it.
+    """
+    period = await latest_closed_period(db, until)
+    totals: LedgerTotals = {}
+    date_filter = {}
+    if period:
+        totals = await carried_account_totals(db, period["period"])
+        date_filter["$gte"] = period["ends_before"]
+    if until:
+        date_filter["$lte" if inclusive else "$lt"] = until
+    return _merge_totals(totals, await ledger_totals(db, date_filter or None))
+
+
+async def ledger_totals_between(db, start: Optional[datetime], end: Optional[datetime]) -> LedgerTotals:
+    """Per-account totals of transactions dated in [start, end], as a difference of cumulative totals."""
+    totals = await ledger_totals_until(db, end)
+    if start:
+        _merge_totals(totals, await ledger_totals_until(db, start, inclusive=False), sign=-1)
+    return totals
+
+
+async def carried_party_balances(db, party_id: str, before: Optional[datetime]) -> Optional[Tuple[datetime, Balances]]:
+    """(ends_before, balances) of the party at the latest period closed by before, if any"""
+    if not before:
+        return None
+    period = await latest_closed_period(db, before)
+    if not period:
+        return None
+    rows = await _snapshot_rows(db, period["period"], PARTY, [party_id])
+    balances = Balances(**{name: _decimal(rows[0].get(name)) for name in PARTY_MEASURES}) if rows else Balances()
+    return period["ends_before"], balances
+
+
+async def ensure_period_open(db, date: Any, what: str = "Entries"):
+    """
+    Raises:
+        PeriodClosedError: date falls in a closed accounting period
+    """
+    if isinstance(date, str):
+        date = datetime.fromisoformat(date.replace('Z', '+00:00'))
+    if not isinstance(date, datetime):
+        return
+    period = await db[ACCOUNTING_PERIODS_COLLECTION].find_one(
+        {"ends_before": {"$gt": date}}, {"_id": 0, "period": 1, "ends_before": 1},
+        sort=[("ends_before", DESCENDING)])
+    if period:
+        raise PeriodClosedError(
+            f"{what} dated {date.date().isoformat()} fall in closed accounting period {period['period']} "
+            f"(books closed before {period['ends_before'].date().isoformat()})"
+        )
+
+
+def account_balance(account: dict, totals: Dict[str, Decimal]) -> Decimal:
+    """Opening balance plus transactions, by the account type's normal side (see calculate_balance_delta)"""
+    net = totals["debit"] - totals["credit"]
+    if (account.get("account_type") or "asset").lower() not in ("asset", "expense"):
+        net = -net
+    return _decimal(account.get("opening_balance")) + net
+
+
+async def close_period(db, period: Period, user_id: str, now: Optional[datetime] = None) -> dict:
+    """
+    Write the snapshot of period and record it as closed.
+
+    Raises:
+        ValueError: period not yet ended, already closed, or before the latest closed period
+    """
+    now = now or datetime.now(timezone.utc)
+    if period.ends_before > now:
+        raise ValueError(f"Period {period.key} has not ended yet")
+    periods = db[ACCOUNTING_PERIODS_COLLECTION]
+    if await periods.find_one({"period": period.key}, {"_id": 1}):
+        raise ValueError(f"Period {period.key} is already closed")
+    previous = await latest_closed_period(db)
+    if previous and _naive_utc(previous["ends_before"]) > _naive_utc(period.ends_before):
+        raise ValueError(
+            f"Period {period.key} ends before the already closed period {previous['period']}; "
+            f"periods are closed in date order"
+        )
+
+    delta_filter = {"$lt": period.ends_before}
+    accounts_totals: LedgerTotals = {}
+    parties: Dict[str, Balances] = {}
+    if previous:
+        delta_filter["$gte"] = previous["ends_before"]
+        accounts_totals = await carried_account_totals(db, previous["period"])
+        for row in await _snapshot_rows(db, previous["period"], PARTY):
+            parties[row["entity_id"]] = Balances(**{name: _decimal(row.get(name)) for name in PARTY_MEASURES})
+    _merge_totals(accounts_totals, await ledger_totals(db, delta_filter))
+    for party_id, balances in (await balances_by_party(db, delta_filter)).items():
+        parties.setdefault(party_id, Balances()).merge(balances)
+
+    accounts = {
+        account["id"]: account
+        async for account in db.accounts.find({}, {"_id": 0, "id": 1, "name": 1, "account_type": 1, "opening_balance": 1})
+    }
+    common = {"period": period.key, "ends_before": period.ends_before}
+    rows = []
+    for account_id, totals in accounts_totals.items():
+        account = accounts.get(account_id, {})
+        rows.append({
+            **common, "entity_type": ACCOUNT, "entity_id": account_id,
+            "name": account.get("name"), "account_type": account.get("account_type"),
+            **{name: Decimal128(value) for name, value in totals.items()},
+            "balance": Decimal128(account_balance(account, totals)),
+        })
+    for party_id, balances in parties.items():
+        rows.append({
+            **common, "entity_type": PARTY, "entity_id": party_id,
+            **{name: Decimal128(getattr(balances, name)) for name in PARTY_MEASURES},
+        })
+
+    # Rows of an earlier attempt that failed before recording the period
+    await db[PERIOD_BALANCES_COLLECTION].delete_many({"period": period.key})
+    if rows:
+        await db[PERIOD_BALANCES_COLLECTION].insert_many(rows)
+    record = {
+        "period": period.key, "kind": period.kind,
+        "starts_at": period.starts_at, "ends_before": period.ends_before,
+        "closed_at": now, "closed_by": user_id,
+        "accounts_count": len(accounts_totals), "parties_count": len(parties),
+    }
+    try:
+        await periods.insert_one(dict(record))
+    except DuplicateKeyError:
+        raise ValueError(f"Period {period.key} is already closed")
+    return record
+
+
+async def reopen_period(db, period_key: str) -> dict:
+    """
+    Remove the latest closed month and its snapshot.
+
+    Raises:
+        LookupError: period not closed
+        ValueError: not the latest period, a fiscal year, or archived
+    """
+    record = await db[ACCOUNTING_PERIODS_COLLECTION].find_one({"period": period_key}, {"_id": 0})
+    if not record:
+        raise LookupError(f"Period {period_key} is not closed")
+    if record["kind"] == 'year':
+        raise ValueError("Fiscal year closes are permanent")
+    latest = await latest_closed_period(db)
+    if latest["period"] != period_key:
+        raise ValueError(f"Only the latest closed period ({latest['period']}) can be reopened")
+    boundary = await archived_before(db)
+    if boundary and _naive_utc(record["starts_at"]) < _naive_utc(boundary):
+        raise ValueError(f"Period {period_key} is archived and can no longer be reopened")
+    await db[ACCOUNTING_PERIODS_COLLECTION].delete_one({"period": period_key})
+    await db[PERIOD_BALANCES_COLLECTION].delete_many({"period": period_key})
+    return record
+
+
+async def ensure_period_indexes(db):
+    """Period lookups by key and ends_before; snapshot rows by (period, entity)"""
+    await db[ACCOUNTING_PERIODS_COLLECTION].create_index("period", unique=True, name="accounting_periods_period")
+    await db[ACCOUNTING_PERIODS_COLLECTION].create_index("ends_before", name="accounting_periods_ends_before")
+    await db[PERIOD_BALANCES_COLLECTION].create_index(
+        [("period", 1), ("entity_type", 1), ("entity_id", 1)], unique=True, name="period_balances_entity")
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Analytics Cube Rebuild
+======================
+Recomputes the `analytics_monthly` cube behind /api/reports/trends from the
+invoices, purchases and returns collections.
+
+The API keeps the cube current on every finalize/create/edit/delete, so this is
+only needed after writes that bypass the API (generate_load_data.py, imports,
+manual fixes) or to repair drift. The new cells are built in a staging
+collection and swapped in with a rename, so trend queries keep working while
+it runs; API writes made meanwhile are queued and applied after the swap.
+
+Usage:
+    python rebuild_analytics_cube.py
+"""
+
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from analytics_cube import ANALYTICS_COLLECTION, RebuildRunningError, rebuild_analytics_cube
+
+load_dotenv(Path(__file__).parent / '.env')
+MONGO_URL = os.environ['MONGO_URL']
+DB_NAME = os.environ['DB_NAME']
+
+
+async def rebuild(db):
+    started = time.perf_counter()
+    print(f"🔄 Rebuilding {ANALYTICS_COLLECTION}...")
+    cells = await rebuild_analytics_cube(db)
+    print(f"✅ {cells:,} cells written in {time.perf_counter() - started:.1f}s")
+    return cells
+
+
+def main():
+    client = AsyncIOMotorClient(MONGO_URL)
+    try:
+        asyncio.run(rebuild(client[DB_NAME]))
+    except RebuildRunningError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Generic, List, Optional, Tuple, TypeVar
+
+from instrumentation import METRICS, Counter
+
+
+# ============================================================================
+# REFERENCE DATA CACHE
+# ============================================================================
+#
+# Tiny, rarely changing collections are read on hot paths (every invoice,
+# payment and purchase). They are cached per process as immutable snapshots:
+# - accounts and inventory headers: only their static fields (id, name, type).
+#   Balances and stock levels change on every posting and are always read from
+#   MongoDB, never from this cache.
+# - shop settings and work types: whole documents
+#
+# Writes go through invalidate(), which drops the local snapshot and bumps the
+# cache's version in the `reference_versions` collection. Other worker processes
+# compare that version at most every REFERENCE_CACHE_CHECK_SECONDS, and every
+# snapshot is reloaded after REFERENCE_CACHE_TTL_SECONDS regardless, so writes
+# made outside the API (scripts, migrations) are picked up too.
+#
+# Lookups that decide whether to create a record (get-or-create by name) must not
+# trust a miss: callers fall back to MongoDB when the snapshot has no match.
+
+REFERENCE_CACHE_TTL_SECONDS = float(os.environ.get('REFERENCE_CACHE_TTL_SECONDS', '300'))
+REFERENCE_CACHE_CHECK_SECONDS = float(os.environ.get('REFERENCE_CACHE_CHECK_SECONDS', '5'))
+REFERENCE_VERSIONS_COLLECTION = 'reference_versions'
+
+REFERENCE_CACHE_LOOKUPS = Counter(
+    'reference_cache_lookups_total', 'Reference cache lookups by cache and result (hit/miss)', ('cache', 'result'))
+REFERENCE_CACHE_LOADS = Counter(
+    'reference_cache_loads_total', 'Reference cache reloads by cache and reason', ('cache', 'reason'))
+METRICS.extend([REFERENCE_CACHE_LOOKUPS, REFERENCE_CACHE_LOADS])
+
+T = TypeVar('T')
+
+
+@dataclass(frozen=True)
+class AccountRef:
+    id: str
+    name: str
+    account_type: str
+
+    def to_dict(self) -> dict:
+        return {"id": self.id, "name": self.name, "account_type": self.account_type}
+
+
+@dataclass(frozen=True)
+class InventoryHeaderRef:
+    id: str
+    name: str
+    is_active: bool = True
+
+    def to_dict(self) -> dict:
+        return {"id": self.id, "name": self.name, "is_active": self.is_active}
+
+
+class NamedRefs(Generic[T]):
+    """Snapshot of references indexed by id and by exact name."""
+
+    def __init__(self, refs: List[T]):
+        self.refs: Tuple[T, ...] = tuple(refs)
+        self._by_id: Dict[str, T] = {ref.id: ref for ref in refs}
+        self._by_name: Dict[str, T] = {}
+        for ref in refs:
+            # First one wins, like find_one on an unsorted collection
+            self._by_name.setdefault(ref.name, ref)
+
+    def __len__(self) -> int:
+        return len(self.refs)
+
+    def get(self, ref_id: Optional[str]) -> Optional[T]:
+        return self._by_id.get(ref_id)
+
+    def by_name(self, name: Optional[str]) -> Optional[T]:
+        return self._by_name.get(name)
+
+
+class AccountDirectory(NamedRefs[AccountRef]):
+    def of_type(self, account_type: str) -> List[AccountRef]:
+        return [ref for ref in self.refs if ref.account_type == account_type]
+
+    def type_map(self) -> Dict[str, str]:
+        return {ref.id: ref.account_type for ref in self.refs}
+
+    def name_map(self) -> Dict[str, str]:
+        return {ref.id: ref.name for ref in self.refs}
+
+
+class ReferenceCache(Generic[T]):
+    """One cached collection snapshot (see section comment above)."""
+
+    def __init__(self, name: str, loader: Callable[[Any], Awaitable[T]]):
+        self.name = name
+        self._loader = loader
+        self._value: Optional[T] = None
+        self._loaded_at = 0.0
+        self._checked_at = 0.0
+        self._version: Optional[int] = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def version(self) -> Optional[int]:
+        return self._version
+
+    async def get(self, db) -> T:
+        reason = await self._stale_reason(db)
+        if reason is None:
+            REFERENCE_CACHE_LOOKUPS.inc((self.name, 'hit'))
+            return self._value
+        REFERENCE_CACHE_LOOKUPS.inc((self.name, 'miss'))
+        requested_at = time.monotonic()
+        async with self._lock:
+            # Another request may have reloaded while this one waited for the lock
+            if self._value is not None and self._loaded_at >= requested_at:
+                return self._value
+            version = await self._shared_version(db)
+            value = await self._loader(db)
+            self._value, self._version = value, version
+            self._loaded_at = self._checked_at = time.monotonic()
+            REFERENCE_CACHE_LOADS.inc((self.name, reason))
+            return value
+
+    async def invalidate(self, db):
+        """Write-through invalidation: drop this process's snapshot and bump the shared version."""
+        self._value = None
+        try:
+            await db[REFERENCE_VERSIONS_COLLECTION].update_one(
+                {"_id": self.name}, {"$inc": {"version": 1}}, upsert=True)
+        except Exception as e:
+            logging.warning(f"Could not bump {self.name} reference version: {e}")
+
+    async def _stale_reason(self, db) -> Optional[str]:
+        if self._value is None:
+            return 'cold'
+        now = time.monotonic()
+        if now - self._loaded_at > REFERENCE_CACHE_TTL_SECONDS:
+            return 'expired'
+        if now - self._checked_at > REFERENCE_CACHE_CHECK_SECONDS:
+            self._checked_at = now
+            if await self._shared_version(db) != self._version:
+                self._value = None
+                return 'remote'
+        return None
+
+    async def _shared_version(self, db) -> int:
+        doc = await db[REFERENCE_VERSIONS_COLLECTION].find_one({"_id": self.name})
+        return doc.get("version", 0) if doc else 0
+
+
+async def _load_accounts(db) -> AccountDirectory:
+    docs = await db.accounts.find(
+        {"is_deleted": False}, {"_id": 0, "id": 1, "name": 1, "account_type": 1}).to_list(None)
+    return AccountDirectory([
+        AccountRef(id=doc['id'], name=doc.get('name', ''), account_type=doc.get('account_type', 'unknown'))
+        for doc in docs if doc.get('id')
+    ])
+
+
+async def _load_inventory_headers(db) -> NamedRefs[InventoryHeaderRef]:
+    docs = await db.inventory_headers.find(
+        {"is_deleted": False}, {"_id": 0, "id": 1, "name": 1, "is_active": 1}).to_list(None)
+    return NamedRefs([
+        InventoryHeaderRef(id=doc['id'], name=doc.get('name', ''), is_active=doc.get('is_active', True))
+        for doc in docs if doc.get('id')
+    ])
+
+
+async def _load_shop_settings(db) -> dict:
+    # Empty dict (not None) caches "not configured yet"
+    return await db.shop_settings.find_one({}, {"_id": 0}) or {}
+
+
+async def _load_work_types(db) -> Tuple[dict, ...]:
+    docs = await db.work_types.find({"is_deleted": False}, {"_id": 0}).sort("name", 1).to_list(None)
+    return tuple(docs)
+
+
+class ReferenceCaches:
+    """All reference caches; `reference_cache.accounts.get(db)` etc."""
+
+    def __init__(self):
+        self.accounts: ReferenceCache[AccountDirectory] = ReferenceCache('accounts', _load_accounts)
+        self.inventory_headers: ReferenceCache[NamedRefs[InventoryHeaderRef]] = ReferenceCache(
+            'inventory_headers', _load_inventory_headers)
+        self.shop_settings: ReferenceCache[dict] = ReferenceCache('shop_settings', _load_shop_settings)
+        self.work_types: ReferenceCache[Tuple[dict, ...]] = ReferenceCache('work_types', _load_work_types)
+
+    def stats(self) -> Dict[str, dict]:
+        stats = {}
+        for cache in (self.accounts, self.inventory_headers, self.shop_settings, self.work_types):
+            hits = REFERENCE_CACHE_LOOKUPS.series.get((cache.name, 'hit'), 0)
+            misses = REFERENCE_CACHE_LOOKUPS.series.get((cache.name, 'miss'), 0)
+            stats[cache.name] = {
+                "version": cache.version,
+                "hits": int(hits),
+                "misses": int(misses),
+                "hit_rate": round(hits / (hits + misses), 4) if hits + misses else None,
+            }
+        return stats
+
+
+reference_cache = ReferenceCaches()
@@ -0,0 +1,191 @@
+import asyncio
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+import orjson
+
+from instrumentation import METRICS, Counter
+
+
+# ============================================================================
+# REPORT RESULT CACHE
+# ============================================================================
+#
+# Rendered report bodies (JSON bytes) are cached per (endpoint, normalized params).
+# Each entry records the write versions (see write_versions.py) of the collections
+# the report reads when it was computed. A lookup passes the current versions and
+# only an entry with exactly those versions is a hit, so any write to one of
+# those collections invalidates precisely the reports that depend on it. Entries
+# also expire after REPORT_CACHE_TTL_SECONDS. That covers writes from other
+# clients and figures relative to today (overdue days).
+#
+# Memory tier: LRU bounded by REPORT_CACHE_MAX_BYTES of body bytes.
+# Disk tier (optional, REPORT_CACHE_DIR): bodies of REPORT_CACHE_DISK_MIN_BYTES
+# or more are written to a per-process directory instead of memory. Only their
+# metadata stays in memory. This tier is bounded by REPORT_CACHE_DISK_MAX_BYTES
+# with its own LRU order.
+
+REPORT_CACHE_ENABLED = os.environ.get('REPORT_CACHE_ENABLED', 'true').lower() == 'true'
+REPORT_CACHE_TTL_SECONDS = float(os.environ.get('REPORT_CACHE_TTL_SECONDS', '300'))
+REPORT_CACHE_MAX_BYTES = int(os.environ.get('REPORT_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+REPORT_CACHE_DIR = os.environ.get('REPORT_CACHE_DIR', '')
+REPORT_CACHE_DISK_MIN_BYTES = int(os.environ.get('REPORT_CACHE_DISK_MIN_BYTES', str(1024 * 1024)))
+REPORT_CACHE_DISK_MAX_BYTES = int(os.environ.get('REPORT_CACHE_DISK_MAX_BYTES', str(512 * 1024 * 1024)))
+
+REPORT_CACHE_LOOKUPS = Counter(
+    'report_cache_lookups_total', 'Report result cache lookups by endpoint and result', ('endpoint', 'result'))
+REPORT_CACHE_EVICTIONS = Counter(
+    'report_cache_evictions_total', 'Report result cache evictions by tier', ('tier',))
+METRICS.extend([REPORT_CACHE_LOOKUPS, REPORT_CACHE_EVICTIONS])
+
+
+@dataclass
+class _Entry:
+    endpoint: str
+    versions: Dict[str, int]
+    created_at: float
+    size: int
+    body: Optional[bytes] = None
+    path: Optional[str] = None
+
+
+def report_cache_key(endpoint: str, params: Dict[str, Any]) -> str:
+    """Stable key for an endpoint called with params (callers drop defaulted params)."""
+    payload = orjson.dumps([endpoint, sorted(params.items())], default=str)
+    return hashlib.sha1(payload).hexdigest()
+
+
+class ReportResultCache:
+    """Two-tier LRU cache of rendered report bodies (see section comment above)."""
+
+    def __init__(self, max_bytes: int = REPORT_CACHE_MAX_BYTES, ttl_seconds: float = REPORT_CACHE_TTL_SECONDS,
+                 disk_dir: str = REPORT_CACHE_DIR, disk_min_bytes: int = REPORT_CACHE_DISK_MIN_BYTES,
+                 disk_max_bytes: int = REPORT_CACHE_DISK_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.disk_dir = disk_dir
+        self.disk_min_bytes = disk_min_bytes
+        self.disk_max_bytes = disk_max_bytes
+        self._memory: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._memory_bytes = 0
+        self._disk: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._disk_bytes = 0
+        self._process_dir: Optional[str] = None
+
+    @property
+    def disk_enabled(self) -> bool:
+        return bool(self.disk_dir)
+
+    async def get(self, key: str, endpoint: str, versions: Dict[str, int]) -> Optional[bytes]:
+        """Cached body for key if it was computed at exactly these versions and has not expired."""
+        entry, tier = self._memory.get(key), self._memory
+        if entry is None:
+            entry, tier = self._disk.get(key), self._disk
+        if entry is None:
+            REPORT_CACHE_LOOKUPS.inc((endpoint, 'miss'))
+            return None
+        if entry.versions != versions or time.monotonic() - entry.created_at > self.ttl_seconds:
+            self._discard(key)
+            REPORT_CACHE_LOOKUPS.inc((endpoint, 'stale'))
+            return None
+        tier.move_to_end(key)
+        if entry.body is not None:
+            REPORT_CACHE_LOOKUPS.inc((endpoint, 'hit'))
+            return entry.body
+        try:
+            body = await asyncio.to_thread(_read_file, entry.path)
+        except OSError as e:
+            logging.warning(f"Report cache file {entry.path} unreadable: {e}")
+            self._discard(key)
+            REPORT_CACHE_LOOKUPS.inc((endpoint, 'miss'))
+            return None
+        REPORT_CACHE_LOOKUPS.inc((endpoint, 'disk_hit'))
+        return body
+
+    async def put(self, key: str, endpoint: str, versions: Dict[str, int], body: bytes):
+        self._discard(key)
+        entry = _Entry(endpoint=endpoint, versions=dict(versions), created_at=time.monotonic(), size=len(body))
+        if self.disk_enabled and entry.size >= self.disk_min_bytes and entry.size <= self.disk_max_bytes:
+            try:
+                entry.path = os.path.join(self._ensure_process_dir(), f"{key}.json")
+                await asyncio.to_thread(_write_file, entry.path, body)
+            except OSError as e:
+                logging.warning(f"Report cache could not write to {self.disk_dir}: {e}")
+                return
+            self._disk[key] = entry
+            self._disk_bytes += entry.size
+            self._evict(self._disk, 'disk', self.disk_max_bytes)
+        elif entry.size <= self.max_bytes:
+            entry.body = body
+            self._memory[key] = entry
+            self._memory_bytes += entry.size
+            self._evict(self._memory, 'memory', self.max_bytes)
+
+    def clear(self):
+        for key in list(self._memory) + list(self._disk):
+            self._discard(key)
+        if self._process_dir is not None:
+            shutil.rmtree(self._process_dir, ignore_errors=True)
+            self._process_dir = None
+
+    def stats(self) -> dict:
+        lookups: Dict[str, Dict[str, int]] = {}
+        for (endpoint, result), count in REPORT_CACHE_LOOKUPS.series.items():
+            lookups.setdefault(endpoint, {})[result] = int(count)
+        return {
+            "memory": {"entries": len(self._memory), "bytes": self._memory_bytes, "max_bytes": self.max_bytes},
+            "disk": {"enabled": self.disk_enabled, "entries": len(self._disk), "bytes": self._disk_bytes,
+                     "max_bytes": self.disk_max_bytes},
+            "ttl_seconds": self.ttl_seconds,
+            "lookups": lookups,
+        }
+
+    def _discard(self, key: str):
+        entry = self._memory.pop(key, None)
+        if entry is not None:
+            self._memory_bytes -= entry.size
+        entry = self._disk.pop(key, None)
+        if entry is not None:
+            self._disk_bytes -= entry.size
+            _remove_file(entry.path)
+
+    def _evict(self, tier: "OrderedDict[str, _Entry]", tier_name: str, max_bytes: int):
+        while tier and (self._memory_bytes if tier is self._memory else self._disk_bytes) > max_bytes:
+            key = next(iter(tier))
+            self._discard(key)
+            REPORT_CACHE_EVICTIONS.inc((tier_name,))
+
+    def _ensure_process_dir(self) -> str:
+        # Per-process directory: worker processes never read each other's files
+        if self._process_dir is None:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            self._process_dir = tempfile.mkdtemp(prefix=f"reports-{os.getpid()}-", dir=self.disk_dir)
+        return self._process_dir
+
+
+def _read_file(path: str) -> bytes:
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def _write_file(path: str, body: bytes):
+    with open(path, 'wb') as f:
+        f.write(body)
+
+
+def _remove_file(path: Optional[str]):
+    if path:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+report_cache = ReportResultCache()
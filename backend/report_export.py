@@ -0,0 +1,87 @@
+import csv
+import io
+from datetime import date, datetime
+from typing import Any, AsyncIterable, AsyncIterator, List, Tuple
+
+import orjson
+from bson import Decimal128
+from fastapi.responses import StreamingResponse
+
+from json_encoding import json_default
+
+
+# ============================================================================
+# CSV / NDJSON REPORT EXPORTS
+# ============================================================================
+#
+# The /reports/*-export endpoints take format=xlsx|csv|ndjson. XLSX is built by
+# openpyxl as before; CSV and NDJSON are async generators over the report's
+# cursor:
+# - each row is encoded as it is read and yielded in chunks of
+#   EXPORT_CHUNK_ROWS rows, so the first bytes leave before the cursor is
+#   exhausted and memory does not grow with the report
+# - CSV starts with a header row of the column titles; NDJSON objects are keyed
+#   by the column keys
+# - Decimal128 values are written as exact decimal strings in CSV and as
+#   numbers in NDJSON (json_encoding.json_default, as in API responses); dates
+#   as ISO 8601
+
+ROW_EXPORT_FORMATS = ('xlsx', 'csv', 'ndjson')
+EXPORT_CHUNK_ROWS = 200
+EXPORT_BATCH_SIZE = 1000
+MEDIA_TYPES = {'csv': 'text/csv; charset=utf-8', 'ndjson': 'application/x-ndjson'}
+
+# (title, key): CSV header and NDJSON field of a row value
+Column = Tuple[str, str]
+
+
+def _csv_value(value: Any) -> Any:
+    if value is None:
+        return ''
+    if isinstance(value, Decimal128):
+        return str(value.to_decimal())
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+async def csv_chunks(columns: List[Column], rows: AsyncIterable[dict]) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([title for title, _key in columns])
+    yield buffer.getvalue().encode('utf-8')
+    buffer.seek(0)
+    buffer.truncate()
+    count = 0
+    async for row in rows:
+        writer.writerow([_csv_value(row.get(key)) for _title, key in columns])
+        count += 1
+        if count % EXPORT_CHUNK_ROWS == 0:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+async def ndjson_chunks(columns: List[Column], rows: AsyncIterable[dict]) -> AsyncIterator[bytes]:
+    chunk = []
+    async for row in rows:
+        chunk.append(orjson.dumps({key: row.get(key) for _title, key in columns},
+                                  default=json_default, option=orjson.OPT_APPEND_NEWLINE))
+        if len(chunk) == EXPORT_CHUNK_ROWS:
+            yield b''.join(chunk)
+            chunk = []
+    if chunk:
+        yield b''.join(chunk)
+
+
+def row_export_response(format: str, columns: List[Column], rows: AsyncIterable[dict],
+                        filename: str) -> StreamingResponse:
+    """Chunked CSV or NDJSON download of rows; filename without extension"""
+    chunks = csv_chunks(columns, rows) if format == 'csv' else ndjson_chunks(columns, rows)
+    return StreamingResponse(
+        chunks,
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{format}"'}
+    )
@@ -1,5 +1,8 @@
 from fastapi import FastAPI, APIRouter, Depends, HTTPException, status, Response, Request, Cookie, Query
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi.responses import JSONResponse
+from fastapi.encoders import jsonable_encoder
+from fastapi import params as fastapi_params
 from dotenv import load_dotenv
 from motor.motor_asyncio import AsyncIOMotorClient
 from slowapi import Limiter, _rate_limit_exceeded_handler
@@ -7,10 +10,15 @@ from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 import os
 import re
+import asyncio
+import functools
+import hashlib
+import inspect
 import logging
+import time
 from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 import uuid
 from datetime import datetime, timezone, timedelta
 from passlib.context import CryptContext
@@ -18,12 +26,48 @@ import jwt
 from decimal import Decimal
 from bson import Decimal128, ObjectId
 import secrets
+from contextlib import AsyncExitStack
+import orjson
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+from instrumentation import (
+    RequestCommandListener, RequestMetricsMiddleware, render_metrics,
+    slow_query_recorder, top_slow_queries,
+)
+from party_search import ensure_party_search_index, party_search_filter, party_search_keys_update
+from typeahead import TYPEAHEAD_MAX_LIMIT, typeahead_service
+from reference_cache import reference_cache
+from write_versions import WriteVersionListener, WriteVersionMiddleware, write_versions
+from compression import CompressionMiddleware
+from fieldsets import Fieldset
+from party_statement import PartyStatement, ensure_statement_indexes
+from stock_card import STOCK_CARD_DEFAULT_PAGE_SIZE, STOCK_CARD_MAX_PAGE_SIZE, ensure_stock_card_index, stock_card_page, stock_card_totals
+from analytics_cube import (
+    ANALYTICS_COLLECTION, DIMENSIONS, FAMILIES, MEASURES, RebuildRunningError, ensure_analytics_indexes,
+    rebuild_analytics_cube, record_invoice, record_purchase, record_return, trend_pipeline,
+)
+from period_close import (
+    ACCOUNTING_PERIODS_COLLECTION, PERIOD_BALANCES_COLLECTION, PeriodClosedError, archivable_before,
+    carried_account_totals, carried_party_balances, close_period, closed_periods, ensure_period_indexes,
+    ensure_period_open, ledger_totals_between, parse_period, reopen_period,
+)
+from archive import (
+    ArchiveSpec, archive_aggregate, archive_collections, archive_count, archive_find, archive_history, archive_status,
+    current_year_numbers, ensure_auth_audit_ttl,
+)
+from report_cache import REPORT_CACHE_ENABLED, report_cache, report_cache_key
+from report_export import EXPORT_BATCH_SIZE, ROW_EXPORT_FORMATS, row_export_response
+from json_encoding import json_default
+from columnar_export import (
+    ColumnarSpec, ExportRunningError, columnar_export_status, ensure_columnar_indexes, export_columnar,
+)
+
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+# Command listeners attribute every MongoDB round trip to the HTTP request that issued it
+# and count writes per collection (conditional GET on reports)
+client = AsyncIOMotorClient(mongo_url, event_listeners=[RequestCommandListener(), WriteVersionListener()])
 db = client[os.environ['DB_NAME']]
 
 # ============================================================================
@@ -119,7 +163,47 @@ def get_user_identifier(request: Request) -> str:
 # Initialize rate limiter with custom key function
 limiter = Limiter(key_func=get_user_identifier)
 
-app = FastAPI()
+# ============================================================================
+# JSON RESPONSE RENDERING
+# ============================================================================
+# Responses are rendered with orjson. MongoDB types are encoded natively
+# (json_encoding.json_default, shared with the NDJSON exports: Decimal128 ->
+# float, ObjectId -> str; datetimes use the same ISO format as
+# datetime.isoformat()), so handlers returning json_response() can hand raw
+# documents over without a decimal_to_float pass or FastAPI's jsonable_encoder.
+
+class AppJSONResponse(JSONResponse):
+    """Default response class: orjson rendering with MongoDB type support"""
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=json_default, option=orjson.OPT_NON_STR_KEYS)
+
+def json_response(content: Any, status_code: int = 200, headers: Optional[Dict[str, str]] = None) -> AppJSONResponse:
+    """
+    Fast path for large responses: render content directly, skipping FastAPI's
+    jsonable_encoder walk and response_model validation. Content may contain
+    Decimal128/ObjectId/datetime values as read from MongoDB.
+    """
+    return AppJSONResponse(content, status_code=status_code, headers=headers)
+
+def model_list_response(model, docs: List[dict]) -> AppJSONResponse:
+    """
+    Fast path for `response_model=List[Model]` endpoints whose documents were written
+    through that model: keeps only the model's fields and fills missing optional fields
+    with their defaults, as validation would, without validating every element.
+    """
+    fields = model.model_fields
+    rows = []
+    for doc in docs:
+        row = {}
+        for name, field in fields.items():
+            if name in doc:
+                row[name] = doc[name]
+            elif not field.is_required():
+                row[name] = field.get_default(call_default_factory=True)
+        rows.append(row)
+    return json_response(rows)
+
+app = FastAPI(default_response_class=AppJSONResponse)
 api_router = APIRouter(prefix="/api")
 
 # Add rate limiter to app state
@@ -135,6 +219,7 @@ security = HTTPBearer(auto_error=False)  # auto_error=False makes it optional
 
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.responses import Response as StarletteResponse
+from starlette.exceptions import HTTPException as StarletteHTTPException
 
 class SecurityHeadersMiddleware(BaseHTTPMiddleware):
     """
@@ -916,6 +1001,92 @@ def create_pagination_response(items: list, total_count: int, page: int, page_si
         }
     }
 
+# ============================================================================
+# QUERY BATCH HELPER - concurrent independent reads
+# ============================================================================
+
+# Upper bound on reads one request runs at the same time (keeps a single report
+# from monopolizing the connection pool)
+QUERY_BATCH_CONCURRENCY = int(os.environ.get('QUERY_BATCH_CONCURRENCY', '4'))
+
+async def run_query_batch(*query_factories, max_concurrency: int = QUERY_BATCH_CONCURRENCY) -> list:
+    """
+    Run independent database reads concurrently and return their results in order.
+    
+    Each argument is a zero-argument callable returning an awaitable, e.g.
+    `lambda: db.accounts.find(query, {"_id": 0}).to_list(1000)`. Callables are used
+    instead of awaitables because Motor starts a query as soon as to_list() is called,
+    so only deferring the call lets max_concurrency actually gate the reads.
+    
+    If any read fails, the reads still pending are cancelled and the error is raised, so a failed report never leaves orphaned queries behind.
+    
+    Usage:
+        accounts, invoices = await run_query_batch(
+            lambda: db.accounts.find({"is_deleted": False}, {"_id": 0}).to_list(1000),
+            lambda: db.invoices.find(invoice_query, {"_id": 0}).to_list(10000),
+        )
+    """
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+    
+    async def run(factory):
+        async with semaphore:
+            return await factory()
+    
+    tasks = [asyncio.ensure_future(run(factory)) for factory in query_factories]
+    if not tasks:
+        return []
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        for task in tasks:
+            if task.done() and not task.cancelled() and task.exception() is not None:
+                raise task.exception()
+        return [task.result() for task in tasks]
+    finally:
+        # Cancels siblings after an error, or everything if the request itself was cancelled
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+# ============================================================================
+# REFERENCE DATA LOOKUPS (cached, see reference_cache.py)
+# ============================================================================
+
+async def get_cached_shop_settings() -> dict:
+    """Shop settings document ({} when not configured), served from the reference cache."""
+    return dict(await reference_cache.shop_settings.get(db))
+
+async def find_account_by_name(name: str) -> Optional[dict]:
+    """
+    id/name/account_type of the active account with this name.
+    
+    Served from the reference cache; a miss is confirmed against MongoDB because
+    callers create the account when nothing is found. Never returns balances.
+    """
+    ref = (await reference_cache.accounts.get(db)).by_name(name)
+    if ref:
+        return ref.to_dict()
+    account = await db.accounts.find_one(
+        {"name": name, "is_deleted": False}, {"_id": 0, "id": 1, "name": 1, "account_type": 1})
+    if account:
+        # Created by another process since the snapshot was loaded
+        await reference_cache.accounts.invalidate(db)
+    return account
+
+async def find_inventory_header_by_name(name: str) -> Optional[dict]:
+    """
+    id/name/is_active of the active inventory header with this name (no stock levels).
+    A cache miss is confirmed against MongoDB like find_account_by_name.
+    """
+    ref = (await reference_cache.inventory_headers.get(db)).by_name(name)
+    if ref:
+        return ref.to_dict()
+    header = await db.inventory_headers.find_one(
+        {"name": name, "is_deleted": False}, {"_id": 0, "id": 1, "name": 1, "is_active": 1})
+    if header:
+        await reference_cache.inventory_headers.invalidate(db)
+    return header
+
 class UserRole(BaseModel):
     role: str
     permissions: List[str] = []
@@ -1325,6 +1496,7 @@ class Purchase(BaseModel):
 class ReturnItem(BaseModel):
     """Item in a return (sales or purchase return)"""
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    item_id: Optional[str] = None  # id of the invoice/purchase line being returned (None for manual entries)
     description: str
     qty: int
     weight_grams: float  # Input as float, stored as Decimal128 with 3 decimal precision
@@ -1412,6 +1584,18 @@ class ShopSettings(BaseModel):
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     updated_by: Optional[str] = None
 
+# Upper bound on sub-requests in one /api/batch call
+BATCH_MAX_REQUESTS = 20
+
+class BatchSubRequest(BaseModel):
+    """One read-only API call inside a batch (path includes the query string)"""
+    id: Optional[str] = None
+    method: str = "GET"
+    path: str
+
+class BatchRequest(BaseModel):
+    requests: List[BatchSubRequest] = Field(..., min_length=1, max_length=BATCH_MAX_REQUESTS)
+
 async def create_audit_log(user_id: str, user_name: str, module: str, record_id: str, action: str, changes: Optional[Dict] = None):
     log = AuditLog(
         user_id=user_id,
@@ -1423,6 +1607,100 @@ async def create_audit_log(user_id: str, user_name: str, module: str, record_id:
     )
     await db.audit_logs.insert_one(log.model_dump())
 
+# ============================================================================
+# SPARSE FIELDSETS FOR LIST ENDPOINTS (see fieldsets.py)
+# ============================================================================
+
+# Whitelists are the model fields; summaries are the list grids' columns
+INVOICE_FIELDSET = Fieldset(
+    resource='invoices',
+    allowed=tuple(Invoice.model_fields),
+    summary=('invoice_number', 'date', 'invoice_type', 'customer_type', 'customer_id', 'customer_name',
+             'walk_in_name', 'status', 'payment_status', 'grand_total', 'paid_amount', 'balance_due'),
+)
+PURCHASE_FIELDSET = Fieldset(
+    resource='purchases',
+    allowed=tuple(Purchase.model_fields),
+    summary=('date', 'vendor_party_id', 'is_walk_in', 'walk_in_vendor_name', 'description', 'weight_grams',
+             'amount_total', 'paid_amount_money', 'balance_due_money', 'status', 'locked'),
+)
+RETURN_FIELDSET = Fieldset(
+    resource='returns',
+    allowed=tuple(Return.model_fields),
+    summary=('return_number', 'return_type', 'date', 'reference_type', 'reference_number', 'party_name',
+             'total_weight_grams', 'total_amount', 'refund_mode', 'status', 'created_at'),
+)
+JOBCARD_FIELDSET = Fieldset(
+    resource='jobcards',
+    allowed=tuple(JobCard.model_fields),
+    summary=('job_card_number', 'card_type', 'created_at', 'delivery_date', 'status', 'customer_type',
+             'customer_name', 'walk_in_name', 'worker_name', 'is_invoiced', 'locked'),
+)
+RETURNABLE_INVOICE_FIELDSET = Fieldset(
+    resource='returnable invoices',
+    allowed=('id', 'invoice_no', 'date', 'party_name', 'total_amount', 'balance_amount', 'items'),
+    summary=('invoice_no', 'date', 'party_name', 'total_amount', 'balance_amount'),
+    sources={
+        'invoice_no': ('invoice_number',),
+        'party_name': ('customer_name', 'walk_in_name'),
+        'total_amount': ('grand_total',),
+        'balance_amount': ('balance_due',),
+    },
+)
+
+# ============================================================================
+# HISTORY ARCHIVE SPECS (see archive.py)
+# ============================================================================
+
+# Archived documents keep the model fields; indexes mirror the report reads on the hot collections
+TRANSACTION_ARCHIVE = ArchiveSpec(
+    collection='transactions',
+    date_field='date',
+    fields=tuple(Transaction.model_fields),
+    indexes=((("date", 1),), (("account_id", 1), ("date", 1)), (("party_id", 1), ("date", 1)), (("reference_id", 1),)),
+    # TXN-<year>-n numbers count the year's transactions
+    keep_hot=current_year_numbers("TXN"),
+)
+STOCK_MOVEMENT_ARCHIVE = ArchiveSpec(
+    collection='stock_movements',
+    date_field='date',
+    fields=tuple(StockMovement.model_fields),
+    indexes=((("date", 1),), (("header_id", 1), ("date", 1), ("id", 1)), (("reference_id", 1),)),
+)
+AUDIT_LOG_ARCHIVE = ArchiveSpec(
+    collection='audit_logs',
+    date_field='timestamp',
+    fields=tuple(AuditLog.model_fields),
+    indexes=((("timestamp", 1),), (("module", 1), ("timestamp", 1))),
+)
+ARCHIVE_SPECS = [TRANSACTION_ARCHIVE, STOCK_MOVEMENT_ARCHIVE, AUDIT_LOG_ARCHIVE]
+
+# Parquet exports for offline analytics; decimal_fields are the Decimal128 fields
+# of the convert_*_to_decimal functions
+COLUMNAR_SPECS = [
+    ColumnarSpec(collection='transactions', model=Transaction, decimal_fields=('amount',)),
+    ColumnarSpec(
+        collection='invoices',
+        model=Invoice,
+        decimal_fields=(
+            'subtotal', 'discount_amount', 'cgst_total', 'sgst_total', 'igst_total', 'vat_total', 'grand_total',
+            'paid_amount', 'balance_due', 'gold_received_rate', 'gold_received_value', 'gold_received_weight',
+            'items.gross_weight', 'items.stone_weight', 'items.net_gold_weight', 'items.weight', 'items.inches',
+            'items.metal_rate', 'items.gold_value', 'items.making_value', 'items.stone_charges',
+            'items.wastage_charges', 'items.item_discount', 'items.vat_amount', 'items.line_total',
+        ),
+    ),
+    ColumnarSpec(collection='stock_movements', model=StockMovement, decimal_fields=('weight_delta',)),
+    ColumnarSpec(collection='gold_ledger', model=GoldLedgerEntry, decimal_fields=('weight_grams',)),
+]
+
+def select_fields(fieldset: Fieldset, fields: Optional[str], view: Optional[str]) -> Optional[List[str]]:
+    """Validate the fields/view query parameters; None means whole documents"""
+    try:
+        return fieldset.select(fields, view)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 # ============================================================================
 # AUTHENTICATION & SECURITY HELPER FUNCTIONS
 # ============================================================================
@@ -1529,6 +1807,278 @@ def user_has_permission(user: User, required_permission: str) -> bool:
     user_permissions = user.permissions if user.permissions else get_user_permissions(user.role)
     return required_permission in user_permissions
 
+# ============================================================================
+# RETURNED QUANTITY COUNTERS (per invoice/purchase line)
+# ============================================================================
+#
+# Invoices and purchases carry running totals of what finalized returns took back:
+#   returned_totals: {"qty", "weight_grams", "amount"}               - whole document
+#   returned_items:  {<line id>: {"qty", "weight_grams", "amount"}}  - per line
+# so return validation and the returnable-items screen read one document instead of
+# re-summing every finalized return.
+#
+# finalize_return applies a return with a single guarded $inc on the reference
+# document (the filter re-checks the limits, so two drafts finalized at the same time
+# cannot over-return); a rolled-back finalization, or deleting a return left in
+# 'processing', subtracts it again. Documents written before the counters existed
+# are backfilled from their finalized returns on first use.
+#
+# A return item counts on the line of its item_id. Without one it matches lines by
+# description and purity, and an item matching several identical lines fills each
+# line's remaining qty and weight in turn. The split is kept on the return as
+# returned_lines, so taking the return back out subtracts exactly what was added.
+
+RETURN_REFERENCE_COLLECTIONS = {'invoice': 'invoices', 'purchase': 'purchases'}
+RETURN_WEIGHT_TOLERANCE = Decimal('0.001')  # 0.1% for rounding
+RETURN_AMOUNT_TOLERANCE = Decimal('0.01')   # 1% for rounding
+
+def _to_decimal(value) -> Decimal:
+    """Decimal from Decimal128 (stored) or float/int/str (API input)."""
+    if isinstance(value, Decimal128):
+        return value.to_decimal()
+    if value is None:
+        return Decimal('0')
+    return Decimal(str(value))
+
+def get_return_reference_lines(reference_type: str, reference_doc: dict) -> List[tuple]:
+    """
+    (line key, qty, weight, amount, description, purity) for each returnable line.
+    The key is the line's id; lines stored without one fall back to their position,
+    and legacy single-item purchases use "legacy" (as the returns screen does).
+    """
+    lines = []
+    if reference_type == 'invoice':
+        for index, item in enumerate(reference_doc.get('items', []) or []):
+            key = str(item.get('id') or f"line-{index}")
+            lines.append((
+                key,
+                item.get('qty', 0),
+                _to_decimal(item.get('net_gold_weight', 0) or item.get('weight', 0)),
+                _to_decimal(item.get('line_total', 0)),
+                item.get('description', ''),
+                item.get('purity', 0),
+            ))
+    else:
+        items = reference_doc.get('items', []) or []
+        for index, item in enumerate(items):
+            key = str(item.get('id') or f"line-{index}")
+            lines.append((
+                key, 1, _to_decimal(item.get('weight_grams', 0)), _to_decimal(item.get('calculated_amount', 0)),
+                item.get('description', ''), item.get('entered_purity', 0),
+            ))
+        if not items:
+            lines.append((
+                'legacy', 1, _to_decimal(reference_doc.get('weight_grams', 0)),
+                _to_decimal(reference_doc.get('amount_total', 0)),
+                reference_doc.get('description', ''), reference_doc.get('entered_purity', 0),
+            ))
+    # Keys become field names under returned_items, which cannot contain '.' or '$'
+    return [(line[0].replace('.', '_').replace('$', '_'),) + line[1:] for line in lines]
+
+def _matching_return_lines(return_item: dict, lines: List[tuple]) -> List[tuple]:
+    """Lines a return item takes back from: its item_id's line, else every line with the same description and purity."""
+    item_id = str(return_item.get('item_id') or '').replace('.', '_').replace('$', '_')
+    for line in lines:
+        if item_id and line[0] == item_id:
+            return [line]
+    return [
+        line for line in lines
+        if line[4] == return_item.get('description', '') and line[5] == return_item.get('purity', 0)
+    ]
+
+def _returned_by_line(reference_doc: dict) -> Dict[str, list]:
+    """[qty, weight] already returned per line key, from the returned_items counters."""
+    return {
+        key: [int(_to_decimal(counters.get('qty', 0))), _to_decimal(counters.get('weight_grams', 0))]
+        for key, counters in (reference_doc.get('returned_items') or {}).items()
+    }
+
+def allocate_return_lines(lines: List[tuple], return_items: list, returned: Dict[str, list]) -> List[dict]:
+    """
+    Split return items over the lines they take back from, as
+    [{"line", "qty", "weight_grams", "amount"}]. An item matching several lines
+    fills each one's remaining qty and weight (given returned, which is updated)
+    in order; what none of them has left stays on the last, for the totals limit
+    to reject. The amount follows the weight (the qty when there is none).
+    """
+    allocations = []
+    for item in return_items:
+        candidates = _matching_return_lines(item, lines)
+        qty = int(_to_decimal(item.get('qty', 0)))
+        weight = _to_decimal(item.get('weight_grams', 0))
+        amount = _to_decimal(item.get('amount', 0))
+        qty_left, weight_left, amount_left = qty, weight, amount
+        for index, (key, line_qty, line_weight, _amount, _description, _purity) in enumerate(candidates):
+            done = returned.setdefault(key, [0, Decimal('0')])
+            if index == len(candidates) - 1:
+                take_qty, take_weight, take_amount = qty_left, weight_left, amount_left
+            else:
+                take_qty = min(qty_left, max(int(_to_decimal(line_qty)) - done[0], 0))
+                take_weight = min(weight_left, max(line_weight - done[1], Decimal('0')))
+                if weight:
+                    take_amount = (amount * take_weight / weight).quantize(Decimal('0.001'))
+                elif qty:
+                    take_amount = (amount * take_qty / qty).quantize(Decimal('0.001'))
+                else:
+                    take_amount = Decimal('0')
+                if take_qty == qty_left and take_weight == weight_left:
+                    take_amount = amount_left
+                if not (take_qty or take_weight or take_amount):
+                    continue
+            done[0] += take_qty
+            done[1] += take_weight
+            qty_left -= take_qty
+            weight_left -= take_weight
+            amount_left -= take_amount
+            allocations.append({"line": key, "qty": take_qty, "weight_grams": take_weight, "amount": take_amount})
+            if not (qty_left or weight_left or amount_left):
+                break
+    return allocations
+
+def return_line_allocations(reference_type: str, reference_doc: dict, return_doc: dict,
+                            returned: Optional[Dict[str, list]] = None) -> List[dict]:
+    """The return's split over the reference lines: as applied when finalized, else allocated now."""
+    if return_doc.get('returned_lines') is not None:
+        return return_doc['returned_lines']
+    if returned is None:
+        returned = _returned_by_line(reference_doc)
+    return allocate_return_lines(
+        get_return_reference_lines(reference_type, reference_doc), return_doc.get('items', []) or [], returned)
+
+def calculate_return_counter_deltas(reference_type: str, reference_doc: dict, return_doc: dict,
+                                    allocations: Optional[List[dict]] = None) -> Dict[str, Any]:
+    """
+    Counter increments for one return as {dotted field path: Decimal or int}.
+    Items that match no line only count towards returned_totals.
+    """
+    if allocations is None:
+        allocations = return_line_allocations(reference_type, reference_doc, return_doc)
+    deltas: Dict[str, Any] = {
+        'returned_totals.qty': 0,
+        'returned_totals.weight_grams': Decimal('0'),
+        'returned_totals.amount': _to_decimal(return_doc.get('total_amount', 0)),
+    }
+    for item in return_doc.get('items', []) or []:
+        deltas['returned_totals.qty'] += int(_to_decimal(item.get('qty', 0)))
+        deltas['returned_totals.weight_grams'] += _to_decimal(item.get('weight_grams', 0))
+    for allocation in allocations:
+        prefix = f"returned_items.{allocation['line']}"
+        deltas[f"{prefix}.qty"] = deltas.get(f"{prefix}.qty", 0) + int(_to_decimal(allocation['qty']))
+        for name in ('weight_grams', 'amount'):
+            deltas[f"{prefix}.{name}"] = deltas.get(f"{prefix}.{name}", Decimal('0')) + _to_decimal(allocation[name])
+    return deltas
+
+def _counter_value(value):
+    """Store counter amounts as Decimal128 like every other money/weight field."""
+    return Decimal128(value) if isinstance(value, Decimal) else value
+
+async def ensure_return_counters(db, reference_type: str, reference_doc: dict) -> dict:
+    """
+    Return reference_doc with returned_totals/returned_items, backfilling them once
+    from finalized returns for documents created before the counters existed.
+    """
+    if 'returned_totals' in reference_doc:
+        return reference_doc
+    
+    totals: Dict[str, Any] = {
+        'returned_totals.qty': 0,
+        'returned_totals.weight_grams': Decimal('0'),
+        'returned_totals.amount': Decimal('0'),
+    }
+    existing_returns = await db.returns.find({
+        'reference_type': reference_type,
+        'reference_id': reference_doc.get('id'),
+        'status': 'finalized',
+        'is_deleted': False
+    }).sort('finalized_at', 1).to_list(length=None)
+    # Identical lines fill up in the order the returns were finalized
+    returned: Dict[str, list] = {}
+    for ret in existing_returns:
+        allocations = return_line_allocations(reference_type, reference_doc, ret, returned)
+        for path, value in calculate_return_counter_deltas(reference_type, reference_doc, ret, allocations).items():
+            totals[path] = totals.get(path, 0) + value
+    
+    returned_totals: Dict[str, Any] = {}
+    returned_items: Dict[str, Dict[str, Any]] = {}
+    for path, value in totals.items():
+        _root, *rest = path.split('.')
+        if path.startswith('returned_totals.'):
+            returned_totals[rest[0]] = _counter_value(value)
+        else:
+            returned_items.setdefault(rest[0], {})[rest[1]] = _counter_value(value)
+    
+    # Only the first backfill wins; a concurrent finalization always backfills before it increments
+    await db[RETURN_REFERENCE_COLLECTIONS[reference_type]].update_one(
+        {'id': reference_doc.get('id'), 'returned_totals': {'$exists': False}},
+        {'$set': {'returned_totals': returned_totals, 'returned_items': returned_items}}
+    )
+    reference_doc['returned_totals'] = returned_totals
+    reference_doc['returned_items'] = returned_items
+    return reference_doc
+
+def get_original_return_limits(reference_type: str, reference_doc: dict) -> tuple:
+    """(original qty, weight, amount, display name) a reference document allows returning."""
+    if reference_type == 'invoice':
+        # For invoices, calculate from items
+        invoice_items = reference_doc.get('items', [])
+        original_total_qty = sum(item.get('qty', 0) for item in invoice_items)
+        original_total_weight = sum(
+            (_to_decimal(item.get('net_gold_weight', 0) or item.get('weight', 0)) for item in invoice_items),
+            Decimal('0')
+        )
+        original_total_amount = _to_decimal(reference_doc.get('grand_total', 0))
+        entity_name = f"Invoice {reference_doc.get('invoice_number')}"
+    else:  # purchase
+        # For purchases, single item structure
+        original_total_qty = 1  # Purchases are typically single transaction
+        original_total_weight = _to_decimal(reference_doc.get('weight_grams', 0))
+        original_total_amount = _to_decimal(reference_doc.get('amount_total', 0))
+        entity_name = f"Purchase {reference_doc.get('id', '')[:8]}..."
+    return original_total_qty, original_total_weight, original_total_amount, entity_name
+
+async def apply_return_counters(db, return_doc: dict, direction: int = 1) -> bool:
+    """
+    Add (direction=1) or subtract (direction=-1) a return on its invoice/purchase counters
+    in one atomic update. Adding is guarded by the original limits and returns False when
+    the return no longer fits (another return was finalized in the meantime).
+    """
+    reference_type = return_doc.get('reference_type')
+    collection_name = RETURN_REFERENCE_COLLECTIONS.get(reference_type)
+    if not collection_name:
+        return True
+    reference_doc = await db[collection_name].find_one({"id": return_doc.get('reference_id')})
+    if not reference_doc:
+        return True
+    reference_doc = await ensure_return_counters(db, reference_type, reference_doc)
+    
+    allocations = return_line_allocations(reference_type, reference_doc, return_doc)
+    deltas = calculate_return_counter_deltas(reference_type, reference_doc, return_doc, allocations)
+    query: Dict[str, Any] = {"id": reference_doc['id']}
+    if direction > 0:
+        original_qty, original_weight, original_amount, _name = get_original_return_limits(reference_type, reference_doc)
+        max_weight = original_weight * (1 + RETURN_WEIGHT_TOLERANCE)
+        max_amount = original_amount * (1 + RETURN_AMOUNT_TOLERANCE)
+        query['returned_totals.qty'] = {"$lte": original_qty - deltas['returned_totals.qty']}
+        query['returned_totals.weight_grams'] = {"$lte": Decimal128(max_weight - deltas['returned_totals.weight_grams'])}
+        query['returned_totals.amount'] = {"$lte": Decimal128(max_amount - deltas['returned_totals.amount'])}
+    
+    result = await db[collection_name].update_one(
+        query,
+        {"$inc": {path: _counter_value(value * direction) for path, value in deltas.items()}}
+    )
+    if result.matched_count != 1:
+        return False
+    # Keep the split applied for taking the return back out; a draft is split again when finalized
+    if direction > 0:
+        return_doc['returned_lines'] = allocations
+        await db.returns.update_one({"id": return_doc.get('id')}, {"$set": {"returned_lines": [
+            {name: _counter_value(value) for name, value in allocation.items()} for allocation in allocations
+        ]}})
+    else:
+        return_doc.pop('returned_lines', None)
+        await db.returns.update_one({"id": return_doc.get('id')}, {"$unset": {"returned_lines": ""}})
+    return True
+
 async def validate_return_against_original(
     db,
     reference_type: str,
@@ -1541,117 +2091,36 @@ async def validate_return_against_original(
     Validate that return qty, weight, and amount don't exceed original invoice/purchase totals.
     Uses Decimal for precise arithmetic to avoid floating point errors.
     
+    Already-returned totals come from the reference document's returned_totals counters,
+    so no returns are re-read (see RETURNED QUANTITY COUNTERS above).
+    
     Args:
         db: MongoDB database instance
         reference_type: 'invoice' or 'purchase'
         reference_id: ID of the invoice or purchase
         reference_doc: The invoice or purchase document
         return_items: List of return items with qty, weight_grams, and amount
-        current_return_id: ID of current return (for update operations, to exclude it from calculation)
+        current_return_id: ID of current return (for update operations). Kept for callers;
+            only finalized returns are counted and those cannot be updated.
     
     Raises:
         HTTPException: If return exceeds original qty, weight, or amount
     """
     # Calculate current return totals using Decimal for precision
     current_total_qty = sum(item.get('qty', 0) for item in return_items)
-    
-    # Convert to Decimal for precise arithmetic
-    current_total_weight = Decimal('0')
-    current_total_amount = Decimal('0')
-    
-    for item in return_items:
-        weight = item.get('weight_grams', 0)
-        amount = item.get('amount', 0)
-        
-        # Handle both Decimal128 (from DB) and float (from API input)
-        if isinstance(weight, Decimal128):
-            current_total_weight += weight.to_decimal()
-        else:
-            current_total_weight += Decimal(str(weight))
-            
-        if isinstance(amount, Decimal128):
-            current_total_amount += amount.to_decimal()
-        else:
-            current_total_amount += Decimal(str(amount))
+    current_total_weight = sum((_to_decimal(item.get('weight_grams', 0)) for item in return_items), Decimal('0'))
+    current_total_amount = sum((_to_decimal(item.get('amount', 0)) for item in return_items), Decimal('0'))
     
     # Get original totals
-    if reference_type == 'invoice':
-        # For invoices, calculate from items
-        invoice_items = reference_doc.get('items', [])
-        original_total_qty = sum(item.get('qty', 0) for item in invoice_items)
-        
-        # Calculate original weight
-        original_total_weight = Decimal('0')
-        for item in invoice_items:
-            weight = item.get('net_gold_weight', 0) or item.get('weight', 0)
-            if isinstance(weight, Decimal128):
-                original_total_weight += weight.to_decimal()
-            else:
-                original_total_weight += Decimal(str(weight))
-        
-        # Get original amount
-        grand_total = reference_doc.get('grand_total', 0)
-        if isinstance(grand_total, Decimal128):
-            original_total_amount = grand_total.to_decimal()
-        else:
-            original_total_amount = Decimal(str(grand_total))
-        
-        entity_name = f"Invoice {reference_doc.get('invoice_number')}"
-    else:  # purchase
-        # For purchases, single item structure
-        original_total_qty = 1  # Purchases are typically single transaction
-        
-        weight = reference_doc.get('weight_grams', 0)
-        if isinstance(weight, Decimal128):
-            original_total_weight = weight.to_decimal()
-        else:
-            original_total_weight = Decimal(str(weight))
-        
-        amount = reference_doc.get('amount_total', 0)
-        if isinstance(amount, Decimal128):
-            original_total_amount = amount.to_decimal()
-        else:
-            original_total_amount = Decimal(str(amount))
-        
-        entity_name = f"Purchase {reference_id[:8]}..."
-    
-    # Calculate totals already returned (finalized returns only)
-    query = {
-        'reference_type': reference_type,
-        'reference_id': reference_id,
-        'status': 'finalized',
-        'is_deleted': False
-    }
-    
-    # Exclude current return if updating
-    if current_return_id:
-        query['id'] = {'$ne': current_return_id}
+    original_total_qty, original_total_weight, original_total_amount, entity_name = \
+        get_original_return_limits(reference_type, reference_doc)
     
-    existing_returns = await db.returns.find(query).to_list(length=None)
-    
-    # Sum up already returned quantities, weights, and amounts using Decimal
-    already_returned_qty = 0
-    already_returned_weight = Decimal('0')
-    already_returned_amount = Decimal('0')
-    
-    for ret in existing_returns:
-        ret_items = ret.get('items', [])
-        already_returned_qty += sum(item.get('qty', 0) for item in ret_items)
-        
-        # Sum weights using Decimal
-        for item in ret_items:
-            weight = item.get('weight_grams', 0)
-            if isinstance(weight, Decimal128):
-                already_returned_weight += weight.to_decimal()
-            else:
-                already_returned_weight += Decimal(str(weight))
-        
-        # Sum amounts using Decimal
-        total_amt = ret.get('total_amount', 0)
-        if isinstance(total_amt, Decimal128):
-            already_returned_amount += total_amt.to_decimal()
-        else:
-            already_returned_amount += Decimal(str(total_amt))
+    # Totals already returned by finalized returns
+    reference_doc = await ensure_return_counters(db, reference_type, reference_doc)
+    returned_totals = reference_doc.get('returned_totals', {})
+    already_returned_qty = int(_to_decimal(returned_totals.get('qty', 0)))
+    already_returned_weight = _to_decimal(returned_totals.get('weight_grams', 0))
+    already_returned_amount = _to_decimal(returned_totals.get('amount', 0))
     
     # Validate quantity
     total_qty_with_new = already_returned_qty + current_total_qty
@@ -1668,7 +2137,7 @@ async def validate_return_against_original(
     # Validate weight using Decimal for precision
     total_weight_with_new = already_returned_weight + current_total_weight
     # Allow 0.1% tolerance for rounding
-    tolerance = original_total_weight * Decimal('0.001')
+    tolerance = original_total_weight * RETURN_WEIGHT_TOLERANCE
     if total_weight_with_new > (original_total_weight + tolerance):
         raise HTTPException(
             status_code=400,
@@ -1682,7 +2151,7 @@ async def validate_return_against_original(
     # Validate amount using Decimal for precision
     total_amount_with_new = already_returned_amount + current_total_amount
     # Allow 1% tolerance for rounding
-    amount_tolerance = original_total_amount * Decimal('0.01')
+    amount_tolerance = original_total_amount * RETURN_AMOUNT_TOLERANCE
     if total_amount_with_new > (original_total_amount + amount_tolerance):
         raise HTTPException(
             status_code=400,
@@ -1722,6 +2191,11 @@ async def get_current_user(
     Get current user from JWT token - supports both cookie and Authorization header.
     Cookie-based auth is preferred for security (HttpOnly + Secure cookies).
     """
+    # Sub-requests of /api/batch run as the user the batch request authenticated
+    batch_user = getattr(request.state, "batch_user", None)
+    if batch_user is not None:
+        return batch_user
+    
     # Try to get token from cookie first (preferred method)
     token = request.cookies.get("access_token")
     
@@ -2052,7 +2526,7 @@ async def get_users(request: Request, current_user: User = Depends(require_permi
         # Populate permissions if not set
         if 'permissions' not in user or not user['permissions']:
             user['permissions'] = get_user_permissions(user.get('role', 'staff'))
-    return users
+    return model_list_response(User, users)
 
 @api_router.patch("/users/{user_id}")
 @limiter.limit("30/minute")  # Sensitive operation: 30 user updates per minute
@@ -2218,6 +2692,8 @@ async def create_inventory_header(header_data: dict, current_user: User = Depend
     
     header = InventoryHeader(name=category_name, created_by=current_user.id)
     await db.inventory_headers.insert_one(header.model_dump())
+    await reference_cache.inventory_headers.invalidate(db)
+    await typeahead_service.refresh("inventory_headers", header.id)
     await create_audit_log(current_user.id, current_user.full_name, "inventory_header", header.id, "create")
     return header
 
@@ -2287,6 +2763,8 @@ async def update_inventory_header(
         {"id": header_id},
         {"$set": update_data}
     )
+    await reference_cache.inventory_headers.invalidate(db)
+    await typeahead_service.refresh("inventory_headers", header_id)
     
     # Create audit log
     await create_audit_log(
@@ -2325,6 +2803,8 @@ async def delete_inventory_header(header_id: str, current_user: User = Depends(r
         {"id": header_id},
         {"$set": {"is_deleted": True}}
     )
+    await reference_cache.inventory_headers.invalidate(db)
+    await typeahead_service.refresh("inventory_headers", header_id)
     
     # Create audit log
     await create_audit_log(
@@ -2353,14 +2833,14 @@ async def get_stock_movements(
         query['header_id'] = header_id
     
     # Get total count
-    total_count = await db.stock_movements.count_documents(query)
+    total_count = await archive_count(db, 'stock_movements', query)
     
     # Calculate pagination
     total_pages = (total_count + page_size - 1) // page_size
     skip = (page - 1) * page_size
     
     # Get paginated movements
-    movements = await db.stock_movements.find(query, {"_id": 0}).sort("date", -1).skip(skip).limit(page_size).to_list(page_size)
+    movements = await archive_find(db, 'stock_movements', query, {"_id": 0}, sort=[("date", -1)], skip=skip, limit=page_size)
     
     # Convert Decimal128 to float for JSON serialization
     movements = [decimal_to_float(movement) for movement in movements]
@@ -2912,6 +3392,10 @@ async def get_inventory(
 # END OF NEW ENDPOINTS
 # ============================================================================
 
+# Party reads returned to clients leave out the internal search_keys array
+PARTY_PROJECTION = {"_id": 0, "search_keys": 0}
+PARTY_SEARCH_MAX_LIMIT = 50
+
 @api_router.get("/parties")
 @limiter.limit("1000/hour")  # General authenticated rate limit: 1000 requests per hour
 async def get_parties(
@@ -2931,14 +3415,10 @@ async def get_parties(
     if party_type and party_type != 'all':
         query['party_type'] = party_type
     
-    # Server-side search filter (name, phone, or oman_id)
-    if search and search.strip():
-        search_pattern = {"$regex": search.strip(), "$options": "i"}  # case-insensitive
-        query['$or'] = [
-            {"name": search_pattern},
-            {"phone": search_pattern},
-            {"oman_id": search_pattern}
-        ]
+    # Server-side search filter (name, phone, or oman_id) served by the search_keys index
+    search_filter = party_search_filter(search)
+    if search_filter:
+        query.update(search_filter)
     
     # Date range filter (filter by created date)
     if date_from or date_to:
@@ -2957,7 +3437,7 @@ async def get_parties(
     total_count = await db.parties.count_documents(query)
     
     # Get paginated results (with filters applied)
-    parties = await db.parties.find(query, {"_id": 0}).skip(skip).limit(page_size).to_list(page_size)
+    parties = await db.parties.find(query, PARTY_PROJECTION).skip(skip).limit(page_size).to_list(page_size)
     
     return create_pagination_response(parties, total_count, page, page_size)
 
@@ -2990,7 +3470,10 @@ async def create_party(request: Request, party_data: dict, current_user: User =
             )
     
     party = Party(**validated_data.dict(), created_by=current_user.id)
-    await db.parties.insert_one(party.model_dump())
+    party_doc = party.model_dump()
+    party_doc.update(party_search_keys_update(party_doc))
+    await db.parties.insert_one(party_doc)
+    await typeahead_service.refresh("parties", party.id)
     await create_audit_log(current_user.id, current_user.full_name, "party", party.id, "create")
     return party
 
@@ -3017,6 +3500,47 @@ async def get_outstanding_summary(current_user: User = Depends(require_permissio
     
     return {"total_customer_due": total_customer_due, "top_10_outstanding": top_10}
 
+@api_router.get("/parties/search")
+@limiter.limit("1000/hour")  # General authenticated rate limit: 1000 requests per hour
+async def search_parties(
+    request: Request,
+    q: str = "",
+    party_type: Optional[str] = None,
+    limit: int = 10,
+    current_user: User = Depends(require_permission('parties.view'))
+):
+    """
+    Typeahead search for the party picker.
+    
+    Matches every word of q against name word prefixes and phone/oman_id digits
+    (prefix or any 3+ digit run). Served from the in-memory typeahead index once it
+    is loaded, otherwise through the indexed search_keys array. Returns at most
+    `limit` (max 50) parties ordered by name, without a total count.
+    """
+    limit = max(1, min(limit, PARTY_SEARCH_MAX_LIMIT))
+    if party_type == 'all':
+        party_type = None
+    
+    if typeahead_service.ready("parties"):
+        return typeahead_response(
+            request, "parties", q, limit,
+            (lambda record: record.get('party_type') == party_type) if party_type else None
+        )
+    
+    search_filter = party_search_filter(q)
+    if not search_filter:
+        return {"items": []}
+    
+    query = {"is_deleted": False, **search_filter}
+    if party_type:
+        query['party_type'] = party_type
+    
+    parties = await db.parties.find(
+        query,
+        {"_id": 0, "id": 1, "name": 1, "phone": 1, "oman_id": 1, "party_type": 1}
+    ).sort("name", 1).limit(limit).to_list(limit)
+    return {"items": parties}
+
 @api_router.get("/parties/{party_id}", response_model=Party)
 async def get_party(party_id: str, current_user: User = Depends(require_permission('parties.view'))):
     party = await db.parties.find_one({"id": party_id, "is_deleted": False}, {"_id": 0})
@@ -3068,7 +3592,8 @@ async def update_party(party_id: str, party_data: dict, current_user: User = Dep
     
     # Update with validated data
     update_dict = validated_data.dict(exclude_unset=False)
-    await db.parties.update_one({"id": party_id}, {"$set": update_dict})
+    await db.parties.update_one({"id": party_id}, {"$set": {**update_dict, **party_search_keys_update(update_dict)}})
+    await typeahead_service.refresh("parties", party_id)
     await create_audit_log(current_user.id, current_user.full_name, "party", party_id, "update", update_dict)
     
     updated = await db.parties.find_one({"id": party_id}, {"_id": 0})
@@ -3089,7 +3614,7 @@ async def get_party_impact(party_id: str, current_user: User = Depends(require_p
     linked_purchases_count = await db.purchases.count_documents({"vendor_party_id": party_id, "is_deleted": False})
     linked_jobcards_count = await db.jobcards.count_documents({"customer_id": party_id, "is_deleted": False})
     linked_gold_ledger_count = await db.gold_ledger.count_documents({"party_id": party_id, "is_deleted": False})
-    linked_transactions_count = await db.transactions.count_documents({"party_id": party_id, "is_deleted": False})
+    linked_transactions_count = await archive_count(db, 'transactions', {"party_id": party_id, "is_deleted": False})
     
     # Get outstanding balances
     money_outstanding = 0
@@ -3138,6 +3663,7 @@ async def delete_party(party_id: str, current_user: User = Depends(require_permi
         {"id": party_id},
         {"$set": {"is_deleted": True, "deleted_at": datetime.now(timezone.utc), "deleted_by": current_user.id}}
     )
+    await typeahead_service.refresh("parties", party_id)
     await create_audit_log(current_user.id, current_user.full_name, "party", party_id, "delete")
     return {"message": "Party deleted successfully"}
 
@@ -3181,6 +3707,168 @@ def validate_worker_name(name: str) -> tuple[bool, str]:
     return True, ""
 
 
+# ============================================================================
+# CONDITIONAL GET (ETag / If-None-Match)
+# ============================================================================
+#
+# Report ETags hash the route, the query string and the write versions of the
+# collections the report reads (see write_versions.py), so an unchanged report is
+# answered with 304 before any report query runs. A time bucket of
+# REPORT_ETAG_MAX_AGE_SECONDS is mixed in as well: it bounds staleness from writes
+# made outside the API and lets date-relative figures (overdue days) move on.
+
+REPORT_ETAG_MAX_AGE_SECONDS = int(os.environ.get('REPORT_ETAG_MAX_AGE_SECONDS', '300'))
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Weak comparison of etag against the request's If-None-Match header"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    candidates = [tag.strip() for tag in header.split(",")]
+    return any((tag[2:] if tag.startswith("W/") else tag) == opaque for tag in candidates)
+
+def report_etag(*collections: str):
+    """
+    Create a FastAPI dependency adding an ETag to a report and answering 304 when
+    the client's copy is current. Declare it after the permission dependency so
+    unauthorized requests never reach the version lookup.
+    Usage:
+    @api_router.get("/reports/endpoint")
+    async def endpoint(current_user: User = Depends(require_permission('reports.view')),
+                       etag: str = Depends(report_etag('invoices'))):
+        ...
+    """
+    async def etag_checker(request: Request, response: Response) -> str:
+        versions = await write_versions.current(db, collections)
+        key = orjson.dumps([
+            request.url.path,
+            sorted(request.query_params.multi_items()),
+            versions,
+            int(time.time() // REPORT_ETAG_MAX_AGE_SECONDS),
+        ])
+        etag = f'W/"{hashlib.sha1(key).hexdigest()[:24]}"'
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if etag_matches(request, etag):
+            raise HTTPException(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        response.headers.update(headers)
+        return etag
+    return etag_checker
+
+
+# ============================================================================
+# REPORT RESULT CACHE (see report_cache.py)
+# ============================================================================
+
+def cached_report(*collections: str):
+    """
+    Cache a report endpoint's rendered JSON body, keyed by endpoint and the query
+    parameters that differ from their defaults, until one of collections is written.
+    Goes between the route decorator and the endpoint:
+    @api_router.get("/reports/endpoint")
+    @cached_report('invoices', 'transactions')
+    async def endpoint(...):
+        ...
+    Headers set by dependencies (report_etag) are kept on cached responses.
+    """
+    def decorator(endpoint):
+        signature = inspect.signature(endpoint)
+        defaults = {
+            name: param.default for name, param in signature.parameters.items()
+            if not isinstance(param.default, fastapi_params.Depends)
+        }
+
+        @functools.wraps(endpoint)
+        async def wrapper(report_cache_response: Optional[Response] = None, **kwargs):
+            # Direct calls (exports reusing a report) get the endpoint's own result
+            if report_cache_response is None or not REPORT_CACHE_ENABLED:
+                return await endpoint(**kwargs)
+            name = endpoint.__name__
+            key = report_cache_key(name, {
+                param: value for param, value in kwargs.items()
+                if param in defaults and value != defaults[param]
+            })
+            # Versions are read before computing: a write racing the computation leaves
+            # the entry tagged with older versions, so it is recomputed on the next call
+            versions = await write_versions.current(db, collections)
+            body = await report_cache.get(key, name, versions)
+            cache_status = "hit"
+            if body is None:
+                cache_status = "miss"
+                result = await endpoint(**kwargs)
+                if isinstance(result, Response):
+                    return result
+                body = AppJSONResponse(jsonable_encoder(result)).body
+                await report_cache.put(key, name, versions, body)
+            headers = {k: v for k, v in report_cache_response.headers.items() if k != "content-length"}
+            headers["X-Report-Cache"] = cache_status
+            return Response(content=body, media_type=AppJSONResponse.media_type, headers=headers)
+
+        # FastAPI injects its sub-response (carrying dependency headers) as an extra parameter
+        wrapper.__signature__ = signature.replace(parameters=[
+            *signature.parameters.values(),
+            inspect.Parameter('report_cache_response', inspect.Parameter.KEYWORD_ONLY, default=None, annotation=Response),
+        ])
+        return wrapper
+    return decorator
+
+
+# ============================================================================
+# TYPEAHEAD (in-memory prefix indexes, see typeahead.py)
+# ============================================================================
+
+def typeahead_response(request: Request, collection: str, q: str, limit: int, predicate=None):
+    """
+    Search an in-memory typeahead index. The index version stamp is returned in the
+    body and as the ETag, so a client repeating a query with If-None-Match gets a 304
+    until the underlying collection changes.
+    """
+    index = typeahead_service.indexes[collection]
+    etag = f'"{collection}-{index.stamp}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    limit = max(1, min(limit, TYPEAHEAD_MAX_LIMIT))
+    items = index.search(q, limit, predicate)
+    return json_response({"items": items, "version": index.stamp}, headers=headers)
+
+def require_typeahead(collection: str):
+    if not typeahead_service.ready(collection):
+        raise HTTPException(status_code=503, detail="Typeahead index is not loaded yet")
+
+@api_router.get("/typeahead/versions")
+async def get_typeahead_versions(current_user: User = Depends(get_current_user)):
+    """Current version stamp of each loaded typeahead index (changes whenever its data changes)"""
+    return {"versions": typeahead_service.versions()}
+
+@api_router.get("/typeahead/inventory-headers")
+async def typeahead_inventory_headers(
+    request: Request,
+    q: str = "",
+    include_inactive: bool = False,
+    limit: int = 10,
+    current_user: User = Depends(require_permission('inventory.view'))
+):
+    """Autocomplete inventory categories by name word prefix"""
+    require_typeahead("inventory_headers")
+    predicate = None if include_inactive else (lambda record: record.get('is_active', True))
+    return typeahead_response(request, "inventory_headers", q, limit, predicate)
+
+@api_router.get("/typeahead/workers")
+async def typeahead_workers(
+    request: Request,
+    q: str = "",
+    active: Optional[bool] = None,
+    limit: int = 10,
+    current_user: User = Depends(get_current_user)
+):
+    """Autocomplete workers by name word prefix or phone digits"""
+    require_typeahead("workers")
+    predicate = None if active is None else (lambda record: record.get('active', True) == active)
+    return typeahead_response(request, "workers", q, limit, predicate)
+
 @api_router.get("/workers")
 @limiter.limit("1000/hour")
 async def get_workers(
@@ -3246,6 +3934,7 @@ async def create_worker(request: Request, worker_data: dict, current_user: User
     
     worker = Worker(**worker_data, created_by=current_user.id)
     await db.workers.insert_one(worker.model_dump())
+    await typeahead_service.refresh("workers", worker.id)
     await create_audit_log(current_user.id, current_user.full_name, "worker", worker.id, "create")
     return worker
 
@@ -3303,6 +3992,7 @@ async def update_worker(worker_id: str, update_data: dict, current_user: User =
                 )
     
     await db.workers.update_one({"id": worker_id}, {"$set": update_data})
+    await typeahead_service.refresh("workers", worker_id)
     await create_audit_log(current_user.id, current_user.full_name, "worker", worker_id, "update", update_data)
     return {"message": "Worker updated successfully"}
 
@@ -3330,6 +4020,7 @@ async def delete_worker(worker_id: str, current_user: User = Depends(get_current
         {"id": worker_id},
         {"$set": {"is_deleted": True, "deleted_at": datetime.now(timezone.utc), "deleted_by": current_user.id}}
     )
+    await typeahead_service.refresh("workers", worker_id)
     await create_audit_log(current_user.id, current_user.full_name, "worker", worker_id, "delete")
     return {"message": "Worker deleted successfully"}
 
@@ -3347,20 +4038,16 @@ async def get_work_types(
     current_user: User = Depends(get_current_user)
 ):
     """Get all work types with optional active filter and pagination"""
-    query = {"is_deleted": False}
+    # Work types are reference data: filter and page the cached list (sorted by name)
+    work_types = await reference_cache.work_types.get(db)
     if active is not None:
-        query['is_active'] = active
-    
-    # Get total count
-    total_count = await db.work_types.count_documents(query)
+        work_types = [wt for wt in work_types if wt.get('is_active') == active]
     
-    # Calculate skip
+    total_count = len(work_types)
     skip = (page - 1) * page_size
+    page_items = [dict(wt) for wt in work_types[skip:skip + page_size]]
     
-    # Get paginated work types
-    work_types = await db.work_types.find(query, {"_id": 0}).sort("name", 1).skip(skip).limit(page_size).to_list(None)
-    
-    return create_pagination_response(work_types, total_count, page, page_size)
+    return create_pagination_response(page_items, total_count, page, page_size)
 
 @api_router.post("/work-types", response_model=WorkType, status_code=201)
 @limiter.limit("1000/hour")
@@ -3386,13 +4073,14 @@ async def create_work_type(request: Request, work_type_data: dict, current_user:
     
     work_type = WorkType(**work_type_data, created_by=current_user.id)
     await db.work_types.insert_one(work_type.model_dump())
+    await reference_cache.work_types.invalidate(db)
     await create_audit_log(current_user.id, current_user.full_name, "work_type", work_type.id, "create")
     return work_type
 
 @api_router.get("/work-types/{work_type_id}", response_model=WorkType)
 async def get_work_type(work_type_id: str, current_user: User = Depends(get_current_user)):
     """Get a specific work type by ID"""
-    work_type = await db.work_types.find_one({"id": work_type_id, "is_deleted": False}, {"_id": 0})
+    work_type = next((wt for wt in await reference_cache.work_types.get(db) if wt.get('id') == work_type_id), None)
     if not work_type:
         raise HTTPException(status_code=404, detail="Work type not found")
     return WorkType(**work_type)
@@ -3425,6 +4113,7 @@ async def update_work_type(work_type_id: str, update_data: dict, current_user: U
             )
     
     await db.work_types.update_one({"id": work_type_id}, {"$set": update_data})
+    await reference_cache.work_types.invalidate(db)
     await create_audit_log(current_user.id, current_user.full_name, "work_type", work_type_id, "update", update_data)
     return {"message": "Work type updated successfully"}
 
@@ -3443,6 +4132,7 @@ async def delete_work_type(work_type_id: str, current_user: User = Depends(get_c
             "deleted_by": current_user.id
         }}
     )
+    await reference_cache.work_types.invalidate(db)
     await create_audit_log(current_user.id, current_user.full_name, "work_type", work_type_id, "delete")
     return {"message": "Work type deleted successfully"}
     await create_audit_log(current_user.id, current_user.full_name, "worker", worker_id, "delete")
@@ -3451,7 +4141,7 @@ async def delete_work_type(work_type_id: str, current_user: User = Depends(get_c
 @api_router.get("/parties/{party_id}/ledger")
 async def get_party_ledger(party_id: str, current_user: User = Depends(require_permission('parties.view'))):
     invoices = await db.invoices.find({"customer_id": party_id, "is_deleted": False}, {"_id": 0}).to_list(1000)
-    transactions = await db.transactions.find({"party_id": party_id, "is_deleted": False}, {"_id": 0}).to_list(1000)
+    transactions = await archive_find(db, 'transactions', {"party_id": party_id, "is_deleted": False}, {"_id": 0}, limit=1000)
     
     outstanding = 0
     for inv in invoices:
@@ -3495,6 +4185,7 @@ async def create_gold_ledger_entry(entry_data: dict, current_user: User = Depend
         notes=entry_data.get('notes'),
         created_by=current_user.id
     )
+    await require_open_period(entry.date, "Gold ledger entries")
     
     await db.gold_ledger.insert_one(convert_gold_ledger_to_decimal(entry.model_dump()))
     await create_audit_log(current_user.id, current_user.full_name, "gold_ledger", entry.id, "create")
@@ -3548,6 +4239,7 @@ async def delete_gold_ledger_entry(entry_id: str, current_user: User = Depends(r
     entry = await db.gold_ledger.find_one({"id": entry_id, "is_deleted": False})
     if not entry:
         raise HTTPException(status_code=404, detail="Gold ledger entry not found")
+    await require_open_period(entry.get('date'), "Gold ledger entries")
     
     # Soft delete
     await db.gold_ledger.update_one(
@@ -3616,6 +4308,7 @@ async def create_gold_deposit(deposit_data: dict, current_user: User = Depends(r
         notes=deposit_data.get('notes'),
         created_by=current_user.id
     )
+    await require_open_period(entry.date, "Gold ledger entries")
     
     await db.gold_ledger.insert_one(convert_gold_ledger_to_decimal(entry.model_dump()))
     await create_audit_log(current_user.id, current_user.full_name, "gold_deposit", entry.id, "create")
@@ -3662,7 +4355,7 @@ async def get_gold_deposits(
         query['date'] = date_query
     
     entries = await db.gold_ledger.find(query, {"_id": 0}).sort("date", -1).to_list(1000)
-    return entries
+    return model_list_response(GoldLedgerEntry, entries)
 
 # Note: Soft delete is handled by existing DELETE /api/gold-ledger/{entry_id} endpoint
 
@@ -3711,13 +4404,22 @@ async def get_party_summary(party_id: str, current_user: User = Depends(require_
     Get comprehensive party summary including both gold and money balances.
     This endpoint combines gold ledger data and financial data (invoices + transactions).
     """
-    # Verify party exists
+    # Verify party exists before reading its history, so an unknown id costs one read
     party = await db.parties.find_one({"id": party_id, "is_deleted": False})
     if not party:
         raise HTTPException(status_code=404, detail="Party not found")
     
-    # Get gold ledger entries
-    gold_entries = await db.gold_ledger.find({"party_id": party_id, "is_deleted": False}, {"_id": 0}).to_list(1000)
+    # Gold ledger, finalized invoices and transactions are independent reads
+    gold_entries, invoices, transactions = await run_query_batch(
+        lambda: db.gold_ledger.find({"party_id": party_id, "is_deleted": False}, {"_id": 0}).to_list(1000),
+        lambda: db.invoices.find({"customer_id": party_id, "is_deleted": False, "status": "finalized"}, {"_id": 0}).to_list(1000),
+        lambda: archive_find(db, 'transactions', {"party_id": party_id, "is_deleted": False}, {"_id": 0}, limit=1000),
+    )
+    
+    # Convert Decimal128 to float for calculations
+    gold_entries = [decimal_to_float(entry) for entry in gold_entries]
+    invoices = [decimal_to_float(inv) for inv in invoices]
+    transactions = [decimal_to_float(txn) for txn in transactions]
     
     # Calculate gold balances
     gold_due_from_party = 0.0  # Party owes shop (IN entries)
@@ -3734,13 +4436,7 @@ async def get_party_summary(party_id: str, current_user: User = Depends(require_
     gold_due_to_party = round(gold_due_to_party, 3)
     net_gold_balance = round(gold_due_from_party - gold_due_to_party, 3)
     
-    # Get invoices for money calculations - ONLY FINALIZED invoices
-    invoices = await db.invoices.find({"customer_id": party_id, "is_deleted": False, "status": "finalized"}, {"_id": 0}).to_list(1000)
-    
-    # Get transactions
-    transactions = await db.transactions.find({"party_id": party_id, "is_deleted": False}, {"_id": 0}).to_list(1000)
-    
-    # Calculate money balances
+    # Calculate money balances (invoices are ONLY FINALIZED invoices)
     money_due_from_party = 0.0  # Outstanding invoices (party owes shop)
     money_due_to_party = 0.0     # Credits or vendor payables (shop owes party)
     
@@ -3832,7 +4528,7 @@ async def create_purchase(request: Request, purchase_data: dict, current_user: U
             raise HTTPException(status_code=400, detail="Invalid conversion factor value")
     else:
         # Fallback to shop settings
-        settings = await db.shop_settings.find_one({})
+        settings = await get_cached_shop_settings()
         conversion_factor = settings.get("purchase_conversion_factor", 0.920) if settings else 0.920
     
     purchase_data["conversion_factor"] = conversion_factor
@@ -4049,6 +4745,7 @@ async def create_purchase(request: Request, purchase_data: dict, current_user: U
     # Create Purchase model instance
     purchase = Purchase(**purchase_data)
     purchase_id = purchase.id
+    await require_open_period(purchase.date, "Purchases")
     
     # Convert to Decimal128 for precise storage
     purchase_data_dec = convert_purchase_to_decimal(purchase.model_dump())
@@ -4063,7 +4760,7 @@ async def create_purchase(request: Request, purchase_data: dict, current_user: U
             purity = purchase_data["valuation_purity_fixed"]  # Always 916
             header_name = f"Gold {purity // 41.6:.0f}K"  # 916 = 22K
             
-            header = await db.inventory_headers.find_one({"name": header_name, "is_deleted": False})
+            header = await find_inventory_header_by_name(header_name)
             if not header:
                 # Create new inventory header
                 header = InventoryHeader(
@@ -4074,6 +4771,8 @@ async def create_purchase(request: Request, purchase_data: dict, current_user: U
                     created_by=current_user.username
                 )
                 await db.inventory_headers.insert_one(header.model_dump())
+                await reference_cache.inventory_headers.invalidate(db)
+                await typeahead_service.refresh("inventory_headers", header.id)
             
             # Create Stock IN movement for this item
             movement = StockMovement(
@@ -4107,7 +4806,7 @@ async def create_purchase(request: Request, purchase_data: dict, current_user: U
         purity = purchase_data["valuation_purity_fixed"]  # Always 916
         header_name = f"Gold {purity // 41.6:.0f}K"  # 916 = 22K
         
-        header = await db.inventory_headers.find_one({"name": header_name, "is_deleted": False})
+        header = await find_inventory_header_by_name(header_name)
         if not header:
             # Create new inventory header
             header = InventoryHeader(
@@ -4118,6 +4817,8 @@ async def create_purchase(request: Request, purchase_data: dict, current_user: U
                 created_by=current_user.username
             )
             await db.inventory_headers.insert_one(header.model_dump())
+            await reference_cache.inventory_headers.invalidate(db)
+            await typeahead_service.refresh("inventory_headers", header.id)
         
         # Create Stock IN movement
         movement = StockMovement(
@@ -4238,7 +4939,7 @@ async def create_purchase(request: Request, purchase_data: dict, current_user: U
         existing_txns = await db.transactions.count_documents({"transaction_number": {"$regex": f"^TXN-{current_year}-"}})
         payable_txn_number = f"TXN-{current_year}-{existing_txns + 1:04d}"
         
-        purchases_account = await db.accounts.find_one({"name": "Purchases", "is_deleted": False})
+        purchases_account = await find_account_by_name("Purchases")
         if not purchases_account:
             purchases_account = Account(
                 name="Purchases",
@@ -4247,6 +4948,7 @@ async def create_purchase(request: Request, purchase_data: dict, current_user: U
                 created_by=current_user.username
             )
             await db.accounts.insert_one(purchases_account.model_dump())
+            await reference_cache.accounts.invalidate(db)
         
         # Create description based on items or legacy
         if purchase_data["items"]:
@@ -4311,6 +5013,8 @@ async def create_purchase(request: Request, purchase_data: dict, current_user: U
         changes=audit_changes
     )
     
+    await record_purchase(db, purchase_data_dec)
+    
     # Return the created purchase with correct status
     return purchase
 
@@ -4514,6 +5218,8 @@ async def get_purchases(
     customer_id: Optional[str] = None,
     page: int = 1,
     page_size: int = 10,
+    fields: Optional[str] = None,
+    view: Optional[str] = None,
     current_user: User = Depends(require_permission('purchases.view'))
 ):
     """
@@ -4522,7 +5228,10 @@ async def get_purchases(
     New filters:
     - vendor_type: Filter by vendor type ("all", "walk_in", "saved")
     - customer_id: Search by Customer ID (Oman ID) for walk-in vendors
+    
+    Sparse fieldsets: fields=id,date,... and/or view=summary (see fieldsets.py)
     """
+    selected = select_fields(PURCHASE_FIELDSET, fields, view)
     query = {"is_deleted": False}
     
     # Filter by vendor
@@ -4563,7 +5272,10 @@ async def get_purchases(
     total_count = await db.purchases.count_documents(query)
     
     # Get paginated results
-    purchases = await db.purchases.find(query).sort("date", -1).skip(skip).limit(page_size).to_list(page_size)
+    projection = PURCHASE_FIELDSET.projection(selected) if selected else None
+    purchases = await db.purchases.find(query, projection).sort("date", -1).skip(skip).limit(page_size).to_list(page_size)
+    if selected:
+        purchases = [PURCHASE_FIELDSET.trim(selected, p) for p in purchases]
     
     # CRITICAL FIX: Process purchases through decimal_to_float to handle Decimal serialization
     purchases = [decimal_to_float(p) for p in purchases]
@@ -4595,6 +5307,9 @@ async def update_purchase(
             status_code=400,
             detail="Cannot edit locked purchase. Purchase is finalized and fully paid. Locked purchases are immutable to maintain financial integrity."
         )
+    await require_open_period(existing.get('date'), "Purchases")
+    if updates.get("date"):
+        await require_open_period(updates["date"], "Purchases")
     
     # Validate walk-in or saved vendor fields
     is_walk_in = updates.get("is_walk_in", existing.get("is_walk_in", False))
@@ -4726,6 +5441,7 @@ async def update_purchase(
             raise HTTPException(status_code=404, detail="Payment account not found")
     
     # Update purchase
+    updates["updated_at"] = datetime.now(timezone.utc)
     await db.purchases.update_one(
         {"id": purchase_id},
         {"$set": updates}
@@ -4743,6 +5459,8 @@ async def update_purchase(
     
     # Get updated purchase
     updated = await db.purchases.find_one({"id": purchase_id})
+    await record_purchase(db, existing, sign=-1, changed_at=updates["updated_at"])
+    await record_purchase(db, updated)
     return decimal_to_float(updated)
 
 
@@ -4833,9 +5551,12 @@ async def finalize_purchase(purchase_id: str, current_user: User = Depends(requi
 async def get_jobcards(
     page: int = 1,
     page_size: int = 10,
+    fields: Optional[str] = None,
+    view: Optional[str] = None,
     current_user: User = Depends(require_permission('jobcards.view'))
 ):
-    """Get job cards with pagination support"""
+    """Get job cards with pagination support; fields=... / view=summary select columns (see fieldsets.py)"""
+    selected = select_fields(JOBCARD_FIELDSET, fields, view)
     query = {"is_deleted": False, "card_type": {"$ne": "template"}}
     
     # Calculate skip value
@@ -4845,7 +5566,10 @@ async def get_jobcards(
     total_count = await db.jobcards.count_documents(query)
     
     # Get paginated results, sorted by creation date (newest first)
-    jobcards = await db.jobcards.find(query, {"_id": 0}).sort("created_at", -1).skip(skip).limit(page_size).to_list(page_size)
+    projection = JOBCARD_FIELDSET.projection(selected) if selected else {"_id": 0}
+    jobcards = await db.jobcards.find(query, projection).sort("created_at", -1).skip(skip).limit(page_size).to_list(page_size)
+    if selected:
+        jobcards = [JOBCARD_FIELDSET.trim(selected, jobcard) for jobcard in jobcards]
     
     return create_pagination_response(jobcards, total_count, page, page_size)
 
@@ -5464,11 +6188,14 @@ async def get_invoices(
     request: Request,
     page: int = 1,
     page_size: int = 10,
+    fields: Optional[str] = None,
+    view: Optional[str] = None,
     current_user: User = Depends(require_permission('invoices.view'))
 ):
-    """Get invoices with pagination support"""
+    """Get invoices with pagination support; fields=... / view=summary select columns (see fieldsets.py)"""
     if not user_has_permission(current_user, 'invoices.view'):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="You don't have permission to view invoices")
+    selected = select_fields(INVOICE_FIELDSET, fields, view)
     
     query = {"is_deleted": False}
     
@@ -5479,7 +6206,10 @@ async def get_invoices(
     total_count = await db.invoices.count_documents(query)
     
     # Get paginated results
-    invoices = await db.invoices.find(query, {"_id": 0}).sort("date", -1).skip(skip).limit(page_size).to_list(page_size)
+    projection = INVOICE_FIELDSET.projection(selected) if selected else {"_id": 0}
+    invoices = await db.invoices.find(query, projection).sort("date", -1).skip(skip).limit(page_size).to_list(page_size)
+    if selected:
+        invoices = [INVOICE_FIELDSET.trim(selected, invoice) for invoice in invoices]
     
     # Convert Decimal128 to float for JSON serialization
     invoices = [decimal_to_float(invoice) for invoice in invoices]
@@ -5489,6 +6219,8 @@ async def get_invoices(
 @api_router.get("/invoices/returnable")
 async def get_returnable_invoices(
     type: str = "sales",
+    fields: Optional[str] = None,
+    view: Optional[str] = None,
     current_user: User = Depends(require_permission('invoices.view'))
 ):
     """"
@@ -5500,12 +6232,14 @@ async def get_returnable_invoices(
     
     Args:
         type: "sales" or "purchase" to filter invoice type
+        fields / view: sparse fieldset; view=summary leaves out the items arrays
     """
     if not user_has_permission(current_user, 'invoices.view'):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN, 
             detail="You don't have permission to view invoices"
         )
+    selected = select_fields(RETURNABLE_INVOICE_FIELDSET, fields, view)
     
     # Build query filter
     query = {
@@ -5523,9 +6257,10 @@ async def get_returnable_invoices(
         query["invoice_type"] = "purchase"
 
     # Fetch matching invoices with required fields only
-    invoices = await db.invoices.find(
-        query,
-        {
+    if selected:
+        projection = RETURNABLE_INVOICE_FIELDSET.projection(selected)
+    else:
+        projection = {
             "_id": 0,
             "id": 1,
             "invoice_number": 1,
@@ -5537,7 +6272,7 @@ async def get_returnable_invoices(
             "balance_due": 1,
             "items": 1
         }
-    ).sort("date", -1).limit(100).to_list(100)
+    invoices = await db.invoices.find(query, projection).sort("date", -1).limit(100).to_list(100)
 
     # Format response with party name
     formatted_invoices = []
@@ -5547,15 +6282,16 @@ async def get_returnable_invoices(
         
         party_name = inv.get("customer_name") or inv.get("walk_in_name") or "Unknown"
         
-        formatted_invoices.append({
+        row = {
             "id": inv["id"],
-            "invoice_no": inv["invoice_number"],
-            "date": inv["date"].isoformat() if isinstance(inv["date"], datetime) else inv["date"],
+            "invoice_no": inv.get("invoice_number"),
+            "date": inv["date"].isoformat() if isinstance(inv.get("date"), datetime) else inv.get("date"),
             "party_name": party_name,
             "total_amount": float(inv.get("grand_total", 0)) if inv.get("grand_total") else 0.0,
             "balance_amount": float(inv.get("balance_due", 0)) if inv.get("balance_due") else 0.0,
             "items": inv.get("items", [])
-        })
+        }
+        formatted_invoices.append(RETURNABLE_INVOICE_FIELDSET.trim(selected, row) if selected else row)
     
     return formatted_invoices
 @api_router.get("/invoices/{invoice_id}/returnable-items")
@@ -5568,7 +6304,7 @@ async def get_invoice_returnable_items(
     
     This endpoint:
     1. Fetches the invoice and its items
-    2. Calculates already returned quantities/weights from finalized returns
+    2. Reads already returned quantities/weights from the invoice's per-line counters
     3. Returns remaining returnable items (original - already returned)
     
     Returns:
@@ -5590,57 +6326,22 @@ async def get_invoice_returnable_items(
     if not invoice_items:
         return []
     
-    # Fetch all finalized returns for this invoice
-    returns = await db.returns.find({
-        "reference_type": "invoice",
-        "reference_id": invoice_id,
-        "status": "finalized",
-        "is_deleted": False
-    }).to_list(None)
-    
-    # Build a map of already returned quantities by item description and purity
-    # Using description+purity as key since items in returns might not have invoice item IDs
-    returned_map = {}
-    for ret in returns:
-        for ret_item in ret.get('items', []):
-            key = f"{ret_item.get('description', '')}_{ret_item.get('purity', 0)}"
-            if key not in returned_map:
-                returned_map[key] = {
-                    'qty': 0,
-                    'weight_grams': 0.0
-                }
-            returned_map[key]['qty'] += ret_item.get('qty', 0)
-            weight_value = ret_item.get('weight_grams', 0)
-            if isinstance(weight_value, Decimal128):
-                weight_value = float(weight_value.to_decimal())
-            returned_map[key]['weight_grams'] += float(weight_value)
+    # Already returned per line, maintained by finalize_return (backfilled once for older invoices)
+    invoice = await ensure_return_counters(db, 'invoice', invoice)
+    returned_items = invoice.get('returned_items', {})
     
     # Calculate returnable items
     returnable_items = []
-    for item in invoice_items:
-        item_desc = item.get('description', '')
-        item_purity = item.get('purity', 0)
-        key = f"{item_desc}_{item_purity}"
-        
-        # Original quantities - Handle Decimal128
-        original_qty = item.get('qty', 0)
-        
-        net_gold_weight = item.get('net_gold_weight', 0) or item.get('weight', 0)
-        if isinstance(net_gold_weight, Decimal128):
-            original_weight = float(net_gold_weight.to_decimal())
-        else:
-            original_weight = float(net_gold_weight) if net_gold_weight else 0.0
-        
-        line_total = item.get('line_total', 0)
-        if isinstance(line_total, Decimal128):
-            original_amount = float(line_total.to_decimal())
-        else:
-            original_amount = float(line_total) if line_total else 0.0
+    for (line_key, original_qty, original_weight, original_amount, item_desc, item_purity), item in zip(
+        get_return_reference_lines('invoice', invoice), invoice_items
+    ):
+        original_weight = float(original_weight)
+        original_amount = float(original_amount)
         
         # Already returned
-        already_returned = returned_map.get(key, {'qty': 0, 'weight_grams': 0.0})
-        returned_qty = already_returned['qty']
-        returned_weight = already_returned['weight_grams']
+        already_returned = returned_items.get(line_key, {})
+        returned_qty = int(_to_decimal(already_returned.get('qty', 0)))
+        returned_weight = float(_to_decimal(already_returned.get('weight_grams', 0)))
         
         # Calculate remaining
         remaining_qty = original_qty - returned_qty
@@ -5752,6 +6453,8 @@ async def finalize_invoice(invoice_id: str, current_user: User = Depends(require
             status_code=400, 
             detail="Invoice is already finalized"
         )
+    # The invoice keeps its date, which may fall in a closed period's party snapshot
+    await require_open_period(existing.get('date'), "Invoices")
     
     # Parse invoice data
     invoice = Invoice(**decimal_to_float(existing))
@@ -5911,6 +6614,8 @@ async def finalize_invoice(invoice_id: str, current_user: User = Depends(require
     
     # Fetch and return updated invoice
     updated_invoice = await db.invoices.find_one({"id": invoice_id}, {"_id": 0})
+    if updated_invoice.get("status") == "finalized":
+        await record_invoice(db, updated_invoice)
     return decimal_to_float(updated_invoice)
 
 @api_router.post("/invoices/{invoice_id}/add-payment")
@@ -5993,6 +6698,9 @@ async def add_payment_to_invoice(
                 status_code=400, 
                 detail=f"Gold exchange value ({payment_amount:.2f} OMR) exceeds remaining balance ({invoice.balance_due:.2f} OMR)"
             )
+        if new_balance_due < 0.01 and existing.get("status", "draft") == "draft":
+            # Paying a draft in full finalizes it on its original date (see below)
+            await require_open_period(existing.get('date'), "Invoices")
         
         # Check if customer has sufficient gold balance
         gold_in_pipeline = db.gold_ledger.aggregate([
@@ -6054,7 +6762,7 @@ async def add_payment_to_invoice(
         await db.gold_ledger.insert_one(convert_gold_ledger_to_decimal(gold_ledger_entry.model_dump()))
         
         # Fetch or create default account for gold exchange transactions
-        account = await db.accounts.find_one({"name": "Gold Exchange Income", "is_deleted": False}, {"_id": 0})
+        account = await find_account_by_name("Gold Exchange Income")
         if not account:
             # Create default Gold Exchange Income account (INCOME type, not asset)
             account = {
@@ -6068,6 +6776,7 @@ async def add_payment_to_invoice(
                 "is_deleted": False
             }
             await db.accounts.insert_one(account)
+            await reference_cache.accounts.invalidate(db)
         
         account_id = account['id']
         account_name = account['name']
@@ -6277,6 +6986,8 @@ async def add_payment_to_invoice(
             {"id": invoice_id},
             {"$set": update_data}
         )
+        if update_data.get("status") == "finalized":
+            await record_invoice(db, {**existing, **update_data})
         
         # Create audit logs
         await create_audit_log(
@@ -6361,6 +7072,9 @@ async def add_payment_to_invoice(
                 status_code=400, 
                 detail=f"Payment amount ({payment_amount}) exceeds remaining balance ({invoice.balance_due})"
             )
+        if new_balance_due < 0.01 and existing.get("status", "draft") == "draft":
+            # Paying a draft in full finalizes it on its original date (see below)
+            await require_open_period(existing.get('date'), "Invoices")
         
         # Fetch account
         try:
@@ -6420,7 +7134,7 @@ async def add_payment_to_invoice(
         
         # Transaction 2: CREDIT Sales Income (INCOME) - Revenue recognized
         # Get or create Sales Income account
-        sales_account = await db.accounts.find_one({"name": "Sales Income", "is_deleted": False})
+        sales_account = await find_account_by_name("Sales Income")
         if not sales_account:
             sales_account = {
                 "id": str(uuid.uuid4()),
@@ -6433,6 +7147,7 @@ async def add_payment_to_invoice(
                 "is_deleted": False
             }
             await db.accounts.insert_one(sales_account)
+            await reference_cache.accounts.invalidate(db)
         
         credit_transaction = Transaction(
             transaction_number=credit_txn_number,
@@ -6615,6 +7330,8 @@ async def add_payment_to_invoice(
             {"id": invoice_id},
             {"$set": update_data}
         )
+        if update_data.get("status") == "finalized":
+            await record_invoice(db, {**existing, **update_data})
         
         # Create audit logs for both transactions (double-entry)
         await create_audit_log(
@@ -6863,11 +7580,11 @@ async def get_invoice_full_details(invoice_id: str, current_user: User = Depends
         raise HTTPException(status_code=404, detail="Invoice not found")
     
     # Get all payment transactions for this invoice
-    payments = await db.transactions.find({
+    payments = await archive_find(db, 'transactions', {
         "reference_type": "invoice",
         "reference_id": invoice_id,
         "is_deleted": False
-    }, {"_id": 0}).to_list(length=100)
+    }, {"_id": 0}, limit=100)
     
     # Get customer details if saved customer
     customer_details = None
@@ -6892,7 +7609,7 @@ async def get_shop_settings(current_user: User = Depends(get_current_user)):
     """
     Get shop settings for invoice printing. Returns placeholder data if not configured.
     """
-    settings = await db.shop_settings.find_one({}, {"_id": 0})
+    settings = await get_cached_shop_settings()
     if not settings:
         # Return default placeholder settings
         default_settings = ShopSettings()
@@ -6914,6 +7631,7 @@ async def update_shop_settings(settings_data: dict, current_user: User = Depends
         # Create new settings
         new_settings = ShopSettings(**settings_data)
         await db.shop_settings.insert_one(new_settings.model_dump())
+    await reference_cache.shop_settings.invalidate(db)
     
     await create_audit_log(current_user.id, current_user.full_name, "settings", "shop_settings", "update", settings_data)
     return {"message": "Shop settings updated successfully"}
@@ -6972,7 +7690,7 @@ async def create_invoice(invoice_data: dict, current_user: User = Depends(requir
             transaction_number = f"TXN-{year}-{str(txn_count + 1).zfill(4)}"
             
             # Find or create Gold Received account
-            gold_account = await db.accounts.find_one({"name": "Gold Received", "is_deleted": False}, {"_id": 0})
+            gold_account = await find_account_by_name("Gold Received")
             if not gold_account:
                 gold_account = {
                     "id": str(uuid.uuid4()),
@@ -6985,6 +7703,7 @@ async def create_invoice(invoice_data: dict, current_user: User = Depends(requir
                     "is_deleted": False
                 }
                 await db.accounts.insert_one(gold_account)
+                await reference_cache.accounts.invalidate(db)
             
             # Create transaction record
             transaction = Transaction(
@@ -7026,9 +7745,8 @@ async def get_accounts(current_user: User = Depends(require_permission('finance.
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="You don't have permission to view finance data")
     
     accounts = await db.accounts.find({"is_deleted": False}, {"_id": 0}).to_list(1000)
-    # Convert Decimal128 to float for JSON serialization
-    accounts = [decimal_to_float(account) for account in accounts]
-    return accounts
+    # Decimal128 balances are encoded by the response renderer
+    return model_list_response(Account, accounts)
 
 @api_router.get("/accounts/{account_id}", response_model=Account)
 async def get_account(account_id: str, current_user: User = Depends(require_permission('finance.view'))):
@@ -7061,6 +7779,7 @@ async def create_account(account_data: dict, current_user: User = Depends(requir
         # Convert to Decimal128 for precise storage
         account_dict = convert_account_to_decimal(account.model_dump())
         await db.accounts.insert_one(account_dict)
+        await reference_cache.accounts.invalidate(db)
         await create_audit_log(current_user.id, current_user.full_name, "account", account.id, "create")
         return account
     except ValueError as e:
@@ -7088,6 +7807,7 @@ async def update_account(account_id: str, update_data: dict, current_user: User
     # Convert to Decimal128 for precise storage
     update_data = convert_account_to_decimal(update_data)
     await db.accounts.update_one({"id": account_id}, {"$set": update_data})
+    await reference_cache.accounts.invalidate(db)
     await create_audit_log(current_user.id, current_user.full_name, "account", account_id, "update", update_data)
     return {"message": "Account updated successfully"}
 
@@ -7109,8 +7829,9 @@ async def delete_account(request: Request, account_id: str, current_user: User =
             detail=f"Cannot delete protected account '{account_name}'. This account is required for system operations."
         )
     
-    # Check if account has transactions
-    transactions = await db.transactions.find_one({"account_id": account_id, "is_deleted": False})
+    # Check if account has transactions, archived years included
+    transactions = await archive_find(
+        db, 'transactions', {"account_id": account_id, "is_deleted": False}, {"_id": 0, "id": 1}, limit=1)
     if transactions:
         raise HTTPException(status_code=400, detail="Cannot delete account with existing transactions")
     
@@ -7118,6 +7839,7 @@ async def delete_account(request: Request, account_id: str, current_user: User =
         {"id": account_id},
         {"$set": {"is_deleted": True}}
     )
+    await reference_cache.accounts.invalidate(db)
     await create_audit_log(current_user.id, current_user.full_name, "account", account_id, "delete")
     return {"message": "Account deleted successfully"}
 
@@ -7164,8 +7886,7 @@ async def get_transactions(
     
     # Account type filter (cash vs bank)
     if account_type:
-        accounts = await db.accounts.find({"account_type": account_type, "is_deleted": False}, {"_id": 0}).to_list(1000)
-        account_ids = [acc['id'] for acc in accounts]
+        account_ids = [acc.id for acc in (await reference_cache.accounts.get(db)).of_type(account_type)]
         if account_ids:
             query["account_id"] = {"$in": account_ids}
         else:
@@ -7176,20 +7897,22 @@ async def get_transactions(
     skip = (page - 1) * page_size
     
     # Get total count for pagination
-    total_count = await db.transactions.count_documents(query)
+    total_count = await archive_count(db, 'transactions', query)
     
     # Get paginated results sorted by date (newest first)
-    transactions = await db.transactions.find(query, {"_id": 0}).sort("date", -1).skip(skip).limit(page_size).to_list(page_size)
+    transactions = await archive_find(db, 'transactions', query, {"_id": 0}, sort=[("date", -1)], skip=skip, limit=page_size)
     
     # Enhance each transaction with account type and running balance
+    # (balances change on every posting, so they are read here in one query, not cached)
+    page_account_ids = list({txn['account_id'] for txn in transactions if txn.get('account_id')})
     account_cache = {}
+    if page_account_ids:
+        page_accounts = await db.accounts.find(
+            {"id": {"$in": page_account_ids}},
+            {"_id": 0}
+        ).to_list(None)
+        account_cache = {acc['id']: acc for acc in page_accounts}
     for txn in transactions:
-        # Get account details
-        if txn['account_id'] not in account_cache:
-            account = await db.accounts.find_one({"id": txn['account_id']}, {"_id": 0})
-            if account:
-                account_cache[txn['account_id']] = account
-        
         if txn['account_id'] in account_cache:
             account = account_cache[txn['account_id']]
             txn['account_type'] = account['account_type']
@@ -7210,14 +7933,26 @@ async def get_transactions(
     
     # Calculate running balance for display
     # For simplicity, we'll calculate the balance at the time of transaction
-    # by getting all transactions for that account up to that date
+    # by getting all transactions for that account up to that date.
+    # Transactions before the nearest closed accounting period are not re-read:
+    # the account's credit/debit totals from that period's snapshot are carried instead.
+    periods = await closed_periods(db)
+    carried_totals = {}
     for txn in transactions:
+        period = None
+        for closed in periods:
+            if isinstance(txn['date'], datetime) and closed['ends_before'] <= txn['date']:
+                period = closed
+        
         # Get all transactions for this account up to and including this transaction date
-        prior_txns = await db.transactions.find({
+        date_filter = {"$lte": txn['date']}
+        if period:
+            date_filter["$gte"] = period['ends_before']
+        prior_txns = await archive_find(db, 'transactions', {
             "account_id": txn['account_id'],
             "is_deleted": False,
-            "date": {"$lte": txn['date']}
-        }, {"_id": 0}).sort("date", 1).to_list(10000)
+            "date": date_filter
+        }, {"_id": 0}, sort=[("date", 1)], limit=10000)
         
         # Get the account's opening balance
         account = account_cache.get(txn['account_id'])
@@ -7230,6 +7965,14 @@ async def get_transactions(
         else:
             running_balance = 0.0
         
+        if period:
+            carried_key = (period['period'], txn['account_id'])
+            if carried_key not in carried_totals:
+                carried = await carried_account_totals(db, period['period'], [txn['account_id']])
+                carried_totals[carried_key] = carried.get(txn['account_id'])
+            if carried_totals[carried_key]:
+                running_balance += float(carried_totals[carried_key]['credit'] - carried_totals[carried_key]['debit'])
+        
         # Calculate running balance up to current transaction
         balance_before = running_balance
         for pt in prior_txns:
@@ -7299,6 +8042,7 @@ async def create_transaction(transaction_data: dict, current_user: User = Depend
         account_name=account['name'],
         created_by=current_user.id
     )
+    await require_open_period(transaction.date, "Transactions")
     
     await db.transactions.insert_one(convert_transaction_to_decimal(transaction.model_dump()))
     
@@ -7368,7 +8112,7 @@ async def get_transactions_summary(
             query["account_id"] = account_id
         
         # Get all transactions matching the query
-        transactions = await db.transactions.find(query, {"_id": 0}).to_list(10000)
+        transactions = await archive_find(db, 'transactions', query, {"_id": 0}, limit=10000)
         
         # Calculate totals
         total_credit = 0.0
@@ -7406,10 +8150,10 @@ async def get_transactions_summary(
         
         # Get accounts to determine cash vs bank
         try:
-            accounts = await db.accounts.find({"is_deleted": False}, {"_id": 0}).to_list(1000)
-            account_types = {acc['id']: acc.get('account_type', 'unknown') for acc in accounts if 'id' in acc}
+            account_directory = await reference_cache.accounts.get(db)
+            account_types = account_directory.type_map()
             # FIX: Also get account names to properly identify cash/bank accounts
-            account_names = {acc['id']: acc.get('name', '').lower() for acc in accounts if 'id' in acc}
+            account_names = {acc_id: name.lower() for acc_id, name in account_directory.name_map().items()}
         except Exception:
             account_types = {}
             account_names = {}
@@ -7569,6 +8313,7 @@ async def create_daily_closing(closing_data: dict, current_user: User = Depends(
             target_date = closing_date
         else:
             raise ValueError("Invalid date format")
+        await ensure_period_open(db, target_date, "Daily closings")
         
         # Check if we need to auto-calculate fields
         needs_calculation = (
@@ -7590,20 +8335,21 @@ async def create_daily_closing(closing_data: dict, current_user: User = Depends(
                           "$lte": previous_date.replace(hour=23, minute=59, second=59, tzinfo=timezone.utc)}},
                 {"_id": 0}
             )
-            opening_cash = round(previous_closing['actual_closing'], 3) if previous_closing else 0.0
+            opening_cash = round(safe_float(previous_closing['actual_closing']), 3) if previous_closing else 0.0
             
             # Get all transactions for the target date
-            transactions = await db.transactions.find(
+            transactions = await archive_find(
+                db, 'transactions',
                 {
                     "date": {"$gte": start_of_day, "$lte": end_of_day},
                     "is_deleted": False
                 },
                 {"_id": 0}
-            ).to_list(None)
+            )
             
             # Calculate total credit and debit
-            total_credit = round(sum(t['amount'] for t in transactions if t['transaction_type'] == 'credit'), 3)
-            total_debit = round(sum(t['amount'] for t in transactions if t['transaction_type'] == 'debit'), 3)
+            total_credit = round(sum(safe_float(t['amount']) for t in transactions if t['transaction_type'] == 'credit'), 3)
+            total_debit = round(sum(safe_float(t['amount']) for t in transactions if t['transaction_type'] == 'debit'), 3)
             expected_closing = round(opening_cash + total_credit - total_debit, 3)
             
             # Update closing_data with calculated values
@@ -7650,20 +8396,21 @@ async def calculate_daily_closing(date: str, current_user: User = Depends(requir
                       "$lte": previous_date.replace(hour=23, minute=59, second=59, tzinfo=timezone.utc)}},
             {"_id": 0}
         )
-        opening_cash = previous_closing['actual_closing'] if previous_closing else 0.0
+        opening_cash = safe_float(previous_closing['actual_closing']) if previous_closing else 0.0
         
         # Get all transactions for the target date
-        transactions = await db.transactions.find(
+        transactions = await archive_find(
+            db, 'transactions',
             {
                 "date": {"$gte": start_of_day, "$lte": end_of_day},
                 "is_deleted": False
             },
             {"_id": 0}
-        ).to_list(None)
+        )
         
         # Calculate total credit and debit
-        total_credit = sum(t['amount'] for t in transactions if t['transaction_type'] == 'credit')
-        total_debit = sum(t['amount'] for t in transactions if t['transaction_type'] == 'debit')
+        total_credit = sum(safe_float(t['amount']) for t in transactions if t['transaction_type'] == 'credit')
+        total_debit = sum(safe_float(t['amount']) for t in transactions if t['transaction_type'] == 'debit')
         
         # Round to 3 decimal places (OMR standard)
         opening_cash = round(opening_cash, 3)
@@ -7671,6 +8418,12 @@ async def calculate_daily_closing(date: str, current_user: User = Depends(requir
         total_debit = round(total_debit, 3)
         expected_closing = round(opening_cash + total_credit - total_debit, 3)
         
+        try:
+            await ensure_period_open(db, start_of_day)
+            period_closed = False
+        except PeriodClosedError:
+            period_closed = True
+        
         return {
             "date": date,
             "opening_cash": opening_cash,
@@ -7680,7 +8433,8 @@ async def calculate_daily_closing(date: str, current_user: User = Depends(requir
             "transaction_count": len(transactions),
             "credit_count": sum(1 for t in transactions if t['transaction_type'] == 'credit'),
             "debit_count": sum(1 for t in transactions if t['transaction_type'] == 'debit'),
-            "has_previous_closing": previous_closing is not None
+            "has_previous_closing": previous_closing is not None,
+            "period_closed": period_closed
         }
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
@@ -7704,6 +8458,7 @@ async def update_daily_closing(closing_id: str, update_data: dict, current_user:
         # Check if record is locked
         if existing_closing.get('is_locked', False) and not update_data.get('is_locked') == False:
             raise HTTPException(status_code=403, detail="Cannot update a locked daily closing record")
+        await require_open_period(existing_closing.get('date'), "Daily closings")
         
         # If actual_closing is being updated, recalculate difference
         if 'actual_closing' in update_data:
@@ -7733,11 +8488,162 @@ async def update_daily_closing(closing_id: str, update_data: dict, current_user:
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to update daily closing: {str(e)}")
 
-@api_router.get("/audit-logs")
-async def get_audit_logs(
-    module: Optional[str] = None,
-    action: Optional[str] = None,
-    user_id: Optional[str] = None,
+# ============================================================================
+# ACCOUNTING PERIOD CLOSE
+# ============================================================================
+
+async def require_open_period(date, what: str = "Entries"):
+    """400 when date falls in a closed accounting period (see period_close.py)"""
+    try:
+        await ensure_period_open(db, date, what)
+    except PeriodClosedError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@api_router.get("/accounting-periods")
+async def get_accounting_periods(current_user: User = Depends(require_permission('finance.view'))):
+    """Closed accounting periods, oldest first, and the date the books are closed before"""
+    periods = await closed_periods(db)
+    return {
+        "items": periods,
+        "closed_before": periods[-1]["ends_before"] if periods else None
+    }
+
+
+@api_router.post("/accounting-periods/close", status_code=201)
+async def close_accounting_period(close_data: dict, current_user: User = Depends(require_permission('finance.create'))):
+    """
+    Close a month ("YYYY-MM") or fiscal year ("YYYY") (admin only).
+    Freezes transactions dated in it and snapshots per-account and per-party closing balances.
+    """
+    if current_user.role != 'admin':
+        raise HTTPException(status_code=403, detail="Only administrators can close accounting periods")
+    try:
+        period = parse_period(close_data.get('period'))
+        record = await close_period(db, period, current_user.id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    await create_audit_log(current_user.id, current_user.full_name, "accounting_period", period.key, "close", {
+        "kind": period.kind,
+        "ends_before": period.ends_before.isoformat(),
+        "accounts_count": record["accounts_count"],
+        "parties_count": record["parties_count"]
+    })
+    return record
+
+
+@api_router.delete("/accounting-periods/{period}")
+async def reopen_accounting_period(period: str, current_user: User = Depends(require_permission('finance.delete'))):
+    """Reopen the latest closed month (admin only). Fiscal year closes are permanent."""
+    if current_user.role != 'admin':
+        raise HTTPException(status_code=403, detail="Only administrators can reopen accounting periods")
+    try:
+        await reopen_period(db, period)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    await create_audit_log(current_user.id, current_user.full_name, "accounting_period", period, "reopen")
+    return {"message": f"Period {period} reopened"}
+
+
+@api_router.get("/accounting-periods/{period}/balances")
+async def get_accounting_period_balances(
+    period: str,
+    entity_type: str = 'account',
+    page: int = Query(1, ge=1),
+    page_size: int = Query(100, ge=1, le=1000),
+    current_user: User = Depends(require_permission('finance.view'))
+):
+    """Closing balances of every account or party as frozen when the period was closed"""
+    if entity_type not in ('account', 'party'):
+        raise HTTPException(status_code=400, detail="entity_type must be 'account' or 'party'")
+    if not await db[ACCOUNTING_PERIODS_COLLECTION].find_one({"period": period}, {"_id": 1}):
+        raise HTTPException(status_code=404, detail=f"Period {period} is not closed")
+    query = {"period": period, "entity_type": entity_type}
+    total_count, rows = await run_query_batch(
+        lambda: db[PERIOD_BALANCES_COLLECTION].count_documents(query),
+        lambda: db[PERIOD_BALANCES_COLLECTION].find(query, {"_id": 0}).sort("entity_id", 1)
+            .skip((page - 1) * page_size).limit(page_size).to_list(page_size),
+    )
+    return create_pagination_response(decimal_to_float(rows), total_count, page, page_size)
+
+
+@api_router.post("/archive/run")
+async def run_history_archive(current_user: User = Depends(get_current_user)):
+    """
+    Move transactions, stock movements and audit logs of fully closed years into
+    per-year archive collections (admin only). Reports keep reading them.
+    """
+    if current_user.role != 'admin':
+        raise HTTPException(status_code=403, detail="Only administrators can archive history")
+    until = await archivable_before(db)
+    if not until:
+        raise HTTPException(status_code=400, detail="No closed accounting period ends in a past year; nothing to archive")
+    result = await archive_history(db, ARCHIVE_SPECS, until)
+    await create_audit_log(current_user.id, current_user.full_name, "archive", until.date().isoformat(), "archive", {
+        collection: sum(years.values()) for collection, years in result["moved"].items()
+    })
+    return result
+
+
+@api_router.get("/archive/status")
+async def get_history_archive_status(current_user: User = Depends(get_current_user)):
+    """Archived collections with their archive boundary and document counts (admin only)"""
+    if current_user.role != 'admin':
+        raise HTTPException(status_code=403, detail="Only administrators can view the history archive")
+    return {"items": await archive_status(db), "archivable_before": await archivable_before(db)}
+
+
+def select_columnar_specs(collections: Optional[str]) -> List[ColumnarSpec]:
+    """Specs of a comma-separated collection list (all when empty); 400 on unknown names"""
+    if not collections:
+        return COLUMNAR_SPECS
+    names = [name.strip() for name in collections.split(',') if name.strip()]
+    specs = {spec.collection: spec for spec in COLUMNAR_SPECS}
+    unknown = [name for name in names if name not in specs]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown collections: {', '.join(unknown)}. Exportable: {', '.join(specs)}"
+        )
+    return [specs[name] for name in names]
+
+
+@api_router.post("/exports/columnar/run")
+async def run_columnar_export(
+    collections: Optional[str] = None,
+    full: bool = False,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Write transactions, invoices, stock movements and the gold ledger to
+    partitioned Parquet files for offline analytics (admin only). Exports the
+    documents created since the previous run, or everything when full=true.
+    """
+    if current_user.role != 'admin':
+        raise HTTPException(status_code=403, detail="Only administrators can run columnar exports")
+    try:
+        results = await export_columnar(db, select_columnar_specs(collections), full=full)
+    except ExportRunningError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    await create_audit_log(current_user.id, current_user.full_name, "columnar_export", "full" if full else "incremental",
+                           "export", {result["collection"]: result["rows"] for result in results})
+    return {"items": results}
+
+
+@api_router.get("/exports/columnar/status")
+async def get_columnar_export_status(current_user: User = Depends(get_current_user)):
+    """High-water mark and Parquet files of each exported collection (admin only)"""
+    if current_user.role != 'admin':
+        raise HTTPException(status_code=403, detail="Only administrators can view columnar exports")
+    return {"items": await columnar_export_status(db, COLUMNAR_SPECS)}
+
+@api_router.get("/audit-logs")
+async def get_audit_logs(
+    module: Optional[str] = None,
+    action: Optional[str] = None,
+    user_id: Optional[str] = None,
     date_from: Optional[str] = None,
     date_to: Optional[str] = None,
     page: int = 1,
@@ -7794,26 +8700,40 @@ async def get_audit_logs(
     skip = (page - 1) * page_size
     
     # Get total count for pagination
-    total_count = await db.audit_logs.count_documents(query)
+    total_count = await archive_count(db, 'audit_logs', query)
     
     # Get paginated results
-    logs = await db.audit_logs.find(query, {"_id": 0}).sort("timestamp", -1).skip(skip).limit(page_size).to_list(page_size)
+    logs = await archive_find(db, 'audit_logs', query, {"_id": 0}, sort=[("timestamp", -1)], skip=skip, limit=page_size)
     
     return create_pagination_response(logs, total_count, page, page_size)
 
+def require_export_format(format: str, allowed: Tuple[str, ...] = ROW_EXPORT_FORMATS):
+    """400 unless format is one of the formats the export supports"""
+    if format not in allowed:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(allowed)}")
+
+INVENTORY_EXPORT_COLUMNS = [
+    ("Date", "date"), ("Type", "movement_type"), ("Category", "header_name"), ("Description", "description"),
+    ("Quantity", "qty_delta"), ("Weight (g)", "weight_delta"), ("Purity", "purity"), ("Notes", "notes")
+]
+
 @api_router.get("/reports/inventory-export")
 async def export_inventory(
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
     movement_type: Optional[str] = None,
     category: Optional[str] = None,
+    format: str = Query('xlsx'),
     current_user: User = Depends(require_permission('reports.view'))
 ):
+    """Export inventory movements as Excel, or streamed CSV/NDJSON (format=csv|ndjson)"""
     from fastapi.responses import StreamingResponse
     from io import BytesIO
     import openpyxl
     from openpyxl.styles import Font, Alignment, PatternFill
     
+    require_export_format(format)
+    
     # Build query with filters
     query = {"is_deleted": False}
     if start_date:
@@ -7829,8 +8749,16 @@ async def export_inventory(
     if category:
         query['header_name'] = category
     
+    if format != 'xlsx':
+        movements = await archive_aggregate(
+            db, 'stock_movements', [{"$match": query}, {"$sort": {"date": -1}}, {"$project": {"_id": 0}}],
+            batchSize=EXPORT_BATCH_SIZE
+        )
+        return row_export_response(format, INVENTORY_EXPORT_COLUMNS, movements, "inventory_export")
+    
     # Get filtered inventory data
-    movements = await db.stock_movements.find(query, {"_id": 0}).sort("date", -1).to_list(10000)
+    movements = await archive_find(db, 'stock_movements', query, {"_id": 0}, sort=[("date", -1)], limit=10000)
+    movements = [decimal_to_float(m) for m in movements]
     
     # Create workbook
     wb = openpyxl.Workbook()
@@ -7871,28 +8799,117 @@ async def export_inventory(
         headers={"Content-Disposition": "attachment; filename=inventory_export.xlsx"}
     )
 
+PARTIES_REPORT_SORTS = {
+    "outstanding_desc": {"outstanding": -1, "name_key": 1, "id": 1},
+    "name_asc": {"name_key": 1, "id": 1},
+}
+
+async def fetch_parties_report(
+    party_type: Optional[str] = None,
+    sort_by: Optional[str] = None,
+    skip: int = 0,
+    limit: Optional[int] = None
+) -> Tuple[list, int]:
+    """
+    Load parties with their outstanding invoice balance in one aggregation.
+    
+    Outstanding is summed per party by a $lookup/$unwind/$group on invoices (customer_id),
+    so sorting and pagination by outstanding happen in MongoDB instead of one
+    invoice query per party. Shared by the parties view, Excel and PDF reports.
+    
+    Returns:
+        (parties, total_count) where parties is the requested page (float values)
+    """
+    query, pipeline = parties_report_pipeline(party_type, sort_by, skip, limit)
+    
+    if skip or limit is not None:
+        parties, total_count = await run_query_batch(
+            lambda: db.parties.aggregate(pipeline).to_list(None),
+            lambda: db.parties.count_documents(query),
+        )
+    else:
+        parties = await db.parties.aggregate(pipeline).to_list(None)
+        total_count = len(parties)
+    
+    parties = [decimal_to_float(party) for party in parties]
+    for party in parties:
+        party['outstanding'] = safe_float(party.get('outstanding', 0))
+    return parties, total_count
+
+def parties_report_pipeline(
+    party_type: Optional[str] = None,
+    sort_by: Optional[str] = None,
+    skip: int = 0,
+    limit: Optional[int] = None
+) -> Tuple[dict, list]:
+    """(party query, aggregation of the parties with their outstanding) of the parties report"""
+    query = {"is_deleted": False}
+    if party_type:
+        query['party_type'] = party_type
+    
+    # localField/foreignField join unwound right away: MongoDB coalesces the two
+    # stages, so a party's invoices are never held as one array, and the $group
+    # folds them back into one document per party with its outstanding
+    pipeline = [
+        {"$match": query},
+        {"$lookup": {
+            "from": "invoices",
+            "localField": "id",
+            "foreignField": "customer_id",
+            "as": "_invoice"
+        }},
+        {"$unwind": {"path": "$_invoice", "preserveNullAndEmptyArrays": True}},
+        {"$group": {
+            "_id": "$_id",
+            "party": {"$first": "$$ROOT"},
+            "outstanding": {"$sum": {"$cond": [
+                {"$eq": ["$_invoice.is_deleted", False]}, {"$ifNull": ["$_invoice.balance_due", 0]}, 0
+            ]}}
+        }},
+        {"$addFields": {"party.outstanding": "$outstanding"}},
+        {"$replaceRoot": {"newRoot": "$party"}},
+        {"$addFields": {"name_key": {"$toLower": {"$ifNull": ["$name", ""]}}}},
+        # $group does not keep the party order; without a report sort, keep insertion order
+        {"$sort": PARTIES_REPORT_SORTS.get(sort_by, {"_id": 1})},
+    ]
+    if skip:
+        pipeline.append({"$skip": skip})
+    if limit is not None:
+        pipeline.append({"$limit": limit})
+    pipeline.append({"$project": {"_id": 0, "_invoice": 0, "name_key": 0, "search_keys": 0}})
+    return query, pipeline
+
+PARTIES_EXPORT_COLUMNS = [
+    ("Name", "name"), ("Phone", "phone"), ("Type", "party_type"), ("Address", "address"), ("Notes", "notes"),
+    ("Created At", "created_at"), ("Outstanding", "outstanding")
+]
+
 @api_router.get("/reports/parties-export")
 async def export_parties(
     party_type: Optional[str] = None,
+    sort_by: Optional[str] = None,
+    format: str = Query('xlsx'),
     current_user: User = Depends(require_permission('reports.view'))
 ):
+    """Export parties with their outstanding as Excel, or streamed CSV/NDJSON (format=csv|ndjson)"""
     from fastapi.responses import StreamingResponse
     from io import BytesIO
     import openpyxl
     from openpyxl.styles import Font, PatternFill
     
-    # Build query with filters
-    query = {"is_deleted": False}
-    if party_type:
-        query['party_type'] = party_type
+    require_export_format(format)
+    if format != 'xlsx':
+        _query, pipeline = parties_report_pipeline(party_type=party_type, sort_by=sort_by)
+        parties = db.parties.aggregate(pipeline, batchSize=EXPORT_BATCH_SIZE)
+        return row_export_response(format, PARTIES_EXPORT_COLUMNS, parties, "parties_export")
     
-    parties = await db.parties.find(query, {"_id": 0}).to_list(10000)
+    parties, _total_count = await fetch_parties_report(party_type=party_type, sort_by=sort_by)
     
     wb = openpyxl.Workbook()
     ws = wb.active
     ws.title = "Parties"
     
-    headers = ["Name", "Phone", "Type", "Address", "Notes", "Created At"]
+    headers = ["Name", "Phone", "Type", "Address", "Notes", "Created At", "Outstanding"]
     for col, header in enumerate(headers, 1):
         cell = ws.cell(row=1, column=col, value=header)
         cell.font = Font(bold=True, color="FFFFFF")
@@ -7905,8 +8922,9 @@ async def export_parties(
         ws.cell(row=row_idx, column=4, value=party.get('address', ''))
         ws.cell(row=row_idx, column=5, value=party.get('notes', ''))
         ws.cell(row=row_idx, column=6, value=str(party.get('created_at', ''))[:10])
+        ws.cell(row=row_idx, column=7, value=party.get('outstanding', 0))
     
-    for col in range(1, 7):
+    for col in range(1, 8):
         ws.column_dimensions[openpyxl.utils.get_column_letter(col)].width = 20
     
     buffer = BytesIO()
@@ -7919,12 +8937,45 @@ async def export_parties(
         headers={"Content-Disposition": "attachment; filename=parties_export.xlsx"}
     )
 
+INVOICE_EXPORT_BATCH_SIZE = 1000
+INVOICE_EXPORT_SUMMARY_PROJECTION = {
+    "_id": 0, "invoice_number": 1, "date": 1, "walk_in_name": 1, "customer_name": 1, "customer_type": 1,
+    "invoice_type": 1, "status": 1, "grand_total": 1, "paid_amount": 1, "balance_due": 1, "payment_status": 1
+}
+INVOICE_EXPORT_ITEM_FIELDS = (
+    "category", "description", "qty", "purity", "weight", "metal_rate", "gold_value", "making_value",
+    "vat_percent", "vat_amount", "line_total"
+)
+INVOICE_EXPORT_COLUMNS = [
+    ("Invoice #", "invoice_number"), ("Date", "date"), ("Customer", "customer"), ("Customer Type", "customer_type"),
+    ("Type", "invoice_type"), ("Status", "status"), ("Grand Total", "grand_total"), ("Paid Amount", "paid_amount"),
+    ("Balance Due", "balance_due"), ("Payment Status", "payment_status")
+]
+
+
+def invoice_export_rows_pipeline(query: dict) -> list:
+    """
+    Matched invoices newest first, one document per line item (item_index 0 on
+    an invoice's first), and one without items for an invoice that has none
+    """
+    return [
+        {"$match": query},
+        {"$sort": {"date": -1}},
+        {"$project": {
+            **INVOICE_EXPORT_SUMMARY_PROJECTION, "vat_total": 1,
+            **{f"items.{name}": 1 for name in INVOICE_EXPORT_ITEM_FIELDS}
+        }},
+        {"$unwind": {"path": "$items", "includeArrayIndex": "item_index", "preserveNullAndEmptyArrays": True}},
+    ]
+
+
 @api_router.get("/reports/invoices-export")
 async def export_invoices(
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
     invoice_type: Optional[str] = None,
     payment_status: Optional[str] = None,
+    format: str = Query('xlsx'),
     current_user: User = Depends(require_permission('reports.view'))
 ):
     """
@@ -7933,12 +8984,20 @@ async def export_invoices(
     - Sheet 2: Line Items (detailed breakdown)
     - Sheet 3: Totals & Statistics
     
-    All numeric columns are proper numbers (not strings) for Excel calculations
+    All numeric columns are proper numbers (not strings) for Excel calculations.
+    One pass over an $unwind of the items fills the summary and line item sheets
+    of a write-only workbook and accumulates the totals, so memory stays bounded
+    for year-end exports and the invoices are read once.
+    
+    format=csv|ndjson streams the Invoice Summary rows instead.
     """
     from fastapi.responses import StreamingResponse
-    from io import BytesIO
+    import tempfile
     import openpyxl
-    from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font, PatternFill, Alignment
+    
+    require_export_format(format)
     
     # Build query with filters
     query = {"is_deleted": False}
@@ -7955,192 +9014,183 @@ async def export_invoices(
     if payment_status:
         query['payment_status'] = payment_status
     
-    invoices = await db.invoices.find(query, {"_id": 0}).sort("date", -1).to_list(10000)
+    if format != 'xlsx':
+        async def invoice_rows():
+            cursor = db.invoices.find(query, INVOICE_EXPORT_SUMMARY_PROJECTION).sort("date", -1) \
+                .batch_size(INVOICE_EXPORT_BATCH_SIZE)
+            async for inv in cursor:
+                yield {**inv, "customer": inv.get('walk_in_name') or inv.get('customer_name', 'N/A')}
+        return row_export_response(format, INVOICE_EXPORT_COLUMNS, invoice_rows(), "invoices_export")
     
-    # Convert Decimal128 to float for Excel export calculations
-    invoices = [decimal_to_float(inv) for inv in invoices]
+    # Write-only workbook: rows go straight to temp files instead of being kept as cells
+    wb = openpyxl.Workbook(write_only=True)
     
-    wb = openpyxl.Workbook()
+    header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
+    header_font = Font(bold=True, color="FFFFFF")
+    
+    def header_row(ws, headers):
+        cells = []
+        for header in headers:
+            cell = WriteOnlyCell(ws, value=header)
+            cell.font = header_font
+            cell.fill = header_fill
+            cell.alignment = Alignment(horizontal='center', vertical='center')
+            cells.append(cell)
+        return cells
     
     # ===========================================================================
     # SHEET 1: Invoice Summary
     # ===========================================================================
-    ws1 = wb.active
-    ws1.title = "Invoice Summary"
+    ws1 = wb.create_sheet("Invoice Summary")
+    
+    # Column widths must be set before the first row is written
+    for col, width in zip("ABCDEFGHIJ", [15, 12, 25, 15, 10, 12, 15, 15, 15, 15]):
+        ws1.column_dimensions[col].width = width
     
-    # Headers with styling
-    summary_headers = [
+    ws1.append(header_row(ws1, [
         "Invoice #", "Date", "Customer", "Customer Type", "Type", 
         "Status", "Grand Total", "Paid Amount", "Balance Due", "Payment Status"
-    ]
-    
-    header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-    header_font = Font(bold=True, color="FFFFFF")
-    
-    for col, header in enumerate(summary_headers, 1):
-        cell = ws1.cell(row=1, column=col, value=header)
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = Alignment(horizontal='center', vertical='center')
-    
-    # Data rows with proper data types
-    for row_idx, inv in enumerate(invoices, 2):
-        ws1.cell(row=row_idx, column=1, value=inv.get('invoice_number', ''))
-        ws1.cell(row=row_idx, column=2, value=str(inv.get('date', ''))[:10])
-        
-        # Customer name (handle walk-in)
-        customer_name = inv.get('walk_in_name') or inv.get('customer_name', 'N/A')
-        ws1.cell(row=row_idx, column=3, value=customer_name)
-        ws1.cell(row=row_idx, column=4, value=inv.get('customer_type', 'walk_in'))
-        ws1.cell(row=row_idx, column=5, value=inv.get('invoice_type', ''))
-        ws1.cell(row=row_idx, column=6, value=inv.get('status', 'draft'))
-        
-        # Numeric columns (proper numbers, not strings)
-        ws1.cell(row=row_idx, column=7, value=float(inv.get('grand_total', 0)))
-        ws1.cell(row=row_idx, column=8, value=float(inv.get('paid_amount', 0)))
-        ws1.cell(row=row_idx, column=9, value=float(inv.get('balance_due', 0)))
-        ws1.cell(row=row_idx, column=10, value=inv.get('payment_status', ''))
-    
-    # Set column widths
-    ws1.column_dimensions['A'].width = 15
-    ws1.column_dimensions['B'].width = 12
-    ws1.column_dimensions['C'].width = 25
-    ws1.column_dimensions['D'].width = 15
-    ws1.column_dimensions['E'].width = 10
-    ws1.column_dimensions['F'].width = 12
-    ws1.column_dimensions['G'].width = 15
-    ws1.column_dimensions['H'].width = 15
-    ws1.column_dimensions['I'].width = 15
-    ws1.column_dimensions['J'].width = 15
+    ]))
     
     # ===========================================================================
     # SHEET 2: Invoice Line Items (Detailed)
     # ===========================================================================
-    ws2 = wb.create_sheet(title="Invoice Line Items")
+    ws2 = wb.create_sheet("Invoice Line Items")
     
-    line_item_headers = [
+    for col in "ABCDE":
+        ws2.column_dimensions[col].width = 15
+    for col in "FGHIJKLMN":
+        ws2.column_dimensions[col].width = 12
+    
+    ws2.append(header_row(ws2, [
         "Invoice #", "Date", "Customer", "Item Category", "Description", 
         "Qty", "Purity", "Weight (g)", "Gold Rate", "Gold Value", 
         "Making Charge", "VAT %", "VAT Amount", "Line Total"
-    ]
-    
-    for col, header in enumerate(line_item_headers, 1):
-        cell = ws2.cell(row=1, column=col, value=header)
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = Alignment(horizontal='center', vertical='center')
+    ]))
     
-    # Populate line items from all invoices
-    current_row = 2
-    for inv in invoices:
-        invoice_number = inv.get('invoice_number', '')
-        invoice_date = str(inv.get('date', ''))[:10]
-        customer_name = inv.get('walk_in_name') or inv.get('customer_name', 'N/A')
-        
-        for item in inv.get('items', []):
-            ws2.cell(row=current_row, column=1, value=invoice_number)
-            ws2.cell(row=current_row, column=2, value=invoice_date)
-            ws2.cell(row=current_row, column=3, value=customer_name)
-            ws2.cell(row=current_row, column=4, value=item.get('category', ''))
-            ws2.cell(row=current_row, column=5, value=item.get('description', ''))
-            
+    # One summary row per invoice (on its first item) and one line item row per item
+    invoice_count = 0
+    totals = {name: Decimal('0') for name in ("metal", "making", "vat", "grand_total", "paid", "outstanding")}
+    rows_cursor = db.invoices.aggregate(invoice_export_rows_pipeline(query), batchSize=INVOICE_EXPORT_BATCH_SIZE)
+    async for inv in rows_cursor:
+        customer = inv.get('walk_in_name') or inv.get('customer_name', 'N/A')
+        if not inv.get('item_index'):
+            ws1.append([
+                inv.get('invoice_number', ''),
+                str(inv.get('date', ''))[:10],
+                customer,
+                inv.get('customer_type', 'walk_in'),
+                inv.get('invoice_type', ''),
+                inv.get('status', 'draft'),
+                # Numeric columns (proper numbers, not strings)
+                safe_float(inv.get('grand_total', 0)),
+                safe_float(inv.get('paid_amount', 0)),
+                safe_float(inv.get('balance_due', 0)),
+                inv.get('payment_status', '')
+            ])
+            invoice_count += 1
+            for total, field in (("vat", "vat_total"), ("grand_total", "grand_total"), ("paid", "paid_amount"),
+                                 ("outstanding", "balance_due")):
+                totals[total] += _to_decimal(inv.get(field))
+        item = inv.get('items')
+        if not isinstance(item, dict):
+            continue
+        ws2.append([
+            inv.get('invoice_number', ''),
+            str(inv.get('date', ''))[:10],
+            customer,
+            item.get('category', ''),
+            item.get('description', ''),
             # Numeric values
-            ws2.cell(row=current_row, column=6, value=int(item.get('qty', 1)))
-            ws2.cell(row=current_row, column=7, value=int(item.get('purity', 916)))
-            ws2.cell(row=current_row, column=8, value=float(item.get('weight', 0)))
-            ws2.cell(row=current_row, column=9, value=float(item.get('metal_rate', 0)))
-            ws2.cell(row=current_row, column=10, value=float(item.get('gold_value', 0)))
-            ws2.cell(row=current_row, column=11, value=float(item.get('making_value', 0)))
-            ws2.cell(row=current_row, column=12, value=float(item.get('vat_percent', 5)))
-            ws2.cell(row=current_row, column=13, value=float(item.get('vat_amount', 0)))
-            ws2.cell(row=current_row, column=14, value=float(item.get('line_total', 0)))
-            
-            current_row += 1
-    
-    # Set column widths for line items
-    for col in ['A', 'B', 'C', 'D', 'E']:
-        ws2.column_dimensions[col].width = 15
-    for col in ['F', 'G', 'H', 'I', 'J', 'K', 'L', 'M', 'N']:
-        ws2.column_dimensions[col].width = 12
+            int(safe_float(item.get('qty', 1))),
+            int(safe_float(item.get('purity', 916))),
+            safe_float(item.get('weight', 0)),
+            safe_float(item.get('metal_rate', 0)),
+            safe_float(item.get('gold_value', 0)),
+            safe_float(item.get('making_value', 0)),
+            safe_float(item.get('vat_percent', 5)),
+            safe_float(item.get('vat_amount', 0)),
+            safe_float(item.get('line_total', 0))
+        ])
+        totals["metal"] += _to_decimal(item.get('gold_value'))
+        totals["making"] += _to_decimal(item.get('making_value'))
     
     # ===========================================================================
     # SHEET 3: Totals & Statistics
     # ===========================================================================
-    ws3 = wb.create_sheet(title="Totals")
-    
-    # Calculate totals
-    total_invoices = len(invoices)
-    metal_total = sum(
-        item.get('gold_value', 0) 
-        for inv in invoices 
-        for item in inv.get('items', [])
-    )
-    making_total = sum(
-        item.get('making_value', 0) 
-        for inv in invoices 
-        for item in inv.get('items', [])
-    )
-    vat_total = sum(safe_float(inv.get('vat_total', 0)) for inv in invoices)
-    grand_total = sum(safe_float(inv.get('grand_total', 0)) for inv in invoices)
-    paid_total = sum(safe_float(inv.get('paid_amount', 0)) for inv in invoices)
-    outstanding_total = sum(safe_float(inv.get('balance_due', 0)) for inv in invoices)
+    ws3 = wb.create_sheet("Totals")
+    ws3.column_dimensions['A'].width = 30
+    ws3.column_dimensions['B'].width = 20
     
-    # Style for totals sheet
     title_font = Font(bold=True, size=14)
     label_font = Font(bold=True)
     
-    ws3['A1'] = 'INVOICE TOTALS SUMMARY'
-    ws3['A1'].font = title_font
-    
-    row = 3
-    totals_data = [
-        ('Total Invoices', total_invoices),
-        ('', ''),
-        ('Metal Total (OMR)', metal_total),
-        ('Making Charges Total (OMR)', making_total),
-        ('VAT Total (OMR)', vat_total),
-        ('', ''),
-        ('Grand Total (OMR)', grand_total),
-        ('Total Paid (OMR)', paid_total),
-        ('Total Outstanding (OMR)', outstanding_total),
-    ]
-    
-    for label, value in totals_data:
-        ws3.cell(row=row, column=1, value=label).font = label_font
-        if value != '':
-            # Make sure numeric values are stored as numbers
-            if isinstance(value, (int, float)):
-                ws3.cell(row=row, column=2, value=float(value))
-        row += 1
-    
-    ws3.column_dimensions['A'].width = 30
-    ws3.column_dimensions['B'].width = 20
-    
-    # Save to buffer
-    buffer = BytesIO()
-    wb.save(buffer)
-    buffer.seek(0)
+    def label_row(label, value=None, font=label_font):
+        cell = WriteOnlyCell(ws3, value=label)
+        cell.font = font
+        return [cell] if value is None else [cell, value]
+    
+    ws3.append(label_row('INVOICE TOTALS SUMMARY', font=title_font))
+    ws3.append([])
+    for label, value in [
+        ('Total Invoices', invoice_count),
+        ('', None),
+        ('Metal Total (OMR)', totals["metal"]),
+        ('Making Charges Total (OMR)', totals["making"]),
+        ('VAT Total (OMR)', totals["vat"]),
+        ('', None),
+        ('Grand Total (OMR)', totals["grand_total"]),
+        ('Total Paid (OMR)', totals["paid"]),
+        ('Total Outstanding (OMR)', totals["outstanding"]),
+    ]:
+        # Numeric values are stored as numbers
+        ws3.append(label_row(label, None if label == '' else safe_float(value)))
+    
+    output = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+    await asyncio.to_thread(wb.save, output)
+    output.seek(0)
     
     return StreamingResponse(
-        buffer,
+        output,
         media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
         headers={"Content-Disposition": "attachment; filename=invoices_export.xlsx"}
     )
 
+TRANSACTIONS_EXPORT_COLUMNS = [
+    ("Date", "date"), ("Transaction #", "transaction_number"), ("Type", "transaction_type"), ("Mode", "mode"),
+    ("Party Name", "party_name"), ("Account", "account_name"), ("Amount (OMR)", "amount"),
+    ("Category", "category"), ("Notes", "notes")
+]
+
 @api_router.get("/reports/transactions-export")
 async def export_transactions(
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
     transaction_type: Optional[str] = None,
     party_id: Optional[str] = None,
+    format: str = Query('xlsx'),
     current_user: User = Depends(require_permission('reports.view'))
 ):
-    """Export transactions report as Excel"""
+    """Export transactions report as Excel, or streamed CSV/NDJSON (format=csv|ndjson)"""
     from fastapi.responses import StreamingResponse
     from io import BytesIO
     import openpyxl
     from openpyxl.styles import Font, Alignment, PatternFill
     
+    require_export_format(format)
+    if format != 'xlsx':
+        query, (sort_field, sort_direction) = transactions_report_filter(
+            start_date, end_date, transaction_type, party_id=party_id, sort_by='date_desc'
+        )
+        transactions = await archive_aggregate(
+            db, 'transactions',
+            [{"$match": query}, {"$sort": {sort_field: sort_direction}}, {"$project": {"_id": 0}}],
+            batchSize=EXPORT_BATCH_SIZE
+        )
+        return row_export_response(
+            format, TRANSACTIONS_EXPORT_COLUMNS, transactions, f"transactions_export_{datetime.now().strftime('%Y%m%d')}"
+        )
+    
     # Get filtered transaction data
     data = await view_transactions_report(
         start_date=start_date,
@@ -8207,20 +9257,30 @@ async def export_transactions(
         headers={"Content-Disposition": f"attachment; filename=transactions_export_{datetime.now().strftime('%Y%m%d')}.xlsx"}
     )
 
+OUTSTANDING_EXPORT_COLUMNS = [
+    ("Party Name", "party_name"), ("Type", "party_type"), ("Total Invoiced", "total_invoiced"),
+    ("Total Paid", "total_paid"), ("Outstanding", "total_outstanding"), ("Overdue 0-7d", "overdue_0_7"),
+    ("Overdue 8-30d", "overdue_8_30"), ("Overdue 31+d", "overdue_31_plus"),
+    ("Last Invoice Date", "last_invoice_date"), ("Last Payment Date", "last_payment_date")
+]
+
 @api_router.get("/reports/outstanding-export")
 async def export_outstanding(
     party_id: Optional[str] = None,
     party_type: Optional[str] = None,
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
+    format: str = Query('xlsx'),
     current_user: User = Depends(require_permission('reports.view'))
 ):
-    """Export outstanding report as Excel"""
+    """Export outstanding report as Excel, or CSV/NDJSON (format=csv|ndjson)"""
     from fastapi.responses import StreamingResponse
     from io import BytesIO
     import openpyxl
     from openpyxl.styles import Font, Alignment, PatternFill
     
+    require_export_format(format)
+    
     # Get filtered outstanding data
     data = await get_outstanding_report(
         party_id=party_id,
@@ -8231,6 +9291,15 @@ async def export_outstanding(
         current_user=current_user
     )
     
+    if format != 'xlsx':
+        # One row per party, as aggregated by the outstanding report
+        async def party_rows():
+            for party in data['parties']:
+                yield party
+        return row_export_response(
+            format, OUTSTANDING_EXPORT_COLUMNS, party_rows(), f"outstanding_export_{datetime.now().strftime('%Y%m%d')}"
+        )
+    
     # Create workbook
     wb = openpyxl.Workbook()
     ws = wb.active
@@ -8315,7 +9384,8 @@ async def view_inventory_report(
     movement_type: Optional[str] = None,
     category: Optional[str] = None,
     sort_by: Optional[str] = None,  # NEW: "date_asc", "date_desc"
-    current_user: User = Depends(require_permission('reports.view'))
+    current_user: User = Depends(require_permission('reports.view')),
+    etag: str = Depends(report_etag('stock_movements'))
 ):
     """View inventory movements with filters - returns JSON for UI"""
     query = {"is_deleted": False}
@@ -8341,7 +9411,7 @@ async def view_inventory_report(
     elif sort_by == "date_desc":
         sort_direction = -1
     
-    movements = await db.stock_movements.find(query, {"_id": 0}).sort(sort_field, sort_direction).to_list(10000)
+    movements = await archive_find(db, 'stock_movements', query, {"_id": 0}, sort=[(sort_field, sort_direction)], limit=10000)
     
     # Convert Decimal128 to float for calculations
     movements = [decimal_to_float(m) for m in movements]
@@ -8369,32 +9439,36 @@ async def view_inventory_report(
 async def view_parties_report(
     party_type: Optional[str] = None,
     sort_by: Optional[str] = None,  # NEW: "outstanding_desc", "name_asc"
+    page: Optional[int] = None,
+    page_size: int = 50,
     current_user: User = Depends(require_permission('reports.view'))
 ):
-    """View parties with filters - returns JSON for UI"""
-    query = {"is_deleted": False}
-    if party_type:
-        query['party_type'] = party_type
-    
-    parties = await db.parties.find(query, {"_id": 0}).to_list(10000)
-    
-    # Get outstanding amounts for each party
-    for party in parties:
-        invoices = await db.invoices.find(
-            {"customer_id": party['id'], "is_deleted": False},
-            {"_id": 0, "balance_due": 1}
-        ).to_list(1000)
-        party['outstanding'] = sum(safe_float(inv.get('balance_due', 0)) for inv in invoices)
+    """
+    View parties with filters - returns JSON for UI.
     
-    # Apply sorting
-    if sort_by == "outstanding_desc":
-        parties = sorted(parties, key=lambda x: x.get('outstanding', 0), reverse=True)
-    elif sort_by == "name_asc":
-        parties = sorted(parties, key=lambda x: x.get('name', '').lower())
+    Pass page (1-indexed) and page_size to fetch one page; count stays the total
+    number of matching parties and a pagination block is added.
+    """
+    if page is None:
+        parties, total_count = await fetch_parties_report(party_type=party_type, sort_by=sort_by)
+        return {
+            "parties": parties,
+            "count": total_count
+        }
     
+    page = max(page, 1)
+    page_size = max(1, min(page_size, 1000))
+    parties, total_count = await fetch_parties_report(
+        party_type=party_type,
+        sort_by=sort_by,
+        skip=(page - 1) * page_size,
+        limit=page_size
+    )
+    paginated = create_pagination_response(parties, total_count, page, page_size)
     return {
-        "parties": parties,
-        "count": len(parties)
+        "parties": paginated['items'],
+        "count": total_count,
+        "pagination": paginated['pagination']
     }
 
 @api_router.get("/reports/invoices-view")
@@ -8405,9 +9479,29 @@ async def view_invoices_report(
     payment_status: Optional[str] = None,
     party_id: Optional[str] = None,  # NEW: Filter by specific party
     sort_by: Optional[str] = None,  # NEW: "date_asc", "date_desc", "amount_desc", "outstanding_desc"
-    current_user: User = Depends(require_permission('reports.view'))
+    current_user: User = Depends(require_permission('reports.view')),
+    etag: str = Depends(report_etag('invoices'))
 ):
     """View invoices with filters - returns JSON for UI"""
+    # Raw invoices go straight to the renderer, which encodes Decimal128/datetime values
+    return json_response(await load_invoices_report(
+        start_date=start_date,
+        end_date=end_date,
+        invoice_type=invoice_type,
+        payment_status=payment_status,
+        party_id=party_id,
+        sort_by=sort_by
+    ), headers={"ETag": etag, "Cache-Control": "private, no-cache"})
+
+async def load_invoices_report(
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    invoice_type: Optional[str] = None,
+    payment_status: Optional[str] = None,
+    party_id: Optional[str] = None,
+    sort_by: Optional[str] = None
+) -> dict:
+    """Invoices report data shared by the JSON view and the PDF (invoices keep their stored types)"""
     query = {"is_deleted": False}
     if start_date:
         query['date'] = {"$gte": datetime.fromisoformat(start_date)}
@@ -8448,8 +9542,7 @@ async def view_invoices_report(
     total_paid = sum(safe_float(inv.get('paid_amount', 0)) for inv in invoices)
     total_balance = sum(safe_float(inv.get('balance_due', 0)) for inv in invoices)
     
-    # CRITICAL FIX: Convert entire response including invoices array to prevent Decimal128 serialization errors
-    return decimal_to_float({
+    return {
         "invoices": invoices,
         "summary": {
             "total_amount": total_amount,
@@ -8457,19 +9550,18 @@ async def view_invoices_report(
             "total_balance": total_balance
         },
         "count": len(invoices)
-    })
+    }
 
 @api_router.get("/reports/transactions-view")
-async def view_transactions_report(
+def transactions_report_filter(
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
     transaction_type: Optional[str] = None,
     account_id: Optional[str] = None,
-    party_id: Optional[str] = None,  # NEW: Filter by specific party
-    sort_by: Optional[str] = None,  # NEW: "date_asc", "date_desc", "amount_desc"
-    current_user: User = Depends(require_permission('reports.view'))
-):
-    """View financial transactions with filters - returns JSON for UI"""
+    party_id: Optional[str] = None,
+    sort_by: Optional[str] = None
+) -> Tuple[dict, Tuple[str, int]]:
+    """(query, (sort field, direction)) of the transactions report view and exports"""
     query = {"is_deleted": False}
     if start_date:
         query['date'] = {"$gte": datetime.fromisoformat(start_date)}
@@ -8499,8 +9591,23 @@ async def view_transactions_report(
     elif sort_by == "amount_desc":
         sort_field = "amount"
         sort_direction = -1
-    
-    transactions = await db.transactions.find(query, {"_id": 0}).sort(sort_field, sort_direction).to_list(10000)
+    return query, (sort_field, sort_direction)
+
+async def view_transactions_report(
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    transaction_type: Optional[str] = None,
+    account_id: Optional[str] = None,
+    party_id: Optional[str] = None,  # NEW: Filter by specific party
+    sort_by: Optional[str] = None,  # NEW: "date_asc", "date_desc", "amount_desc"
+    current_user: User = Depends(require_permission('reports.view')),
+    etag: str = Depends(report_etag('transactions'))
+):
+    """View financial transactions with filters - returns JSON for UI"""
+    query, (sort_field, sort_direction) = transactions_report_filter(
+        start_date, end_date, transaction_type, account_id, party_id, sort_by
+    )
+    transactions = await archive_find(db, 'transactions', query, {"_id": 0}, sort=[(sort_field, sort_direction)], limit=10000)
     
     # Calculate totals
     total_credit = sum(safe_float(txn.get('amount', 0)) for txn in transactions if txn.get('transaction_type') == 'credit')
@@ -8525,16 +9632,19 @@ async def get_invoice_report(invoice_id: str, current_user: User = Depends(requi
         raise HTTPException(status_code=404, detail="Invoice not found")
     
     # Get related payments/transactions
-    transactions = await db.transactions.find(
+    transactions = await archive_find(
+        db, 'transactions',
         {"party_id": invoice.get('customer_id'), "is_deleted": False},
-        {"_id": 0}
-    ).to_list(1000)
+        {"_id": 0}, limit=1000
+    )
     
     return {
         "invoice": invoice,
         "transactions": transactions
     }
 
+LEDGER_REPORT_MAX_ROWS = 1000
+
 @api_router.get("/reports/party/{party_id}/ledger-report")
 async def get_party_ledger_report(
     party_id: str,
@@ -8542,8 +9652,12 @@ async def get_party_ledger_report(
     end_date: Optional[str] = None,
     current_user: User = Depends(require_permission('reports.view'))
 ):
-    """Get detailed ledger report for a party with date filtering"""
-    party = await db.parties.find_one({"id": party_id, "is_deleted": False}, {"_id": 0})
+    """
+    Get detailed ledger report for a party with date filtering.
+    Lists and totals cover at most LEDGER_REPORT_MAX_ROWS rows each (flagged as
+    truncated); /reports/party/{party_id}/statement has the complete history.
+    """
+    party = await db.parties.find_one({"id": party_id, "is_deleted": False}, PARTY_PROJECTION)
     if not party:
         raise HTTPException(status_code=404, detail="Party not found")
     
@@ -8558,7 +9672,10 @@ async def get_party_ledger_report(
         else:
             invoice_query['date'] = {"$lte": end_dt}
     
-    invoices = await db.invoices.find(invoice_query, {"_id": 0}).sort("date", -1).to_list(1000)
+    # One row past the cap tells whether the list is cut off (full history: /statement)
+    invoices = await db.invoices.find(invoice_query, {"_id": 0}).sort("date", -1).to_list(LEDGER_REPORT_MAX_ROWS + 1)
+    invoices_truncated = len(invoices) > LEDGER_REPORT_MAX_ROWS
+    invoices = invoices[:LEDGER_REPORT_MAX_ROWS]
     
     # Build query for transactions
     txn_query = {"party_id": party_id, "is_deleted": False}
@@ -8571,14 +9688,17 @@ async def get_party_ledger_report(
         else:
             txn_query['date'] = {"$lte": end_dt}
     
-    transactions = await db.transactions.find(txn_query, {"_id": 0}).sort("date", -1).to_list(1000)
+    transactions = await archive_find(db, 'transactions', txn_query, {"_id": 0}, sort=[("date", -1)],
+                                      limit=LEDGER_REPORT_MAX_ROWS + 1)
+    transactions_truncated = len(transactions) > LEDGER_REPORT_MAX_ROWS
+    transactions = transactions[:LEDGER_REPORT_MAX_ROWS]
     
     # Calculate totals
     total_invoiced = sum(safe_float(inv.get('grand_total', 0)) for inv in invoices)
     total_paid = sum(safe_float(txn.get('amount', 0)) for txn in transactions if txn.get('transaction_type') == 'debit')
     total_outstanding = sum(safe_float(inv.get('balance_due', 0)) for inv in invoices)
     
-    return {
+    return decimal_to_float({
         "party": party,
         "invoices": invoices,
         "transactions": transactions,
@@ -8586,62 +9706,355 @@ async def get_party_ledger_report(
             "total_invoiced": total_invoiced,
             "total_paid": total_paid,
             "total_outstanding": total_outstanding
-        }
+        },
+        "invoices_truncated": invoices_truncated,
+        "transactions_truncated": transactions_truncated
+    })
+
+# ============================================================================
+# PARTY STATEMENT
+# ============================================================================
+#
+# Merged, uncapped statement of a party with opening balance carry-forward and
+# running money/gold balances (engine in party_statement.py). The JSON endpoint
+# is paginated; the export streams every line as NDJSON or CSV, or writes Excel or PDF.
+
+STATEMENT_EXPORT_FORMATS = ('ndjson', 'csv', 'xlsx', 'pdf')
+STATEMENT_COLUMNS = [
+    ("Date", "date"), ("Type", "source"), ("Reference", "reference"), ("Description", "description"),
+    ("Debit", "debit"), ("Credit", "credit"), ("Balance", "money_balance"),
+    ("Gold In (g)", "gold_in"), ("Gold Out (g)", "gold_out"), ("Gold Balance (g)", "gold_balance"),
+]
+
+
+def parse_statement_date(value: Optional[str], name: str) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid {name}, expected an ISO date")
+
+
+async def load_party_statement(party_id: str, start_date: Optional[str], end_date: Optional[str]):
+    """(party, statement, opening balances, period totals) or 404 for an unknown party"""
+    start = parse_statement_date(start_date, 'start_date')
+    end = parse_statement_date(end_date, 'end_date')
+    if start and end and start > end:
+        raise HTTPException(status_code=400, detail="start_date must not be after end_date")
+    party = await db.parties.find_one({"id": party_id, "is_deleted": False}, PARTY_PROJECTION)
+    if not party:
+        raise HTTPException(status_code=404, detail="Party not found")
+    carried = await carried_party_balances(db, party_id, start)
+    statement = PartyStatement(db, party_id, start, end, carried)
+    opening, totals = await asyncio.gather(statement.opening(), statement.period_totals())
+    return party, statement, opening, totals
+
+
+def statement_summary(opening, totals) -> dict:
+    opening_balance = opening.to_dict()
+    return {
+        "opening_balance": {"money": opening_balance["money"], "gold": opening_balance["gold"]},
+        "period_totals": {key: value for key, value in totals.to_dict().items() if key not in ("money", "gold")},
+        "closing_balance": {
+            "money": float((opening.money + totals.money).quantize(Decimal('0.001'))),
+            "gold": float((opening.gold + totals.gold).quantize(Decimal('0.001'))),
+        },
     }
 
+
+def statement_cell(line: dict, key: str):
+    value = line.get(key)
+    if key == "date":
+        return str(value or '')[:10]
+    if isinstance(value, float) and value == 0 and key not in ("money_balance", "gold_balance"):
+        return None
+    return value
+
+
+@api_router.get("/reports/party/{party_id}/statement")
+async def get_party_statement(
+    party_id: str,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    page: int = Query(1, ge=1),
+    page_size: int = Query(100, ge=1, le=1000),
+    current_user: User = Depends(require_permission('reports.view'))
+):
+    """
+    Party statement: invoices, purchases, returns, payments and gold movements
+    merged by date, with opening balance before start_date and running balances.
+    Balances of lines on earlier pages are carried into each page.
+    """
+    party, statement, opening, totals = await load_party_statement(party_id, start_date, end_date)
+    total_count = await statement.count()
+    lines = [line async for line in statement.lines(opening, skip=(page - 1) * page_size, limit=page_size)]
+    response = create_pagination_response(lines, total_count, page, page_size)
+    response.update({"party": party, "start_date": start_date, "end_date": end_date,
+                     **statement_summary(opening, totals)})
+    return response
+
+
+@api_router.get("/reports/party/{party_id}/statement/export")
+async def export_party_statement(
+    party_id: str,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    format: str = Query('ndjson'),
+    current_user: User = Depends(require_permission('reports.view'))
+):
+    """Full party statement as NDJSON or CSV (streamed), Excel or PDF."""
+    from fastapi.responses import StreamingResponse
+
+    if format not in STATEMENT_EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(STATEMENT_EXPORT_FORMATS)}")
+    party, statement, opening, totals = await load_party_statement(party_id, start_date, end_date)
+    summary = statement_summary(opening, totals)
+    filename = f"party_statement_{party_id}"
+
+    if format == 'csv':
+        # Statement lines only; their running balances start from the opening balance
+        return row_export_response('csv', STATEMENT_COLUMNS, statement.lines(opening), filename)
+
+    if format == 'ndjson':
+        async def ndjson_lines():
+            yield orjson.dumps({"type": "header", "party": party, "start_date": start_date, "end_date": end_date,
+                                "opening_balance": summary["opening_balance"]},
+                               default=json_default, option=orjson.OPT_APPEND_NEWLINE)
+            async for line in statement.lines(opening):
+                yield orjson.dumps({"type": "line", **line}, default=json_default, option=orjson.OPT_APPEND_NEWLINE)
+            yield orjson.dumps({"type": "footer", "period_totals": summary["period_totals"],
+                                "closing_balance": summary["closing_balance"]}, option=orjson.OPT_APPEND_NEWLINE)
+
+        return StreamingResponse(
+            ndjson_lines(),
+            media_type="application/x-ndjson",
+            headers={"Content-Disposition": f'attachment; filename="{filename}.ndjson"'}
+        )
+
+    if format == 'xlsx':
+        import tempfile
+        import openpyxl
+        from openpyxl.cell import WriteOnlyCell
+        from openpyxl.styles import Font
+
+        # Write-only workbook: rows go straight to the temp file instead of being kept as cells
+        wb = openpyxl.Workbook(write_only=True)
+        ws = wb.create_sheet("Statement")
+        bold = Font(bold=True)
+
+        def bold_row(values):
+            cells = []
+            for value in values:
+                cell = WriteOnlyCell(ws, value=value)
+                cell.font = bold
+                cells.append(cell)
+            return cells
+
+        ws.append(bold_row([f"Statement: {party.get('name', '')}", f"{start_date or 'start'} to {end_date or 'today'}"]))
+        ws.append(bold_row(["Opening balance", summary["opening_balance"]["money"], "Gold",
+                            summary["opening_balance"]["gold"]]))
+        ws.append(bold_row([title for title, _key in STATEMENT_COLUMNS]))
+        async for line in statement.lines(opening):
+            ws.append([statement_cell(line, key) for _title, key in STATEMENT_COLUMNS])
+        ws.append(bold_row(["Closing balance", summary["closing_balance"]["money"], "Gold",
+                            summary["closing_balance"]["gold"]]))
+        output = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+        await asyncio.to_thread(wb.save, output)
+        output.seek(0)
+        return StreamingResponse(
+            output,
+            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            headers={"Content-Disposition": f'attachment; filename="{filename}.xlsx"'}
+        )
+
+    import tempfile
+    from reportlab.lib.pagesizes import A4, landscape
+    from reportlab.pdfgen import canvas
+
+    output = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+    page_width, page_height = landscape(A4)
+    pdf = canvas.Canvas(output, pagesize=(page_width, page_height))
+    x_positions = [30, 95, 150, 250, 470, 530, 590, 650, 710, 770]
+    numeric_keys = {"debit", "credit", "money_balance", "gold_in", "gold_out", "gold_balance"}
+
+    def draw_row(values, y, font="Helvetica", size=8):
+        pdf.setFont(font, size)
+        for x, (value, (_title, key)) in zip(x_positions, zip(values, STATEMENT_COLUMNS)):
+            if value is None:
+                text = ""
+            elif key in numeric_keys and isinstance(value, (int, float)):
+                text = f"{value:,.3f}"
+            else:
+                text = str(value)[:40]
+            pdf.drawString(x, y, text)
+
+    def new_page():
+        pdf.setFont("Helvetica-Bold", 12)
+        pdf.drawString(30, page_height - 30,
+                       f"Statement: {party.get('name', '')}  ({start_date or 'start'} to {end_date or 'today'})")
+        draw_row([title for title, _key in STATEMENT_COLUMNS], page_height - 55, "Helvetica-Bold")
+        return page_height - 70
+
+    y = new_page()
+    pdf.setFont("Helvetica-Bold", 9)
+    pdf.drawString(30, y, f"Opening balance: {summary['opening_balance']['money']:,.3f}   "
+                          f"Gold: {summary['opening_balance']['gold']:,.3f} g")
+    y -= 14
+    async for line in statement.lines(opening):
+        if y < 40:
+            pdf.showPage()
+            y = new_page()
+        draw_row([statement_cell(line, key) for _title, key in STATEMENT_COLUMNS], y)
+        y -= 12
+    if y < 40:
+        pdf.showPage()
+        y = new_page()
+    pdf.setFont("Helvetica-Bold", 9)
+    pdf.drawString(30, y - 4, f"Closing balance: {summary['closing_balance']['money']:,.3f}   "
+                              f"Gold: {summary['closing_balance']['gold']:,.3f} g")
+    await asyncio.to_thread(pdf.save)
+    output.seek(0)
+    return StreamingResponse(
+        output,
+        media_type="application/pdf",
+        headers={"Content-Disposition": f'attachment; filename="{filename}.pdf"'}
+    )
+
 @api_router.get("/reports/inventory/{header_id}/stock-report")
 async def get_inventory_stock_report(
     header_id: str,
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
+    cursor: Optional[str] = None,
+    page_size: int = Query(STOCK_CARD_DEFAULT_PAGE_SIZE, ge=1, le=STOCK_CARD_MAX_PAGE_SIZE),
     current_user: User = Depends(require_permission('reports.view'))
 ):
-    """Get detailed stock report for a specific inventory category"""
+    """
+    Stock card for an inventory category: opening stock before start_date, each
+    movement in date order with running qty/weight, and closing stock.
+    Movements are paged with pagination.next_cursor; summary covers the whole range.
+    """
     header = await db.inventory_headers.find_one({"id": header_id, "is_deleted": False}, {"_id": 0})
     if not header:
         raise HTTPException(status_code=404, detail="Inventory category not found")
+    start = parse_statement_date(start_date, 'start_date')
+    end = parse_statement_date(end_date, 'end_date')
     
-    # Build query for movements
-    query = {"header_id": header_id, "is_deleted": False}
-    if start_date:
-        query['date'] = {"$gte": datetime.fromisoformat(start_date)}
-    if end_date:
-        end_dt = datetime.fromisoformat(end_date)
-        if 'date' in query:
-            query['date']['$lte'] = end_dt
-        else:
-            query['date'] = {"$lte": end_dt}
-    
-    movements = await db.stock_movements.find(query, {"_id": 0}).sort("date", -1).to_list(10000)
-    
-    # Convert Decimal128 to float for calculations
-    movements = [decimal_to_float(m) for m in movements]
-    header = decimal_to_float(header)
-    
-    # Calculate stock totals
-    total_in = sum(safe_float(m.get('qty_delta', 0)) for m in movements if safe_float(m.get('qty_delta', 0)) > 0)
-    total_out = sum(abs(safe_float(m.get('qty_delta', 0))) for m in movements if safe_float(m.get('qty_delta', 0)) < 0)
-    current_stock = total_in - total_out
-    
-    total_weight_in = sum(safe_float(m.get('weight_delta', 0)) for m in movements if safe_float(m.get('weight_delta', 0)) > 0)
-    total_weight_out = sum(abs(safe_float(m.get('weight_delta', 0))) for m in movements if safe_float(m.get('weight_delta', 0)) < 0)
-    current_weight = total_weight_in - total_weight_out
+    totals = await stock_card_totals(db, header_id, start, end)
+    try:
+        movements, next_cursor = await stock_card_page(
+            db, header_id, start, end, totals["opening_qty"], totals["opening_weight"], cursor, page_size)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    return {
+    opening_qty, opening_weight = float(totals["opening_qty"]), float(totals["opening_weight"])
+    closing_qty = float(totals["opening_qty"] + totals["qty"])
+    closing_weight = float(totals["opening_weight"] + totals["weight"])
+    return decimal_to_float({
         "header": header,
+        "opening": {"qty": opening_qty, "weight": opening_weight},
         "movements": movements,
+        "closing": {"qty": closing_qty, "weight": closing_weight},
         "summary": {
-            "total_in": total_in,
-            "total_out": total_out,
-            "current_stock": current_stock,
-            "total_weight_in": total_weight_in,
-            "total_weight_out": total_weight_out,
-            "current_weight": current_weight
+            "total_in": float(totals["qty_in"]),
+            "total_out": float(totals["qty_out"]),
+            "current_stock": closing_qty,
+            "total_weight_in": float(totals["weight_in"]),
+            "total_weight_out": float(totals["weight_out"]),
+            "current_weight": closing_weight
         },
-        "count": len(movements)
+        "count": totals["count"],
+        "pagination": {
+            "page_size": page_size,
+            "next_cursor": next_cursor,
+            "has_next": next_cursor is not None
+        }
+    })
+
+# ============================================================================
+# TREND ANALYTICS (MONTHLY CUBE)
+# ============================================================================
+
+TREND_MONTH_PATTERN = re.compile(r"^\d{4}-(0[1-9]|1[0-2])$")
+
+
+def parse_csv_choices(value: Optional[str], allowed, name: str, default):
+    """Comma separated query parameter restricted to allowed values (400 otherwise)"""
+    if not value:
+        return list(default)
+    chosen = [part.strip() for part in value.split(',') if part.strip()]
+    unknown = [part for part in chosen if part not in allowed]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown {name}: {', '.join(unknown)}. Allowed: {', '.join(allowed)}"
+        )
+    return list(dict.fromkeys(chosen))
+
+
+@api_router.get("/reports/trends")
+async def get_trends_report(
+    start_month: Optional[str] = None,
+    end_month: Optional[str] = None,
+    families: Optional[str] = None,
+    group_by: Optional[str] = None,
+    current_user: User = Depends(require_permission('reports.view'))
+):
+    """
+    Monthly sales/purchase/return trends from the analytics_monthly cube.
+    start_month/end_month: YYYY-MM (inclusive). families: comma list of
+    sales, purchases, sales_returns, purchase_returns (default all).
+    group_by: comma list of purity, category, party_type (default none).
+    """
+    for name, value in (("start_month", start_month), ("end_month", end_month)):
+        if value and not TREND_MONTH_PATTERN.match(value):
+            raise HTTPException(status_code=400, detail=f"Invalid {name} format. Use YYYY-MM")
+    if start_month and end_month and start_month > end_month:
+        raise HTTPException(status_code=400, detail="start_month must not be after end_month")
+    selected_families = parse_csv_choices(families, FAMILIES, "families", FAMILIES)
+    dimensions = parse_csv_choices(group_by, DIMENSIONS, "group_by", ())
+    
+    pipeline = trend_pipeline(selected_families, start_month, end_month, dimensions)
+    groups = await db[ANALYTICS_COLLECTION].aggregate(pipeline).to_list(None)
+    
+    series = []
+    totals = {family: {measure: 0.0 for measure in MEASURES} for family in selected_families}
+    for group in groups:
+        row = dict(group["_id"])
+        for measure in MEASURES:
+            value = round(safe_float(group.get(measure)), 3)
+            row[measure] = value
+            totals[row["family"]][measure] += value
+        series.append(row)
+    
+    return {
+        "start_month": start_month,
+        "end_month": end_month,
+        "families": selected_families,
+        "group_by": dimensions,
+        "months": sorted({row["month"] for row in series}),
+        "series": series,
+        "totals": {family: {m: round(v, 3) for m, v in values.items()} for family, values in totals.items()}
     }
 
+
+@api_router.post("/reports/trends/rebuild")
+async def rebuild_trends_cube(current_user: User = Depends(require_permission('reports.view'))):
+    """Recompute the analytics cube from invoices, purchases and returns (admin only)"""
+    if current_user.role != 'admin':
+        raise HTTPException(status_code=403, detail="Only administrators can rebuild analytics")
+    started = time.monotonic()
+    try:
+        cells = await rebuild_analytics_cube(db)
+    except RebuildRunningError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    await create_audit_log(current_user.id, current_user.full_name, "analytics", ANALYTICS_COLLECTION, "rebuild",
+                           {"cells": cells})
+    return {"cells": cells, "duration_ms": round((time.monotonic() - started) * 1000, 1)}
+
 @api_router.get("/reports/financial-summary")
+@cached_report('accounting_periods', 'accounts', 'daily_closings', 'invoices', 'returns', 'transactions')
 async def get_financial_summary(
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
@@ -8661,17 +10074,13 @@ async def get_financial_summary(
     - Total Debit = SUM of all Debit transactions
     - Net Flow = Total Credit - Total Debit
     - Net Profit = Total Income - Total Expenses
+    
+    Transaction sums are per-account totals over the date range, computed from
+    the closed accounting period snapshots plus the transactions after them.
     """
-    # Build query for transactions
-    txn_query = {"is_deleted": False}
-    if start_date:
-        txn_query['date'] = {"$gte": datetime.fromisoformat(start_date)}
-    if end_date:
-        end_dt = datetime.fromisoformat(end_date)
-        if 'date' in txn_query:
-            txn_query['date']['$lte'] = end_dt
-        else:
-            txn_query['date'] = {"$lte": end_dt}
+    # Date range for transactions
+    txn_start = datetime.fromisoformat(start_date) if start_date else None
+    txn_end = datetime.fromisoformat(end_date) if end_date else None
     
     # Build query for invoices (only for outstanding calculation)
     invoice_query = {"is_deleted": False, "status": "finalized"}
@@ -8682,15 +10091,44 @@ async def get_financial_summary(
         if 'date' in invoice_query:
             invoice_query['date']['$lte'] = end_dt
         else:
-            invoice_query['date'] = {"$lte": end_dt}
+            invoice_query['date'] = {"$lte": end_dt}
+    
+    # Daily closings in the period (or today) for reconciliation
+    closing_query = {"is_deleted": False}
+    if start_date and end_date:
+        closing_query['date'] = {
+            "$gte": datetime.fromisoformat(start_date),
+            "$lte": datetime.fromisoformat(end_date)
+        }
+    else:
+        today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+        closing_query['date'] = {"$gte": today}
+    
+    # Returns metrics for the period
+    returns_query = {"is_deleted": False, "status": "finalized"}
+    if start_date:
+        returns_query['date'] = {"$gte": datetime.fromisoformat(start_date)}
+    if end_date:
+        end_dt = datetime.fromisoformat(end_date)
+        if 'date' in returns_query:
+            returns_query['date']['$lte'] = end_dt
+        else:
+            returns_query['date'] = {"$lte": end_dt}
     
-    # Get data from database
-    transactions = await db.transactions.find(txn_query, {"_id": 0}).to_list(10000)
-    accounts = await db.accounts.find({"is_deleted": False}, {"_id": 0}).to_list(1000)
-    invoices = await db.invoices.find(invoice_query, {"_id": 0}).to_list(10000)
+    # Get data from database - all five reads are independent
+    ledger_totals, accounts, invoices, closings, returns_docs = await run_query_batch(
+        lambda: ledger_totals_between(db, txn_start, txn_end),
+        lambda: db.accounts.find({"is_deleted": False}, {"_id": 0}).to_list(1000),
+        lambda: db.invoices.find(invoice_query, {"_id": 0}).to_list(10000),
+        lambda: db.daily_closings.find(closing_query, {"_id": 0}).to_list(100),
+        lambda: db.returns.find(returns_query, {"_id": 0}).to_list(1000),
+    )
     
     # Convert Decimal128 to float for calculations (prevents TypeError with mixed types)
-    transactions = [decimal_to_float(txn) for txn in transactions]
+    account_totals = {
+        account_id: {name: float(value) for name, value in totals.items()}
+        for account_id, totals in ledger_totals.items()
+    }
     accounts = [decimal_to_float(acc) for acc in accounts]
     invoices = [decimal_to_float(inv) for inv in invoices]
     
@@ -8719,17 +10157,16 @@ async def get_financial_summary(
     # Sum of all credits to Income-type accounts
     # Subtract sales returns (debits to income accounts)
     total_sales_credits = sum(
-        txn.get('amount', 0) for txn in transactions
-        if txn.get('transaction_type') == 'credit' and
-        account_type_map.get(txn.get('account_id'), '') == 'income'
+        totals['credit'] for account_id, totals in account_totals.items()
+        if account_type_map.get(account_id, '') == 'income'
     )
     
     # Sales returns reduce total sales (debits or category="sales_return")
     total_sales_returns = sum(
-        txn.get('amount', 0) for txn in transactions
-        if (txn.get('category') == 'sales_return' or 
-            (txn.get('transaction_type') == 'debit' and
-             account_type_map.get(txn.get('account_id'), '') == 'income'))
+        totals['debit'] + totals['sales_return_credit']
+        if account_type_map.get(account_id, '') == 'income'
+        else totals['sales_return_debit'] + totals['sales_return_credit']
+        for account_id, totals in account_totals.items()
     )
     
     # Net Sales = Gross Sales - Returns
@@ -8751,15 +10188,9 @@ async def get_financial_summary(
     net_profit = total_income - total_expenses
     
     # Calculate Total Credit and Debit from TRANSACTIONS
-    total_credit = sum(
-        txn.get('amount', 0) for txn in transactions 
-        if txn.get('transaction_type') == 'credit'
-    )
+    total_credit = sum(totals['credit'] for totals in account_totals.values())
     
-    total_debit = sum(
-        txn.get('amount', 0) for txn in transactions 
-        if txn.get('transaction_type') == 'debit'
-    )
+    total_debit = sum(totals['debit'] for totals in account_totals.values())
     
     # Net Flow = Total Credits - Total Debits
     net_flow = total_credit - total_debit
@@ -8776,35 +10207,11 @@ async def get_financial_summary(
     
     # Daily closing difference (for reconciliation)
     daily_closing_difference = 0
-    closing_query = {"is_deleted": False}
-    if start_date and end_date:
-        closing_query['date'] = {
-            "$gte": datetime.fromisoformat(start_date),
-            "$lte": datetime.fromisoformat(end_date)
-        }
-    else:
-        today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
-        closing_query['date'] = {"$gte": today}
-    
-    closings = await db.daily_closings.find(closing_query, {"_id": 0}).to_list(100)
     for closing in closings:
         expected = closing.get('expected_closing', 0)
         actual = closing.get('actual_closing', 0)
         daily_closing_difference += (actual - expected)
     
-    # Get returns metrics for the period
-    returns_query = {"is_deleted": False, "status": "finalized"}
-    if start_date:
-        returns_query['date'] = {"$gte": datetime.fromisoformat(start_date)}
-    if end_date:
-        end_dt = datetime.fromisoformat(end_date)
-        if 'date' in returns_query:
-            returns_query['date']['$lte'] = end_dt
-        else:
-            returns_query['date'] = {"$lte": end_dt}
-    
-    returns_docs = await db.returns.find(returns_query, {"_id": 0}).to_list(1000)
-    
     total_sales_returns_count = len([r for r in returns_docs if r.get('return_type') == 'sale_return'])
     total_purchase_returns_count = len([r for r in returns_docs if r.get('return_type') == 'purchase_return'])
     
@@ -8829,13 +10236,15 @@ async def get_financial_summary(
 
 
 @api_router.get("/reports/outstanding")
+@cached_report('invoices', 'transactions')
 async def get_outstanding_report(
     party_id: Optional[str] = None,
     party_type: Optional[str] = None,  # "customer", "vendor", or None for both
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
     include_paid: bool = False,  # Include fully paid invoices
-    current_user: User = Depends(require_permission('reports.view'))
+    current_user: User = Depends(require_permission('reports.view')),
+    etag: str = Depends(report_etag('invoices', 'transactions'))
 ):
     """
     Get outstanding report with overdue buckets
@@ -8863,10 +10272,11 @@ async def get_outstanding_report(
     
     # Get all transactions for payment tracking
     # CRITICAL FIX: Include "Purchase" category for vendor payables from purchase finalization
-    transactions = await db.transactions.find(
+    transactions = await archive_find(
+        db, 'transactions',
         {"is_deleted": False, "category": {"$in": ["Sales Invoice", "Purchase Invoice", "Purchase"]}},
-        {"_id": 0}
-    ).to_list(10000)
+        {"_id": 0}, limit=10000
+    )
     
     # Calculate today for overdue calculations
     today = datetime.now(timezone.utc)
@@ -9198,14 +10608,13 @@ async def export_invoices_pdf(
     from fastapi.responses import StreamingResponse
     
     # Get data
-    data = await view_invoices_report(
+    data = await load_invoices_report(
         start_date=start_date,
         end_date=end_date,
         invoice_type=invoice_type,
         payment_status=payment_status,
         party_id=party_id,
-        sort_by=None,
-        current_user=current_user
+        sort_by=None
     )
     
     buffer = BytesIO()
@@ -9243,7 +10652,7 @@ async def export_invoices_pdf(
     y_position -= 0.3*inch
     
     table_data = [['Invoice #', 'Date', 'Customer', 'Type', 'Amount', 'Paid', 'Balance']]
-    for inv in data['invoices'][:25]:
+    for inv in decimal_to_float(data['invoices'][:25]):
         inv_date = inv.get('date', '')
         if isinstance(inv_date, str):
             inv_date = inv_date[:10]
@@ -9299,12 +10708,13 @@ async def export_parties_pdf(
     from io import BytesIO
     from fastapi.responses import StreamingResponse
     
-    # Get data
-    data = await view_parties_report(
+    # Get data (only the rows that fit on the page are loaded)
+    parties, total_count = await fetch_parties_report(
         party_type=party_type,
         sort_by="outstanding_desc",
-        current_user=current_user
+        limit=30
     )
+    data = {"parties": parties, "count": total_count}
     
     buffer = BytesIO()
     c = canvas.Canvas(buffer, pagesize=A4)
@@ -9566,13 +10976,403 @@ async def export_inventory_pdf(
 # MODULE 5/10: SALES HISTORY REPORT (Finalized Invoices Only)
 # ============================================================================
 
+HISTORY_REPORT_PAGE_SIZE = 50
+HISTORY_REPORT_MAX_PAGE_SIZE = 1000
+SALES_HISTORY_TXN_CATEGORIES = ['sales', 'sales_income']
+PURCHASE_HISTORY_TXN_CATEGORIES = ['purchase', 'purchases', 'inventory_purchase']
+PURCHASE_HISTORY_STATUSES = ["Paid", "Partially Paid", "Finalized (Unpaid)"]
+
+
+def history_date_filter(date_from: Optional[str], date_to: Optional[str]) -> Optional[dict]:
+    date_filter = {}
+    if date_from:
+        date_filter["$gte"] = datetime.fromisoformat(date_from)
+    if date_to:
+        date_filter["$lte"] = datetime.fromisoformat(date_to)
+    return date_filter or None
+
+
+def history_lookup_stages(movement_type: str, txn_categories: List[str], date_filter: Optional[dict],
+                          movement_archives: List[str] = (), transaction_archives: List[str] = ()) -> list:
+    """
+    Stages adding `_weight` (absolute weight of the document's stock movements)
+    and `_amount` (its credit transactions in txn_categories). Movements and
+    transactions are joined on reference_id by localField/foreignField $lookups
+    (served by the reference_id indexes), one per source collection including the
+    archives of the report's range; the joined rows are narrowed to the report's
+    filters and date range with $filter and summed.
+    """
+    def row_filter(conditions: list) -> dict:
+        conditions = [{"$eq": ["$$row.is_deleted", False]}, *conditions]
+        if date_filter and "$gte" in date_filter:
+            conditions.append({"$gte": ["$$row.date", date_filter["$gte"]]})
+        if date_filter and "$lte" in date_filter:
+            conditions.append({"$lte": ["$$row.date", date_filter["$lte"]]})
+        return {"$and": conditions}
+    
+    measures = {
+        "_weight": (["stock_movements", *movement_archives],
+                    row_filter([{"$eq": ["$$row.movement_type", movement_type]}]),
+                    {"$abs": "$$row.weight_delta"}),
+        "_amount": (["transactions", *transaction_archives],
+                    row_filter([{"$in": ["$$row.category", txn_categories]},
+                                {"$eq": ["$$row.transaction_type", "credit"]}]),
+                    "$$row.amount"),
+    }
+    stages, values, aliases = [], {}, []
+    for field, (names, condition, value) in measures.items():
+        joined = []
+        for name in names:
+            alias = f"{field}_rows_{len(joined)}"
+            stages.append({"$lookup": {"from": name, "localField": "id", "foreignField": "reference_id", "as": alias}})
+            joined.append(f"${alias}")
+            aliases.append(alias)
+        rows = joined[0] if len(joined) == 1 else {"$concatArrays": joined}
+        values[field] = {"$map": {
+            "input": {"$filter": {"input": rows, "as": "row", "cond": condition}}, "as": "row", "in": value
+        }}
+    # The matching values first, then their $sum as a separate stage
+    stages.append({"$addFields": values})
+    stages.append({"$addFields": {field: {"$sum": f"${field}"} for field in values}})
+    stages.append({"$project": {alias: 0 for alias in aliases}})
+    return stages
+
+
+async def history_archives(date_filter: Optional[dict]) -> Tuple[List[str], List[str]]:
+    """Stock movement and transaction archive collections a history report's date range reaches"""
+    dated = {"date": date_filter} if date_filter else {}
+    return (await archive_collections(db, 'stock_movements', dated),
+            await archive_collections(db, 'transactions', dated))
+
+
+def history_rows_pipeline(query: dict, lookups: list, page_stages: list,
+                          skip: int = 0, limit: Optional[int] = None) -> list:
+    """Matched documents newest first, joined by lookups and shaped by page_stages"""
+    pipeline = [{"$match": query}, {"$sort": {"date": -1, "id": 1}}]
+    if skip:
+        pipeline.append({"$skip": skip})
+    if limit is not None:
+        pipeline.append({"$limit": limit})
+    return pipeline + lookups + page_stages
+
+
+HISTORY_TOTALS_ID_BATCH = 5000
+
+
+async def history_totals(collection, query: dict, movement_type: str, txn_categories: List[str],
+                         date_filter: Optional[dict]) -> dict:
+    """
+    Totals of a history report over every matched document: the count, and the
+    weight and amount summed by one $group over stock movements / transactions
+    whose reference_id is among the matched ids (HISTORY_TOTALS_ID_BATCH ids per
+    $in), so the summary does not repeat the per-document joins of the rows.
+
+    Returns:
+        {"amount", "weight", "count"} as float/int
+    """
+    dated = {"date": date_filter} if date_filter else {}
+    
+    async def group_total(source: str, match: dict, value) -> Decimal:
+        cursor = await archive_aggregate(db, source, [
+            {"$match": match},
+            {"$group": {"_id": None, "total": {"$sum": value}}}
+        ])
+        return sum((_to_decimal(row["total"]) for row in await cursor.to_list(None)), Decimal('0'))
+    
+    ids = [doc["id"] async for doc in collection.find(query, {"_id": 0, "id": 1})]
+    weight, amount = Decimal('0'), Decimal('0')
+    for start in range(0, len(ids), HISTORY_TOTALS_ID_BATCH):
+        batch = ids[start:start + HISTORY_TOTALS_ID_BATCH]
+        batch_weight, batch_amount = await run_query_batch(
+            lambda: group_total('stock_movements', {
+                "reference_id": {"$in": batch}, "is_deleted": False, "movement_type": movement_type, **dated
+            }, {"$abs": "$weight_delta"}),
+            lambda: group_total('transactions', {
+                "reference_id": {"$in": batch}, "is_deleted": False, "category": {"$in": txn_categories},
+                "transaction_type": "credit", **dated
+            }, "$amount"),
+        )
+        weight += batch_weight
+        amount += batch_amount
+    return {"amount": float(amount), "weight": float(weight), "count": len(ids)}
+
+
+async def run_history_pipelines(collection, query: dict, lookups: list, page_stages: list,
+                                skip: int, limit: Optional[int], movement_type: str,
+                                txn_categories: List[str], date_filter: Optional[dict]) -> Tuple[list, dict]:
+    """
+    Run a history report: the requested page of documents (newest first, joined by
+    lookups and shaped by page_stages) and the history_totals over every matched document.
+
+    Returns:
+        (rows, totals) with totals {"amount", "weight", "count"} as float/int
+    """
+    pipeline = history_rows_pipeline(query, lookups, page_stages, skip, limit)
+    rows, totals = await run_query_batch(
+        lambda: collection.aggregate(pipeline).to_list(None),
+        lambda: history_totals(collection, query, movement_type, txn_categories, date_filter),
+    )
+    return rows, totals
+
+
+def history_display_date(value) -> str:
+    if isinstance(value, str):
+        return value[:10]
+    if hasattr(value, 'strftime'):
+        return value.strftime('%Y-%m-%d')
+    return value or ''
+
+
+async def sales_history_plan(
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    party_id: Optional[str] = None,
+    search: Optional[str] = None
+) -> Tuple[dict, list, list]:
+    """
+    (query, lookups, page_stages) of the sales history: finalized invoices matched
+    by date, party and search, joined to their Stock OUT movements (weight), sales
+    income credits (amount) and customer phone.
+    """
+    query = {
+        "is_deleted": False,
+        "status": "finalized"  # CRITICAL: Only finalized invoices
+    }
+    date_filter = history_date_filter(date_from, date_to)
+    if date_filter:
+        query['date'] = date_filter
+    if party_id and party_id != 'all':
+        query['customer_id'] = party_id
+    
+    # Search filter: saved customers through the indexed party search keys,
+    # invoice number and walk-in details by case-insensitive substring
+    search_text = search.strip() if search else ''
+    if search_text:
+        search_pattern = {"$regex": re.escape(search_text), "$options": "i"}
+        search_clauses = [
+            {"invoice_number": search_pattern},
+            {"walk_in_name": search_pattern},
+            {"walk_in_phone": search_pattern}
+        ]
+        party_filter = party_search_filter(search_text)
+        if party_filter:
+            matched_parties = await db.parties.find(party_filter, {"_id": 0, "id": 1}).to_list(None)
+            if matched_parties:
+                search_clauses.append({"customer_id": {"$in": [p['id'] for p in matched_parties]}})
+        query['$or'] = search_clauses
+    
+    page_stages = [
+        # Phone of saved customers
+        {"$lookup": {"from": "parties", "localField": "customer_id", "foreignField": "id", "as": "_party"}},
+        {"$project": {
+            "_id": 0, "invoice_number": 1, "customer_type": 1, "customer_id": 1, "customer_name": 1,
+            "walk_in_name": 1, "walk_in_phone": 1, "date": 1, "items.purity": 1,
+            "_weight": 1, "_amount": 1, "_party.phone": 1
+        }},
+    ]
+    lookups = history_lookup_stages("Stock OUT", SALES_HISTORY_TXN_CATEGORIES, date_filter,
+                                    *await history_archives(date_filter))
+    return query, lookups, page_stages
+
+
+def sales_history_record(inv: dict) -> dict:
+    # Get customer info (handle both saved and walk-in)
+    if inv.get('customer_type') == 'walk_in':
+        customer_name = inv.get('walk_in_name', 'Walk-in Customer')
+        customer_phone = inv.get('walk_in_phone', '')
+    else:
+        customer_name = inv.get('customer_name', 'Unknown Customer')
+        customer_phone = ''
+        if inv.get('customer_id') and inv.get('_party'):
+            customer_phone = inv['_party'][0].get('phone', '')
+    
+    # Calculate purity summary from invoice items (for display only)
+    purities = list(set(item.get('purity') for item in inv.get('items', []) if item.get('purity')))
+    if len(purities) == 0:
+        purity_summary = "N/A"
+    elif len(purities) == 1:
+        purity_summary = f"{purities[0]}K"
+    else:
+        purity_summary = "Mixed"
+    
+    return {
+        "invoice_id": inv.get('invoice_number', ''),
+        "customer_name": customer_name,
+        "customer_phone": customer_phone,
+        "date": history_display_date(inv.get('date', '')),
+        "total_weight_grams": round(safe_float(inv['_weight']), 3),  # FROM STOCKMOVEMENTS
+        "purity_summary": purity_summary,
+        "grand_total": round(safe_float(inv['_amount']), 2)  # FROM TRANSACTIONS
+    }
+
+
+async def fetch_sales_history(
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    party_id: Optional[str] = None,
+    search: Optional[str] = None,
+    skip: int = 0,
+    limit: Optional[int] = None
+) -> Tuple[list, dict]:
+    """
+    Load sales history rows and summary in MongoDB. Shared by the sales history
+    view, Excel and PDF.
+    
+    Returns:
+        (sales_records, summary) where sales_records is the requested page
+    """
+    query, lookups, page_stages = await sales_history_plan(date_from, date_to, party_id, search)
+    invoices, totals = await run_history_pipelines(
+        db.invoices, query, lookups, page_stages, skip, limit,
+        "Stock OUT", SALES_HISTORY_TXN_CATEGORIES, history_date_filter(date_from, date_to)
+    )
+    sales_records = [sales_history_record(inv) for inv in invoices]
+    
+    summary = {
+        "total_sales": round(totals["amount"], 2),  # FROM TRANSACTIONS
+        "total_weight": round(totals["weight"], 3),  # FROM STOCKMOVEMENTS
+        "total_invoices": totals["count"]
+    }
+    return sales_records, summary
+
+
+async def stream_sales_history(
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    party_id: Optional[str] = None,
+    search: Optional[str] = None
+):
+    """Every sales history record, read from the report cursor one batch at a time"""
+    query, lookups, page_stages = await sales_history_plan(date_from, date_to, party_id, search)
+    pipeline = history_rows_pipeline(query, lookups, page_stages)
+    async for inv in db.invoices.aggregate(pipeline, batchSize=EXPORT_BATCH_SIZE):
+        yield sales_history_record(inv)
+
+
+async def purchase_history_plan(
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    vendor_party_id: Optional[str] = None,
+    search: Optional[str] = None
+) -> Tuple[dict, list, list]:
+    """
+    (query, lookups, page_stages) of the purchase history: committed purchases
+    matched by date, vendor and search, joined to their Stock IN movements
+    (weight), purchase credits (amount) and vendor.
+    """
+    query = {
+        "is_deleted": False,
+        "status": {"$in": PURCHASE_HISTORY_STATUSES}  # CRITICAL: All committed purchases
+    }
+    date_filter = history_date_filter(date_from, date_to)
+    if date_filter:
+        query['date'] = date_filter
+    if vendor_party_id and vendor_party_id != 'all':
+        query['vendor_party_id'] = vendor_party_id
+    
+    # Search filter: vendors through the indexed party search keys, description
+    # by case-insensitive substring
+    search_text = search.strip() if search else ''
+    if search_text:
+        search_clauses = [{"description": {"$regex": re.escape(search_text), "$options": "i"}}]
+        party_filter = party_search_filter(search_text)
+        if party_filter:
+            matched_vendors = await db.parties.find(
+                {**party_filter, "is_deleted": False}, {"_id": 0, "id": 1}
+            ).to_list(None)
+            if matched_vendors:
+                search_clauses.append({"vendor_party_id": {"$in": [v['id'] for v in matched_vendors]}})
+        query['$or'] = search_clauses
+    
+    page_stages = [
+        {"$lookup": {"from": "parties", "localField": "vendor_party_id", "foreignField": "id", "as": "_vendor"}},
+        {"$addFields": {"_vendor": {"$filter": {
+            "input": "$_vendor", "as": "vendor", "cond": {"$eq": ["$$vendor.is_deleted", False]}
+        }}}},
+        {"$project": {
+            "_id": 0, "vendor_party_id": 1, "date": 1, "description": 1, "entered_purity": 1,
+            "_weight": 1, "_amount": 1, "_vendor.name": 1, "_vendor.phone": 1
+        }},
+    ]
+    lookups = history_lookup_stages("Stock IN", PURCHASE_HISTORY_TXN_CATEGORIES, date_filter,
+                                    *await history_archives(date_filter))
+    return query, lookups, page_stages
+
+
+def purchase_history_record(purchase: dict) -> dict:
+    vendor = purchase['_vendor'][0] if purchase.get('vendor_party_id') and purchase.get('_vendor') else {}
+    return decimal_to_float({
+        "vendor_name": vendor.get('name', 'Unknown Vendor'),
+        "vendor_phone": vendor.get('phone', ''),
+        "date": history_display_date(purchase.get('date', '')),
+        "description": purchase.get('description', ''),
+        "weight_grams": round(safe_float(purchase['_weight']), 3),  # FROM STOCKMOVEMENTS
+        "entered_purity": purchase.get('entered_purity', 0),
+        "valuation_purity": "22K",  # 916 purity = 22K
+        "amount_total": round(safe_float(purchase['_amount']), 2)  # FROM TRANSACTIONS
+    })
+
+
+async def fetch_purchase_history(
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    vendor_party_id: Optional[str] = None,
+    search: Optional[str] = None,
+    skip: int = 0,
+    limit: Optional[int] = None
+) -> Tuple[list, dict]:
+    """
+    Load purchase history rows and summary in MongoDB. Shared by the purchase
+    history view, Excel and PDF.
+    
+    Returns:
+        (purchase_records, summary) where purchase_records is the requested page
+    """
+    query, lookups, page_stages = await purchase_history_plan(date_from, date_to, vendor_party_id, search)
+    purchases, totals = await run_history_pipelines(
+        db.purchases, query, lookups, page_stages, skip, limit,
+        "Stock IN", PURCHASE_HISTORY_TXN_CATEGORIES, history_date_filter(date_from, date_to)
+    )
+    purchase_records = [purchase_history_record(purchase) for purchase in purchases]
+    
+    summary = {
+        "total_amount": round(totals["amount"], 2),  # FROM TRANSACTIONS
+        "total_weight": round(totals["weight"], 3),  # FROM STOCKMOVEMENTS
+        "total_purchases": totals["count"]
+    }
+    return purchase_records, summary
+
+
+async def stream_purchase_history(
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    vendor_party_id: Optional[str] = None,
+    search: Optional[str] = None
+):
+    """Every purchase history record, read from the report cursor one batch at a time"""
+    query, lookups, page_stages = await purchase_history_plan(date_from, date_to, vendor_party_id, search)
+    pipeline = history_rows_pipeline(query, lookups, page_stages)
+    async for purchase in db.purchases.aggregate(pipeline, batchSize=EXPORT_BATCH_SIZE):
+        yield purchase_history_record(purchase)
+
+
+async def ensure_history_report_indexes(db):
+    """reference_id indexes serving the history reports' $lookup joins"""
+    await db.stock_movements.create_index([("reference_id", 1)], name="stock_movements_reference_id")
+    await db.transactions.create_index([("reference_id", 1)], name="transactions_reference_id")
+
+
 @api_router.get("/reports/sales-history")
+@cached_report('invoices', 'parties', 'stock_movements', 'transactions')
 async def get_sales_history_report(
     date_from: Optional[str] = None,
     date_to: Optional[str] = None,
     party_id: Optional[str] = None,
     search: Optional[str] = None,
-    current_user: User = Depends(require_permission('reports.view'))
+    page: int = Query(1, ge=1),
+    page_size: int = Query(HISTORY_REPORT_PAGE_SIZE, ge=1, le=HISTORY_REPORT_MAX_PAGE_SIZE),
+    current_user: User = Depends(require_permission('reports.view')),
+    etag: str = Depends(report_etag('invoices', 'parties', 'stock_movements', 'transactions'))
 ):
     """
     Get sales history report using SOURCE-OF-TRUTH DATA.
@@ -9586,6 +11386,7 @@ async def get_sales_history_report(
     - date_from/date_to: Date range filter
     - party_id: Filter by specific party (or "all" for all parties)
     - search: Search in customer name, phone, or invoice_id
+    - page/page_size: Page of sales_records (summary covers all matches)
     
     Returns table with:
     - invoice_id
@@ -9595,174 +11396,53 @@ async def get_sales_history_report(
     - purity summary ("Mixed" if multiple purities, otherwise single purity)
     - grand_total (from Transactions)
     """
-    # Query for FINALIZED invoices only (for display details)
-    query = {
-        "is_deleted": False,
-        "status": "finalized"  # CRITICAL: Only finalized invoices
-    }
-    
-    # Date filters
-    if date_from:
-        query['date'] = {"$gte": datetime.fromisoformat(date_from)}
-    if date_to:
-        end_dt = datetime.fromisoformat(date_to)
-        if 'date' in query:
-            query['date']['$lte'] = end_dt
-        else:
-            query['date'] = {"$lte": end_dt}
-    
-    # Party filter
-    if party_id and party_id != 'all':
-        query['customer_id'] = party_id
-    
-    # Get invoices
-    invoices = await db.invoices.find(query, {"_id": 0}).sort("date", -1).to_list(10000)
-    # Convert Decimal128 to float for calculations
-    invoices = [decimal_to_float(inv) for inv in invoices]
-    
-    # Build queries for SOURCE-OF-TRUTH data
-    stock_query = {"is_deleted": False, "movement_type": "Stock OUT"}
-    txn_query = {"is_deleted": False}
-    
-    if date_from:
-        stock_query['date'] = {"$gte": datetime.fromisoformat(date_from)}
-        txn_query['date'] = {"$gte": datetime.fromisoformat(date_from)}
-    if date_to:
-        end_dt = datetime.fromisoformat(date_to)
-        if 'date' in stock_query:
-            stock_query['date']['$lte'] = end_dt
-            txn_query['date']['$lte'] = end_dt
-        else:
-            stock_query['date'] = {"$lte": end_dt}
-            txn_query['date'] = {"$lte": end_dt}
-    
-    # Get StockMovements and Transactions
-    stock_movements = await db.stock_movements.find(stock_query, {"_id": 0}).to_list(10000)
-    transactions = await db.transactions.find(txn_query, {"_id": 0}).to_list(10000)
-    
-    # Convert Decimal128 to float for calculations
-    stock_movements = [decimal_to_float(m) for m in stock_movements]
-    transactions = [decimal_to_float(t) for t in transactions]
-    
-    # Build maps for quick lookup by reference_id (invoice.id)
-    stock_by_invoice = {}
-    for movement in stock_movements:
-        ref_id = movement.get('reference_id')
-        if ref_id:
-            if ref_id not in stock_by_invoice:
-                stock_by_invoice[ref_id] = []
-            stock_by_invoice[ref_id].append(movement)
-    
-    txn_by_invoice = {}
-    for txn in transactions:
-        ref_id = txn.get('reference_id')
-        # Only count income account transactions for sales
-        if ref_id and txn.get('category') in ['sales', 'sales_income']:
-            if ref_id not in txn_by_invoice:
-                txn_by_invoice[ref_id] = []
-            txn_by_invoice[ref_id].append(txn)
-    
-    # Process each invoice using SOURCE-OF-TRUTH data
-    sales_records = []
-    total_sales = 0.0
-    total_weight = 0.0
-    
-    for inv in invoices:
-        invoice_id = inv.get('id')
-        
-        # Get customer info (handle both saved and walk-in)
-        if inv.get('customer_type') == 'walk_in':
-            customer_name = inv.get('walk_in_name', 'Walk-in Customer')
-            customer_phone = inv.get('walk_in_phone', '')
-        else:
-            customer_name = inv.get('customer_name', 'Unknown Customer')
-            # Fetch phone from party if saved customer
-            customer_phone = ''
-            if inv.get('customer_id'):
-                party = await db.parties.find_one({"id": inv['customer_id']}, {"_id": 0, "phone": 1})
-                if party:
-                    customer_phone = party.get('phone', '')
-        
-        # Get weight from StockMovements (SOURCE-OF-TRUTH)
-        invoice_movements = stock_by_invoice.get(invoice_id, [])
-        invoice_weight = sum(abs(safe_float(m.get('weight_delta', 0))) for m in invoice_movements)
-        
-        # Get sales amount from Transactions (SOURCE-OF-TRUTH)
-        invoice_txns = txn_by_invoice.get(invoice_id, [])
-        invoice_amount = sum(safe_float(t.get('amount', 0)) for t in invoice_txns if t.get('transaction_type') == 'credit')
-        
-        # Calculate purity summary from invoice items (for display only)
-        items = inv.get('items', [])
-        purities = list(set(item.get('purity') for item in items if item.get('purity')))
-        if len(purities) == 0:
-            purity_summary = "N/A"
-        elif len(purities) == 1:
-            purity_summary = f"{purities[0]}K"
-        else:
-            purity_summary = "Mixed"
-        
-        # Apply search filter (if provided)
-        if search:
-            search_lower = search.lower()
-            if not (
-                search_lower in customer_name.lower() or
-                search_lower in customer_phone.lower() or
-                search_lower in inv.get('invoice_number', '').lower()
-            ):
-                continue  # Skip this invoice if search doesn't match
-        
-        # Format date
-        invoice_date = inv.get('date', '')
-        if isinstance(invoice_date, str):
-            invoice_date = invoice_date[:10]
-        elif hasattr(invoice_date, 'strftime'):
-            invoice_date = invoice_date.strftime('%Y-%m-%d')
-        
-        sales_records.append({
-            "invoice_id": inv.get('invoice_number', ''),
-            "customer_name": customer_name,
-            "customer_phone": customer_phone,
-            "date": invoice_date,
-            "total_weight_grams": round(invoice_weight, 3),  # FROM STOCKMOVEMENTS
-            "purity_summary": purity_summary,
-            "grand_total": round(invoice_amount, 2)  # FROM TRANSACTIONS
-        })
-        
-        total_sales += invoice_amount
-        total_weight += invoice_weight
-    
+    sales_records, summary = await fetch_sales_history(
+        date_from=date_from, date_to=date_to, party_id=party_id, search=search,
+        skip=(page - 1) * page_size, limit=page_size
+    )
     return {
         "sales_records": sales_records,
-        "summary": {
-            "total_sales": round(total_sales, 2),  # FROM TRANSACTIONS
-            "total_weight": round(total_weight, 3),  # FROM STOCKMOVEMENTS
-            "total_invoices": len(sales_records)
-        }
+        "summary": summary,
+        "pagination": create_pagination_response([], summary["total_invoices"], page, page_size)["pagination"]
     }
 
 
+SALES_HISTORY_EXPORT_COLUMNS = [
+    ("Invoice #", "invoice_id"), ("Customer Name", "customer_name"), ("Phone", "customer_phone"),
+    ("Date", "date"), ("Weight (g)", "total_weight_grams"), ("Purity", "purity_summary"),
+    ("Grand Total (OMR)", "grand_total")
+]
+
 @api_router.get("/reports/sales-history-export")
 async def export_sales_history(
     date_from: Optional[str] = None,
     date_to: Optional[str] = None,
     party_id: Optional[str] = None,
     search: Optional[str] = None,
+    format: str = Query('xlsx'),
     current_user: User = Depends(require_permission('reports.view'))
 ):
-    """Export sales history report as Excel file with applied filters"""
+    """Export sales history report as Excel, or streamed CSV/NDJSON (format=csv|ndjson), with applied filters"""
     from fastapi.responses import StreamingResponse
     from io import BytesIO
     import openpyxl
     from openpyxl.styles import Font, PatternFill, Alignment
     
-    # Get data using the main report function
-    data = await get_sales_history_report(
+    require_export_format(format)
+    if format != 'xlsx':
+        return row_export_response(
+            format, SALES_HISTORY_EXPORT_COLUMNS, stream_sales_history(date_from, date_to, party_id, search),
+            f"sales_history_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        )
+    
+    # Same pipeline as the report view, all pages
+    records, summary = await fetch_sales_history(
         date_from=date_from,
         date_to=date_to,
         party_id=party_id,
-        search=search,
-        current_user=current_user
+        search=search
     )
+    data = {"sales_records": records, "summary": summary}
     
     wb = openpyxl.Workbook()
     ws = wb.active
@@ -9845,14 +11525,14 @@ async def export_sales_history_pdf(
     from io import BytesIO
     from fastapi.responses import StreamingResponse
     
-    # Get data using the main report function
-    data = await get_sales_history_report(
+    # Same pipeline as the report view, all pages
+    records, summary = await fetch_sales_history(
         date_from=date_from,
         date_to=date_to,
         party_id=party_id,
-        search=search,
-        current_user=current_user
+        search=search
     )
+    data = {"sales_records": records, "summary": summary}
     
     buffer = BytesIO()
     c = canvas.Canvas(buffer, pagesize=A4)
@@ -9931,11 +11611,14 @@ async def export_sales_history_pdf(
 
 
 @api_router.get("/reports/purchase-history")
+@cached_report('parties', 'purchases', 'stock_movements', 'transactions')
 async def get_purchase_history_report(
     date_from: Optional[str] = None,
     date_to: Optional[str] = None,
     vendor_party_id: Optional[str] = None,
     search: Optional[str] = None,
+    page: int = Query(1, ge=1),
+    page_size: int = Query(HISTORY_REPORT_PAGE_SIZE, ge=1, le=HISTORY_REPORT_MAX_PAGE_SIZE),
     current_user: User = Depends(require_permission('reports.view'))
 ):
     """
@@ -9950,152 +11633,36 @@ async def get_purchase_history_report(
     - date_from/date_to: Date range filter
     - vendor_party_id: Filter by specific vendor (or "all" for all vendors)
     - search: Search in vendor name, phone, or description
+    - page/page_size: Page of purchase_records (summary covers all matches)
     
-    Returns table with:
-    - vendor_name + phone (from parties collection)
-    - date
-    - weight_grams (from StockMovements)
-    - entered_purity
-    - valuation_purity (converted to "22K" display)
-    - amount_total (from Transactions)
-    
-    Summary includes:
-    - total_amount (from Transactions)
-    - total_weight (from StockMovements)
-    - total_purchases (count)
-    """
-    # Query for ALL COMMITTED purchases (excludes only Draft/Voided)
-    query = {
-        "is_deleted": False,
-        "status": {"$in": ["Paid", "Partially Paid", "Finalized (Unpaid)"]}  # CRITICAL: All committed purchases
-    }
-    
-    # Date filters
-    if date_from:
-        query['date'] = {"$gte": datetime.fromisoformat(date_from)}
-    if date_to:
-        end_dt = datetime.fromisoformat(date_to)
-        if 'date' in query:
-            query['date']['$lte'] = end_dt
-        else:
-            query['date'] = {"$lte": end_dt}
-    
-    # Vendor filter
-    if vendor_party_id and vendor_party_id != 'all':
-        query['vendor_party_id'] = vendor_party_id
-    
-    # Get purchases
-    purchases = await db.purchases.find(query, {"_id": 0}).sort("date", -1).to_list(10000)
-    
-    # Build queries for SOURCE-OF-TRUTH data
-    stock_query = {"is_deleted": False, "movement_type": "Stock IN"}
-    txn_query = {"is_deleted": False}
-    
-    if date_from:
-        stock_query['date'] = {"$gte": datetime.fromisoformat(date_from)}
-        txn_query['date'] = {"$gte": datetime.fromisoformat(date_from)}
-    if date_to:
-        end_dt = datetime.fromisoformat(date_to)
-        if 'date' in stock_query:
-            stock_query['date']['$lte'] = end_dt
-            txn_query['date']['$lte'] = end_dt
-        else:
-            stock_query['date'] = {"$lte": end_dt}
-            txn_query['date'] = {"$lte": end_dt}
-    
-    # Get StockMovements and Transactions
-    stock_movements = await db.stock_movements.find(stock_query, {"_id": 0}).to_list(10000)
-    transactions = await db.transactions.find(txn_query, {"_id": 0}).to_list(10000)
-    
-    # Build maps for quick lookup by reference_id (purchase.id)
-    stock_by_purchase = {}
-    for movement in stock_movements:
-        ref_id = movement.get('reference_id')
-        if ref_id:
-            if ref_id not in stock_by_purchase:
-                stock_by_purchase[ref_id] = []
-            stock_by_purchase[ref_id].append(movement)
-    
-    txn_by_purchase = {}
-    for txn in transactions:
-        ref_id = txn.get('reference_id')
-        # Only count purchase-related transactions
-        if ref_id and txn.get('category') in ['purchase', 'purchases', 'inventory_purchase']:
-            if ref_id not in txn_by_purchase:
-                txn_by_purchase[ref_id] = []
-            txn_by_purchase[ref_id].append(txn)
-    
-    # Process each purchase using SOURCE-OF-TRUTH data
-    purchase_records = []
-    total_amount = 0.0
-    total_weight = 0.0
-    
-    for purchase in purchases:
-        purchase_id = purchase.get('id')
-        
-        # Get vendor info from parties collection
-        vendor_name = "Unknown Vendor"
-        vendor_phone = ""
-        if purchase.get('vendor_party_id'):
-            vendor = await db.parties.find_one(
-                {"id": purchase['vendor_party_id'], "is_deleted": False},
-                {"_id": 0, "name": 1, "phone": 1}
-            )
-            if vendor:
-                vendor_name = vendor.get('name', 'Unknown Vendor')
-                vendor_phone = vendor.get('phone', '')
-        
-        # Apply search filter (if provided)
-        if search:
-            search_lower = search.lower()
-            if not (
-                search_lower in vendor_name.lower() or
-                search_lower in vendor_phone.lower() or
-                search_lower in purchase.get('description', '').lower()
-            ):
-                continue  # Skip this purchase if search doesn't match
-        
-        # Get weight from StockMovements (SOURCE-OF-TRUTH)
-        purchase_movements = stock_by_purchase.get(purchase_id, [])
-        purchase_weight = sum(abs(safe_float(m.get('weight_delta', 0))) for m in purchase_movements)
-        
-        # Get purchase amount from Transactions (SOURCE-OF-TRUTH)
-        purchase_txns = txn_by_purchase.get(purchase_id, [])
-        purchase_amount = sum(safe_float(t.get('amount', 0)) for t in purchase_txns if t.get('transaction_type') == 'credit')
-        
-        # Format date
-        purchase_date = purchase.get('date', '')
-        if isinstance(purchase_date, str):
-            purchase_date = purchase_date[:10]
-        elif hasattr(purchase_date, 'strftime'):
-            purchase_date = purchase_date.strftime('%Y-%m-%d')
-        
-        # Convert valuation_purity 916 to "22K" display
-        valuation_purity_display = "22K"  # 916 purity = 22K
-        
-        purchase_records.append({
-            "vendor_name": vendor_name,
-            "vendor_phone": vendor_phone,
-            "date": purchase_date,
-            "description": purchase.get('description', ''),
-            "weight_grams": round(purchase_weight, 3),  # FROM STOCKMOVEMENTS
-            "entered_purity": purchase.get('entered_purity', 0),
-            "valuation_purity": valuation_purity_display,
-            "amount_total": round(purchase_amount, 2)  # FROM TRANSACTIONS
-        })
-        
-        total_amount += purchase_amount
-        total_weight += purchase_weight
-    
-    # CRITICAL FIX: Convert entire response including purchase_records array to prevent Decimal128 serialization errors
-    return decimal_to_float({
+    Returns table with:
+    - vendor_name + phone (from parties collection)
+    - date
+    - weight_grams (from StockMovements)
+    - entered_purity
+    - valuation_purity (converted to "22K" display)
+    - amount_total (from Transactions)
+    
+    Summary includes:
+    - total_amount (from Transactions)
+    - total_weight (from StockMovements)
+    - total_purchases (count)
+    """
+    purchase_records, summary = await fetch_purchase_history(
+        date_from=date_from, date_to=date_to, vendor_party_id=vendor_party_id, search=search,
+        skip=(page - 1) * page_size, limit=page_size
+    )
+    return {
         "purchase_records": purchase_records,
-        "summary": {
-            "total_amount": round(total_amount, 2),  # FROM TRANSACTIONS
-            "total_weight": round(total_weight, 3),  # FROM STOCKMOVEMENTS
-            "total_purchases": len(purchase_records)
-        }
-    })
+        "summary": summary,
+        "pagination": create_pagination_response([], summary["total_purchases"], page, page_size)["pagination"]
+    }
+
+PURCHASE_HISTORY_EXPORT_COLUMNS = [
+    ("Vendor Name", "vendor_name"), ("Phone", "vendor_phone"), ("Date", "date"),
+    ("Description", "description"), ("Weight (g)", "weight_grams"), ("Entered Purity", "entered_purity"),
+    ("Valuation Purity", "valuation_purity"), ("Amount (OMR)", "amount_total")
+]
 
 @api_router.get("/reports/purchase-history-export")
 async def export_purchase_history(
@@ -10103,22 +11670,31 @@ async def export_purchase_history(
     date_to: Optional[str] = None,
     vendor_party_id: Optional[str] = None,
     search: Optional[str] = None,
+    format: str = Query('xlsx'),
     current_user: User = Depends(get_current_user)
 ):
-    """Export purchase history report as Excel file with applied filters"""
+    """Export purchase history report as Excel, or streamed CSV/NDJSON (format=csv|ndjson), with applied filters"""
     from fastapi.responses import StreamingResponse
     from io import BytesIO
     import openpyxl
     from openpyxl.styles import Font, PatternFill, Alignment
     
-    # Get data using the main report function
-    data = await get_purchase_history_report(
+    require_export_format(format)
+    if format != 'xlsx':
+        return row_export_response(
+            format, PURCHASE_HISTORY_EXPORT_COLUMNS,
+            stream_purchase_history(date_from, date_to, vendor_party_id, search),
+            f"purchase_history_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        )
+    
+    # Same pipeline as the report view, all pages
+    records, summary = await fetch_purchase_history(
         date_from=date_from,
         date_to=date_to,
         vendor_party_id=vendor_party_id,
-        search=search,
-        current_user=current_user
+        search=search
     )
+    data = {"purchase_records": records, "summary": summary}
     
     wb = openpyxl.Workbook()
     ws = wb.active
@@ -10205,14 +11781,14 @@ async def export_purchase_history_pdf(
     from io import BytesIO
     from fastapi.responses import StreamingResponse
     
-    # Get data using the main report function
-    data = await get_purchase_history_report(
+    # Same pipeline as the report view, all pages
+    records, summary = await fetch_purchase_history(
         date_from=date_from,
         date_to=date_to,
         vendor_party_id=vendor_party_id,
-        search=search,
-        current_user=current_user
+        search=search
     )
+    data = {"purchase_records": records, "summary": summary}
     
     buffer = BytesIO()
     c = canvas.Canvas(buffer, pagesize=A4)
@@ -10293,7 +11869,92 @@ async def export_purchase_history_pdf(
 # RETURNS REPORT ENDPOINTS
 # ============================================================================
 
+RETURNS_EXPORT_BATCH_SIZE = 500
+RETURNS_DETAIL_PROJECTION = {
+    "_id": 0, "return_number": 1, "date": 1, "return_type": 1, "party_name": 1, "status": 1,
+    "refund_mode": 1, "refund_money_amount": 1, "refund_gold_grams": 1, "reference_number": 1,
+    "reference_id": 1, "payment_mode": 1, "notes": 1
+}
+
+
+def returns_report_match(date_from: Optional[str], date_to: Optional[str], return_type: Optional[str],
+                         status: Optional[str], refund_mode: Optional[str], party_id: Optional[str],
+                         search: Optional[str]) -> dict:
+    """
+    $match shared by the returns summary and exports. search matches party name,
+    return number or reason (case-insensitive substring).
+    """
+    query = {"is_deleted": False}
+    
+    # Date filters
+    if date_from:
+        query['date'] = {"$gte": datetime.fromisoformat(date_from)}
+    if date_to:
+        end_dt = datetime.fromisoformat(date_to)
+        if 'date' in query:
+            query['date']['$lte'] = end_dt
+        else:
+            query['date'] = {"$lte": end_dt}
+    
+    if return_type and return_type != 'all':
+        query['return_type'] = return_type
+    if status and status != 'all':
+        query['status'] = status
+    if refund_mode and refund_mode != 'all':
+        query['refund_mode'] = refund_mode
+    if party_id and party_id != 'all':
+        query['party_id'] = party_id
+    
+    if search:
+        pattern = {"$regex": re.escape(search), "$options": "i"}
+        query['$or'] = [{"party_name": pattern}, {"return_number": pattern}, {"reason": pattern}]
+    return query
+
+
+def returns_summary_pipeline(match: dict) -> list:
+    """One pass over the matched returns: overall totals and totals by return type and refund mode"""
+    def total(field):
+        return {"$sum": {"$ifNull": [f"${field}", 0]}}
+    
+    return [
+        {"$match": match},
+        {"$facet": {
+            "totals": [{"$group": {
+                "_id": None, "count": {"$sum": 1}, "amount": total("total_amount"),
+                "money": total("refund_money_amount"), "gold": total("refund_gold_grams")
+            }}],
+            "by_return_type": [{"$group": {
+                "_id": "$return_type", "count": {"$sum": 1}, "amount": total("total_amount")
+            }}],
+            "by_refund_mode": [{"$group": {
+                "_id": "$refund_mode", "count": {"$sum": 1}, "amount": total("total_amount"),
+                "money": total("refund_money_amount"), "gold": total("refund_gold_grams")
+            }}],
+        }},
+    ]
+
+
+def returns_detail_cursor(match: dict):
+    """Matched returns, newest first, fetched in batches for the exports"""
+    return db.returns.find(match, RETURNS_DETAIL_PROJECTION).sort("date", -1).batch_size(RETURNS_EXPORT_BATCH_SIZE)
+
+
+def returns_report_row(ret: dict) -> dict:
+    """Display date and float refund amounts of a return"""
+    ret_date = ret.get('date', '')
+    if isinstance(ret_date, str):
+        ret_date = ret_date[:10]
+    elif hasattr(ret_date, 'strftime'):
+        ret_date = ret_date.strftime('%Y-%m-%d')
+    return {
+        "date": ret_date,
+        "refund_amount": safe_float(ret.get('refund_money_amount', 0)),
+        "gold_weight": safe_float(ret.get('refund_gold_grams', 0))
+    }
+
+
 @api_router.get("/reports/returns-summary")
+@cached_report('returns')
 async def get_returns_summary_report(
     date_from: Optional[str] = None,
     date_to: Optional[str] = None,
@@ -10314,100 +11975,49 @@ async def get_returns_summary_report(
     - total_refund_amount: Total refund amount across all returns (OMR)
     - money_refunded: Total money refunded (OMR)
     - gold_refunded: Total gold weight refunded (grams)
+    - by_return_type / by_refund_mode: count and amounts per return type and refund mode
     
     Note: Only FINALIZED returns are included in financial totals.
     Draft returns are excluded from metrics.
     """
-    # Build query - only finalized returns for summary
-    query = {
-        "is_deleted": False,
-        "status": "finalized"  # Only finalized returns count in financial totals
-    }
+    # Only finalized returns count in financial totals
+    match = returns_report_match(date_from, date_to, return_type, "finalized", refund_mode, party_id, search)
+    facets = (await db.returns.aggregate(returns_summary_pipeline(match)).to_list(1))[0]
     
-    # Date filters
-    if date_from:
-        query['date'] = {"$gte": datetime.fromisoformat(date_from)}
-    if date_to:
-        end_dt = datetime.fromisoformat(date_to)
-        if 'date' in query:
-            query['date']['$lte'] = end_dt
-        else:
-            query['date'] = {"$lte": end_dt}
-    
-    # Return type filter
-    if return_type and return_type != 'all':
-        query['return_type'] = return_type
-    
-    # Refund mode filter
-    if refund_mode and refund_mode != 'all':
-        query['refund_mode'] = refund_mode
-    
-    # Party filter
-    if party_id and party_id != 'all':
-        query['party_id'] = party_id
-    
-    # Get returns
-    returns = await db.returns.find(query, {"_id": 0}).to_list(10000)
-    
-    # Calculate summary metrics
-    total_returns_count = 0
-    sales_returns_amount = 0.0
-    purchase_returns_amount = 0.0
-    total_refund_amount = 0.0
-    money_refunded = 0.0
-    gold_refunded = 0.0
-    
-    for ret in returns:
-        # Apply search filter if provided
-        if search:
-            search_lower = search.lower()
-            party_name = ret.get('party_name', '').lower()
-            return_number = ret.get('return_number', '').lower()
-            reason = ret.get('reason', '').lower()
-            
-            if not (search_lower in party_name or 
-                    search_lower in return_number or 
-                    search_lower in reason):
-                continue  # Skip this return if search doesn't match
-        
-        total_returns_count += 1
-        
-        # Get total_amount (handle Decimal128)
-        total_amt = ret.get('total_amount', 0)
-        if isinstance(total_amt, Decimal128):
-            total_amt = float(total_amt.to_decimal())
-        
-        # Categorize by return type
-        if ret.get('return_type') == 'sale_return':
-            sales_returns_amount += total_amt
-        elif ret.get('return_type') == 'purchase_return':
-            purchase_returns_amount += total_amt
-        
-        # Total refund amount (same as total_amount)
-        total_refund_amount += total_amt
-        
-        # Money refunded
-        refund_money = ret.get('refund_money_amount', 0)
-        if isinstance(refund_money, Decimal128):
-            refund_money = float(refund_money.to_decimal())
-        money_refunded += refund_money
-        
-        # Gold refunded
-        refund_gold = ret.get('refund_gold_grams', 0)
-        if isinstance(refund_gold, Decimal128):
-            refund_gold = float(refund_gold.to_decimal())
-        gold_refunded += refund_gold
+    totals = facets["totals"][0] if facets["totals"] else {}
+    by_return_type = {
+        group["_id"]: {"count": group["count"], "amount": round(safe_float(group["amount"]), 2)}
+        for group in facets["by_return_type"]
+    }
+    by_refund_mode = {
+        group["_id"]: {
+            "count": group["count"],
+            "amount": round(safe_float(group["amount"]), 2),
+            "money_refunded": round(safe_float(group["money"]), 2),
+            "gold_refunded": round(safe_float(group["gold"]), 3)
+        }
+        for group in facets["by_refund_mode"]
+    }
     
     return {
-        "total_returns_count": total_returns_count,
-        "sales_returns_amount": round(sales_returns_amount, 2),
-        "purchase_returns_amount": round(purchase_returns_amount, 2),
-        "total_refund_amount": round(total_refund_amount, 2),
-        "money_refunded": round(money_refunded, 2),
-        "gold_refunded": round(gold_refunded, 3)
+        "total_returns_count": totals.get("count", 0),
+        "sales_returns_amount": by_return_type.get("sale_return", {}).get("amount", 0.0),
+        "purchase_returns_amount": by_return_type.get("purchase_return", {}).get("amount", 0.0),
+        "total_refund_amount": round(safe_float(totals.get("amount")), 2),
+        "money_refunded": round(safe_float(totals.get("money")), 2),
+        "gold_refunded": round(safe_float(totals.get("gold")), 3),
+        "by_return_type": by_return_type,
+        "by_refund_mode": by_refund_mode
     }
 
 
+RETURNS_EXPORT_COLUMNS = [
+    ("Return #", "return_number"), ("Date", "date"), ("Return Type", "return_type"), ("Party Name", "party_name"),
+    ("Status", "status"), ("Refund Mode", "refund_mode"), ("Refund Amount (OMR)", "refund_money_amount"),
+    ("Gold Weight Returned (g)", "refund_gold_grams"), ("Linked Invoice/Purchase #", "reference_number"),
+    ("Payment Mode", "payment_mode"), ("Notes", "notes")
+]
+
 @api_router.get("/reports/returns-export")
 async def export_returns_report(
     date_from: Optional[str] = None,
@@ -10417,60 +12027,27 @@ async def export_returns_report(
     refund_mode: Optional[str] = None,
     party_id: Optional[str] = None,
     search: Optional[str] = None,
+    format: str = Query('xlsx'),
     current_user: User = Depends(require_permission('reports.view'))
 ):
-    """Export returns report as Excel file with applied filters"""
+    """Export returns report as Excel, or streamed CSV/NDJSON (format=csv|ndjson), with applied filters"""
     from fastapi.responses import StreamingResponse
-    from io import BytesIO
+    import tempfile
     import openpyxl
+    from openpyxl.cell import WriteOnlyCell
     from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
     
-    # Build query
-    query = {"is_deleted": False}
-    
-    # Date filters
-    if date_from:
-        query['date'] = {"$gte": datetime.fromisoformat(date_from)}
-    if date_to:
-        end_dt = datetime.fromisoformat(date_to)
-        if 'date' in query:
-            query['date']['$lte'] = end_dt
-        else:
-            query['date'] = {"$lte": end_dt}
-    
-    # Return type filter
-    if return_type and return_type != 'all':
-        query['return_type'] = return_type
-    
-    # Status filter
-    if status and status != 'all':
-        query['status'] = status
-    
-    # Refund mode filter
-    if refund_mode and refund_mode != 'all':
-        query['refund_mode'] = refund_mode
-    
-    # Party filter
-    if party_id and party_id != 'all':
-        query['party_id'] = party_id
-    
-    # Get returns
-    returns = await db.returns.find(query, {"_id": 0}).sort("date", -1).to_list(10000)
-    
-    # Apply search filter
-    if search:
-        search_lower = search.lower()
-        returns = [
-            ret for ret in returns
-            if (search_lower in ret.get('party_name', '').lower() or
-                search_lower in ret.get('return_number', '').lower() or
-                search_lower in ret.get('reason', '').lower())
-        ]
+    require_export_format(format)
+    match = returns_report_match(date_from, date_to, return_type, status, refund_mode, party_id, search)
+    if format != 'xlsx':
+        return row_export_response(
+            format, RETURNS_EXPORT_COLUMNS, returns_detail_cursor(match),
+            f"returns_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        )
     
-    # Create workbook
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Returns Report"
+    # Write-only workbook: rows go straight to the temp file instead of being kept as cells
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("Returns Report")
     
     # Styles
     header_font = Font(bold=True, color="FFFFFF", size=12)
@@ -10483,76 +12060,57 @@ async def export_returns_report(
         bottom=Side(style='thin')
     )
     
+    # Column widths must be set before the first row is written
+    column_widths = [15, 12, 15, 20, 12, 12, 18, 20, 22, 15, 30]
+    for col_num, width in enumerate(column_widths, 1):
+        ws.column_dimensions[openpyxl.utils.get_column_letter(col_num)].width = width
+    
     # Headers
     headers = [
         "Return #", "Date", "Return Type", "Party Name", "Status",
         "Refund Mode", "Refund Amount (OMR)", "Gold Weight Returned (g)",
         "Linked Invoice/Purchase #", "Payment Mode", "Notes"
     ]
-    
-    for col_num, header in enumerate(headers, 1):
-        cell = ws.cell(row=1, column=col_num, value=header)
+    header_cells = []
+    for header in headers:
+        cell = WriteOnlyCell(ws, value=header)
         cell.font = header_font
         cell.fill = header_fill
         cell.alignment = header_alignment
         cell.border = thin_border
+        header_cells.append(cell)
+    ws.append(header_cells)
     
-    # Data rows
-    for row_num, ret in enumerate(returns, 2):
-        # Format date
-        ret_date = ret.get('date', '')
-        if isinstance(ret_date, str):
-            ret_date = ret_date[:10]
-        elif hasattr(ret_date, 'strftime'):
-            ret_date = ret_date.strftime('%Y-%m-%d')
-        
-        # Get refund amount
-        refund_amount = ret.get('refund_money_amount', 0)
-        if isinstance(refund_amount, Decimal128):
-            refund_amount = float(refund_amount.to_decimal())
-        
-        # Get gold weight
-        gold_weight = ret.get('refund_gold_grams', 0)
-        if isinstance(gold_weight, Decimal128):
-            gold_weight = float(gold_weight.to_decimal())
-        
-        # Return type display
-        return_type_display = "Sales Return" if ret.get('return_type') == 'sale_return' else "Purchase Return"
-        
-        # Refund mode display
-        refund_mode_display = ret.get('refund_mode', '').capitalize()
-        
+    # Data rows, streamed from the detail cursor
+    async for ret in returns_detail_cursor(match):
+        row = returns_report_row(ret)
         row_data = [
             ret.get('return_number', ''),
-            ret_date,
-            return_type_display,
+            row["date"],
+            "Sales Return" if ret.get('return_type') == 'sale_return' else "Purchase Return",
             ret.get('party_name', ''),
             ret.get('status', '').capitalize(),
-            refund_mode_display,
-            round(refund_amount, 2),
-            round(gold_weight, 3),
+            ret.get('refund_mode', '').capitalize(),
+            round(row["refund_amount"], 2),
+            round(row["gold_weight"], 3),
             ret.get('reference_number', ret.get('reference_id', '')[:8]),
             ret.get('payment_mode', '').replace('_', ' ').title() if ret.get('payment_mode') else '',
             ret.get('notes', '')
         ]
-        
-        for col_num, value in enumerate(row_data, 1):
-            cell = ws.cell(row=row_num, column=col_num, value=value)
+        cells = []
+        for value in row_data:
+            cell = WriteOnlyCell(ws, value=value)
             cell.border = thin_border
+            cells.append(cell)
+        ws.append(cells)
     
-    # Adjust column widths
-    column_widths = [15, 12, 15, 20, 12, 12, 18, 20, 22, 15, 30]
-    for col_num, width in enumerate(column_widths, 1):
-        ws.column_dimensions[openpyxl.utils.get_column_letter(col_num)].width = width
-    
-    # Save to BytesIO
-    buffer = BytesIO()
-    wb.save(buffer)
-    buffer.seek(0)
+    output = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+    await asyncio.to_thread(wb.save, output)
+    output.seek(0)
     
     filename = f"returns_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
     return StreamingResponse(
-        buffer,
+        output,
         media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
         headers={"Content-Disposition": f"attachment; filename={filename}"}
     )
@@ -10571,73 +12129,19 @@ async def export_returns_pdf(
 ):
     """Export returns report as PDF file with applied filters"""
     from fastapi.responses import StreamingResponse
-    from io import BytesIO
+    import tempfile
     from reportlab.lib import colors
     from reportlab.lib.pagesizes import A4, landscape
-    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-    from reportlab.lib.units import inch
-    
-    # Build query
-    query = {"is_deleted": False}
-    
-    # Date filters
-    if date_from:
-        query['date'] = {"$gte": datetime.fromisoformat(date_from)}
-    if date_to:
-        end_dt = datetime.fromisoformat(date_to)
-        if 'date' in query:
-            query['date']['$lte'] = end_dt
-        else:
-            query['date'] = {"$lte": end_dt}
-    
-    # Return type filter
-    if return_type and return_type != 'all':
-        query['return_type'] = return_type
-    
-    # Status filter
-    if status and status != 'all':
-        query['status'] = status
-    
-    # Refund mode filter
-    if refund_mode and refund_mode != 'all':
-        query['refund_mode'] = refund_mode
-    
-    # Party filter
-    if party_id and party_id != 'all':
-        query['party_id'] = party_id
-    
-    # Get returns
-    returns = await db.returns.find(query, {"_id": 0}).sort("date", -1).to_list(10000)
+    from reportlab.pdfgen import canvas
     
-    # Apply search filter
-    if search:
-        search_lower = search.lower()
-        returns = [
-            ret for ret in returns
-            if (search_lower in ret.get('party_name', '').lower() or
-                search_lower in ret.get('return_number', '').lower() or
-                search_lower in ret.get('reason', '').lower())
-        ]
+    match = returns_report_match(date_from, date_to, return_type, status, refund_mode, party_id, search)
     
-    # Create PDF
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=landscape(A4), rightMargin=30, leftMargin=30, topMargin=30, bottomMargin=30)
-    
-    elements = []
-    styles = getSampleStyleSheet()
-    
-    # Title
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=18,
-        textColor=colors.HexColor('#1f2937'),
-        spaceAfter=30,
-        alignment=1  # Center
-    )
-    elements.append(Paragraph("Returns Report", title_style))
-    elements.append(Spacer(1, 0.2 * inch))
+    # Rows are drawn page by page as they stream from the cursor
+    output = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+    page_width, page_height = landscape(A4)
+    pdf = canvas.Canvas(output, pagesize=(page_width, page_height))
+    headers = ["Return #", "Date", "Type", "Party", "Status", "Refund Mode", "Amount (OMR)", "Gold (g)"]
+    x_positions = [30, 130, 210, 290, 440, 520, 610, 720]
     
     # Filter info
     filter_info = []
@@ -10650,81 +12154,58 @@ async def export_returns_pdf(
     if status and status != 'all':
         filter_info.append(f"Status: {status}")
     
-    if filter_info:
-        filter_text = " | ".join(filter_info)
-        elements.append(Paragraph(f"<b>Filters:</b> {filter_text}", styles['Normal']))
-        elements.append(Spacer(1, 0.2 * inch))
-    
-    # Table data
-    table_data = [[
-        "Return #", "Date", "Type", "Party", "Status",
-        "Refund Mode", "Amount (OMR)", "Gold (g)"
-    ]]
-    
-    for ret in returns:
-        # Format date
-        ret_date = ret.get('date', '')
-        if isinstance(ret_date, str):
-            ret_date = ret_date[:10]
-        elif hasattr(ret_date, 'strftime'):
-            ret_date = ret_date.strftime('%Y-%m-%d')
-        
-        # Get refund amount
-        refund_amount = ret.get('refund_money_amount', 0)
-        if isinstance(refund_amount, Decimal128):
-            refund_amount = float(refund_amount.to_decimal())
-        
-        # Get gold weight
-        gold_weight = ret.get('refund_gold_grams', 0)
-        if isinstance(gold_weight, Decimal128):
-            gold_weight = float(gold_weight.to_decimal())
-        
-        # Return type display (abbreviated for PDF)
-        return_type_display = "Sales" if ret.get('return_type') == 'sale_return' else "Purchase"
-        
-        table_data.append([
+    def draw_row(values, y, font="Helvetica", size=8):
+        pdf.setFont(font, size)
+        for x, value in zip(x_positions, values):
+            pdf.drawString(x, y, str(value))
+    
+    def new_page(first=False):
+        y = page_height - 40
+        if first:
+            pdf.setFont("Helvetica-Bold", 18)
+            pdf.setFillColor(colors.HexColor('#1f2937'))
+            pdf.drawCentredString(page_width / 2, y, "Returns Report")
+            y -= 30
+            if filter_info:
+                pdf.setFont("Helvetica", 9)
+                pdf.drawString(30, y, f"Filters: {' | '.join(filter_info)}")
+                y -= 20
+        pdf.setFillColor(colors.HexColor('#4472C4'))
+        pdf.rect(25, y - 4, page_width - 50, 16, stroke=0, fill=1)
+        pdf.setFillColor(colors.whitesmoke)
+        draw_row(headers, y, "Helvetica-Bold", 10)
+        pdf.setFillColor(colors.black)
+        return y - 18
+    
+    y = new_page(first=True)
+    async for ret in returns_detail_cursor(match):
+        if y < 40:
+            pdf.showPage()
+            y = new_page()
+        row = returns_report_row(ret)
+        draw_row([
             ret.get('return_number', '')[:10],
-            ret_date,
-            return_type_display,
+            row["date"],
+            "Sales" if ret.get('return_type') == 'sale_return' else "Purchase",
             ret.get('party_name', '')[:15],
             ret.get('status', '').capitalize()[:8],
             ret.get('refund_mode', '').capitalize()[:8],
-            f"{refund_amount:.2f}",
-            f"{gold_weight:.3f}"
-        ])
-    
-    # Create table
-    table = Table(table_data, repeatRows=1)
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#4472C4')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 1), (-1, -1), 8),
-        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f3f4f6')])
-    ]))
-    
-    elements.append(table)
-    
-    # Build PDF
-    doc.build(elements)
-    buffer.seek(0)
+            f"{row['refund_amount']:.2f}",
+            f"{row['gold_weight']:.3f}"
+        ], y)
+        y -= 12
+    await asyncio.to_thread(pdf.save)
+    output.seek(0)
     
     filename = f"returns_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
     return StreamingResponse(
-        buffer,
+        output,
         media_type="application/pdf",
         headers={"Content-Disposition": f"attachment; filename={filename}"}
     )
 
 
 
-
 # Health check endpoint (no authentication required)
 @api_router.get("/health")
 @limiter.limit("100/minute")  # General rate limit: 100 requests per minute per IP
@@ -10746,6 +12227,60 @@ async def health_check(request: Request):
         )
 
 
+# Metrics endpoint for Prometheus scraping
+@api_router.get("/metrics")
+async def get_metrics(request: Request, credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)):
+    """
+    Per-route request latency, MongoDB time and query-count histograms in Prometheus text format.
+
+    Scrapers authenticate with the static METRICS_TOKEN bearer token when it is configured;
+    otherwise an authenticated user with audit.view permission is required.
+    """
+    metrics_token = os.environ.get('METRICS_TOKEN')
+    if metrics_token and credentials and secrets.compare_digest(credentials.credentials, metrics_token):
+        pass
+    else:
+        current_user = await get_current_user(request, credentials)
+        if not user_has_permission(current_user, 'audit.view'):
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="You don't have permission to perform this action. Required: audit.view"
+            )
+    return Response(content=render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@api_router.get("/slow-queries")
+async def get_slow_queries(
+    limit: int = Query(20, ge=1, le=200),
+    hours: int = Query(24, ge=1, le=24 * 30),
+    route: Optional[str] = None,
+    current_user: User = Depends(require_permission('audit.view'))
+):
+    """
+    Top slow MongoDB query shapes ranked by total time spent.
+
+    Populated when SLOW_QUERY_THRESHOLD_MS is set. Each entry groups samples with the same
+    collection, command and redacted filter shape, lists the routes that issued them and
+    includes the latest executionStats summary (keys/docs examined, plan stages, COLLSCAN).
+    """
+    offenders = await top_slow_queries(db, limit=limit, hours=hours, route=route)
+    return {
+        "enabled": slow_query_recorder.enabled,
+        "hours": hours,
+        "items": decimal_to_float(offenders),
+    }
+
+@api_router.get("/reference-cache/stats")
+async def get_reference_cache_stats(current_user: User = Depends(require_permission('audit.view'))):
+    """Hit/miss counts, hit rate and loaded version of each reference data cache."""
+    return {"caches": reference_cache.stats()}
+
+@api_router.get("/report-cache/stats")
+async def get_report_cache_stats(current_user: User = Depends(require_permission('audit.view'))):
+    """Size of each report result cache tier and lookup results per report endpoint."""
+    return report_cache.stats()
+
+
 # ========================================
 # WORKFLOW CONTROL - IMPACT SUMMARY ENDPOINTS
 # ========================================
@@ -11006,11 +12541,14 @@ async def delete_purchase(purchase_id: str, current_user: User = Depends(require
             status_code=400, 
             detail="Cannot delete finalized purchase. Finalized purchases are immutable to maintain financial integrity."
         )
+    await require_open_period(existing.get('date'), "Purchases")
     
+    deleted_at = datetime.now(timezone.utc)
     await db.purchases.update_one(
         {"id": purchase_id},
-        {"$set": {"is_deleted": True}}
+        {"$set": {"is_deleted": True, "deleted_at": deleted_at, "deleted_by": current_user.id}}
     )
+    await record_purchase(db, existing, sign=-1, changed_at=deleted_at)
     await create_audit_log(current_user.id, current_user.full_name, "purchases", purchase_id, "delete")
     return {"message": "Purchase deleted successfully"}
 
@@ -11037,7 +12575,7 @@ async def get_party_delete_impact(party_id: str, current_user: User = Depends(re
         "is_deleted": False
     })
     
-    transaction_count = await db.transactions.count_documents({
+    transaction_count = await archive_count(db, 'transactions', {
         "party_id": party_id,
         "is_deleted": False
     })
@@ -11133,6 +12671,7 @@ async def delete_transaction(
             status_code=400,
             detail="Cannot delete invoice payment transactions. Delete the invoice or payment record instead."
         )
+    await require_open_period(transaction.get('date'), "Transactions")
     
     # Get transaction details for balance reversal
     account_id = transaction.get('account_id')
@@ -11417,12 +12956,16 @@ async def get_returns(
     status: Optional[str] = None,
     refund_mode: Optional[str] = None,
     search: Optional[str] = None,
+    fields: Optional[str] = None,
+    view: Optional[str] = None,
     current_user: User = Depends(require_permission('returns.view'))
 ):
     """
     Get all returns with pagination and filters.
     Filters: return_type, party_id, status, refund_mode, search
+    Sparse fieldsets: fields=id,return_number,... and/or view=summary (see fieldsets.py)
     """
+    selected = select_fields(RETURN_FIELDSET, fields, view)
     try:
         # Build query
         query = {"is_deleted": False}
@@ -11451,8 +12994,11 @@ async def get_returns(
         total_pages = (total_count + page_size - 1) // page_size
         
         # Fetch returns
-        cursor = db.returns.find(query).sort("created_at", -1).skip(skip).limit(page_size)
+        projection = RETURN_FIELDSET.projection(selected) if selected else None
+        cursor = db.returns.find(query, projection).sort("created_at", -1).skip(skip).limit(page_size)
         returns = await cursor.to_list(length=page_size)
+        if selected:
+            returns = [RETURN_FIELDSET.trim(selected, ret) for ret in returns]
         
         return {
             "items": [decimal_to_float(ret) for ret in returns],
@@ -11615,6 +13161,7 @@ async def finalize_return(
     
     if current_status == 'processing':
         raise HTTPException(status_code=409, detail="Return is currently being processed. Please try again in a moment.")
+    await require_open_period(return_doc.get('date'), "Returns")
     
     # ========== VALIDATE REFUND DETAILS (REQUIRED AT FINALIZATION) ==========
     refund_mode = return_doc.get('refund_mode')
@@ -11672,6 +13219,7 @@ async def finalize_return(
     # ==========================================================================
     
     # Use status lock + rollback for safety (MongoDB transactions require replica set)
+    counters_applied = False
     try:
         # Step 1: Atomic lock - Set status to 'processing'
         lock_result = await db.returns.update_one(
@@ -11693,6 +13241,22 @@ async def finalize_return(
         transaction_id = None
         gold_ledger_id = None
         
+        # Add this return to the invoice/purchase returned counters (guarded atomic $inc).
+        # Fails when returns finalized since this draft was validated used up the remaining qty.
+        if not await apply_return_counters(db, return_doc):
+            reference_doc = await db[RETURN_REFERENCE_COLLECTIONS[reference_type]].find_one({"id": reference_id})
+            # Raises the detailed qty/weight/amount message
+            await validate_return_against_original(
+                db=db,
+                reference_type=reference_type,
+                reference_id=reference_id,
+                reference_doc=reference_doc,
+                return_items=return_doc.get('items', [])
+            )
+            raise HTTPException(status_code=409, detail="Returned quantities changed during finalization. Please try again.")
+        counters_applied = True
+        await db.returns.update_one({"id": return_id}, {"$set": {"returned_counters_applied": True}})
+        
         # ========================================================================
         # SALES RETURN WORKFLOW
         # ========================================================================
@@ -11742,7 +13306,7 @@ async def finalize_return(
                     raise HTTPException(status_code=400, detail="Account not found for money refund")
             
             # 2a. Transaction 1: Debit Cash/Bank account (money going out)
-            transactions_count = await db.transactions.count_documents({})
+            transactions_count = await archive_count(db, 'transactions', {})
             transaction_number = f"TXN-{transactions_count + 1:05d}"
             
             transaction_id = str(uuid.uuid4())
@@ -11783,7 +13347,7 @@ async def finalize_return(
             })
             
             if sales_income_account:
-                transactions_count = await db.transactions.count_documents({})
+                transactions_count = await archive_count(db, 'transactions', {})
                 income_transaction_number = f"TXN-{transactions_count + 1:05d}"
                 income_transaction_id = str(uuid.uuid4())
                 
@@ -11912,7 +13476,7 @@ async def finalize_return(
                     raise HTTPException(status_code=400, detail="Account not found for money refund")
                 
                 # Generate transaction number
-                transactions_count = await db.transactions.count_documents({})
+                transactions_count = await archive_count(db, 'transactions', {})
                 transaction_number = f"TXN-{transactions_count + 1:05d}"
                 
                 transaction_id = str(uuid.uuid4())
@@ -12026,6 +13590,7 @@ async def finalize_return(
         
         # Fetch updated return
         updated_return = await db.returns.find_one({"id": return_id})
+        await record_return(db, updated_return)
         
         # Build response message - Both sales and purchase returns require manual inventory action
         message = "Return finalized successfully. ⚠️ IMPORTANT: Manual inventory adjustment is required after inspection."
@@ -12046,9 +13611,11 @@ async def finalize_return(
     except HTTPException as he:
         # Rollback: Reset status to draft if processing lock was acquired
         try:
+            if counters_applied:
+                await apply_return_counters(db, return_doc, direction=-1)
             await db.returns.update_one(
                 {"id": return_id, "status": "processing"},
-                {"$set": {"status": "draft"}, "$unset": {"processing_started_at": ""}}
+                {"$set": {"status": "draft"}, "$unset": {"processing_started_at": "", "returned_counters_applied": ""}}
             )
         except:
             pass  # Best effort rollback
@@ -12065,10 +13632,14 @@ async def finalize_return(
                         "processing_started_at": "",
                         "stock_movement_ids": "",
                         "transaction_id": "",
-                        "gold_ledger_id": ""
+                        "gold_ledger_id": "",
+                        "returned_counters_applied": ""
                     }
                 }
             )
+            if counters_applied:
+                # Take the return back out of the invoice/purchase returned counters
+                await apply_return_counters(db, return_doc, direction=-1)
             
             # 2. Delete any stock movements created
             if stock_movement_ids:
@@ -12154,16 +13725,23 @@ async def delete_return(
             raise HTTPException(status_code=400, detail="Cannot delete finalized return. Finalized returns are immutable.")
         
         # Soft delete
-        await db.returns.update_one(
-            {"id": return_id},
+        result = await db.returns.update_one(
+            {"id": return_id, "is_deleted": False, "status": {"$ne": "finalized"}},
             {
                 "$set": {
                     "is_deleted": True,
                     "deleted_at": datetime.now(timezone.utc),
                     "deleted_by": current_user.id
-                }
+                },
+                "$unset": {"returned_counters_applied": ""}
             }
         )
+        if result.modified_count == 0:
+            raise HTTPException(status_code=409, detail="Return was modified. Please refresh and try again.")
+        
+        # A return abandoned in 'processing' may already be counted on its invoice/purchase
+        if return_doc.get('returned_counters_applied'):
+            await apply_return_counters(db, return_doc, direction=-1)
         
         # Create audit log
         await create_audit_log(
@@ -12258,6 +13836,127 @@ async def get_return_finalize_impact(
 
 
 
+# ============================================================================
+# BATCH REQUESTS
+# ============================================================================
+#
+# POST /api/batch runs up to BATCH_MAX_REQUESTS read-only (GET) API calls in one
+# round trip. The batch request is authenticated and rate limited once; each
+# sub-request is then dispatched concurrently, in process, straight to the router
+# (skipping the middleware stack), with the authenticated user passed through the
+# ASGI scope state. Route dependencies still run, so per-route permission checks
+# apply to every sub-request. Sub-request bodies are embedded verbatim.
+
+# Headers a sub-request inherits from the batch request
+BATCH_FORWARDED_HEADERS = {b"authorization", b"cookie", b"user-agent", b"accept-language", b"x-forwarded-for"}
+
+def validate_batch_path(path: str) -> Optional[str]:
+    """Error message for a sub-request path that cannot be dispatched, else None"""
+    if not path.startswith("/api/"):
+        return "path must start with /api/"
+    if path.split("?", 1)[0].rstrip("/") == "/api/batch":
+        return "batches cannot be nested"
+    return None
+
+async def run_batch_subrequest(request: Request, current_user: User, path: str) -> dict:
+    """Dispatch one GET to the router and capture its status and JSON body"""
+    path, _, query_string = path.partition("?")
+    scope = {
+        "type": "http",
+        "asgi": request.scope.get("asgi", {"version": "3.0"}),
+        "http_version": request.scope.get("http_version", "1.1"),
+        "method": "GET",
+        "scheme": request.scope.get("scheme", "http"),
+        "server": request.scope.get("server"),
+        "client": request.scope.get("client"),
+        "root_path": request.scope.get("root_path", ""),
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query_string.encode(),
+        "headers": [(name, value) for name, value in request.scope["headers"] if name in BATCH_FORWARDED_HEADERS]
+                   + [(b"accept", b"application/json")],
+        "app": request.scope.get("app"),
+        # Route-level exception handling looks its handlers up in the scope
+        "starlette.exception_handlers": request.scope.get("starlette.exception_handlers"),
+        # Already authenticated and rate limited as part of the batch
+        "state": {"batch_user": current_user, "_rate_limiting_complete": True},
+    }
+    started = {"status": 500, "headers": []}
+    chunks = []
+    finished = asyncio.Event()
+    request_sent = False
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await finished.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            started["status"] = message["status"]
+            started["headers"] = message.get("headers", [])
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                finished.set()
+
+    try:
+        # Normally provided by FastAPI's outermost middleware, which sub-requests skip
+        async with AsyncExitStack() as exit_stack:
+            scope["fastapi_middleware_astack"] = exit_stack
+            await app.router(scope, receive, send)
+    except StarletteHTTPException as e:
+        # Raised by the router itself when no route matches
+        return {"status": e.status_code, "body": {"detail": e.detail}}
+    except Exception as e:
+        logger.error(f"Batch sub-request {path} failed: {e}")
+        return {"status": 500, "body": {"detail": "Internal server error"}}
+    finally:
+        finished.set()
+
+    body = b"".join(chunks)
+    content_type = next((value for name, value in started["headers"] if name == b"content-type"), b"")
+    if not body:
+        payload = None
+    elif b"json" in content_type:
+        payload = orjson.Fragment(body)
+    else:
+        payload = {"detail": f"Non-JSON response ({content_type.decode() or 'unknown type'}) is not returned in batches"}
+    return {"status": started["status"], "body": payload}
+
+@api_router.post("/batch")
+@limiter.limit("1000/hour")  # General authenticated rate limit; sub-requests are not counted separately
+async def run_batch(
+    request: Request,
+    batch: BatchRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Run several read-only API calls in one request.
+    
+    Body: {"requests": [{"id": "invoice", "path": "/api/invoices/<id>"}, ...]}
+    Returns: {"responses": [{"id": ..., "status": ..., "body": ...}, ...]} in request order.
+    A failing sub-request only fails its own entry (its status and error body).
+    """
+    for index, sub in enumerate(batch.requests):
+        if sub.method.upper() != "GET":
+            raise HTTPException(status_code=400, detail=f"requests[{index}]: only GET sub-requests are allowed")
+        error = validate_batch_path(sub.path)
+        if error:
+            raise HTTPException(status_code=400, detail=f"requests[{index}]: {error}")
+    
+    results = await asyncio.gather(*(
+        run_batch_subrequest(request, current_user, sub.path) for sub in batch.requests
+    ))
+    return json_response({"responses": [
+        {"id": sub.id if sub.id is not None else str(index), **result}
+        for index, (sub, result) in enumerate(zip(batch.requests, results))
+    ]})
+
+
 app.include_router(api_router)
 
 
@@ -12276,7 +13975,16 @@ app.include_router(api_router)
 # (You can comment this out if you still have issues, but moving it 'above' CORS usually fixes it)
 # app.add_middleware(CSRFProtectionMiddleware)
 
-# 5. CORS Middleware (MUST BE LAST/OUTERMOST)
+# 5. Write versions: flush collection write counters before a response leaves
+app.add_middleware(WriteVersionMiddleware)
+
+# 6. Compression (brotli/gzip), applied to responses after the security middleware
+app.add_middleware(CompressionMiddleware)
+
+# 7. Request metrics (Server-Timing header, structured request log, /api/metrics histograms)
+app.add_middleware(RequestMetricsMiddleware)
+
+# 8. CORS Middleware (MUST BE LAST/OUTERMOST)
 # This ensures CORS headers are added to ALL responses, even 403 errors.
 from fastapi.middleware.cors import CORSMiddleware
 
@@ -12314,7 +14022,48 @@ async def startup_db_init():
         await initialize_database()
     except Exception as e:
         logger.warning(f"Database initialization warning: {e}")
+    try:
+        backfilled = await ensure_party_search_index(db)
+        if backfilled:
+            logger.info(f"Added search keys to {backfilled} parties")
+    except Exception as e:
+        logger.warning(f"Party search index warning: {e}")
+    try:
+        await ensure_statement_indexes(db)
+    except Exception as e:
+        logger.warning(f"Party statement index warning: {e}")
+    try:
+        await ensure_stock_card_index(db)
+    except Exception as e:
+        logger.warning(f"Stock card index warning: {e}")
+    try:
+        await ensure_history_report_indexes(db)
+    except Exception as e:
+        logger.warning(f"History report index warning: {e}")
+    try:
+        await ensure_analytics_indexes(db)
+    except Exception as e:
+        logger.warning(f"Analytics cube index warning: {e}")
+    try:
+        await ensure_period_indexes(db)
+    except Exception as e:
+        logger.warning(f"Accounting period index warning: {e}")
+    try:
+        await ensure_columnar_indexes(db, COLUMNAR_SPECS)
+    except Exception as e:
+        logger.warning(f"Columnar export index warning: {e}")
+    try:
+        await ensure_auth_audit_ttl(db)
+    except Exception as e:
+        logger.warning(f"Auth audit log TTL index warning: {e}")
+    await slow_query_recorder.start(db)
+    await typeahead_service.start(db)
+    await write_versions.start(db)
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await slow_query_recorder.stop()
+    await typeahead_service.stop()
+    await write_versions.stop()
+    report_cache.clear()
     client.close()
\ No newline at end of file
@@ -0,0 +1,155 @@
+import base64
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from typing import Any, Dict, List, Optional, Tuple
+
+import orjson
+from bson import Decimal128
+
+from archive import archive_aggregate
+
+
+# ============================================================================
+# STOCK CARD
+# ============================================================================
+#
+# Stock card of one inventory header: opening stock before start_date, every
+# movement in (date, id) order with running qty and weight, and closing stock.
+#
+# - Opening, period in/out totals and the movement count come from a single
+#   $group over the header's movements up to end_date.
+# - Pages use keyset pagination on (date, id). The running sums within a page are
+#   computed by $setWindowFields; the cursor carries the balances after the last
+#   row, so a page never re-reads the movements before it.
+#
+# Cursors are opaque base64 tokens bound to the header; a cursor from another
+# header is rejected rather than producing wrong balances.
+
+STOCK_CARD_DEFAULT_PAGE_SIZE = 500
+STOCK_CARD_MAX_PAGE_SIZE = 5000
+ZERO = Decimal('0')
+
+
+def _decimal(value: Any) -> Decimal:
+    if value is None:
+        return ZERO
+    if isinstance(value, Decimal128):
+        return value.to_decimal()
+    return Decimal(str(value))
+
+
+def encode_cursor(header_id: str, date: datetime, movement_id: str, qty: Decimal, weight: Decimal) -> str:
+    payload = orjson.dumps([header_id, date.isoformat(), movement_id, str(qty), str(weight)])
+    return base64.urlsafe_b64encode(payload).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str, header_id: str) -> Tuple[datetime, str, Decimal, Decimal]:
+    """
+    Position and running balances stored in a cursor.
+
+    Raises:
+        ValueError: malformed cursor or cursor of another header
+    """
+    try:
+        payload = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        cursor_header, date, movement_id, qty, weight = orjson.loads(payload)
+        position = (datetime.fromisoformat(date), str(movement_id), Decimal(qty), Decimal(weight))
+    except (ValueError, TypeError, InvalidOperation, orjson.JSONDecodeError):
+        raise ValueError("Invalid cursor")
+    if cursor_header != header_id:
+        raise ValueError("Cursor belongs to another inventory header")
+    return position
+
+
+def movement_filter(header_id: str, start: Optional[datetime] = None, end: Optional[datetime] = None) -> dict:
+    query = {"header_id": header_id, "is_deleted": False}
+    date_filter = {}
+    if start:
+        date_filter["$gte"] = start
+    if end:
+        date_filter["$lte"] = end
+    if date_filter:
+        query["date"] = date_filter
+    return query
+
+
+def _signed_sum(field: str, positive: bool) -> dict:
+    """$sum of the positive (or absolute negative) values of field"""
+    if positive:
+        return {"$sum": {"$cond": [{"$gt": [f"${field}", 0]}, f"${field}", 0]}}
+    return {"$sum": {"$cond": [{"$lt": [f"${field}", 0]}, {"$subtract": [0, f"${field}"]}, 0]}}
+
+
+async def stock_card_totals(db, header_id: str, start: Optional[datetime], end: Optional[datetime]) -> Dict[str, Decimal]:
+    """Opening stock before start and movement totals within [start, end] in one $group."""
+    in_period = {"$gte": ["$date", start]} if start else True
+    pipeline = [
+        {"$match": movement_filter(header_id, None, end)},
+        {"$group": {
+            "_id": {"$cond": [in_period, "period", "opening"]},
+            "qty": {"$sum": "$qty_delta"},
+            "weight": {"$sum": "$weight_delta"},
+            "qty_in": _signed_sum("qty_delta", True),
+            "qty_out": _signed_sum("qty_delta", False),
+            "weight_in": _signed_sum("weight_delta", True),
+            "weight_out": _signed_sum("weight_delta", False),
+            "count": {"$sum": 1},
+        }},
+    ]
+    groups = {group["_id"]: group async for group in await archive_aggregate(db, 'stock_movements', pipeline)}
+    opening, period = groups.get("opening", {}), groups.get("period", {})
+    totals = {key: _decimal(period.get(key)) for key in ("qty", "weight", "qty_in", "qty_out", "weight_in", "weight_out")}
+    totals.update({
+        "count": int(period.get("count", 0)),
+        "opening_qty": _decimal(opening.get("qty")),
+        "opening_weight": _decimal(opening.get("weight")),
+    })
+    return totals
+
+
+async def stock_card_page(
+    db, header_id: str, start: Optional[datetime], end: Optional[datetime],
+    opening_qty: Decimal, opening_weight: Decimal, cursor: Optional[str], page_size: int,
+) -> Tuple[List[dict], Optional[str]]:
+    """
+    One page of movements with running_qty/running_weight, and the cursor of the next page.
+
+    Raises:
+        ValueError: invalid cursor
+    """
+    query = movement_filter(header_id, start, end)
+    carried_qty, carried_weight = opening_qty, opening_weight
+    if cursor:
+        after_date, after_id, carried_qty, carried_weight = decode_cursor(cursor, header_id)
+        query["$or"] = [{"date": {"$gt": after_date}}, {"date": after_date, "id": {"$gt": after_id}}]
+    window = {"documents": ["unbounded", "current"]}
+    pipeline = [
+        {"$match": query},
+        {"$sort": {"date": 1, "id": 1}},
+        {"$limit": page_size + 1},
+        {"$setWindowFields": {
+            "sortBy": {"date": 1, "id": 1},
+            "output": {
+                "running_qty": {"$sum": "$qty_delta", "window": window},
+                "running_weight": {"$sum": "$weight_delta", "window": window},
+            },
+        }},
+        {"$set": {
+            "running_qty": {"$add": ["$running_qty", Decimal128(carried_qty)]},
+            "running_weight": {"$add": ["$running_weight", Decimal128(carried_weight)]},
+        }},
+        {"$project": {"_id": 0}},
+    ]
+    rows = await (await archive_aggregate(db, 'stock_movements', pipeline)).to_list(page_size + 1)
+    if len(rows) <= page_size:
+        return rows, None
+    rows = rows[:page_size]
+    last = rows[-1]
+    return rows, encode_cursor(
+        header_id, last["date"], last["id"], _decimal(last["running_qty"]), _decimal(last["running_weight"]))
+
+
+async def ensure_stock_card_index(db):
+    """(header_id, date, id) index serving the keyset pages and the totals $group"""
+    await db.stock_movements.create_index(
+        [("header_id", 1), ("date", 1), ("id", 1)], name="stock_movements_header_date_id")
@@ -0,0 +1,303 @@
+import asyncio
+import bisect
+import heapq
+import logging
+import os
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+from party_search import MIN_DIGIT_SUBSTRING, digits_only, parse_search_query, tokenize
+
+
+# ============================================================================
+# IN-MEMORY TYPEAHEAD INDEXES
+# ============================================================================
+#
+# Small reference collections (parties, inventory headers, workers) are held in
+# process as sorted (term, id) arrays so autocomplete never touches MongoDB:
+# - name fields contribute their word tokens, found by prefix with bisect
+# - digit fields (phone, oman_id) contribute the full digit string and every
+#   suffix of MIN_DIGIT_SUBSTRING+ digits, so a prefix lookup finds any digit run
+#
+# Each index is loaded at startup and then kept current by a MongoDB change stream
+# (requires a replica set; a single-node replica set is enough). On a standalone
+# server the index falls back to reloading every TYPEAHEAD_POLL_SECONDS, and
+# refresh() lets this process apply its own writes immediately.
+#
+# Every applied change bumps the index version. The "<epoch>.<version>" stamp is
+# returned with results so clients can cache them until the stamp changes.
+
+TYPEAHEAD_ENABLED = os.environ.get('TYPEAHEAD_ENABLED', 'true').lower() == 'true'
+TYPEAHEAD_POLL_SECONDS = float(os.environ.get('TYPEAHEAD_POLL_SECONDS', '30'))
+TYPEAHEAD_MAX_LIMIT = 50
+
+# Server error code for "$changeStream is only supported on replica sets"
+CHANGE_STREAM_UNSUPPORTED = 40573
+
+logger = logging.getLogger("typeahead")
+
+
+class PrefixIndex:
+    """Sorted-array prefix index over one collection (see section comment above)."""
+
+    def __init__(self, collection: str, fields: Tuple[str, ...], text_fields: Tuple[str, ...],
+                 digit_fields: Tuple[str, ...] = (), sort_field: str = 'name'):
+        self.collection = collection
+        self.fields = fields
+        self.text_fields = text_fields
+        self.digit_fields = digit_fields
+        self.sort_field = sort_field
+        self.epoch = uuid.uuid4().hex[:8]
+        self.version = 0
+        self.loaded = False
+        self.loaded_at: Optional[float] = None
+        self._records: Dict[str, dict] = {}
+        self._terms: Dict[str, List[str]] = {}
+        self._sort_keys: Dict[str, Tuple[str, str]] = {}
+        self._ids_by_object_id: Dict[Any, str] = {}
+        self._entries: List[Tuple[str, str]] = []
+
+    @property
+    def stamp(self) -> str:
+        return f"{self.epoch}.{self.version}"
+
+    @property
+    def projection(self) -> dict:
+        return {field: 1 for field in ('_id', 'is_deleted') + self.fields}
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def index_terms(self, doc: dict) -> List[str]:
+        terms = set()
+        for field in self.text_fields:
+            terms.update(tokenize(doc.get(field)))
+        for field in self.digit_fields:
+            digits = digits_only(doc.get(field))
+            if digits:
+                terms.add(digits)
+                for start in range(1, len(digits) - MIN_DIGIT_SUBSTRING + 1):
+                    terms.add(digits[start:])
+        return sorted(terms)
+
+    def load(self, docs: List[dict]):
+        """Replace the whole index (startup, fallback polling, stream restarts)."""
+        records, terms, sort_keys, object_ids, entries = {}, {}, {}, {}, []
+        for doc in docs:
+            if doc.get('is_deleted') or not doc.get('id'):
+                continue
+            doc_id = doc['id']
+            records[doc_id] = {field: doc.get(field) for field in self.fields}
+            terms[doc_id] = self.index_terms(doc)
+            sort_keys[doc_id] = self._sort_key(records[doc_id])
+            object_ids[doc.get('_id')] = doc_id
+            entries.extend((term, doc_id) for term in terms[doc_id])
+        entries.sort()
+        changed = records != self._records
+        self._records, self._terms, self._sort_keys = records, terms, sort_keys
+        self._ids_by_object_id, self._entries = object_ids, entries
+        if changed or not self.loaded:
+            self.version += 1
+        self.loaded = True
+        self.loaded_at = time.time()
+
+    def upsert(self, doc: dict):
+        """Apply one inserted/updated document; soft-deleted documents are removed."""
+        if doc.get('is_deleted') or not doc.get('id'):
+            self.remove(doc_id=doc.get('id'), object_id=doc.get('_id'))
+            return
+        doc_id = doc['id']
+        record = {field: doc.get(field) for field in self.fields}
+        if self._records.get(doc_id) == record:
+            return
+        self._remove_entries(doc_id)
+        self._records[doc_id] = record
+        self._terms[doc_id] = self.index_terms(doc)
+        self._sort_keys[doc_id] = self._sort_key(record)
+        self._ids_by_object_id[doc.get('_id')] = doc_id
+        for term in self._terms[doc_id]:
+            bisect.insort(self._entries, (term, doc_id))
+        self.version += 1
+
+    def remove(self, doc_id: Optional[str] = None, object_id: Any = None):
+        if doc_id is None:
+            doc_id = self._ids_by_object_id.get(object_id)
+        if doc_id is None or doc_id not in self._records:
+            return
+        self._remove_entries(doc_id)
+        del self._records[doc_id]
+        del self._sort_keys[doc_id]
+        self._ids_by_object_id = {oid: rid for oid, rid in self._ids_by_object_id.items() if rid != doc_id}
+        self.version += 1
+
+    def _remove_entries(self, doc_id: str):
+        for term in self._terms.pop(doc_id, []):
+            position = bisect.bisect_left(self._entries, (term, doc_id))
+            if position < len(self._entries) and self._entries[position] == (term, doc_id):
+                del self._entries[position]
+
+    def _sort_key(self, record: dict) -> Tuple[str, str]:
+        return (str(record.get(self.sort_field) or '').casefold(), record.get('id') or '')
+
+    def _prefix_range(self, prefix: str) -> Tuple[int, int]:
+        """Slice of _entries whose terms start with prefix."""
+        return (bisect.bisect_left(self._entries, (prefix,)),
+                bisect.bisect_left(self._entries, (prefix + '\uffff',)))
+
+    @staticmethod
+    def _has_prefix(terms: List[str], prefix: str) -> bool:
+        position = bisect.bisect_left(terms, prefix)
+        return position < len(terms) and terms[position].startswith(prefix)
+
+    def search(self, query: str, limit: int = 10, predicate: Optional[Callable[[dict], bool]] = None) -> List[dict]:
+        """
+        Records with a term starting with every word of query, ordered by sort_field.
+        An empty query returns no records.
+        """
+        query_terms = parse_search_query(query)
+        if not query_terms:
+            return []
+        # Walk the narrowest prefix range and check the other words per record
+        ranges = [(self._prefix_range(term), term) for term in query_terms]
+        ranges.sort(key=lambda item: item[0][1] - item[0][0])
+        (start, end), _narrowest = ranges[0]
+        other_terms = [term for _range, term in ranges[1:]]
+        
+        matched_ids = set()
+        for _term, doc_id in self._entries[start:end]:
+            if doc_id in matched_ids:
+                continue
+            doc_terms = self._terms[doc_id]
+            if all(self._has_prefix(doc_terms, term) for term in other_terms):
+                if predicate is None or predicate(self._records[doc_id]):
+                    matched_ids.add(doc_id)
+        top_ids = heapq.nsmallest(limit, matched_ids, key=self._sort_keys.__getitem__)
+        return [self._records[doc_id] for doc_id in top_ids]
+
+
+class TypeaheadService:
+    """Owns the typeahead indexes and the background tasks keeping them fresh."""
+
+    def __init__(self):
+        self.indexes: Dict[str, PrefixIndex] = {
+            'parties': PrefixIndex(
+                'parties', ('id', 'name', 'phone', 'oman_id', 'party_type'),
+                text_fields=('name',), digit_fields=('phone', 'oman_id')),
+            'inventory_headers': PrefixIndex(
+                'inventory_headers', ('id', 'name', 'is_active'), text_fields=('name',)),
+            'workers': PrefixIndex(
+                'workers', ('id', 'name', 'phone', 'role', 'active'),
+                text_fields=('name',), digit_fields=('phone',)),
+        }
+        self._db = None
+        self._tasks: List[asyncio.Task] = []
+        self._streaming: Dict[str, bool] = {}
+
+    def ready(self, collection: str) -> bool:
+        index = self.indexes.get(collection)
+        return TYPEAHEAD_ENABLED and index is not None and index.loaded
+
+    def versions(self) -> Dict[str, str]:
+        return {name: index.stamp for name, index in self.indexes.items() if index.loaded}
+
+    async def start(self, db):
+        if not TYPEAHEAD_ENABLED or self._tasks:
+            return
+        self._db = db
+        for name in self.indexes:
+            try:
+                await self.reload(name)
+            except PyMongoError as e:
+                logger.warning(f"Typeahead index {name} could not be loaded: {e}")
+            self._tasks.append(asyncio.create_task(self._watch(name)))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+        self._streaming = {}
+
+    async def reload(self, name: str):
+        index = self.indexes[name]
+        docs = await self._db[index.collection].find({"is_deleted": {"$ne": True}}, index.projection).to_list(None)
+        index.load(docs)
+
+    async def refresh(self, collection: str, doc_id: str):
+        """
+        Re-read one document after this process wrote it. Only needed while no change
+        stream is running (standalone server); with a stream the change arrives anyway.
+        """
+        if not self.ready(collection) or self._streaming.get(collection):
+            return
+        index = self.indexes[collection]
+        try:
+            doc = await self._db[index.collection].find_one({"id": doc_id}, index.projection)
+        except PyMongoError as e:
+            logger.warning(f"Typeahead refresh of {collection}/{doc_id} failed: {e}")
+            return
+        if doc is None:
+            index.remove(doc_id=doc_id)
+        else:
+            index.upsert(doc)
+
+    def _apply_change(self, index: PrefixIndex, change: dict):
+        operation = change.get('operationType')
+        if operation in ('insert', 'update', 'replace'):
+            doc = change.get('fullDocument')
+            if doc is None:
+                # Deleted before the update lookup ran
+                index.remove(object_id=change.get('documentKey', {}).get('_id'))
+            else:
+                index.upsert(doc)
+        elif operation == 'delete':
+            index.remove(object_id=change.get('documentKey', {}).get('_id'))
+
+    async def _watch(self, name: str):
+        index = self.indexes[name]
+        collection = self._db[index.collection]
+        while True:
+            try:
+                async with collection.watch(full_document='updateLookup') as stream:
+                    # Open the cursor before reloading so no change made during the reload is missed
+                    change = await stream.try_next()
+                    await self.reload(name)
+                    self._streaming[name] = True
+                    while stream.alive:
+                        if change is not None:
+                            if change.get('operationType') in ('drop', 'rename', 'dropDatabase', 'invalidate'):
+                                break
+                            self._apply_change(index, change)
+                        change = await stream.try_next()
+            except asyncio.CancelledError:
+                raise
+            except (OperationFailure, NotImplementedError) as e:
+                self._streaming[name] = False
+                if isinstance(e, NotImplementedError) or e.code == CHANGE_STREAM_UNSUPPORTED:
+                    logger.info(f"Change streams unavailable; typeahead index {name} reloads every {TYPEAHEAD_POLL_SECONDS:g}s")
+                    await self._poll(name)
+                    return
+                logger.warning(f"Typeahead change stream for {name} failed: {e}")
+            except PyMongoError as e:
+                logger.warning(f"Typeahead change stream for {name} failed: {e}")
+            # Stream ended or failed: the next pass reopens it and reloads the index
+            self._streaming[name] = False
+            await asyncio.sleep(min(TYPEAHEAD_POLL_SECONDS, 5))
+
+    async def _poll(self, name: str):
+        while True:
+            await asyncio.sleep(TYPEAHEAD_POLL_SECONDS)
+            try:
+                await self.reload(name)
+            except PyMongoError as e:
+                logger.warning(f"Typeahead reload of {name} failed: {e}")
+
+
+typeahead_service = TypeaheadService()
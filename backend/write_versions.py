@@ -0,0 +1,160 @@
+import asyncio
+import logging
+import os
+import threading
+from typing import Dict, Iterable, Optional, Set
+
+from pymongo import UpdateOne, monitoring
+
+from instrumentation import SLOW_QUERIES_COLLECTION
+from reference_cache import REFERENCE_VERSIONS_COLLECTION
+
+
+# ============================================================================
+# COLLECTION WRITE VERSIONS
+# ============================================================================
+#
+# Each collection has a version counter in the `write_versions` collection.
+# WriteVersionListener watches every MongoDB command of this process. When an
+# insert, update, delete or findAndModify completes, it marks the target collection
+# as pending. Pending collections are flushed as one $inc per collection:
+# - before an HTTP response is sent (WriteVersionMiddleware), so a client that
+#   saw its write acknowledged never reads an older version afterwards, even when
+#   its next request lands on another worker process
+# - before this process reads versions (current())
+# - every WRITE_VERSIONS_FLUSH_SECONDS for writes made outside requests
+#
+# A write is counted only once its command completes, so a reader never sees the
+# new version before the new data. The application does not use multi-document
+# transactions; if it ever does, their writes should be counted at commitTransaction.
+#
+# Writes made by other MongoDB clients (scripts, shell) are not seen. Callers that
+# cache on these versions should also expire entries after a bounded age.
+
+WRITE_VERSIONS_COLLECTION = 'write_versions'
+WRITE_VERSIONS_FLUSH_SECONDS = float(os.environ.get('WRITE_VERSIONS_FLUSH_SECONDS', '1'))
+
+WRITE_COMMANDS = {'insert', 'update', 'delete', 'findAndModify'}
+# Bookkeeping collections whose writes would otherwise bump versions endlessly
+UNTRACKED_COLLECTIONS = {WRITE_VERSIONS_COLLECTION, SLOW_QUERIES_COLLECTION, REFERENCE_VERSIONS_COLLECTION}
+
+
+class WriteVersionTracker:
+    """Pending write marks and the shared version counters (see section comment above)."""
+
+    def __init__(self):
+        self._pending: Set[str] = set()
+        # The listener marks collections from Motor executor threads
+        self._lock = threading.Lock()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._db = None
+
+    @property
+    def has_pending(self) -> bool:
+        return bool(self._pending)
+
+    def mark(self, collection: str):
+        if collection in UNTRACKED_COLLECTIONS or collection.startswith('system.'):
+            return
+        with self._lock:
+            self._pending.add(collection)
+
+    async def start(self, db):
+        if self._task is not None:
+            return
+        self._db = db
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(WRITE_VERSIONS_FLUSH_SECONDS)
+            await self.flush()
+
+    async def flush(self):
+        """Bump the shared version of every collection written since the last flush."""
+        if self._db is None:
+            return
+        # Wait for a flush already in flight: its collections must be bumped before a read
+        async with self._flush_lock:
+            with self._lock:
+                collections, self._pending = self._pending, set()
+            if not collections:
+                return
+            try:
+                await self._db[WRITE_VERSIONS_COLLECTION].bulk_write([
+                    UpdateOne({"_id": name}, {"$inc": {"version": 1}}, upsert=True)
+                    for name in sorted(collections)
+                ], ordered=False)
+            except Exception as e:
+                logging.warning(f"Could not bump write versions of {sorted(collections)}: {e}")
+                with self._lock:
+                    self._pending.update(collections)
+
+    async def current(self, db, collections: Iterable[str]) -> Dict[str, int]:
+        """
+        Version of each collection (0 if never written through this application).
+        This process's pending writes are flushed first.
+        """
+        await self.flush()
+        names = sorted(set(collections))
+        versions = {name: 0 for name in names}
+        async for doc in db[WRITE_VERSIONS_COLLECTION].find({"_id": {"$in": names}}):
+            versions[doc["_id"]] = doc.get("version", 0)
+        return versions
+
+
+write_versions = WriteVersionTracker()
+
+
+class WriteVersionListener(monitoring.CommandListener):
+    """Marks collections as written when a write command completes."""
+
+    def __init__(self, tracker: WriteVersionTracker = write_versions):
+        self._tracker = tracker
+        # (connection_id, request_id) -> collection for in-flight write commands
+        self._in_flight: Dict[tuple, str] = {}
+
+    def started(self, event):
+        if event.command_name in WRITE_COMMANDS:
+            collection = event.command.get(event.command_name)
+            if isinstance(collection, str):
+                self._in_flight[(event.connection_id, event.request_id)] = collection
+
+    def succeeded(self, event):
+        collection = self._in_flight.pop((event.connection_id, event.request_id), None)
+        if collection is not None:
+            self._tracker.mark(collection)
+
+    # A failed write may still have modified documents (network error after apply)
+    failed = succeeded
+
+
+class WriteVersionMiddleware:
+    """Flushes pending write versions before each response starts."""
+
+    def __init__(self, app, tracker: WriteVersionTracker = write_versions):
+        self.app = app
+        self.tracker = tracker
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_after_flush(message):
+            if message["type"] == "http.response.start" and self.tracker.has_pending:
+                await self.tracker.flush()
+            await send(message)
+
+        await self.app(scope, receive, send_after_flush)
@@ -120,6 +120,18 @@ export default function ReportsPageEnhanced() {
     }
   }, [datePreset, startDate, endDate, selectedPartyId, sortBy]);
 
+  useEffect(() => {
+    if (activeTab === 'sales-history') {
+      loadSalesHistoryReport();
+    }
+  }, [salesHistoryPage, salesHistoryPageSize]);
+
+  useEffect(() => {
+    if (activeTab === 'purchase-history') {
+      loadPurchaseHistoryReport();
+    }
+  }, [purchaseHistoryPage, purchaseHistoryPageSize]);
+
   // Date preset handler
   const applyDatePreset = (preset) => {
     const today = new Date();
@@ -315,14 +327,8 @@ export default function ReportsPageEnhanced() {
       if (searchQuery) params.search = searchQuery;
       
       const response = await API.get(`/api/reports/sales-history`, { params });
-      // Handle both paginated and non-paginated responses
-      if (response.data && response.data.items) {
-        setSalesHistoryData({ ...response.data, items: response.data.items });
-        setSalesHistoryPagination(response.data.pagination);
-      } else {
-        setSalesHistoryData(response.data);
-        setSalesHistoryPagination(null);
-      }
+      setSalesHistoryData(response.data);
+      setSalesHistoryPagination(response.data?.pagination || null);
     } catch (error) {
       toast.error('Failed to load sales history report');
     } finally {
@@ -339,18 +345,12 @@ export default function ReportsPageEnhanced() {
       };
       if (startDate) params.date_from = startDate;
       if (endDate) params.date_to = endDate;
-      if (selectedPartyId && selectedPartyId !== 'all') params.vendor_id = selectedPartyId;
+      if (selectedPartyId && selectedPartyId !== 'all') params.vendor_party_id = selectedPartyId;
       if (purchaseSearchQuery) params.search = purchaseSearchQuery;
       
       const response = await API.get(`/api/reports/purchase-history`, { params });
-      // Handle both paginated and non-paginated responses
-      if (response.data && response.data.items) {
-        setPurchaseHistoryData({ ...response.data, items: response.data.items });
-        setPurchaseHistoryPagination(response.data.pagination);
-      } else {
-        setPurchaseHistoryData(response.data);
-        setPurchaseHistoryPagination(null);
-      }
+      setPurchaseHistoryData(response.data);
+      setPurchaseHistoryPagination(response.data?.pagination || null);
     } catch (error) {
       toast.error('Failed to load purchase history report');
     } finally {
@@ -1200,7 +1200,7 @@ export default function ReportsPageEnhanced() {
               {/* Sales History Table */}
               <Card>
                 <CardHeader>
-                  <CardTitle>Sales History ({salesHistoryData.sales_records.length})</CardTitle>
+                  <CardTitle>Sales History ({salesHistoryData.summary?.total_invoices ?? salesHistoryData.sales_records.length})</CardTitle>
                   <p className="text-sm text-gray-500">Showing finalized invoices only</p>
                 </CardHeader>
                 <CardContent>
@@ -1248,6 +1248,16 @@ export default function ReportsPageEnhanced() {
                       </TableBody>
                     </Table>
                   </div>
+                  {salesHistoryPagination && (
+                    <Pagination
+                      pagination={salesHistoryPagination}
+                      onPageChange={setSalesHistoryPage}
+                      onPageSizeChange={(newPageSize) => {
+                        setSalesHistoryPageSize(newPageSize);
+                        setSalesHistoryPage(1);
+                      }}
+                    />
+                  )}
                 </CardContent>
               </Card>
             </>
@@ -1328,7 +1338,7 @@ export default function ReportsPageEnhanced() {
               {/* Purchase History Table */}
               <Card>
                 <CardHeader>
-                  <CardTitle>Purchase History ({purchaseHistoryData.purchase_records.length})</CardTitle>
+                  <CardTitle>Purchase History ({purchaseHistoryData.summary?.total_purchases ?? purchaseHistoryData.purchase_records.length})</CardTitle>
                   <p className="text-sm text-gray-500">Showing all committed purchases</p>
                 </CardHeader>
                 <CardContent>
@@ -1376,6 +1386,16 @@ export default function ReportsPageEnhanced() {
                       </TableBody>
                     </Table>
                   </div>
+                  {purchaseHistoryPagination && (
+                    <Pagination
+                      pagination={purchaseHistoryPagination}
+                      onPageChange={setPurchaseHistoryPage}
+                      onPageSizeChange={(newPageSize) => {
+                        setPurchaseHistoryPageSize(newPageSize);
+                        setPurchaseHistoryPage(1);
+                      }}
+                    />
+                  )}
                 </CardContent>
               </Card>
             </>
@@ -385,7 +385,8 @@ const ReturnsPage = () => {
           qty: parseInt(item.qty) || 1,
           weight_grams: parseFloat(item.weight_grams) || 0,
           purity: parseInt(item.purity) || 916,
-          amount: parseFloat(item.amount) || 0
+          amount: parseFloat(item.amount) || 0,
+          item_id: item.item_id || null
         })),
         reason: formData.reason || '',
         notes: formData.notes || ''
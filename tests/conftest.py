@@ -0,0 +1,47 @@
+import os
+import sys
+import uuid
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / 'backend'
+sys.path.insert(0, str(BACKEND_DIR))
+
+# server.py reads these at import; tests never talk to the configured database
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'gold_shop_erp_test')
+os.environ.setdefault('REPORT_CACHE_ENABLED', 'false')
+
+# Database tests run against TEST_MONGO_URL when set (a throwaway database per
+# test, dropped afterwards), otherwise against mongomock with the aggregation
+# stages it lacks filled in by mongomock_compat.
+TEST_MONGO_URL = os.environ.get('TEST_MONGO_URL')
+
+
+@pytest.fixture
+def db():
+    if TEST_MONGO_URL:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        from pymongo import MongoClient
+
+        name = f"gold_shop_erp_test_{uuid.uuid4().hex[:12]}"
+        yield AsyncIOMotorClient(TEST_MONGO_URL)[name]
+        MongoClient(TEST_MONGO_URL).drop_database(name)
+        return
+    mongomock_motor = pytest.importorskip('mongomock_motor')
+    from . import mongomock_compat  # noqa: F401
+
+    yield mongomock_motor.AsyncMongoMockClient()['gold_shop_erp_test']
+
+
+@pytest.fixture
+def server(db):
+    """server module with the app pointed at db"""
+    import reference_cache
+    import server
+
+    server.db = db
+    server.limiter.enabled = False
+    server.reference_cache = reference_cache.ReferenceCaches()
+    return server
@@ -0,0 +1,40 @@
+import contextlib
+import io
+import uuid
+import zlib
+
+import brotli
+import httpx
+import jwt
+
+
+async def generate_dataset(db, *argv: str):
+    """Load-test dataset of generate_load_data.py, small unless argv says otherwise"""
+    import generate_load_data
+
+    args = generate_load_data.parse_args([
+        '--parties', '15', '--invoices', '200', '--purchases', '60', '--gold-ledger', '60',
+        '--returns', '15', '--expenses', '40', '--seed', '7', *argv])
+    with contextlib.redirect_stdout(io.StringIO()):
+        await generate_load_data.generate(args, db)
+
+
+async def admin_headers(server) -> dict:
+    """Authorization header of a new admin user"""
+    user_id = str(uuid.uuid4())
+    await server.db.users.insert_one({
+        "id": user_id, "username": f"admin-{user_id[:8]}", "email": f"{user_id[:8]}@example.com",
+        "full_name": "Admin", "role": "admin", "is_active": True, "is_deleted": False,
+    })
+    return {"Authorization": "Bearer " + jwt.encode({"user_id": user_id}, server.JWT_SECRET, algorithm="HS256")}
+
+
+def api_client(server) -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://testserver")
+
+
+def decoder(encoding):
+    """Incremental decoder of a br or gzip response body"""
+    if encoding == 'br':
+        return brotli.Decompressor().process
+    return zlib.decompressobj(16 + zlib.MAX_WBITS).decompress
@@ -0,0 +1,68 @@
+"""
+What the backend relies on that mongomock does not implement, for tests run
+without TEST_MONGO_URL. Real MongoDB needs none of this.
+
+- Decimal128 arithmetic and ordering ($sum / $inc / $gt over Decimal128 values)
+- $unionWith, as archive_aggregate appends one per archive collection
+- $setWindowFields with a running $sum over ["unbounded", "current"] documents
+- the sort argument pymongo 4.16 passes to bulk updates
+"""
+import numbers
+from decimal import Decimal
+
+import mongomock.aggregate
+import mongomock.collection
+from bson import Decimal128
+from mongomock import helpers
+
+
+def _decimal(value) -> Decimal:
+    if isinstance(value, Decimal128):
+        return value.to_decimal()
+    return Decimal(str(value))
+
+
+numbers.Number.register(Decimal128)
+Decimal128.__add__ = Decimal128.__radd__ = lambda a, b: Decimal128(_decimal(a) + _decimal(b))
+Decimal128.__sub__ = lambda a, b: Decimal128(_decimal(a) - _decimal(b))
+Decimal128.__rsub__ = lambda a, b: Decimal128(_decimal(b) - _decimal(a))
+Decimal128.__mul__ = Decimal128.__rmul__ = lambda a, b: Decimal128(_decimal(a) * _decimal(b))
+Decimal128.__neg__ = lambda a: Decimal128(-_decimal(a))
+Decimal128.__abs__ = lambda a: Decimal128(abs(_decimal(a)))
+for _op in ('lt', 'le', 'gt', 'ge'):
+    setattr(Decimal128, f'__{_op}__', (lambda op: lambda a, b: getattr(_decimal(a), f'__{op}__')(_decimal(b)))(_op))
+
+
+def _union_with(in_collection, database, options):
+    if isinstance(options, str):
+        options = {'coll': options}
+    other = database.get_collection(options['coll'])
+    return list(in_collection) + list(other.aggregate(options.get('pipeline', [])))
+
+
+def _set_window_fields(in_collection, database, options):
+    partition = options.get('partitionBy')
+    docs = list(in_collection)
+    for key, direction in reversed(list(options['sortBy'].items())):
+        docs.sort(key=lambda doc: helpers.get_value_by_dot(doc, key), reverse=direction < 0)
+    totals = {}
+    for doc in docs:
+        group = helpers.get_value_by_dot(doc, partition[1:]) if isinstance(partition, str) else None
+        for name, spec in options['output'].items():
+            if spec.get('window', {}).get('documents') != ['unbounded', 'current'] or '$sum' not in spec:
+                raise NotImplementedError(f"$setWindowFields output {spec}")
+            try:
+                value = helpers.get_value_by_dot(doc, spec['$sum'][1:])
+            except KeyError:
+                value = 0
+            totals[group, name] = totals.get((group, name), Decimal(0)) + _decimal(value or 0)
+            doc[name] = Decimal128(totals[group, name])
+    return docs
+
+
+mongomock.aggregate._PIPELINE_HANDLERS['$unionWith'] = _union_with
+mongomock.aggregate._PIPELINE_HANDLERS['$setWindowFields'] = _set_window_fields
+
+_add_update = mongomock.collection.BulkOperationBuilder.add_update
+mongomock.collection.BulkOperationBuilder.add_update = (
+    lambda self, *args, sort=None, **kwargs: _add_update(self, *args, **kwargs))
@@ -0,0 +1,141 @@
+import asyncio
+from decimal import Decimal
+
+import pytest
+
+import analytics_cube
+from analytics_cube import (
+    ANALYTICS_COLLECTION, ANALYTICS_STATE_COLLECTION, MEASURES, RebuildRunningError, rebuild_analytics_cube,
+)
+
+from .helpers import admin_headers, api_client, generate_dataset
+
+
+async def cube(db) -> dict:
+    """Cells with a non-zero measure, measures as Decimal"""
+    cells = {}
+    async for cell in db[ANALYTICS_COLLECTION].find({}):
+        measures = {name: analytics_cube._decimal(cell.get(name)) for name in MEASURES}
+        if any(measures.values()):
+            cells[cell["_id"]] = measures
+    return cells
+
+
+class Writes:
+    """Cube-changing writes through the API on a generated dataset"""
+
+    def __init__(self, server, client, headers):
+        self.server, self.client, self.headers = server, client, headers
+
+    async def setup(self):
+        db = self.server.db
+        self.open_purchases = [purchase["id"] async for purchase in db.purchases.find(
+            {"locked": False, "is_deleted": False}).sort("id", 1)]
+        self.draft_invoices = [invoice["id"] async for invoice in db.invoices.find(
+            {"status": "draft", "is_deleted": False})]
+        assert len(self.open_purchases) >= 4 and self.draft_invoices
+
+    async def create_purchase(self):
+        response = await self.client.post("/api/purchases", headers=self.headers, json={
+            "is_walk_in": True, "vendor_oman_id": "12345678", "walk_in_vendor_name": "Walk-in",
+            "items": [{"description": "Bangle", "weight_grams": 12.5, "entered_purity": 916,
+                       "rate_per_gram_22k": 24}]})
+        assert response.status_code == 201, response.text
+
+    async def edit_purchase(self):
+        purchase_id = self.open_purchases.pop()
+        response = await self.client.patch(f"/api/purchases/{purchase_id}", headers=self.headers, json={
+            "items": [{"description": "Re-weighed lot", "weight_grams": 33.3, "entered_purity": 875,
+                       "rate_per_gram_22k": 22, "calculated_amount": 700.125}],
+            "paid_amount_money": 0})
+        assert response.status_code == 200, response.text
+
+    async def delete_purchase(self):
+        purchase_id = self.open_purchases.pop()
+        response = await self.client.delete(f"/api/purchases/{purchase_id}", headers=self.headers)
+        assert response.status_code == 200, response.text
+
+    async def finalize_invoice(self):
+        invoice_id = self.draft_invoices.pop()
+        response = await self.client.post(f"/api/invoices/{invoice_id}/finalize", headers=self.headers)
+        assert response.status_code == 200, response.text
+
+
+def test_incremental_writes_match_a_rebuild(server):
+    async def run():
+        await generate_dataset(server.db)
+        await rebuild_analytics_cube(server.db)
+        async with api_client(server) as client:
+            writes = Writes(server, client, await admin_headers(server))
+            await writes.setup()
+            for write in (writes.create_purchase, writes.edit_purchase, writes.edit_purchase,
+                          writes.delete_purchase, writes.finalize_invoice):
+                await write()
+        incremental = await cube(server.db)
+        await rebuild_analytics_cube(server.db)
+        assert incremental == await cube(server.db)
+
+    asyncio.run(run())
+
+
+def test_writes_during_a_rebuild_are_kept(server, monkeypatch):
+    scan_cells = analytics_cube._scan_cells
+
+    async def run():
+        await generate_dataset(server.db)
+        await rebuild_analytics_cube(server.db)
+        async with api_client(server) as client:
+            writes = Writes(server, client, await admin_headers(server))
+            await writes.setup()
+
+            async def scan_with_writes(db, started_at):
+                # Before the scan: it reads these documents with their new version
+                await writes.create_purchase()
+                await writes.edit_purchase()
+                await writes.delete_purchase()
+                scanned = await scan_cells(db, started_at)
+                # After the scan: it counted the old version, and the new one is only queued
+                await writes.edit_purchase()
+                await writes.delete_purchase()
+                await writes.finalize_invoice()
+                with pytest.raises(RebuildRunningError):
+                    await rebuild_analytics_cube(db)
+                return scanned
+
+            monkeypatch.setattr(analytics_cube, '_scan_cells', scan_with_writes)
+            await rebuild_analytics_cube(server.db)
+            monkeypatch.setattr(analytics_cube, '_scan_cells', scan_cells)
+
+        state = await server.db[ANALYTICS_STATE_COLLECTION].find_one({"_id": ANALYTICS_COLLECTION})
+        assert state["rebuild_started_at"] is None and "pending" not in state
+        rebuilt_with_writes = await cube(server.db)
+        await rebuild_analytics_cube(server.db)
+        assert rebuilt_with_writes == await cube(server.db)
+
+    asyncio.run(run())
+
+
+def test_failed_rebuild_applies_queued_writes_to_the_old_cube(server, monkeypatch):
+    async def run():
+        await generate_dataset(server.db)
+        await rebuild_analytics_cube(server.db)
+        async with api_client(server) as client:
+            writes = Writes(server, client, await admin_headers(server))
+            await writes.setup()
+
+            async def failing_scan(db, started_at):
+                await writes.create_purchase()
+                await writes.edit_purchase()
+                raise RuntimeError("scan failed")
+
+            monkeypatch.setattr(analytics_cube, '_scan_cells', failing_scan)
+            with pytest.raises(RuntimeError, match="scan failed"):
+                await rebuild_analytics_cube(server.db)
+            monkeypatch.undo()
+
+        after_failure = await cube(server.db)
+        await rebuild_analytics_cube(server.db)
+        assert after_failure == await cube(server.db)
+        assert sum(cell["lines"] for cell in after_failure.values()) > Decimal(0)
+
+    asyncio.run(run())
@@ -0,0 +1,111 @@
+import asyncio
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from archive import archive_aggregate, archive_collections, archive_count, archive_find, archive_spec
+
+from .helpers import admin_headers, api_client
+
+NOW = datetime(2025, 6, 1)
+UNTIL = datetime(2024, 1, 1)
+
+
+def transactions(count: int, seed: int) -> list:
+    """Transactions over 2022-2025, all fields of the model so archiving keeps them whole"""
+    from server import Transaction
+
+    rng = random.Random(seed)
+    docs = []
+    for i in range(count):
+        date = datetime(2022, 1, 1) + timedelta(days=rng.randrange(3 * 365 + 150), minutes=i)
+        docs.append(Transaction(
+            id=f"t{i:04d}", transaction_number=f"TXN-{date.year}-{i}", date=date, created_at=date,
+            transaction_type=rng.choice(["credit", "debit"]), mode="cash",
+            account_id=rng.choice(["a1", "a2"]), account_name="Cash", party_id=rng.choice(["p1", "p2", None]),
+            amount=rng.randrange(1, 10000) / 100, category="sales", created_by="u1",
+            is_deleted=rng.random() < 0.1,
+        ).model_dump())
+    # Dated in an archived year but numbered in the current one: stays hot
+    docs[0].update(date=datetime(2023, 5, 5), transaction_number=f"TXN-{NOW.year}-0")
+    return docs
+
+
+QUERIES = [
+    ({"party_id": "p1", "is_deleted": False}, [("date", -1), ("id", 1)], 0, 25),
+    ({"date": {"$gte": datetime(2023, 3, 1), "$lt": datetime(2024, 2, 1)}}, [("date", 1), ("id", 1)], 3, 10),
+    ({"date": {"$gte": datetime(2022, 12, 1), "$lte": datetime(2023, 1, 31)}, "account_id": "a2"},
+     [("amount", -1), ("id", 1)], 0, None),
+    ({"date": {"$gte": datetime(2024, 6, 1)}}, [("id", 1)], 0, None),
+    ({"account_id": "a1"}, None, 0, None),
+]
+
+
+def test_archive_reads_match_the_unarchived_collection(db):
+    import server
+
+    docs = transactions(400, seed=11)
+
+    async def run():
+        await db.transactions.insert_many([dict(doc) for doc in docs])
+        await db.reference.insert_many([dict(doc) for doc in docs])
+        moved = await archive_spec(db, server.TRANSACTION_ARCHIVE, UNTIL, batch_size=37, now=NOW)
+        assert set(moved) == {2022, 2023}
+        assert await db.transactions.count_documents({"date": {"$lt": UNTIL}}) == 1
+
+        for query, sort, skip, limit in QUERIES:
+            expected = db.reference.find(query, {"_id": 0})
+            if sort:
+                expected = expected.sort(sort)
+            expected = await expected.skip(skip).limit(limit or 0).to_list(None)
+            found = await archive_find(db, 'transactions', query, {"_id": 0}, sort=sort, skip=skip, limit=limit)
+            if not sort:
+                expected.sort(key=lambda doc: doc["id"])
+                found.sort(key=lambda doc: doc["id"])
+            assert found == expected, query
+            assert await archive_count(db, 'transactions', query) == await db.reference.count_documents(query)
+
+            pipeline = [{"$match": query}, {"$group": {"_id": "$account_id", "amount": {"$sum": "$amount"}}}]
+            totals = {row["_id"]: round(row["amount"], 2)
+                      async for row in await archive_aggregate(db, 'transactions', pipeline)}
+            assert totals == {row["_id"]: round(row["amount"], 2) async for row in db.reference.aggregate(pipeline)}
+
+    asyncio.run(run())
+
+
+@pytest.mark.parametrize("date, years", [
+    (None, [2022, 2023]),
+    ({"$gte": datetime(2023, 3, 1)}, [2023]),
+    ({"$lt": datetime(2022, 7, 1)}, [2022]),
+    ({"$gte": datetime(2024, 1, 1)}, []),
+    (datetime(2022, 4, 1), [2022]),
+])
+def test_only_the_archive_years_a_query_reaches_are_read(db, date, years):
+    import server
+
+    async def run():
+        await db.transactions.insert_many(transactions(100, seed=12))
+        await archive_spec(db, server.TRANSACTION_ARCHIVE, UNTIL, now=NOW)
+        query = {"account_id": "a1"} if date is None else {"date": date}
+        assert await archive_collections(db, 'transactions', query) == [f"transactions_{year}" for year in years]
+
+    asyncio.run(run())
+
+
+def test_account_with_only_archived_transactions_cannot_be_deleted(server):
+    docs = [doc for doc in transactions(60, seed=13) if doc["date"] < UNTIL and doc["transaction_number"] != "TXN-2025-0"]
+
+    async def run():
+        await server.db.accounts.insert_one({"id": "a1", "name": "Old Bank", "account_type": "asset",
+                                             "opening_balance": 0, "current_balance": 0, "is_deleted": False})
+        await server.db.transactions.insert_many([{**doc, "account_id": "a1"} for doc in docs])
+        await archive_spec(server.db, server.TRANSACTION_ARCHIVE, UNTIL, now=NOW)
+        assert await server.db.transactions.count_documents({}) == 0
+        async with api_client(server) as client:
+            response = await client.delete("/api/accounts/a1", headers=await admin_headers(server))
+        assert response.status_code == 400, response.text
+        assert "existing transactions" in response.json()["detail"]
+        assert (await server.db.accounts.find_one({"id": "a1"}))["is_deleted"] is False
+
+    asyncio.run(run())
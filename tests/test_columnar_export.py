@@ -0,0 +1,130 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from pathlib import Path
+
+import pytest
+from bson import Decimal128
+
+from columnar_export import COLUMNAR_STATE_COLLECTION, ExportRunningError, export_collection
+
+pa_dataset = pytest.importorskip('pyarrow.dataset')
+
+START = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+def transaction(i: int, date, created_at) -> dict:
+    doc = {
+        "id": f"t{i:04d}", "transaction_number": f"TXN-{i}", "created_at": created_at,
+        "transaction_type": "credit" if i % 2 else "debit", "mode": "cash", "account_id": "a1",
+        "account_name": "Cash", "amount": Decimal128(f"{i}.125"), "category": "sales",
+        "created_by": "u1", "is_deleted": False,
+    }
+    if date is not None:
+        doc["date"] = date
+    return doc
+
+
+def read_dataset(root: Path) -> dict:
+    table = pa_dataset.dataset(root, format='parquet', partitioning='hive').to_table()
+    return {row["id"]: row for row in table.to_pylist()}
+
+
+def transactions_spec():
+    from server import COLUMNAR_SPECS
+
+    return next(spec for spec in COLUMNAR_SPECS if spec.collection == 'transactions')
+
+
+def test_round_trip_with_partitions_the_cursor_comes_back_to(db, tmp_path):
+    spec = transactions_spec()
+    # Dated documents over three months, then undated ones partitioned by created_at in February:
+    # they sort before every date, so the February partition is entered twice
+    docs = [transaction(i, START + timedelta(days=i), START + timedelta(days=i)) for i in range(80)]
+    docs += [transaction(100 + i, None, START + timedelta(days=35, hours=i)) for i in range(5)]
+    later = [transaction(200 + i, START + timedelta(days=40 + i), START + timedelta(days=100)) for i in range(6)]
+
+    async def run():
+        await db.transactions.insert_many([dict(doc) for doc in docs])
+        first = await export_collection(db, spec, str(tmp_path), batch_rows=4, now=START + timedelta(days=90))
+        assert first["rows"] == len(docs)
+        assert sorted(first["files"]) == [
+            f"transactions/year=2025/month={month:02d}/part-{first['high_water_mark']:%Y%m%dT%H%M%S%fZ}.parquet"
+            for month in (1, 2, 3)]
+
+        await db.transactions.insert_many([dict(doc) for doc in later])
+        second = await export_collection(db, spec, str(tmp_path), batch_rows=4, now=START + timedelta(days=120))
+        assert second["rows"] == len(later) and len(second["files"]) == 1
+
+        exported = read_dataset(tmp_path / 'transactions')
+        assert sorted(exported) == sorted(doc["id"] for doc in docs + later)
+        for doc in docs + later:
+            row = exported[doc["id"]]
+            assert row["amount"] == doc["amount"].to_decimal().quantize(Decimal('0.001'))
+            partition_date = doc.get("date", doc["created_at"])
+            assert (row["year"], row["month"]) == (partition_date.year, partition_date.month)
+            assert row["date"] == doc.get("date")
+        assert not list(tmp_path.rglob('_part-*'))
+
+        state = await db[COLUMNAR_STATE_COLLECTION].find_one({"_id": 'transactions'})
+        assert state["running"] is None and state["last_run_rows"] == len(later)
+
+    asyncio.run(run())
+
+
+def test_a_running_export_keeps_its_lock_and_files(db, tmp_path):
+    spec = transactions_spec()
+    now = START + timedelta(days=90)
+    in_flight = tmp_path / 'transactions' / 'year=2025' / 'month=01' / '_part-other.parquet.tmp'
+
+    async def run():
+        await db.transactions.insert_many([transaction(i, START + timedelta(days=i), START) for i in range(10)])
+        in_flight.parent.mkdir(parents=True)
+        in_flight.write_bytes(b"rows of another run")
+        await db[COLUMNAR_STATE_COLLECTION].insert_one(
+            {"_id": 'transactions', "running": {"run_id": "other", "started_at": now - timedelta(minutes=5)}})
+
+        with pytest.raises(ExportRunningError):
+            await export_collection(db, spec, str(tmp_path), now=now)
+        assert in_flight.exists()
+        assert not list(tmp_path.rglob('part-*.parquet'))
+
+        # A lock past the timeout belongs to a dead run: taken over, and its leftovers removed
+        result = await export_collection(db, spec, str(tmp_path), now=now + timedelta(days=1))
+        assert result["rows"] == 10
+        assert not in_flight.exists()
+        state = await db[COLUMNAR_STATE_COLLECTION].find_one({"_id": 'transactions'})
+        assert state["running"] is None
+
+    asyncio.run(run())
+
+
+def test_full_run_killed_before_removing_old_parts_loses_no_rows(db, tmp_path, monkeypatch):
+    spec = transactions_spec()
+    docs = [transaction(i, START + timedelta(days=i), START) for i in range(40)]
+
+    async def run():
+        await db.transactions.insert_many([dict(doc) for doc in docs])
+        first = await export_collection(db, spec, str(tmp_path), now=START + timedelta(days=90))
+
+        unlink = Path.unlink
+
+        def killed_on_old_parts(path, *args, **kwargs):
+            if path.name.startswith('part-'):
+                raise KeyboardInterrupt
+            return unlink(path, *args, **kwargs)
+
+        monkeypatch.setattr(Path, 'unlink', killed_on_old_parts)
+        with pytest.raises(KeyboardInterrupt):
+            await export_collection(db, spec, str(tmp_path), full=True, now=START + timedelta(days=91))
+        monkeypatch.undo()
+        table = pa_dataset.dataset(tmp_path / 'transactions', format='parquet', partitioning='hive').to_table()
+        assert set(table.column('id').to_pylist()) == {doc["id"] for doc in docs}
+
+        second = await export_collection(db, spec, str(tmp_path), full=True, now=START + timedelta(days=92))
+        assert sorted(read_dataset(tmp_path / 'transactions')) == sorted(doc["id"] for doc in docs)
+        assert sorted(path.name for path in tmp_path.rglob('part-*.parquet')) == \
+            sorted(Path(name).name for name in second["files"])
+        assert not set(first["files"]) & set(second["files"])
+
+    asyncio.run(run())
@@ -0,0 +1,70 @@
+import asyncio
+
+import pytest
+
+from compression import CompressionMiddleware, _Compressor
+
+from .helpers import decoder
+
+CSV_CHUNK = b"".join(b"INV-%05d,2025-01-01,Customer %d,1234.500\r\n" % (i, i) for i in range(200))
+
+
+def streaming_app(chunks):
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", b"text/csv; charset=utf-8")]})
+        for chunk in chunks:
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+    return app
+
+
+def run_app(app, accept_encoding):
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": "/", "headers": [(b"accept-encoding", accept_encoding)]}
+    asyncio.run(CompressionMiddleware(app)(scope, receive, send))
+    return messages
+
+
+@pytest.mark.parametrize("encoding", ['br', 'gzip'])
+def test_compressor_flush_emits_decodable_chunks(encoding):
+    compressor = _Compressor(encoding)
+    decode = decoder(encoding)
+    for _ in range(50):
+        chunk = compressor.compress(CSV_CHUNK) + compressor.flush()
+        assert decode(chunk) == CSV_CHUNK
+    assert decode(compressor.finish()) == b""
+
+
+@pytest.mark.parametrize("encoding", ['br', 'gzip'])
+def test_streamed_response_is_sent_chunk_by_chunk(encoding):
+    messages = run_app(streaming_app([CSV_CHUNK] * 50), encoding.encode())
+
+    start, *bodies = messages
+    assert dict(start["headers"])[b"content-encoding"] == encoding.encode()
+    assert bodies[-1]["more_body"] is False
+    intermediate = bodies[:-1]
+    assert len(intermediate) == 50
+    assert all(message["more_body"] and message["body"] for message in intermediate)
+    # The first chunk decodes on its own, before the rest of the stream exists
+    decode = decoder(encoding)
+    assert decode(intermediate[0]["body"]) == CSV_CHUNK
+    decoded = b"".join(decode(message["body"]) for message in bodies[1:])
+    assert decoded == CSV_CHUNK * 49
+
+
+def test_small_single_body_is_not_compressed():
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": b'{"ok": true}'})
+
+    start, body = run_app(app, b"br, gzip")
+    assert b"content-encoding" not in dict(start["headers"])
+    assert body["body"] == b'{"ok": true}'
@@ -0,0 +1,29 @@
+import asyncio
+
+from .helpers import admin_headers, api_client, generate_dataset
+
+
+def test_unknown_party_is_rejected_before_reading_its_history(server, monkeypatch):
+    batches = []
+    run_query_batch = server.run_query_batch
+
+    async def counted_batch(*query_factories, **kwargs):
+        batches.append(len(query_factories))
+        return await run_query_batch(*query_factories, **kwargs)
+
+    monkeypatch.setattr(server, 'run_query_batch', counted_batch)
+
+    async def run():
+        await generate_dataset(server.db)
+        party = await server.db.parties.find_one({"is_deleted": False})
+        headers = await admin_headers(server)
+        async with api_client(server) as client:
+            missing = await client.get("/api/parties/no-such-party/summary", headers=headers)
+            assert missing.status_code == 404, missing.text
+            assert batches == []
+            found = await client.get(f"/api/parties/{party['id']}/summary", headers=headers)
+            assert found.status_code == 200, found.text
+            assert found.json()["party"]["id"] == party["id"]
+            assert batches == [3]
+
+    asyncio.run(run())
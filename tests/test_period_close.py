@@ -0,0 +1,143 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from party_statement import Balances, balances_by_party
+from period_close import (
+    ACCOUNTING_PERIODS_COLLECTION, PERIOD_BALANCES_COLLECTION, carried_party_balances, ledger_totals,
+    ledger_totals_until, parse_period,
+)
+
+from .helpers import admin_headers, api_client, generate_dataset
+
+NOW = datetime.now(timezone.utc)
+# Generated data spans the last three years: close its first full fiscal year, then a later month
+CLOSED_YEAR = parse_period(str(NOW.year - 2))
+CLOSED_MONTH = parse_period(f"{NOW.year - 1}-06")
+IN_CLOSED_PERIOD = CLOSED_YEAR.starts_at + timedelta(days=40)
+
+
+async def close(client, headers, *periods):
+    for period in periods:
+        response = await client.post("/api/accounting-periods/close", json={"period": period.key}, headers=headers)
+        assert response.status_code == 201, response.text
+
+
+def test_snapshot_plus_later_postings_equals_full_rescan(server):
+    async def run():
+        await generate_dataset(server.db)
+        headers = await admin_headers(server)
+        async with api_client(server) as client:
+            await close(client, headers, CLOSED_YEAR, CLOSED_MONTH)
+
+        # Accounts: nearest snapshot + transactions after it, at the end and inside the open period
+        assert await ledger_totals_until(server.db, None) == await ledger_totals(server.db, None)
+        until = CLOSED_MONTH.ends_before + timedelta(days=45)
+        assert await ledger_totals_until(server.db, until) == await ledger_totals(server.db, {"$lte": until})
+
+        # Parties: snapshot row + statement postings after it
+        full = await balances_by_party(server.db, None)
+        later = await balances_by_party(server.db, {"$gte": CLOSED_MONTH.ends_before})
+        assert full
+        for party_id, balances in full.items():
+            ends_before, carried = await carried_party_balances(server.db, party_id, NOW)
+            assert ends_before.replace(tzinfo=timezone.utc) == CLOSED_MONTH.ends_before
+            carried.merge(later.get(party_id, Balances()))
+            assert carried == balances, party_id
+
+    asyncio.run(run())
+
+
+def test_financial_summary_is_unchanged_by_a_close(server):
+    ranges = [
+        {},
+        {"start_date": CLOSED_YEAR.starts_at.date().isoformat()},
+        {"start_date": (CLOSED_YEAR.starts_at + timedelta(days=100)).date().isoformat(),
+         "end_date": (CLOSED_MONTH.ends_before + timedelta(days=20)).date().isoformat()},
+        {"end_date": CLOSED_MONTH.starts_at.date().isoformat()},
+    ]
+
+    async def summaries(client, headers):
+        results = []
+        for params in ranges:
+            response = await client.get("/api/reports/financial-summary", params=params, headers=headers)
+            assert response.status_code == 200, response.text
+            results.append(response.json())
+        return results
+
+    async def run():
+        await generate_dataset(server.db)
+        headers = await admin_headers(server)
+        async with api_client(server) as client:
+            before = await summaries(client, headers)
+            await close(client, headers, CLOSED_YEAR, CLOSED_MONTH)
+            assert await summaries(client, headers) == before
+
+    asyncio.run(run())
+
+
+def test_writes_dated_in_a_closed_period_are_rejected(server):
+    db = server.db
+    draft = {"is_deleted": False, "date": IN_CLOSED_PERIOD, "created_at": IN_CLOSED_PERIOD}
+    invoice_id, purchase_id, return_id = (str(uuid.uuid4()) for _ in range(3))
+
+    async def run():
+        headers = await admin_headers(server)
+        account_id = str(uuid.uuid4())
+        await db.accounts.insert_one({"id": account_id, "name": "Cash", "account_type": "asset",
+                                      "opening_balance": 0, "current_balance": 0, "is_deleted": False})
+        await db.parties.insert_one({"id": "p1", "name": "Customer", "party_type": "customer", "is_deleted": False})
+        await db.invoices.insert_one({**draft, "id": invoice_id, "invoice_number": "INV-1", "status": "draft",
+                                      "invoice_type": "sale", "grand_total": 100, "balance_due": 100})
+        await db.purchases.insert_one({**draft, "id": purchase_id, "status": "Draft", "locked": False,
+                                       "amount_total": 100, "weight_grams": 10})
+        await db.returns.insert_one({**draft, "id": return_id, "return_number": "RET-1", "status": "draft",
+                                     "return_type": "sale_return", "refund_mode": "money"})
+        async with api_client(server) as client:
+            await close(client, headers, CLOSED_YEAR)
+            responses = {
+                "transaction": await client.post("/api/transactions", headers=headers, json={
+                    "account_id": account_id, "transaction_type": "debit", "amount": 10, "mode": "cash",
+                    "category": "sales", "date": IN_CLOSED_PERIOD.isoformat()}),
+                "gold ledger": await client.post("/api/gold-ledger", headers=headers, json={
+                    "party_id": "p1", "type": "IN", "weight_grams": 1, "purity_entered": 916,
+                    "purpose": "job_work", "date": IN_CLOSED_PERIOD.isoformat()}),
+                "purchase create": await client.post("/api/purchases", headers=headers, json={
+                    "is_walk_in": True, "vendor_oman_id": "12345678", "walk_in_vendor_name": "Walk-in",
+                    "items": [{"description": "Ring", "weight_grams": 5, "entered_purity": 916,
+                               "rate_per_gram_22k": 20}],
+                    "date": IN_CLOSED_PERIOD.isoformat()}),
+                "purchase update": await client.patch(
+                    f"/api/purchases/{purchase_id}", headers=headers, json={"description": "edited"}),
+                "purchase delete": await client.delete(f"/api/purchases/{purchase_id}", headers=headers),
+                "invoice finalize": await client.post(f"/api/invoices/{invoice_id}/finalize", headers=headers),
+                "return finalize": await client.post(f"/api/returns/{return_id}/finalize", headers=headers),
+            }
+        for what, response in responses.items():
+            assert response.status_code == 400, (what, response.text)
+            assert "closed accounting period" in response.json()["detail"], what
+
+        assert await db.transactions.count_documents({}) == 0
+        assert await db.gold_ledger.count_documents({}) == 0
+        assert await db.purchases.count_documents({}) == 1
+        assert (await db.purchases.find_one({"id": purchase_id}))["is_deleted"] is False
+        assert (await db.invoices.find_one({"id": invoice_id}))["status"] == "draft"
+        assert (await db.returns.find_one({"id": return_id}))["status"] == "draft"
+
+    asyncio.run(run())
+
+
+def test_reopening_the_latest_month_drops_its_snapshot(server):
+    async def run():
+        await generate_dataset(server.db)
+        headers = await admin_headers(server)
+        async with api_client(server) as client:
+            await close(client, headers, CLOSED_YEAR, CLOSED_MONTH)
+            assert (await client.delete(f"/api/accounting-periods/{CLOSED_YEAR.key}", headers=headers)).status_code == 400
+            response = await client.delete(f"/api/accounting-periods/{CLOSED_MONTH.key}", headers=headers)
+            assert response.status_code == 200, response.text
+        assert await server.db[PERIOD_BALANCES_COLLECTION].count_documents({"period": CLOSED_MONTH.key}) == 0
+        assert [period["period"] async for period in server.db[ACCOUNTING_PERIODS_COLLECTION].find({})] == \
+            [CLOSED_YEAR.key]
+
+    asyncio.run(run())
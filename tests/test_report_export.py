@@ -0,0 +1,148 @@
+import asyncio
+import csv
+import io
+import json
+from datetime import datetime
+
+import pytest
+from bson import Decimal128
+
+from compression import CompressionMiddleware
+from report_export import EXPORT_CHUNK_ROWS, row_export_response
+
+from .helpers import admin_headers, api_client, decoder, generate_dataset
+
+COLUMNS = [("Invoice #", "invoice_number"), ("Customer", "customer_name"), ("Total", "grand_total")]
+ROWS = 3 * EXPORT_CHUNK_ROWS
+
+
+class GatedCursor:
+    """Rows of an export; after the first chunk's rows it waits until the client has decoded them"""
+
+    def __init__(self, first_chunk_seen: asyncio.Event):
+        self.first_chunk_seen = first_chunk_seen
+        self.exhausted = False
+
+    async def __aiter__(self):
+        for i in range(ROWS):
+            if i == EXPORT_CHUNK_ROWS:
+                # Times out when the middleware holds the chunk back until the end of the body
+                await asyncio.wait_for(self.first_chunk_seen.wait(), timeout=5)
+            yield {"invoice_number": f"INV-{i:05d}", "customer_name": f"Customer {i}", "grand_total": 1234.5}
+        self.exhausted = True
+
+
+def parse(format, data: bytes) -> list:
+    text = data.decode('utf-8')
+    if format == 'csv':
+        return list(csv.reader(io.StringIO(text)))[1:]
+    return [json.loads(line) for line in text.splitlines()]
+
+
+async def stream_export(format, encoding):
+    first_chunk_seen = asyncio.Event()
+    cursor = GatedCursor(first_chunk_seen)
+    app = CompressionMiddleware(row_export_response(format, COLUMNS, cursor, "invoices_export"))
+    decode = decoder(encoding)
+    decoded = []
+    start = {}
+    rows_before_exhausted = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            start.update(message)
+            return
+        decoded.append(decode(message["body"]))
+        if not first_chunk_seen.is_set() and len(parse(format, b"".join(decoded))) >= EXPORT_CHUNK_ROWS:
+            rows_before_exhausted.append(cursor.exhausted)
+            first_chunk_seen.set()
+
+    # ASGI 2.4: the response does not listen for disconnects while streaming
+    scope = {"type": "http", "asgi": {"spec_version": "2.4"}, "method": "GET", "path": "/",
+             "headers": [(b"accept-encoding", encoding.encode())]}
+    await app(scope, receive, send)
+    return start, rows_before_exhausted, b"".join(decoded)
+
+
+@pytest.mark.parametrize("encoding", ['br', 'gzip'])
+@pytest.mark.parametrize("format", ['csv', 'ndjson'])
+def test_compressed_export_sends_first_chunk_before_cursor_is_exhausted(format, encoding):
+    start, rows_before_exhausted, body = asyncio.run(stream_export(format, encoding))
+
+    assert dict(start["headers"])[b"content-encoding"] == encoding.encode()
+    assert rows_before_exhausted == [False]
+    rows = parse(format, body)
+    assert len(rows) == ROWS
+    if format == 'csv':
+        assert rows[-1] == [f"INV-{ROWS - 1:05d}", f"Customer {ROWS - 1}", "1234.5"]
+    else:
+        assert rows[-1] == {"invoice_number": f"INV-{ROWS - 1:05d}", "customer_name": f"Customer {ROWS - 1}",
+                            "grand_total": 1234.5}
+
+
+def invoice(number: str, day: int, grand_total: str, items, **fields) -> dict:
+    doc = {"id": number, "invoice_number": number, "date": datetime(2025, 3, day), "customer_type": "walk_in",
+           "walk_in_name": f"Customer {number}", "invoice_type": "sale", "status": "finalized",
+           "grand_total": Decimal128(grand_total), "paid_amount": Decimal128("10.000"),
+           "balance_due": Decimal128(str(float(grand_total) - 10)), "vat_total": Decimal128("1.250"),
+           "payment_status": "partial", "is_deleted": False, **fields}
+    if items is not None:
+        doc["items"] = items
+    return doc
+
+
+def item(description: str, gold_value: str, making_value: str) -> dict:
+    return {"category": "Ring", "description": description, "qty": 1, "purity": 916,
+            "weight": Decimal128("5.125"), "metal_rate": Decimal128("24.500"), "gold_value": Decimal128(gold_value),
+            "making_value": Decimal128(making_value), "vat_percent": 5, "vat_amount": Decimal128("1.250"),
+            "line_total": Decimal128(gold_value)}
+
+
+def test_invoice_workbook_lists_invoices_without_items_and_totals_every_row(server):
+    openpyxl = pytest.importorskip('openpyxl')
+
+    async def run():
+        await server.db.invoices.insert_many([
+            invoice("INV-1", 1, "200.500", [item("a", "100.125", "20.250"), item("b", "50.250", "5.500")]),
+            invoice("INV-2", 3, "30.000", []),
+            invoice("INV-3", 2, "40.000", None),
+            invoice("INV-4", 4, "99.000", [item("c", "80.000", "9.000")], is_deleted=True),
+        ])
+        async with api_client(server) as client:
+            response = await client.get("/api/reports/invoices-export", headers=await admin_headers(server))
+        assert response.status_code == 200, response.text
+        return openpyxl.load_workbook(io.BytesIO(response.content))
+
+    workbook = asyncio.run(run())
+    summary, items, totals = (list(ws.iter_rows(min_row=2, values_only=True)) for ws in workbook.worksheets)
+    assert [row[0] for row in summary] == ["INV-2", "INV-3", "INV-1"]
+    assert [(row[0], row[4], row[9]) for row in items] == [("INV-1", "a", 100.125), ("INV-1", "b", 50.25)]
+    assert {row[0]: row[1] for row in totals if row and row[0]} == {
+        "Total Invoices": 3, "Metal Total (OMR)": 150.375, "Making Charges Total (OMR)": 25.75,
+        "VAT Total (OMR)": 3.75, "Grand Total (OMR)": 270.5, "Total Paid (OMR)": 30.0,
+        "Total Outstanding (OMR)": 240.5,
+    }
+
+
+def test_party_statement_csv_has_the_ndjson_lines(server):
+    async def run():
+        await generate_dataset(server.db)
+        party = await server.db.parties.find_one({"party_type": "customer", "is_deleted": False})
+        url = f"/api/reports/party/{party['id']}/statement/export"
+        async with api_client(server) as client:
+            headers = await admin_headers(server)
+            csv_response = await client.get(url, params={"format": "csv"}, headers=headers)
+            ndjson_response = await client.get(url, params={"format": "ndjson"}, headers=headers)
+        assert csv_response.status_code == 200, csv_response.text
+        assert csv_response.headers["content-type"].startswith("text/csv")
+        return csv_response.text, ndjson_response.text
+
+    csv_text, ndjson_text = asyncio.run(run())
+    header, *rows = list(csv.reader(io.StringIO(csv_text)))
+    lines = [line for line in map(json.loads, ndjson_text.splitlines()) if line["type"] == "line"]
+    assert header[0] == "Date" and header[-1] == "Gold Balance (g)"
+    assert lines and len(rows) == len(lines)
+    assert [(row[2], float(row[6])) for row in rows] == [(line["reference"] or "", line["money_balance"]) for line in lines]
@@ -0,0 +1,103 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+from bson import Decimal128
+
+from .helpers import admin_headers, api_client
+
+NOW = datetime(2025, 5, 1, tzinfo=timezone.utc)
+
+
+def line(line_id: str, description: str, weight: str, amount: str) -> dict:
+    return {"id": line_id, "description": description, "qty": 1, "purity": 916,
+            "weight": Decimal128(weight), "net_gold_weight": Decimal128(weight), "line_total": Decimal128(amount)}
+
+
+INVOICE = {
+    "id": "inv1", "invoice_number": "INV-1", "status": "finalized", "is_deleted": False,
+    "grand_total": Decimal128("450.000"),
+    "items": [line("l1", "Bangle", "10.000", "200.000"), line("l2", "Bangle", "10.000", "200.000"),
+              line("l3", "Ring", "2.500", "50.000")],
+}
+
+
+def sale_return(return_id: str, qty: int, weight: str, amount: str, status: str = "processing", **item) -> dict:
+    """A return as finalize_return applies it: locked in 'processing', so the counter backfill skips it"""
+    return {"id": return_id, "reference_type": "invoice", "reference_id": "inv1", "status": status,
+            "is_deleted": False, "total_amount": Decimal128(amount),
+            "items": [{"description": "Bangle", "purity": 916, "qty": qty, "weight_grams": Decimal128(weight),
+                       "amount": Decimal128(amount), **item}]}
+
+
+async def returned_by_line(db) -> dict:
+    invoice = await db.invoices.find_one({"id": "inv1"})
+    return {key: (int(counters["qty"]), counters["weight_grams"].to_decimal(), counters["amount"].to_decimal())
+            for key, counters in invoice["returned_items"].items() if counters["qty"] or counters["weight_grams"]}
+
+
+def test_item_without_line_id_spreads_over_identical_lines(server):
+    db = server.db
+
+    async def run():
+        await db.invoices.insert_one(dict(INVOICE))
+        first = sale_return("r1", 1, "6.000", "120.000")
+        await db.returns.insert_one(dict(first))
+        assert await server.apply_return_counters(db, first)
+        second = sale_return("r2", 1, "14.000", "280.000")
+        await db.returns.insert_one(dict(second))
+        assert await server.apply_return_counters(db, second)
+
+        # l1 has 4g left after the first return; the rest of the second goes to l2
+        assert await returned_by_line(db) == {
+            "l1": (1, Decimal("10.000"), Decimal("200.000")),
+            "l2": (1, Decimal("10.000"), Decimal("200.000")),
+        }
+        async with api_client(server) as client:
+            response = await client.get("/api/invoices/inv1/returnable-items", headers=await admin_headers(server))
+        assert [item["item_id"] for item in response.json()] == ["l3"]
+
+        # Taking the first return back out subtracts what it added, not a fresh split
+        stored = await db.returns.find_one({"id": "r1"})
+        assert [allocation["line"] for allocation in stored["returned_lines"]] == ["l1"]
+        assert await server.apply_return_counters(db, stored, direction=-1)
+        assert await returned_by_line(db) == {
+            "l1": (0, Decimal("4.000"), Decimal("80.000")),
+            "l2": (1, Decimal("10.000"), Decimal("200.000")),
+        }
+        assert "returned_lines" not in await db.returns.find_one({"id": "r1"})
+
+    asyncio.run(run())
+
+
+def test_item_id_keeps_the_return_on_its_line(server):
+    db = server.db
+
+    async def run():
+        await db.invoices.insert_one(dict(INVOICE))
+        ret = sale_return("r1", 1, "10.000", "200.000", item_id="l2")
+        await db.returns.insert_one(dict(ret))
+        assert await server.apply_return_counters(db, ret)
+        assert await returned_by_line(db) == {"l2": (1, Decimal("10.000"), Decimal("200.000"))}
+
+    asyncio.run(run())
+
+
+def test_backfill_spreads_older_returns_in_finalization_order(server):
+    db = server.db
+
+    async def run():
+        await db.invoices.insert_one(dict(INVOICE))
+        await db.returns.insert_many([
+            {**sale_return("r2", 1, "10.000", "200.000", "finalized"), "finalized_at": NOW + timedelta(days=1)},
+            {**sale_return("r1", 1, "10.000", "200.000", "finalized"), "finalized_at": NOW},
+        ])
+        invoice = await server.ensure_return_counters(db, 'invoice', await db.invoices.find_one({"id": "inv1"}))
+        assert invoice["returned_totals"]["qty"] == 2
+        assert await returned_by_line(db) == {
+            "l1": (1, Decimal("10.000"), Decimal("200.000")),
+            "l2": (1, Decimal("10.000"), Decimal("200.000")),
+        }
+
+    asyncio.run(run())
+
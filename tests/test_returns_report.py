@@ -0,0 +1,132 @@
+import asyncio
+import json
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone
+from decimal import Decimal
+
+import pytest
+from bson import Decimal128
+
+from .helpers import admin_headers, api_client, generate_dataset
+
+WHEN = datetime(2025, 2, 10, tzinfo=timezone.utc)
+
+
+def extra_return(number: str, return_type: str, refund_mode: str, amount: str, money: str, gold: str,
+                 **fields) -> dict:
+    """Returns of the kinds the generated dataset lacks (purchase, gold and mixed refunds, drafts, deleted)"""
+    return {
+        "id": str(uuid.uuid4()), "return_number": number, "return_type": return_type,
+        "reference_type": "invoice" if return_type == 'sale_return' else "purchase", "reference_id": "ref",
+        "party_id": "p-extra", "party_name": "Extra (Trading) Co", "date": WHEN, "reason": "Damaged clasp",
+        "total_amount": Decimal128(amount), "refund_mode": refund_mode, "refund_money_amount": Decimal128(money),
+        "refund_gold_grams": Decimal128(gold), "status": "finalized", "is_deleted": False, **fields,
+    }
+
+
+EXTRA_RETURNS = [
+    extra_return("RET-X-1", "purchase_return", "gold", "310.500", "0", "12.345"),
+    extra_return("RET-X-2", "purchase_return", "mixed", "99.990", "49.990", "2.000"),
+    extra_return("RET-X-3", "sale_return", "gold", "75.250", "0", "3.125"),
+    extra_return("RET-X-4", "sale_return", "money", "1000", "1000", "0", status="draft"),
+    extra_return("RET-X-5", "sale_return", "money", "1000", "1000", "0", is_deleted=True),
+]
+
+
+def decimal(value) -> Decimal:
+    return value.to_decimal() if isinstance(value, Decimal128) else Decimal(str(value or 0))
+
+
+def expected_summary(returns: list) -> dict:
+    """The summary recomputed from the finalized return documents"""
+    totals = {"count": 0, "amount": Decimal(0), "money": Decimal(0), "gold": Decimal(0)}
+    by_type = defaultdict(lambda: {"count": 0, "amount": Decimal(0)})
+    by_mode = defaultdict(lambda: {"count": 0, "amount": Decimal(0), "money": Decimal(0), "gold": Decimal(0)})
+    for ret in returns:
+        amount, money, gold = (decimal(ret.get(field)) for field in
+                               ("total_amount", "refund_money_amount", "refund_gold_grams"))
+        for group in (totals, by_type[ret["return_type"]], by_mode[ret["refund_mode"]]):
+            group["count"] += 1
+            group["amount"] += amount
+        for group in (totals, by_mode[ret["refund_mode"]]):
+            group["money"] += money
+            group["gold"] += gold
+    return {
+        "total_returns_count": totals["count"],
+        "sales_returns_amount": round(float(by_type["sale_return"]["amount"]), 2),
+        "purchase_returns_amount": round(float(by_type["purchase_return"]["amount"]), 2),
+        "total_refund_amount": round(float(totals["amount"]), 2),
+        "money_refunded": round(float(totals["money"]), 2),
+        "gold_refunded": round(float(totals["gold"]), 3),
+        "by_return_type": {name: {"count": group["count"], "amount": round(float(group["amount"]), 2)}
+                           for name, group in by_type.items() if group["count"]},
+        "by_refund_mode": {name: {"count": group["count"], "amount": round(float(group["amount"]), 2),
+                                  "money_refunded": round(float(group["money"]), 2),
+                                  "gold_refunded": round(float(group["gold"]), 3)}
+                           for name, group in by_mode.items()},
+    }
+
+
+def matches(ret: dict, search: str) -> bool:
+    return any(search.lower() in (ret.get(field) or '').lower() for field in ("party_name", "return_number", "reason"))
+
+
+async def setup(server) -> list:
+    await generate_dataset(server.db)
+    await server.db.returns.insert_many([dict(ret) for ret in EXTRA_RETURNS])
+    return await server.db.returns.find({"is_deleted": False}, {"_id": 0}).to_list(None)
+
+
+@pytest.mark.parametrize("params", [
+    {},
+    {"return_type": "purchase_return"},
+    {"refund_mode": "gold"},
+    {"date_from": "2025-01-01", "date_to": "2025-03-01"},
+])
+def test_summary_totals_and_breakdowns_match_the_returns(server, params):
+    async def run():
+        returns = await setup(server)
+        async with api_client(server) as client:
+            response = await client.get("/api/reports/returns-summary", params=params,
+                                        headers=await admin_headers(server))
+        assert response.status_code == 200, response.text
+
+        finalized = [ret for ret in returns if ret["status"] == "finalized"
+                     and ret["return_type"] == params.get("return_type", ret["return_type"])
+                     and ret["refund_mode"] == params.get("refund_mode", ret["refund_mode"])]
+        if "date_from" in params:
+            start, end = (datetime.fromisoformat(params[name]) for name in ("date_from", "date_to"))
+            finalized = [ret for ret in finalized if start <= ret["date"].replace(tzinfo=None) <= end]
+        assert finalized
+        assert response.json() == expected_summary(finalized)
+
+    asyncio.run(run())
+
+
+@pytest.mark.parametrize("search", ["extra (trading", "ret-x-", "CLASP", "no such return ("])
+def test_search_filters_summary_and_exports(server, search):
+    async def run():
+        returns = await setup(server)
+        headers = await admin_headers(server)
+        params = {"search": search}
+        async with api_client(server) as client:
+            summary = await client.get("/api/reports/returns-summary", params=params, headers=headers)
+            ndjson = await client.get("/api/reports/returns-export", params={**params, "format": "ndjson"},
+                                      headers=headers)
+            xlsx = await client.get("/api/reports/returns-export", params=params, headers=headers)
+            pdf = await client.get("/api/reports/returns-pdf", params=params, headers=headers)
+
+        for response in (summary, ndjson, xlsx, pdf):
+            assert response.status_code == 200, response.text
+        assert xlsx.content[:2] == b"PK"
+        assert pdf.content[:5] == b"%PDF-"
+
+        found = [ret for ret in returns if matches(ret, search)]
+        assert summary.json() == expected_summary([ret for ret in found if ret["status"] == "finalized"])
+        # The exports list every status of the matched returns
+        rows = [json.loads(line) for line in ndjson.text.splitlines()]
+        assert sorted(row["return_number"] for row in rows) == sorted(ret["return_number"] for ret in found)
+        assert bool(found) != search.startswith("no such")
+
+    asyncio.run(run())
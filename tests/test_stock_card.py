@@ -0,0 +1,92 @@
+import asyncio
+import random
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pytest
+from bson import Decimal128
+
+from stock_card import stock_card_page, stock_card_totals
+
+START = datetime(2025, 1, 1)
+
+
+def movements(header_id: str, count: int, seed: int) -> list:
+    rng = random.Random(seed)
+    docs = []
+    for i in range(count):
+        qty = rng.choice([1, 2, 3, -1, -2])
+        docs.append({
+            "id": f"{header_id}-{rng.randrange(10 ** 6):06d}-{i}",
+            "header_id": header_id,
+            # Few distinct dates, so pages often split movements of the same timestamp
+            "date": START + timedelta(days=rng.randrange(-20, 40)),
+            "qty_delta": Decimal128(str(qty)),
+            "weight_delta": Decimal128(str(Decimal(rng.randrange(1, 50000)) / 1000 * (1 if qty > 0 else -1))),
+            "is_deleted": rng.random() < 0.05,
+        })
+    return docs
+
+
+def running(docs, opening_qty=Decimal(0), opening_weight=Decimal(0)):
+    """(id, running qty, running weight) of docs in (date, id) order"""
+    qty, weight, rows = opening_qty, opening_weight, []
+    for doc in sorted(docs, key=lambda doc: (doc["date"], doc["id"])):
+        qty += doc["qty_delta"].to_decimal()
+        weight += doc["weight_delta"].to_decimal()
+        rows.append((doc["id"], qty, weight))
+    return rows
+
+
+async def page_through(db, header_id, start, end, totals, page_size):
+    rows, cursor, pages = [], None, 0
+    while True:
+        page, cursor = await stock_card_page(
+            db, header_id, start, end, totals["opening_qty"], totals["opening_weight"], cursor, page_size)
+        rows += page
+        pages += 1
+        if cursor is None:
+            return rows, pages
+
+
+@pytest.mark.parametrize("page_size", [1, 7, 50, 500])
+def test_pages_continue_running_balances_across_cursors(db, page_size):
+    docs = movements("h1", 120, seed=1) + movements("h2", 30, seed=2)
+    end = START + timedelta(days=30)
+
+    async def run():
+        await db.stock_movements.insert_many([dict(doc) for doc in docs])
+        totals = await stock_card_totals(db, "h1", START, end)
+        rows, pages = await page_through(db, "h1", START, end, totals, page_size)
+
+        live = [doc for doc in docs if doc["header_id"] == "h1" and not doc["is_deleted"]]
+        before = [doc for doc in live if doc["date"] < START]
+        in_range = [doc for doc in live if START <= doc["date"] <= end]
+        opening_qty = sum((doc["qty_delta"].to_decimal() for doc in before), Decimal(0))
+        opening_weight = sum((doc["weight_delta"].to_decimal() for doc in before), Decimal(0))
+        assert (totals["opening_qty"], totals["opening_weight"]) == (opening_qty, opening_weight)
+        assert totals["count"] == len(in_range) == len(rows)
+        # Lookahead of one row: no empty trailing page when the count is a multiple of the size
+        assert pages == max(1, -(-len(rows) // page_size))
+
+        expected = running(in_range, opening_qty, opening_weight)
+        actual = [(row["id"], row["running_qty"].to_decimal(), row["running_weight"].to_decimal()) for row in rows]
+        assert actual == expected
+        # The last row's balance is the closing stock of the summary
+        assert actual[-1][1:] == (opening_qty + totals["qty"], opening_weight + totals["weight"])
+
+    asyncio.run(run())
+
+
+def test_cursor_of_another_header_is_rejected(db):
+    async def run():
+        await db.stock_movements.insert_many(movements("h1", 10, seed=3) + movements("h2", 10, seed=4))
+        zero = Decimal(0)
+        _rows, cursor = await stock_card_page(db, "h1", None, None, zero, zero, None, 3)
+        assert cursor
+        with pytest.raises(ValueError, match="another inventory header"):
+            await stock_card_page(db, "h2", None, None, zero, zero, cursor, 3)
+        with pytest.raises(ValueError, match="Invalid cursor"):
+            await stock_card_page(db, "h1", None, None, zero, zero, cursor[:-4], 3)
+
+    asyncio.run(run())